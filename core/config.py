@@ -58,6 +58,10 @@ MCP_FETCH_SERVER_URL: str = os.getenv("MCP_FETCH_SERVER_URL", "http://localhost:
 MCP_FETCH_ENABLED: bool = os.getenv("MCP_FETCH_ENABLED", "false").lower() == "true"
 MCP_FETCH_TIMEOUT: float = float(os.getenv("MCP_FETCH_TIMEOUT", "30.0"))
 
+# ===== Local state (индексы, курсоры, кэши) =====
+_PROJECT_ROOT: str = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+STATE_DIR: str = os.getenv("SOOBSHIO_STATE_DIR", os.path.join(_PROJECT_ROOT, "data", "state"))
+
 # ===== Other =====
 JWT_SECRET: str = os.getenv("JWT_SECRET", "")
 NV_OPENDATA_API_KEY: str = os.getenv("NV_OPENDATA_API_KEY", "")
@@ -1,91 +1,61 @@
-import re
 import logging
 from typing import Tuple, Optional, Dict, Any
 from dotenv import load_dotenv
 
+from services.address_extractor import extract_address
+from services.message_filters import keyword_category
+
 # Load .env from project root
 load_dotenv()
 
 logger = logging.getLogger(__name__)
 
 # Nominatim for geocoding
-NOMINATIM_URL = "https://nominatim.openstreetmap.org/search"
 DEFAULT_LAT = 60.9344
 DEFAULT_LNG = 76.5531
 DEFAULT_ADDRESS = "Нижневартовск центр"
 
-# Categories for keyword matching
-CATEGORY_KEYWORDS = {
-    "Дороги": ["яма", "дорог", "асфальт", "тротуар", "выбоин", "колея", "светофор"],
-    "ЖКХ": ["жкх", "управляющ", "коммунал", "квитанц", "тариф", "подъезд"],
-    "Освещение": ["фонар", "освещен", "свет не гор", "темно", "лампа"],
-    "Транспорт": ["автобус", "маршрут", "транспорт", "остановк", "парков"],
-    "Экология": ["эколог", "загрязн", "выброс", "запах", "мусор", "свалк"],
-    "Безопасность": ["полиц", "кража", "вандал", "камер", "охрана"],
-    "Снег/Наледь": ["снег", "налед", "гололёд", "гололед", "сугроб"],
-    "Отопление": ["отоплен", "батаре", "холодн", "не греет"],
-    "Водоснабжение и канализация": ["канализ", "труб", "течь", "затоп", "прорыв"],
-    "Благоустройство": ["двор", "клумб", "газон", "лавочк", "сквер", "парк"],
-}
-
 
 def _extract_address_from_text(text: str) -> Optional[str]:
     """Извлечь адрес из текста сообщения"""
-    patterns = [
-        r'ул\.?\s+([А-Яа-яЁё]+)\s*,?\s*(\d+[а-яА-Я]?)',
-        r'улица\s+([А-Яа-яЁё]+)\s*,?\s*(\d+[а-яА-Я]?)',
-        r'пр-?кт\.?\s+([А-Яа-яЁё]+)\s*,?\s*(\d+[а-яА-Я]?)',
-        r'проспект\s+([А-Яа-яЁё]+)\s*,?\s*(\d+[а-яА-Я]?)',
-        r'пер\.?\s+([А-Яа-яЁё]+)\s*,?\s*(\d+[а-яА-Я]?)',
-        r'переулок\s+([А-Яа-я�ё]+)\s*,?\s*(\d+[а-яА-Я]?)',
-        r'мкр\.?\s+(\d+[а-яА-Я]?)\s*,?\s*д\.?\s*(\d+)',
-        r'микрорайон\s+(\d+)\s*,?\s*дом\s+(\d+)',
-    ]
-    
-    for pattern in patterns:
-        match = re.search(pattern, text, re.IGNORECASE)
-        if match:
-            parts = [g for g in match.groups() if g]
-            return " ".join(parts) + ", Нижневартовск"
-    
-    return None
+    return extract_address(text)
 
 
 def _extract_category_from_text(text: str) -> str:
     """Определить категорию по ключевым словам"""
-    text_lower = text.lower()
-    
-    for category, keywords in CATEGORY_KEYWORDS.items():
-        for keyword in keywords:
-            if keyword in text_lower:
-                return category
-    
-    return "Прочее"
+    return keyword_category(text, "geo")
 
 
 async def nominatim_geocode(address: str) -> Tuple[float, float]:
     """Геокодинг адреса через Nominatim"""
     if not address or address == "Нижневартовск центр":
         return DEFAULT_LAT, DEFAULT_LNG
-    
-    try:
-        import httpx
-        params = {
-            'q': f"Нижневартовск {address}",
-            'format': 'json',
-            'limit': 1,
-            'accept-language': 'ru'
-        }
-        headers = {'User-Agent': 'Soobshio/1.0 (City Complaint System)'}
-        
-        async with httpx.AsyncClient(timeout=10.0) as client:
-            resp = await client.get(NOMINATIM_URL, params=params, headers=headers)
-            if resp.status_code == 200:
-                data = resp.json()
-                if data:
-                    return float(data[0]['lat']), float(data[0]['lon'])
-    except Exception as e:
-        logger.warning(f"Nominatim geocoding failed: {e}")
+
+    from services.gazetteer import get_gazetteer
+    from services.geo_cache import MISS, get_geo_cache
+    from services.nominatim_scheduler import get_nominatim_scheduler
+
+    coords = get_gazetteer().forward(address)
+    if coords:
+        return coords
+    cache = get_geo_cache()
+    cached = cache.get(address)
+    if cached is not MISS:
+        return cached if cached is not None else (DEFAULT_LAT, DEFAULT_LNG)
+
+    data = await get_nominatim_scheduler().get("search", {
+        'q': f"Нижневартовск {address}",
+        'limit': 1,
+        'accept-language': 'ru'
+    })
+    if data:
+        coords = float(data[0]['lat']), float(data[0]['lon'])
+        cache.put(address, coords)
+        return coords
+    if data is not None:
+        cache.put_negative(address)
+    else:
+        logger.warning(f"Nominatim geocoding failed: {address}")
     
     return DEFAULT_LAT, DEFAULT_LNG
 
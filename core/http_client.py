@@ -58,6 +58,18 @@ def get_proxy_url() -> str | None:
 # Специальное значение: не передавать proxy в kwargs, применять логику USE_PROXY_FOR_EXTERNAL
 _AUTO_PROXY = object()
 
+# Подмена транспорта для всех новых AsyncClient (локальные стенды и бенчмарки, без сети)
+_transport_override: httpx.AsyncBaseTransport | None = None
+
+
+def set_transport_override(transport: httpx.AsyncBaseTransport | None) -> None:
+    """
+    Направляет все клиенты get_http_client() в transport (например, httpx.MockTransport).
+    None — вернуть обычную сеть. Используется scripts/benchmarks/replay_monitoring.py.
+    """
+    global _transport_override
+    _transport_override = transport
+
 
 def get_http_client(timeout: float = 30.0, proxy: str | None | bool | object = _AUTO_PROXY, **kwargs) -> httpx.AsyncClient:
     """
@@ -66,6 +78,9 @@ def get_http_client(timeout: float = 30.0, proxy: str | None | bool | object = _
     - False или None: явно без прокси
     - True: явно с прокси (если настроен)
     """
+    if _transport_override is not None:
+        kwargs.pop("proxy", None)
+        return httpx.AsyncClient(timeout=timeout, transport=_transport_override, **kwargs)
     proxy_url = get_proxy_url()
     if "proxy" in kwargs:
         pass  # явно передан в kwargs
@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Бенчмарк извлечения адреса из текста: services/address_extractor.py (один
+проход скомпилированных шаблонов) против прежнего парсера geo_service
+(десяток re.search подряд + поиск ориентиров подстрокой).
+
+Корпус — размеченные посты scripts/benchmarks/address_corpus.jsonl (поля
+text, street, house, intersection [a, b], landmark; null — адреса нет).
+Для каждого поля печатаются точность (доля постов, где ответ совпал с
+разметкой, включая «адреса нет»), precision и recall; затем — посты, где
+ответ расходится с разметкой, и мкс на сообщение (медиана по --repeat).
+Сравнение — без учёта регистра и ё/е.
+
+Запуск из корня проекта:
+  py scripts/benchmarks/address_extraction.py
+  py scripts/benchmarks/address_extraction.py --corpus my_corpus.jsonl --show-misses
+"""
+
+import argparse
+import json
+import re
+import statistics
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent.parent
+sys.path.insert(0, str(ROOT))
+
+from services.address_extractor import AddressExtractor  # noqa: E402
+from services.landmark_index import NV_LANDMARKS, get_landmark_index  # noqa: E402
+
+DEFAULT_CORPUS = Path(__file__).resolve().parent / "address_corpus.jsonl"
+FIELDS = ("street", "house", "intersection", "landmark")
+
+
+# --- Прежняя реализация (geo_service.extract_address_from_text / find_landmark) ---
+
+def legacy_address(text):
+    intersection_patterns = [
+        r'перекр[её]ст(?:ок|ке)\s+(?:ул(?:иц[еы]|\.)\s+)?([А-Яа-яЁё]+)\s+и\s+(?:ул(?:иц[еы]|\.)\s+)?([А-Яа-яЁё]+)',
+        r'(?:на\s+)?угл[уе]\s+(?:ул(?:иц[еы]|\.)\s+)?([А-Яа-яЁё]+)\s+и\s+(?:ул(?:иц[еы]|\.)\s+)?([А-Яа-яЁё]+)',
+        r'(?:ул(?:иц[еы]|\.)\s+)?([А-Яа-яЁё]+)\s*/\s*(?:ул(?:иц[еы]|\.)\s+)?([А-Яа-яЁё]+)',
+        r'пересечени[еи]\s+(?:ул(?:иц[еы]|\.)\s+)?([А-Яа-яЁё]+)\s+и\s+(?:ул(?:иц[еы]|\.)\s+)?([А-Яа-яЁё]+)',
+    ]
+    for pat in intersection_patterns:
+        m = re.search(pat, text, re.IGNORECASE)
+        if m:
+            street1, street2 = m.group(1).strip(), m.group(2).strip()
+            skip = {'около', 'более', 'менее', 'через', 'после', 'перед'}
+            if street1.lower() in skip or street2.lower() in skip:
+                continue
+            return f"перекрёсток ул. {street1} и ул. {street2}, Нижневартовск"
+    patterns = [
+        r'(?:ул(?:ица|ице|\.)\s+)([А-Яа-яЁё]+(?:\s+[А-Яа-яЁё]+)?)\s*[,.]?\s*(?:д(?:ом)?\.?\s*)?(\d+[а-яА-Я]?(?:/\d+)?)',
+        r'(?:пр(?:оспект|оспекте|\.)\s+)([А-Яа-яЁё]+(?:\s+[А-Яа-яЁё]+)?)\s*[,.]?\s*(?:д(?:ом)?\.?\s*)?(\d+[а-яА-Я]?(?:/\d+)?)',
+        r'(?:пер(?:еулок|еулке|\.)\s+)([А-Яа-яЁё]+(?:\s+[А-Яа-яЁё]+)?)\s*[,.]?\s*(?:д(?:ом)?\.?\s*)?(\d+[а-яА-Я]?(?:/\d+)?)',
+        r'(?:б(?:ульвар|ульваре|\.)\s+)([А-Яа-яЁё]+(?:\s+[А-Яа-яЁё]+)?)\s*[,.]?\s*(?:д(?:ом)?\.?\s*)?(\d+[а-яА-Я]?(?:/\d+)?)',
+        r'(?:м(?:икрорайон|кр)\.?\s*)(\d+[а-яА-Я]?)\s*[,.]?\s*(?:д(?:ом)?\.?\s*)?(\d+[а-яА-Я]?(?:/\d+)?)',
+        r'(?:д(?:ом)?\.?\s*)(\d+[а-яА-Я]?)\s+(?:по\s+)?(?:ул(?:ице|\.)\s+)([А-Яа-яЁё]+)',
+        r'(?:^|\s)([А-Яа-яЁё]{3,}(?:\s+[А-Яа-яЁё]+)?)\s+(\d{1,3}[а-яА-Я]?)\s*(?:[,.\s]|$)',
+    ]
+    for i, pat in enumerate(patterns):
+        m = re.search(pat, text, re.IGNORECASE)
+        if m:
+            if i == 4:
+                return f"мкр. {m.group(1)} д. {m.group(2)}, Нижневартовск"
+            elif i == 5:
+                return f"ул. {m.group(2)} {m.group(1)}, Нижневартовск"
+            elif i == 6:
+                street = m.group(1)
+                skip_words = {'около', 'более', 'менее', 'через', 'после', 'перед', 'возле', 'рядом', 'номер', 'этаж', 'подъезд'}
+                if street.lower() in skip_words:
+                    continue
+                return f"ул. {street} {m.group(2)}, Нижневартовск"
+            else:
+                prefix = "ул." if i == 0 else "пр." if i == 1 else "пер." if i == 2 else "б-р"
+                return f"{prefix} {m.group(1)} {m.group(2)}, Нижневартовск"
+    return None
+
+
+def legacy_landmark(text):
+    t = text.lower()
+    for name in NV_LANDMARKS:
+        if name in t:
+            return name
+    return None
+
+
+# --- Разбор строки адреса в поля (формат общий у обеих реализаций) ---
+
+_INTERSECTION_RE = re.compile(r"^перекр[её]сток ул\. (.+) и ул\. (.+), Нижневартовск$")
+_MKR_RE = re.compile(r"^мкр\. (\S+)(?: д\. (\S+))?, Нижневартовск$")
+_STREET_RE = re.compile(r"^(?:ул\.|пр\.|пер\.|б-р) (.+?)(?: (\d\S*))?, Нижневартовск$")
+
+
+def parse_address(address):
+    fields = dict.fromkeys(("street", "house", "intersection"))
+    if not address:
+        return fields
+    m = _INTERSECTION_RE.match(address)
+    if m:
+        fields["intersection"] = (m.group(1), m.group(2))
+        return fields
+    m = _MKR_RE.match(address) or _STREET_RE.match(address)
+    if m:
+        fields["street"], fields["house"] = m.group(1), m.group(2)
+    return fields
+
+
+def legacy(text):
+    fields = parse_address(legacy_address(text))
+    fields["landmark"] = legacy_landmark(text)
+    return fields
+
+
+def make_compiled(extractor):
+    def compiled(text):
+        found = extractor.extract(text)
+        fields = parse_address(found.address)
+        fields["landmark"] = found.landmark
+        return fields
+    return compiled
+
+
+def norm(value):
+    if value is None:
+        return None
+    if isinstance(value, (list, tuple)):
+        return tuple(sorted(norm(v) for v in value))
+    return str(value).lower().replace("ё", "е").strip()
+
+
+def score(fn, corpus):
+    stats = {f: {"ok": 0, "tp": 0, "predicted": 0, "expected": 0} for f in FIELDS}
+    misses = []
+    for item in corpus:
+        got = fn(item["text"])
+        wrong = []
+        for f in FIELDS:
+            want, have = norm(item.get(f)), norm(got[f])
+            s = stats[f]
+            s["ok"] += want == have
+            s["predicted"] += have is not None
+            s["expected"] += want is not None
+            s["tp"] += have is not None and want == have
+            if want != have:
+                wrong.append(f"{f}: {got[f]!r} ≠ {item.get(f)!r}")
+        if wrong:
+            misses.append((item.get("id"), wrong))
+    return stats, misses
+
+
+def timed_us(fn, texts, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for text in texts:
+            fn(text)
+        samples.append((time.perf_counter() - start) / len(texts) * 1e6)
+    return statistics.median(samples)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--corpus", type=Path, default=DEFAULT_CORPUS)
+    parser.add_argument("--repeat", type=int, default=200)
+    parser.add_argument("--show-misses", action="store_true", help="печатать расхождения с разметкой")
+    args = parser.parse_args()
+
+    if not args.corpus.exists():
+        print(f"Нет корпуса {args.corpus}")
+        return 1
+    corpus = [json.loads(line) for line in args.corpus.read_text(encoding="utf-8").splitlines() if line.strip()]
+    print(f"Корпус: {len(corpus)} постов ({args.corpus.name})\n")
+
+    compiled = make_compiled(AddressExtractor(get_landmark_index()))
+    texts = [item["text"] for item in corpus]
+    for label, fn in (("прежний", legacy), ("скомпилированный", compiled)):
+        stats, misses = score(fn, corpus)
+        print(f"{label}: {len(corpus) - len(misses)}/{len(corpus)} постов без расхождений, "
+              f"{timed_us(fn, texts, args.repeat):.1f} мкс/сообщение")
+        for f in FIELDS:
+            s = stats[f]
+            precision = s["tp"] / s["predicted"] if s["predicted"] else 0.0
+            recall = s["tp"] / s["expected"] if s["expected"] else 0.0
+            print(f"  {f:<13} точность {s['ok'] / len(corpus):.0%}, precision {precision:.0%}, recall {recall:.0%}")
+        if args.show_misses:
+            for item_id, wrong in misses:
+                print(f"    #{item_id}: " + "; ".join(wrong))
+        print()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
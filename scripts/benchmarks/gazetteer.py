@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Бенчмарк офлайн-справочника адресов (services/gazetteer.py) против Nominatim.
+
+Корпус — записанные адреса с эталонными координатами (их когда-то вернул
+Nominatim): выгрузка жалоб services/Frontend/temp_supa_reports.json (поля
+address, lat, lng) или свой JSON/JSONL (--corpus, поля address, lat, lng|lon).
+Печатается:
+- покрытие прямого поиска (доля адресов без похода в сеть) по видам
+  совпадения (дом, дом без корпуса/литеры, улица, перекрёсток, ориентир);
+- точность: расхождение с эталоном в метрах (p50/p95, доля в 50/150/500 м);
+- обратный поиск по эталонным точкам: доля ответов и расхождение
+  адреса-ответа с точкой;
+- задержка прямого и обратного поиска, мкс (медиана по --repeat прогонам);
+- с --nominatim N — задержка живого Nominatim на N адресах (1 запрос/с).
+
+Справочник строит scripts/setup/build_gazetteer.py.
+
+Запуск из корня проекта:
+  py scripts/benchmarks/gazetteer.py
+  py scripts/benchmarks/gazetteer.py --corpus data/geo/addresses.jsonl --nominatim 10
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import statistics
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent.parent
+sys.path.insert(0, str(ROOT))
+
+from services.gazetteer import get_gazetteer  # noqa: E402
+
+DEFAULT_CORPUS = ROOT / "services" / "Frontend" / "temp_supa_reports.json"
+
+
+def load_corpus(path: Path):
+    text = path.read_text(encoding="utf-8")
+    if path.suffix == ".jsonl":
+        items = [json.loads(line) for line in text.splitlines() if line.strip()]
+    else:
+        items = json.loads(text)
+    corpus = []
+    for item in items:
+        lat = item.get("lat")
+        lon = item.get("lng", item.get("lon"))
+        if item.get("address") and lat is not None and lon is not None:
+            corpus.append((item["address"], float(lat), float(lon)))
+    return corpus
+
+
+def distance_m(a, b):
+    dy = (a[0] - b[0]) * 110574.0
+    dx = (a[1] - b[1]) * 111320.0 * math.cos(math.radians(a[0]))
+    return math.hypot(dx, dy)
+
+
+def pct(data, q):
+    data = sorted(data)
+    return data[min(len(data) - 1, int(len(data) * q / 100))] if data else 0.0
+
+
+def timed_us(fn, args_list, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for args in args_list:
+            fn(*args)
+        samples.append((time.perf_counter() - start) / len(args_list) * 1e6)
+    return statistics.median(samples)
+
+
+async def nominatim_latency(addresses):
+    from services.geo_service import _geocode
+
+    samples = []
+    for i, address in enumerate(addresses):
+        if i:
+            await asyncio.sleep(1.0)  # политика Nominatim: не чаще 1 запроса/с
+        start = time.perf_counter()
+        await _geocode(address)
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--corpus", type=Path, default=DEFAULT_CORPUS)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--nominatim", type=int, default=0, help="замерить живой Nominatim на N адресах")
+    args = parser.parse_args()
+
+    gazetteer = get_gazetteer()
+    if not gazetteer.load():
+        print(f"Справочник не найден: {gazetteer.path} (соберите scripts/setup/build_gazetteer.py)")
+        return 1
+    if not args.corpus.exists():
+        print(f"Нет корпуса {args.corpus}")
+        return 1
+    corpus = load_corpus(args.corpus)
+    if not corpus:
+        print(f"В {args.corpus} нет адресов с координатами")
+        return 1
+    stats = gazetteer.stats()
+    print(
+        f"Справочник: {stats['houses']} домов, {stats['streets']} улиц, {stats['intersections']} перекрёстков, "
+        f"{stats['landmarks']} ориентиров (собран {stats['built_at']})"
+    )
+    print(f"Корпус: {len(corpus)} адресов с эталонными координатами\n")
+
+    errors = []
+    for address, lat, lon in corpus:
+        coords = gazetteer.forward(address)
+        if coords:
+            errors.append(distance_m(coords, (lat, lon)))
+    counters = gazetteer.counters
+    print(f"Прямой поиск: найдено {len(errors)}/{len(corpus)} ({len(errors) / len(corpus):.0%}) без сети")
+    for kind in ("house", "house_base", "street", "intersection", "landmark"):
+        print(f"  {kind:<13} {counters[f'hits_{kind}']}")
+    if errors:
+        print(
+            f"  расхождение с эталоном: p50 {pct(errors, 50):.0f} м, p95 {pct(errors, 95):.0f} м; "
+            + ", ".join(f"≤{r} м {sum(e <= r for e in errors) / len(errors):.0%}" for r in (50, 150, 500))
+        )
+
+    reverse_errors = []
+    answered = 0
+    for _, lat, lon in corpus:
+        label = gazetteer.reverse(lat, lon)
+        if label:
+            answered += 1
+            coords = gazetteer.forward(label)
+            if coords:
+                reverse_errors.append(distance_m(coords, (lat, lon)))
+    print(f"\nОбратный поиск: адрес для {answered}/{len(corpus)} точек")
+    if reverse_errors:
+        print(f"  дом-ответ от точки: p50 {pct(reverse_errors, 50):.0f} м, p95 {pct(reverse_errors, 95):.0f} м")
+
+    forward_us = timed_us(gazetteer.forward, [(a,) for a, _, _ in corpus], args.repeat)
+    reverse_us = timed_us(gazetteer.reverse, [(lat, lon) for _, lat, lon in corpus], args.repeat)
+    print(f"\nЗадержка: прямой {forward_us:.1f} мкс, обратный {reverse_us:.1f} мкс на запрос")
+
+    if args.nominatim:
+        samples = asyncio.run(nominatim_latency([a for a, _, _ in corpus[: args.nominatim]]))
+        print(
+            f"Nominatim ({len(samples)} запросов): p50 {pct(samples, 50) * 1000:.0f} мс, "
+            f"p95 {pct(samples, 95) * 1000:.0f} мс"
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
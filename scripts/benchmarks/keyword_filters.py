@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Микробенчмарк фильтров ключевых слов: один проход KeywordMatcher против
+прежних построчных `kw in text.lower()` по каждому списку.
+
+Проверяет, что решения фильтров и категории совпадают, и печатает время
+на сообщение. Корпус по умолчанию — выгрузка реальных жалоб
+services/Frontend/temp_supa_reports.json; свой корпус: JSON-список объектов
+или JSONL с полем text (или title/description).
+
+Запуск из корня проекта:
+  py scripts/benchmarks/keyword_filters.py
+  py scripts/benchmarks/keyword_filters.py --corpus data/tg_dump.jsonl --repeat 200
+"""
+
+import argparse
+import json
+import statistics
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent.parent
+sys.path.insert(0, str(ROOT))
+
+from services.message_filters import (  # noqa: E402
+    COMPLAINT_MARKERS,
+    GEOPARSE_CATEGORY_KEYWORDS,
+    KEYWORD_CATEGORY_RULES,
+    SIMPLE_CATEGORY_KEYWORDS,
+    TG_AD_KEYWORDS,
+    TG_STRONG_AD_KEYWORDS,
+    VK_AD_KEYWORDS,
+    VK_COMPLAINT_MARKERS,
+    VK_STRONG_AD_KEYWORDS,
+    category_from_hits,
+    scan,
+)
+from services.keyword_matcher import hit_count  # noqa: E402
+
+DEFAULT_CORPUS = ROOT / "services" / "Frontend" / "temp_supa_reports.json"
+
+
+# --- Прежняя реализация (отдельный проход по тексту на каждый список) ---
+
+def _legacy_category(t, rules):
+    for cat, keywords in rules:
+        if any(kw in t for kw in keywords):
+            return cat
+    return None
+
+
+def legacy(text):
+    t = text.lower()
+    tg_ad_count = sum(1 for kw in TG_AD_KEYWORDS if kw in t)
+    t = text.lower()
+    tg_strong = any(kw in t for kw in TG_STRONG_AD_KEYWORDS)
+    t = text.lower()
+    tg_complaint = any(m in t for m in COMPLAINT_MARKERS)
+    t = text.lower()
+    vk_ad_count = sum(1 for kw in VK_AD_KEYWORDS if kw in t)
+    vk_strong = any(kw in t for kw in VK_STRONG_AD_KEYWORDS)
+    t = text.lower()
+    vk_complaint = any(m in t for m in VK_COMPLAINT_MARKERS)
+    t = text.lower()
+    zai = _legacy_category(t, KEYWORD_CATEGORY_RULES)
+    t = text.lower()
+    geo = _legacy_category(t, GEOPARSE_CATEGORY_KEYWORDS.items())
+    t = text.lower()
+    simple = _legacy_category(t, SIMPLE_CATEGORY_KEYWORDS.items())
+    return (tg_ad_count, tg_strong, tg_complaint, vk_ad_count, vk_strong, vk_complaint, zai, geo, simple)
+
+
+def compiled(text):
+    hits = scan(text)
+    return (
+        hit_count(hits, "tg_ad"), "tg_ad_strong" in hits, "tg_complaint" in hits,
+        hit_count(hits, "vk_ad"), "vk_ad_strong" in hits, "vk_complaint" in hits,
+        category_from_hits(hits, "zai"), category_from_hits(hits, "geo"), category_from_hits(hits, "simple"),
+    )
+
+
+def load_corpus(path: Path):
+    raw = path.read_text(encoding="utf-8")
+    if path.suffix == ".jsonl":
+        items = [json.loads(line) for line in raw.splitlines() if line.strip()]
+    else:
+        items = json.loads(raw)
+    texts = []
+    for item in items:
+        if isinstance(item, str):
+            text = item
+        else:
+            text = item.get("text") or "\n".join(
+                part for part in (item.get("title"), item.get("description")) if part
+            )
+        if text:
+            texts.append(text)
+    return texts
+
+
+def bench(fn, texts, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for text in texts:
+            fn(text)
+        samples.append((time.perf_counter() - start) / len(texts))
+    return samples
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--corpus", type=Path, default=DEFAULT_CORPUS)
+    parser.add_argument("--repeat", type=int, default=100)
+    args = parser.parse_args()
+
+    texts = load_corpus(args.corpus)
+    if not texts:
+        print(f"Корпус пуст: {args.corpus}")
+        return 1
+
+    mismatches = [t for t in texts if legacy(t) != compiled(t)]
+    avg_len = statistics.mean(len(t) for t in texts)
+    print(f"Корпус: {args.corpus} — {len(texts)} сообщений, средняя длина {avg_len:.0f} символов")
+    print(f"Расхождений с прежней реализацией: {len(mismatches)}")
+    for t in mismatches[:5]:
+        print(f"  ✗ {t[:80]!r}\n    legacy={legacy(t)}\n    scan  ={compiled(t)}")
+
+    results = {}
+    for name, fn in (("legacy", legacy), ("scan", compiled)):
+        samples = bench(fn, texts, args.repeat)
+        results[name] = statistics.median(samples)
+        print(
+            f"{name:>7}: median {results[name] * 1e6:7.1f} мкс/сообщение, "
+            f"min {min(samples) * 1e6:7.1f}, max {max(samples) * 1e6:7.1f}"
+        )
+    print(f"Ускорение: ×{results['legacy'] / results['scan']:.2f}")
+    return 1 if mismatches else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Микробенчмарк поиска ориентиров: services/landmark_index.py (основы названий
+в одном автомате) против прежнего перебора `name in text.lower()` по
+NV_LANDMARKS.
+
+Печатает посты, где ответы расходятся (ожидаемо — падежные формы: «в
+старом Вартовске», «у Ледового дворца»), и время на сообщение при росте
+таблицы: к NV_LANDMARKS добавляются --grow синтетических названий
+(или названия ориентиров справочника OSM, если он собран,
+scripts/setup/build_gazetteer.py). Перебор растёт линейно, индекс — нет.
+Корпус по умолчанию — выгрузка реальных жалоб
+services/Frontend/temp_supa_reports.json; свой: --corpus (JSON/JSONL).
+
+Запуск из корня проекта:
+  py scripts/benchmarks/landmark_index.py
+  py scripts/benchmarks/landmark_index.py --grow 0,100,1000,10000 --repeat 20
+"""
+
+import argparse
+import json
+import random
+import statistics
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent.parent
+sys.path.insert(0, str(ROOT))
+
+from services.landmark_index import (  # noqa: E402
+    LANDMARK_ALIASES,
+    LANDMARK_EXACT,
+    NV_LANDMARKS,
+    LandmarkIndex,
+)
+
+DEFAULT_CORPUS = ROOT / "services" / "Frontend" / "temp_supa_reports.json"
+
+
+def load_corpus(path: Path):
+    raw = path.read_text(encoding="utf-8")
+    if path.suffix == ".jsonl":
+        items = [json.loads(line) for line in raw.splitlines() if line.strip()]
+    else:
+        items = json.loads(raw)
+    texts = []
+    for item in items:
+        if isinstance(item, str):
+            text = item
+        else:
+            text = item.get("text") or "\n".join(
+                part for part in (item.get("title"), item.get("description")) if part
+            )
+        if text:
+            texts.append(text)
+    return texts
+
+
+def make_legacy(table):
+    def legacy(text):
+        t = text.lower()
+        for name in table:
+            if name in t:
+                return name
+        return None
+    return legacy
+
+
+def make_indexed(index):
+    def indexed(text):
+        found = index.first(text)
+        return found[0] if found else None
+    return indexed
+
+
+def extra_names(count):
+    """Названия ориентиров справочника OSM, иначе синтетические «слова» из слогов."""
+    names = []
+    try:
+        from services.gazetteer import get_gazetteer
+
+        gazetteer = get_gazetteer()
+        if gazetteer.load():
+            names = [name for name in gazetteer._landmarks if name not in NV_LANDMARKS]
+    except Exception:
+        names = []
+    rng = random.Random(0)
+    syllables = [c + v for c in "бвгдзклмнпрстфхцчш" for v in "аоуиэе"]
+    while len(names) < count:
+        words = ("".join(rng.choice(syllables) for _ in range(rng.randint(2, 4))) for _ in range(rng.randint(1, 2)))
+        names.append(" ".join(words) + rng.choice(("ый", "ая", "ое", "")))
+    return names[:count]
+
+
+def bench(fn, texts, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for text in texts:
+            fn(text)
+        samples.append((time.perf_counter() - start) / len(texts))
+    return statistics.median(samples)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--corpus", type=Path, default=DEFAULT_CORPUS)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--grow", default="0,100,1000,5000", help="сколько названий добавить к таблице (через запятую)")
+    args = parser.parse_args()
+
+    texts = load_corpus(args.corpus)
+    if not texts:
+        print(f"Корпус пуст: {args.corpus}")
+        return 1
+    print(f"Корпус: {args.corpus} — {len(texts)} сообщений")
+
+    legacy = make_legacy(NV_LANDMARKS)
+    indexed = make_indexed(LandmarkIndex(NV_LANDMARKS, LANDMARK_ALIASES, LANDMARK_EXACT))
+    diffs = [(t, legacy(t), indexed(t)) for t in texts if legacy(t) != indexed(t)]
+    print(f"Расхождений с прежним перебором: {len(diffs)}")
+    for t, old, new in diffs[:10]:
+        print(f"  {old!r} → {new!r}: {' '.join(t.split())[:90]!r}")
+
+    grow = [int(x) for x in args.grow.split(",") if x.strip()]
+    extra = extra_names(max(grow, default=0))
+    print(f"\n{'мест':>7} {'перебор, мкс':>13} {'индекс, мкс':>12}")
+    for n in grow:
+        table = dict(NV_LANDMARKS)
+        table.update((name, (0.0, 0.0)) for name in extra[:n])
+        started = time.perf_counter()
+        index = LandmarkIndex(table, LANDMARK_ALIASES, LANDMARK_EXACT)
+        build_ms = (time.perf_counter() - started) * 1000
+        legacy_us = bench(make_legacy(table), texts, args.repeat) * 1e6
+        index_us = bench(make_indexed(index), texts, args.repeat) * 1e6
+        print(f"{len(table):>7} {legacy_us:>13.1f} {index_us:>12.1f}   (сборка индекса {build_ms:.0f} мс)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
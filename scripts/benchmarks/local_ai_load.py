@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Нагрузочный бенчмарк services/local_ai (динамический батчинг на CPU).
+
+Для каждого уровня параллельности N клиентов шлют запросы /analyze (или пакеты
+/analyze_batch с --batch-size) к запущенному сервису; печатаются запросы/с,
+тексты/с, p50/p95/p99 задержки и средний размер пакета модели (из /health).
+
+Сервис запускается отдельно, например:
+  cd services/local_ai && LOCAL_AI_BACKEND=onnx uvicorn main:app --port 8000
+
+Запуск из корня проекта:
+  py scripts/benchmarks/local_ai_load.py
+  py scripts/benchmarks/local_ai_load.py --url http://127.0.0.1:8000 --concurrency 1 4 16 64 --requests 400
+  py scripts/benchmarks/local_ai_load.py --batch-size 16
+"""
+
+import argparse
+import asyncio
+import json
+import statistics
+import sys
+import time
+from pathlib import Path
+
+import httpx
+
+ROOT = Path(__file__).resolve().parent.parent.parent
+DEFAULT_CORPUS = ROOT / "services" / "Frontend" / "temp_supa_reports.json"
+FALLBACK_TEXTS = [
+    "Во дворе дома на Ленина 10 третий день не вывозят мусор",
+    "Огромная яма на перекрёстке Мира и Чапаева, машины бьют колёса",
+    "В подъезде не работает лифт уже неделю, пожилым не подняться",
+    "Срочно! Прорвало трубу, заливает подвал",
+]
+
+
+def load_texts(path: Path):
+    if not path.exists():
+        return FALLBACK_TEXTS
+    items = json.loads(path.read_text(encoding="utf-8"))
+    texts = [
+        "\n".join(p for p in (i.get("title"), i.get("description")) if p) for i in items if isinstance(i, dict)
+    ]
+    return [t for t in texts if t] or FALLBACK_TEXTS
+
+
+def pct(data, q):
+    data = sorted(data)
+    return data[min(len(data) - 1, int(len(data) * q / 100))] if data else 0.0
+
+
+async def run_level(client, url, texts, concurrency, total, batch_size):
+    latencies = []
+    counter = iter(range(total))
+
+    async def worker():
+        for i in counter:
+            start = time.perf_counter()
+            if batch_size > 1:
+                chunk = [texts[(i * batch_size + k) % len(texts)] for k in range(batch_size)]
+                r = await client.post(f"{url}/analyze_batch", json={"texts": chunk})
+            else:
+                r = await client.post(f"{url}/analyze", json={"text": texts[i % len(texts)]})
+            r.raise_for_status()
+            latencies.append(time.perf_counter() - start)
+
+    before = (await client.get(f"{url}/health")).json().get("batching", {})
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    after = (await client.get(f"{url}/health")).json().get("batching", {})
+    batches = after.get("batches", 0) - before.get("batches", 0)
+    items = after.get("items", 0) - before.get("items", 0)
+    return {
+        "rps": total / elapsed,
+        "texts_per_s": total * max(1, batch_size) / elapsed,
+        "p50": pct(latencies, 50),
+        "p95": pct(latencies, 95),
+        "p99": pct(latencies, 99),
+        "mean": statistics.mean(latencies),
+        "model_batch": items / batches if batches else 0.0,
+    }
+
+
+async def main_async(args) -> int:
+    texts = load_texts(args.corpus)
+    limits = httpx.Limits(max_connections=max(args.concurrency) + 4)
+    async with httpx.AsyncClient(timeout=120.0, limits=limits) as client:
+        try:
+            health = (await client.get(f"{args.url}/health")).json()
+        except httpx.HTTPError as e:
+            print(f"Сервис недоступен ({args.url}): {e}")
+            return 1
+        print(f"Сервис: backend={health.get('backend')} batching={health.get('batching')}")
+        # Прогрев: первые прогоны модели заметно медленнее
+        await run_level(client, args.url, texts, 1, args.warmup, args.batch_size)
+
+        mode = f"/analyze_batch ×{args.batch_size}" if args.batch_size > 1 else "/analyze"
+        print(f"\n{mode}, {args.requests} запросов на уровень")
+        print(f"{'клиентов':>9} {'запр/с':>8} {'текст/с':>8} {'p50 мс':>8} {'p95 мс':>8} {'p99 мс':>8} {'пакет':>6}")
+        for concurrency in args.concurrency:
+            r = await run_level(client, args.url, texts, concurrency, args.requests, args.batch_size)
+            print(
+                f"{concurrency:>9} {r['rps']:>8.1f} {r['texts_per_s']:>8.1f} {r['p50'] * 1000:>8.0f} "
+                f"{r['p95'] * 1000:>8.0f} {r['p99'] * 1000:>8.0f} {r['model_batch']:>6.1f}"
+            )
+    return 0
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--corpus", type=Path, default=DEFAULT_CORPUS)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16, 32])
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--batch-size", type=int, default=1, help=">1 — через /analyze_batch")
+    parser.add_argument("--warmup", type=int, default=10)
+    args = parser.parse_args()
+    return asyncio.run(main_async(args))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
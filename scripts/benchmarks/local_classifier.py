@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Бенчмарк локального ONNX-предклассификатора против keyword-пути zai_service.
+
+На размеченном корпусе считает точность relevant/category для keyword-правил
+(keyword_category, relevant = категория не «Прочее») и для локальной модели,
+долю сообщений, на которые модель отвечает уверенно (не уходят в Grok), и
+точность именно на этой доле — её можно сравнивать с разметкой Grok. Плюс
+CPU на сообщение (process_time): keyword-правила, featurize и инференс
+поштучно и пакетом.
+
+Корпус по умолчанию — журнал ответов Grok data/state/classifier_labels.jsonl;
+для честной оценки используйте сообщения, которые не попадали в обучение.
+
+Запуск из корня проекта:
+  py scripts/benchmarks/local_classifier.py
+  py scripts/benchmarks/local_classifier.py --corpus data/holdout.jsonl --repeat 20
+"""
+
+import argparse
+import statistics
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent.parent
+sys.path.insert(0, str(ROOT))
+
+from services.local_classifier import (  # noqa: E402
+    LABELS_LOG_PATH,
+    featurize,
+    get_local_classifier,
+    load_labeled_corpus,
+)
+from services.message_filters import keyword_category  # noqa: E402
+
+
+def cpu_per_message(fn, items, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.process_time()
+        fn(items)
+        samples.append((time.process_time() - start) / len(items))
+    return statistics.median(samples)
+
+
+def accuracy(pairs):
+    pairs = list(pairs)
+    return sum(p == t for p, t in pairs) / len(pairs) if pairs else 0.0
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--corpus", type=Path, default=Path(LABELS_LOG_PATH))
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--batch", type=int, default=32, help="размер пакета для замера пакетного инференса")
+    args = parser.parse_args()
+
+    if not args.corpus.exists():
+        print(f"Нет корпуса: {args.corpus}")
+        return 1
+    rows = load_labeled_corpus(args.corpus)
+    if not rows:
+        print(f"Корпус пуст: {args.corpus}")
+        return 1
+    texts = [r["text"] for r in rows]
+
+    classifier = get_local_classifier()
+    predictions = classifier.predict_batch(texts)
+    if predictions is None:
+        print(f"Локальная модель недоступна ({classifier.path}) — сначала scripts/setup/train_text_classifier.py")
+        return 1
+
+    keyword = [keyword_category(t, "zai") for t in texts]
+    print(f"Корпус: {args.corpus} — {len(rows)} сообщений, релевантных {sum(r['relevant'] for r in rows)}")
+
+    relevant_rows = [(r, k, p) for r, k, p in zip(rows, keyword, predictions) if r["relevant"]]
+    print("\nТочность на всём корпусе:")
+    print(
+        f"  keyword: relevant {accuracy((k != 'Прочее', r['relevant']) for r, k in zip(rows, keyword)):.3f}, "
+        f"category {accuracy((k, r['category']) for r, k, _ in relevant_rows):.3f}"
+    )
+    print(
+        f"  local:   relevant {accuracy((p.relevant >= 0.5, r['relevant']) for r, p in zip(rows, predictions)):.3f}, "
+        f"category {accuracy((p.category, r['category']) for r, _, p in relevant_rows):.3f}"
+    )
+
+    decided = [(r, p, p.decision()) for r, p in zip(rows, predictions) if p.decision() is not None]
+    print(f"\nУверенные ответы (без Grok): {len(decided)}/{len(rows)} = {len(decided) / len(rows):.1%}")
+    if decided:
+        print(f"  relevant верно: {accuracy((d == 'relevant', r['relevant']) for r, _, d in decided):.3f}")
+        confident_relevant = [(p.category, r["category"]) for r, p, d in decided if d == "relevant" and r["relevant"]]
+        if confident_relevant:
+            print(f"  category верно: {accuracy(confident_relevant):.3f} (на {len(confident_relevant)})")
+
+    print("\nCPU на сообщение (median):")
+    kw_us = cpu_per_message(lambda items: [keyword_category(t, "zai") for t in items], texts, args.repeat) * 1e6
+    feat_us = cpu_per_message(featurize, texts[:args.batch], args.repeat) * 1e6
+    single_us = cpu_per_message(
+        lambda items: [classifier.predict_batch([t]) for t in items], texts[:200], args.repeat
+    ) * 1e6
+    batch_us = cpu_per_message(classifier.predict_batch, texts[:args.batch], args.repeat) * 1e6
+    print(f"  keyword:              {kw_us:8.1f} мкс")
+    print(f"  featurize:            {feat_us:8.1f} мкс")
+    print(f"  local (по одному):    {single_us:8.1f} мкс")
+    print(f"  local (пакет {args.batch:>3}):   {batch_us:8.1f} мкс")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,365 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Replay записанных постов через настоящий конвейер start_all_monitoring.py.
+
+Посты из JSONL (MONITOR_RECORD_PATH, см. services/monitor_recorder.py)
+подаются в handle_telegram_message / handle_vk_post (VK — сырой пост стены,
+через vk_post_data, как из poll_all_groups: фильтр → AI анализ конвейера) с
+исходными интервалами, ускоренными в --speed раз (0 — без пауз). Внешние сервисы
+заменены детерминированными локальными стендами:
+- Grok (xAI) text/vision — ответ из keyword-анализа текста, задержка --grok-ms
+- Nominatim — координаты из хеша запроса в пределах города, задержка --nominatim-ms
+- Telegram клиент — send_message/download_media с задержкой --telegram-ms
+База SQLite и локальное состояние создаются во временном каталоге.
+
+Результат: p50/p95/p99 по стадиям, сквозная задержка и пропускная способность.
+
+Запуск из корня проекта:
+  py scripts/benchmarks/replay_monitoring.py --input data/monitor_record.jsonl --speed 10
+  py scripts/benchmarks/replay_monitoring.py --reports services/Frontend/temp_supa_reports.json --speed 0
+"""
+
+import argparse
+import asyncio
+import hashlib
+import io
+import json
+import logging
+import os
+import re
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Any, Dict, List, Optional
+
+ROOT = Path(__file__).resolve().parent.parent.parent
+sys.path.insert(0, str(ROOT))
+
+# Город: рамка для координат стенда Nominatim
+CITY_BBOX = (60.90, 60.98, 76.45, 76.65)  # lat_min, lat_max, lon_min, lon_max
+
+
+def _digest(value: str) -> int:
+    return int.from_bytes(hashlib.blake2b(value.encode("utf-8"), digest_size=8).digest(), "big")
+
+
+def _jittered(ms: float, key: str) -> float:
+    """Детерминированная задержка ms ±25% по ключу запроса (сек)."""
+    if ms <= 0:
+        return 0.0
+    return ms * (0.75 + (_digest(key) % 1000) / 2000.0) / 1000.0
+
+
+# ============================================================
+# Загрузка событий
+# ============================================================
+
+def load_recording(path: Path) -> List[Dict[str, Any]]:
+    events = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                events.append(json.loads(line))
+    events.sort(key=lambda e: e.get("received_at", 0))
+    return events
+
+
+def load_reports(path: Path, interval: float) -> List[Dict[str, Any]]:
+    """Выгрузка reports (JSON-список) → TG события с шагом interval секунд."""
+    items = json.loads(path.read_text(encoding="utf-8"))
+    events = []
+    for i, item in enumerate(items):
+        text = item.get("description") or item.get("title") or ""
+        if not text:
+            continue
+        events.append({
+            "kind": "tg",
+            "channel": "replay_reports",
+            "msg_id": i + 1,
+            "text": text,
+            "media": None,
+            "received_at": i * interval,
+        })
+    return events
+
+
+# ============================================================
+# Локальные стенды внешних сервисов
+# ============================================================
+
+class ServiceStandIns:
+    """httpx-обработчик для Grok (xAI) и Nominatim; счётчики вызовов."""
+
+    _TEXT_RE = re.compile(r'Текст сообщения:\n"""\n(.*?)\n"""', re.DOTALL)
+
+    def __init__(self, grok_ms: float, nominatim_ms: float):
+        self.grok_ms = grok_ms
+        self.nominatim_ms = nominatim_ms
+        self.calls: Dict[str, int] = {"grok_text": 0, "grok_vision": 0, "nominatim": 0, "other": 0}
+
+    async def handle(self, request):
+        import httpx
+
+        host = request.url.host
+        if request.url.path.endswith("/chat/completions"):
+            return await self._grok(request)
+        if "nominatim" in host:
+            return await self._nominatim(request)
+        self.calls["other"] += 1
+        return httpx.Response(404, json={"error": f"no stand-in for {host}"})
+
+    async def _grok(self, request):
+        import httpx
+        from services.zai_service import _keyword_analyze
+
+        payload = json.loads(request.content)
+        content = payload["messages"][-1]["content"]
+        if isinstance(content, list):  # vision: текстовая часть запроса
+            self.calls["grok_vision"] += 1
+            prompt = " ".join(p.get("text", "") for p in content if p.get("type") == "text")
+        else:
+            self.calls["grok_text"] += 1
+            prompt = content
+        m = self._TEXT_RE.search(prompt)
+        text = m.group(1) if m else prompt
+        await asyncio.sleep(_jittered(self.grok_ms, text))
+
+        result = _keyword_analyze(text)
+        result["relevant"] = result["category"] != "Прочее"
+        result["summary"] = text[:100]
+        result["description"] = text[:200]
+        body = {"choices": [{"message": {"content": json.dumps(result, ensure_ascii=False)}}]}
+        return httpx.Response(200, json=body)
+
+    async def _nominatim(self, request):
+        import httpx
+
+        self.calls["nominatim"] += 1
+        query = str(request.url)
+        await asyncio.sleep(_jittered(self.nominatim_ms, query))
+        if request.url.path.endswith("/reverse"):
+            return httpx.Response(200, json={"display_name": "Нижневартовск, replay"})
+        h = _digest(query)
+        lat_min, lat_max, lon_min, lon_max = CITY_BBOX
+        lat = lat_min + (h & 0xFFFF) / 0xFFFF * (lat_max - lat_min)
+        lon = lon_min + (h >> 16 & 0xFFFF) / 0xFFFF * (lon_max - lon_min)
+        return httpx.Response(200, json=[{"lat": f"{lat:.6f}", "lon": f"{lon:.6f}"}])
+
+
+class FakeTelegramClient:
+    """Минимальный Telethon-клиент: send_message и download_media."""
+
+    def __init__(self, latency_ms: float):
+        self.latency_ms = latency_ms
+        self.sent: List[str] = []
+        self._jpeg_cache: Dict[tuple, bytes] = {}
+
+    async def send_message(self, entity, message, parse_mode=None, **kwargs):
+        await asyncio.sleep(_jittered(self.latency_ms, message))
+        self.sent.append(message)
+        return SimpleNamespace(id=len(self.sent))
+
+    def _jpeg(self, w: int, h: int) -> bytes:
+        key = (w, h)
+        if key not in self._jpeg_cache:
+            from PIL import Image
+
+            buf = io.BytesIO()
+            Image.new("RGB", (w, h), (120, 120, 120)).save(buf, format="JPEG", quality=80)
+            self._jpeg_cache[key] = buf.getvalue()
+        return self._jpeg_cache[key]
+
+    async def download_media(self, message, file=None, **kwargs):
+        media = getattr(message, "replay_media", None) or {}
+        await asyncio.sleep(_jittered(self.latency_ms, f"media:{message.id}"))
+        data = self._jpeg(min(int(media.get("w") or 640), 1280), min(int(media.get("h") or 480), 1280))
+        with open(file, "wb") as f:
+            f.write(data)
+        return file
+
+
+def _fake_event(event: Dict[str, Any], msg_id: int):
+    media = event.get("media") or None
+    photo = SimpleNamespace(id=media.get("id")) if media and media.get("type") == "photo" else None
+    message = SimpleNamespace(
+        id=msg_id,
+        date=datetime.now(timezone.utc),
+        message=event.get("text") or "",
+        text=event.get("text") or "",
+        photo=photo,
+        replay_media=media,
+    )
+    return SimpleNamespace(chat=SimpleNamespace(username=event.get("channel") or "replay"), message=message)
+
+
+# ============================================================
+# Прогон
+# ============================================================
+
+def _prepare_environment(workdir: Path, publish_rate: float, nominatim_rate: float) -> None:
+    """Окружение до импорта модулей мониторинга (они читают env при импорте)."""
+    os.environ["DATABASE_URL"] = f"sqlite:///{workdir / 'replay.db'}"
+    os.environ["SOOBSHIO_STATE_DIR"] = str(workdir / "state")
+    os.environ["XAI_API_KEY"] = "replay"
+    os.environ["AI_TEXT_PROVIDER"] = "grok"
+    os.environ["USE_SUPABASE_PRIMARY"] = "false"
+    os.environ["PUBLISH_RATE_PER_MIN"] = str(publish_rate)
+    os.environ["PUBLISH_BURST"] = str(max(1, int(publish_rate / 60)))
+    os.environ["NOMINATIM_RATE_PER_SECOND"] = str(nominatim_rate)
+    os.environ.setdefault("TG_API_ID", "1")
+    os.environ.setdefault("TG_API_HASH", "replay")
+    os.environ["MONITOR_RECORD_PATH"] = ""
+
+
+async def replay(events: List[Dict[str, Any]], args) -> Dict[str, Any]:
+    import functools
+
+    import httpx
+
+    import start_all_monitoring as mon
+    from backend.database import Base, engine
+    import backend.models  # noqa: F401 — регистрирует таблицы
+    from core.http_client import set_transport_override
+    from services.publish_queue import PublishQueue
+    from services.published_index import PublishedIndex
+    from services.realtime_guard import RealtimeGuard
+    from services.vk_monitor_service import vk_post_data
+
+    Base.metadata.create_all(bind=engine)
+
+    stand_ins = ServiceStandIns(args.grok_ms, args.nominatim_ms)
+    set_transport_override(httpx.MockTransport(stand_ins.handle))
+    client = FakeTelegramClient(args.telegram_ms)
+
+    mon.guard = RealtimeGuard()
+    mon.published_index = PublishedIndex()
+    mon.pipeline = mon.build_pipeline(client)
+    mon.publish_queue = PublishQueue(
+        functools.partial(mon._send_post, client),
+        rate_per_min=mon.PUBLISH_RATE_PER_MIN,
+        burst=mon.PUBLISH_BURST,
+    )
+    await mon.pipeline.start()
+    await mon.publish_queue.start()
+
+    base = events[0].get("received_at", 0) if events else 0
+    started = time.monotonic()
+    submitted = 0
+    feeder_lag = 0.0
+    msg_id = 0
+    for loop in range(args.loops):
+        loop_start = time.monotonic()
+        for event in events:
+            if args.speed > 0:
+                due = loop_start + (event.get("received_at", base) - base) / args.speed
+                delay = due - time.monotonic()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                else:
+                    feeder_lag = max(feeder_lag, -delay)
+            msg_id += 1
+            if event.get("kind") == "vk":
+                if "post" in event:
+                    data = vk_post_data(event["post"], tuple(event["group"]))
+                else:  # запись формата 1: готовая жалоба, берутся текст и источник
+                    data = dict(event["data"])
+                data["post_link"] = f"{data.get('post_link', 'vk')}#replay{loop}"
+                await mon.handle_vk_post(data)
+            else:
+                await mon.handle_telegram_message(client, _fake_event(event, msg_id))
+            submitted += 1
+    feed_seconds = time.monotonic() - started
+
+    await mon.pipeline.stop(drain=True, timeout=args.drain_timeout)
+    await mon.publish_queue.stop(drain=True, timeout=args.drain_timeout)
+    total_seconds = time.monotonic() - started
+    set_transport_override(None)
+    mon.published_index.close()
+
+    snapshot = mon.pipeline.stats()
+    completed = snapshot["end_to_end"]["completed"]
+    return {
+        "events": submitted,
+        "speed": args.speed,
+        "feed_seconds": round(feed_seconds, 3),
+        "total_seconds": round(total_seconds, 3),
+        "throughput_per_s": round(completed / total_seconds, 3) if total_seconds else 0.0,
+        "max_feeder_lag_s": round(feeder_lag, 3),
+        "pipeline": snapshot,
+        "publish": mon.publish_queue.snapshot(),
+        "stand_in_calls": stand_ins.calls,
+        "stats": {k: v for k, v in mon.stats.items() if k != "by_category"},
+    }
+
+
+def print_report(result: Dict[str, Any]) -> None:
+    print(
+        f"\nСобытий: {result['events']} (×{result['speed'] or '∞'}), подача {result['feed_seconds']}с, "
+        f"всего {result['total_seconds']}с, макс. отставание подачи {result['max_feeder_lag_s']}с"
+    )
+    header = f"{'стадия':<10}{'обраб.':>8}{'отбр.':>7}{'ошиб.':>7}{'p50 мс':>10}{'p95 мс':>10}{'p99 мс':>10}{'max мс':>10}"
+    print(header)
+    print("-" * len(header))
+    for name, s in result["pipeline"]["stages"].items():
+        print(
+            f"{name:<10}{s['processed']:>8}{s['dropped']:>7}{s['errors']:>7}"
+            f"{s['p50_ms']:>10.1f}{s['p95_ms']:>10.1f}{s['p99_ms']:>10.1f}{s['max_ms']:>10.1f}"
+        )
+    e2e = result["pipeline"]["end_to_end"]
+    print(
+        f"{'e2e':<10}{e2e['completed']:>8}{'':>7}{'':>7}"
+        f"{e2e['p50_ms']:>10.1f}{e2e['p95_ms']:>10.1f}{e2e['p99_ms']:>10.1f}{e2e['max_ms']:>10.1f}"
+    )
+    pub = result["publish"]
+    print(
+        f"\nПропускная способность: {result['throughput_per_s']} сообщений/с до очереди публикации; "
+        f"опубликовано {pub['sent']}, лаг публикации p50 {pub['lag_p50_s']}с p95 {pub['lag_p95_s']}с"
+    )
+    print(f"Вызовы стендов: {result['stand_in_calls']}")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--input", type=Path, help="JSONL запись MONITOR_RECORD_PATH")
+    source.add_argument("--reports", type=Path, help="JSON-выгрузка reports (текст → TG события)")
+    parser.add_argument("--interval", type=float, default=1.0, help="шаг событий для --reports, с")
+    parser.add_argument("--speed", type=float, default=10.0, help="ускорение времени (0 — без пауз)")
+    parser.add_argument("--loops", type=int, default=1, help="сколько раз проиграть запись")
+    parser.add_argument("--grok-ms", type=float, default=800.0)
+    parser.add_argument("--nominatim-ms", type=float, default=300.0)
+    parser.add_argument(
+        "--nominatim-rate", type=float, default=0.0, help="лимит Nominatim, запросов/с реального времени (0 — без лимита)"
+    )
+    parser.add_argument("--telegram-ms", type=float, default=50.0)
+    parser.add_argument("--publish-rate", type=float, default=6000.0, help="темп публикации, постов/мин")
+    parser.add_argument("--drain-timeout", type=float, default=300.0)
+    parser.add_argument("--json", type=Path, help="сохранить результат в JSON")
+    parser.add_argument("-v", "--verbose", action="store_true", help="логи мониторинга (INFO)")
+    args = parser.parse_args()
+
+    events = load_recording(args.input) if args.input else load_reports(args.reports, args.interval)
+    if not events:
+        print("Нет событий для проигрывания")
+        return 1
+
+    workdir = Path(tempfile.mkdtemp(prefix="replay_monitoring_"))
+    _prepare_environment(workdir, args.publish_rate, args.nominatim_rate)
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING)
+    logging.getLogger().setLevel(logging.INFO if args.verbose else logging.WARNING)
+
+    result = asyncio.run(replay(events, args))
+    result["workdir"] = str(workdir)
+    print_report(result)
+    if args.json:
+        args.json.write_text(json.dumps(result, ensure_ascii=False, indent=2), encoding="utf-8")
+        print(f"JSON: {args.json}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
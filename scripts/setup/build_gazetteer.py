@@ -0,0 +1,279 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Сборка офлайн-справочника адресов (services/gazetteer.py) из выгрузки OSM.
+
+Вход — выгрузка города в формате OSM XML (.osm, .osm.bz2, .osm.gz) или PBF
+(.osm.pbf, нужен пакет osmium). Например, через Overpass:
+  curl -o data/geo/nv.osm "https://overpass-api.de/api/map?bbox=76.40,60.90,76.75,60.99"
+или из выгрузки округа Geofabrik:
+  osmium extract -b 76.40,60.90,76.75,60.99 ural-fed-district-latest.osm.pbf -o data/geo/nv.osm.pbf
+
+Берутся:
+- дома: addr:housenumber + addr:street (или addr:place), точка — узел или
+  центроид контура здания (way/multipolygon);
+- улицы: highway-линии с name, точка — узел улицы ближе всего к её центру;
+- перекрёстки: общие узлы линий двух разных улиц;
+- ориентиры: объекты с name и amenity/shop/leisure/tourism/office/… .
+Объекты вне --bbox отбрасываются. Результат — SQLite (GAZETTEER_PATH).
+
+Запуск из корня проекта:
+  py scripts/setup/build_gazetteer.py data/geo/nv.osm
+  py scripts/setup/build_gazetteer.py nv.osm.pbf --out data/geo/gazetteer.sqlite3
+"""
+
+import argparse
+import bz2
+import gzip
+import os
+import sqlite3
+import sys
+import time
+import xml.etree.ElementTree as ET
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent.parent
+sys.path.insert(0, str(ROOT))
+
+from services.gazetteer import GAZETTEER_PATH, split_address  # noqa: E402
+from services.geo_cache import canonical_address  # noqa: E402
+
+# south, west, north, east — Нижневартовск с запасом
+DEFAULT_BBOX = (60.90, 76.40, 60.99, 76.75)
+LANDMARK_TAGS = ("amenity", "shop", "leisure", "tourism", "office", "healthcare", "public_transport", "railway", "aeroway")
+PLACE_KINDS = {"suburb", "quarter", "neighbourhood", "square"}
+
+
+def open_xml(path: Path):
+    name = path.name.lower()
+    if name.endswith(".bz2"):
+        return bz2.open(path, "rb")
+    if name.endswith(".gz"):
+        return gzip.open(path, "rb")
+    return open(path, "rb")
+
+
+def read_xml(path: Path):
+    """Поток (тип, id, данные, теги): узлы → (lat, lon), линии → [узлы], отношения → [(тип, ref, роль)]."""
+    with open_xml(path) as f:
+        for _, elem in ET.iterparse(f, events=("end",)):
+            if elem.tag not in ("node", "way", "relation"):
+                continue
+            tags = {t.get("k"): t.get("v") for t in elem.iter("tag")}
+            oid = int(elem.get("id"))
+            if elem.tag == "node":
+                yield "node", oid, (float(elem.get("lat")), float(elem.get("lon"))), tags
+            elif elem.tag == "way":
+                yield "way", oid, [int(nd.get("ref")) for nd in elem.iter("nd")], tags
+            else:
+                members = [(m.get("type"), int(m.get("ref")), m.get("role") or "") for m in elem.iter("member")]
+                yield "relation", oid, members, tags
+            elem.clear()
+
+
+def read_pbf(path: Path):
+    import osmium
+
+    items = []
+
+    class Handler(osmium.SimpleHandler):
+        def node(self, n):
+            if n.location.valid():
+                items.append(("node", n.id, (n.location.lat, n.location.lon), dict(n.tags)))
+
+        def way(self, w):
+            items.append(("way", w.id, [nd.ref for nd in w.nodes], dict(w.tags)))
+
+        def relation(self, r):
+            items.append(("relation", r.id, [(m.type_name(), m.ref, m.role) for m in r.members], dict(r.tags)))
+
+    Handler().apply_file(str(path))
+    return items
+
+
+def centroid(points):
+    points = [p for p in points if p is not None]
+    if len(points) > 1 and points[0] == points[-1]:
+        points = points[:-1]  # замкнутый контур
+    if not points:
+        return None
+    return sum(p[0] for p in points) / len(points), sum(p[1] for p in points) / len(points)
+
+
+def landmark_kind(tags):
+    if tags.get("place") in PLACE_KINDS:
+        return f"place={tags['place']}"
+    for tag in LANDMARK_TAGS:
+        if tag in tags:
+            return f"{tag}={tags[tag]}"
+    if "building" in tags:
+        return "building"
+    return None
+
+
+def build(elements, bbox):
+    south, west, north, east = bbox
+
+    def inside(p):
+        return p is not None and south <= p[0] <= north and west <= p[1] <= east
+
+    nodes = {}
+    way_centroids = {}
+    street_nodes = {}  # название улицы → [id узлов]
+    node_streets = {}  # id узла → {название улицы}
+    houses, landmarks = [], []
+    counts = {"node": 0, "way": 0, "relation": 0}
+
+    def add_object(tags, point):
+        if not inside(point):
+            return
+        street = tags.get("addr:street") or tags.get("addr:place")
+        if street and tags.get("addr:housenumber"):
+            houses.append((street, tags["addr:housenumber"], point))
+        name = tags.get("name")
+        kind = landmark_kind(tags) if name else None
+        if kind:
+            landmarks.append((name, kind, point))
+
+    for kind, oid, data, tags in elements:
+        counts[kind] += 1
+        if kind == "node":
+            nodes[oid] = data
+            if tags:
+                add_object(tags, data)
+        elif kind == "way":
+            point = centroid([nodes.get(ref) for ref in data])
+            if point is not None:
+                way_centroids[oid] = point
+            name = tags.get("name")
+            if "highway" in tags and name:
+                street_nodes.setdefault(name, []).extend(data)
+                for ref in data:
+                    node_streets.setdefault(ref, set()).add(name)
+            if tags and "highway" not in tags:
+                add_object(tags, point)
+        elif tags.get("type") == "multipolygon":
+            outer = [way_centroids.get(ref) for mtype, ref, role in data if mtype == "way" and role != "inner"]
+            add_object(tags, centroid(outer))
+
+    streets = []
+    for name, refs in street_nodes.items():
+        points = [nodes[ref] for ref in set(refs) if ref in nodes]
+        center = centroid(points)
+        if not inside(center):
+            continue
+        # Точка на самой улице, ближайшая к центру (у изогнутых улиц центр мимо)
+        best = min(points, key=lambda p: (p[0] - center[0]) ** 2 + ((p[1] - center[1]) * 0.485) ** 2)
+        streets.append((name, best))
+
+    crossings = {}
+    for ref, names in node_streets.items():
+        if len(names) < 2 or not inside(nodes.get(ref)):
+            continue
+        ordered = sorted(names)
+        for i, a in enumerate(ordered):
+            for b in ordered[i + 1:]:
+                crossings.setdefault((a, b), []).append(nodes[ref])
+    # Двойные проезжие части дают несколько общих узлов — среднее
+    intersections = [(a, b, centroid(points)) for (a, b), points in crossings.items()]
+    return houses, streets, intersections, landmarks, counts
+
+
+def write(out: Path, houses, streets, intersections, landmarks, meta):
+    out.parent.mkdir(parents=True, exist_ok=True)
+    tmp = out.with_suffix(out.suffix + ".tmp")
+    if tmp.exists():
+        tmp.unlink()
+    conn = sqlite3.connect(tmp)
+    conn.executescript(
+        """
+        CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT);
+        CREATE TABLE houses (street_type TEXT, name TEXT, house TEXT, street TEXT, housenumber TEXT, lat REAL, lon REAL);
+        CREATE TABLE streets (street_type TEXT, name TEXT, street TEXT, lat REAL, lon REAL);
+        CREATE TABLE intersections (a TEXT, b TEXT, street_a TEXT, street_b TEXT, lat REAL, lon REAL);
+        CREATE TABLE landmarks (key TEXT, name TEXT, kind TEXT, lat REAL, lon REAL);
+        """
+    )
+    seen = set()
+    rows = []
+    for street, housenumber, (lat, lon) in houses:
+        street_type, name, house = split_address(canonical_address(f"{street} {housenumber}"))
+        if not name or not house or (street_type, name, house) in seen:
+            continue
+        seen.add((street_type, name, house))
+        rows.append((street_type, name, house, street, housenumber, lat, lon))
+    conn.executemany("INSERT INTO houses VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+    conn.executemany(
+        "INSERT INTO streets VALUES (?, ?, ?, ?, ?)",
+        [(*split_address(canonical_address(street))[:2], street, lat, lon) for street, (lat, lon) in streets],
+    )
+    rows = []
+    for street_a, street_b, (lat, lon) in intersections:
+        a = split_address(canonical_address(street_a))[1]
+        b = split_address(canonical_address(street_b))[1]
+        if a and b and a != b:
+            rows.append((*sorted((a, b)), street_a, street_b, lat, lon))
+    conn.executemany("INSERT INTO intersections VALUES (?, ?, ?, ?, ?, ?)", rows)
+    conn.executemany(
+        "INSERT INTO landmarks VALUES (?, ?, ?, ?, ?)",
+        [(canonical_address(name), name, kind, lat, lon) for name, kind, (lat, lon) in landmarks if canonical_address(name)],
+    )
+    conn.executescript(
+        """
+        CREATE INDEX houses_key ON houses (name, house);
+        CREATE INDEX streets_key ON streets (name);
+        CREATE INDEX intersections_key ON intersections (a, b);
+        CREATE INDEX landmarks_key ON landmarks (key);
+        """
+    )
+    conn.executemany("INSERT INTO meta VALUES (?, ?)", [(k, str(v)) for k, v in meta.items()])
+    conn.commit()
+    conn.execute("VACUUM")
+    conn.close()
+    os.replace(tmp, out)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("source", type=Path, help="выгрузка OSM: .osm / .osm.bz2 / .osm.gz / .osm.pbf")
+    parser.add_argument("--out", type=Path, default=Path(GAZETTEER_PATH))
+    parser.add_argument(
+        "--bbox", type=lambda s: tuple(float(x) for x in s.split(",")), default=DEFAULT_BBOX,
+        help="south,west,north,east (по умолчанию — Нижневартовск)",
+    )
+    args = parser.parse_args()
+    if not args.source.exists():
+        print(f"Нет файла {args.source}")
+        return 1
+
+    started = time.time()
+    if args.source.name.lower().endswith(".pbf"):
+        try:
+            elements = read_pbf(args.source)
+        except ImportError:
+            print("Для .pbf нужен пакет osmium (pip install osmium) или выгрузка в OSM XML")
+            return 1
+    else:
+        elements = read_xml(args.source)
+    houses, streets, intersections, landmarks, counts = build(elements, args.bbox)
+    meta = {
+        "source": args.source.name,
+        "bbox": ",".join(str(x) for x in args.bbox),
+        "built_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+        **{f"osm_{kind}s": n for kind, n in counts.items()},
+    }
+    write(args.out, houses, streets, intersections, landmarks, meta)
+    print(
+        f"OSM: {counts['node']} узлов, {counts['way']} линий, {counts['relation']} отношений "
+        f"за {time.time() - started:.1f} с"
+    )
+    print(
+        f"Справочник {args.out}: {len(houses)} домов, {len(streets)} улиц, "
+        f"{len(intersections)} перекрёстков, {len(landmarks)} ориентиров "
+        f"({args.out.stat().st_size / 1024:.0f} КБ)"
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
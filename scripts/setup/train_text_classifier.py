@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Обучение и экспорт в ONNX локального предклассификатора (services/local_classifier.py).
+
+Данные: журнал ответов Grok data/state/classifier_labels.jsonl (пишется
+мониторингом при LOCAL_CLASSIFIER_COLLECT=1) и выгрузка жалоб
+services/Frontend/temp_supa_reports.json; свои корпуса — --corpus (JSON/JSONL
+с полями text, relevant, category, необязательно spam). Без явного spam метка
+берётся из фильтра рекламы message_filters (сильное слово или 2+ рекламных).
+
+Три логистические регрессии (scikit-learn) над featurize() переносятся в один
+ONNX-граф вручную (MatMul + Add + Sigmoid/Softmax), категории и n_features —
+в metadata_props модели. Нужны scikit-learn и onnx (только для обучения).
+
+Запуск из корня проекта:
+  py scripts/setup/train_text_classifier.py
+  py scripts/setup/train_text_classifier.py --corpus data/labeled.jsonl --holdout 0.2
+"""
+
+import argparse
+import json
+import random
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent.parent
+sys.path.insert(0, str(ROOT))
+
+import numpy as np  # noqa: E402
+
+from services.keyword_matcher import hit_count  # noqa: E402
+from services.local_classifier import (  # noqa: E402
+    LABELS_LOG_PATH,
+    LOCAL_CLASSIFIER_PATH,
+    N_FEATURES,
+    featurize,
+    load_labeled_corpus,
+)
+from services.message_filters import scan  # noqa: E402
+
+DEFAULT_CORPORA = [Path(LABELS_LOG_PATH), ROOT / "services" / "Frontend" / "temp_supa_reports.json"]
+
+
+def weak_spam(text: str) -> bool:
+    hits = scan(text)
+    ads = hit_count(hits, "tg_ad")
+    return ads >= 2 or (ads >= 1 and "tg_ad_strong" in hits)
+
+
+def fit_head(X, y, C):
+    from sklearn.linear_model import LogisticRegression
+
+    model = LogisticRegression(C=C, max_iter=2000, class_weight="balanced")
+    model.fit(X, y)
+    return model
+
+
+def export_onnx(path: Path, relevant, spam, category, categories, version, metrics):
+    import onnx
+    from onnx import TensorProto, helper, numpy_helper
+
+    def binary_head(name, model):
+        # classes_ = [False, True]: coef_ — логит класса True
+        w = numpy_helper.from_array(model.coef_.T.astype(np.float32), f"{name}_W")
+        b = numpy_helper.from_array(model.intercept_.astype(np.float32), f"{name}_b")
+        nodes = [
+            helper.make_node("MatMul", ["features", f"{name}_W"], [f"{name}_mm"]),
+            helper.make_node("Add", [f"{name}_mm", f"{name}_b"], [f"{name}_logit"]),
+            helper.make_node("Sigmoid", [f"{name}_logit"], [name]),
+        ]
+        return nodes, [w, b]
+
+    rel_nodes, rel_init = binary_head("relevant", relevant)
+    spam_nodes, spam_init = binary_head("spam", spam)
+    cat_w = numpy_helper.from_array(category.coef_.T.astype(np.float32), "category_W")
+    cat_b = numpy_helper.from_array(category.intercept_.astype(np.float32), "category_b")
+    cat_nodes = [
+        helper.make_node("MatMul", ["features", "category_W"], ["category_mm"]),
+        helper.make_node("Add", ["category_mm", "category_b"], ["category_logit"]),
+        helper.make_node("Softmax", ["category_logit"], ["category"], axis=1),
+    ]
+
+    graph = helper.make_graph(
+        rel_nodes + spam_nodes + cat_nodes,
+        "text_classifier",
+        [helper.make_tensor_value_info("features", TensorProto.FLOAT, [None, N_FEATURES])],
+        [
+            helper.make_tensor_value_info("relevant", TensorProto.FLOAT, [None, 1]),
+            helper.make_tensor_value_info("spam", TensorProto.FLOAT, [None, 1]),
+            helper.make_tensor_value_info("category", TensorProto.FLOAT, [None, len(categories)]),
+        ],
+        initializer=rel_init + spam_init + [cat_w, cat_b],
+    )
+    model = helper.make_model(graph, opset_imports=[helper.make_opsetid("", 13)])
+    model.ir_version = 8
+    helper.set_model_props(model, {
+        "categories": json.dumps(categories, ensure_ascii=False),
+        "n_features": str(N_FEATURES),
+        "version": version,
+        "metrics": json.dumps(metrics, ensure_ascii=False),
+    })
+    onnx.checker.check_model(model)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    onnx.save(model, path.as_posix())
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--corpus", type=Path, action="append", help="доп. корпус (можно несколько раз)")
+    parser.add_argument("--output", type=Path, default=Path(LOCAL_CLASSIFIER_PATH))
+    parser.add_argument("--holdout", type=float, default=0.2, help="доля отложенной выборки для метрик")
+    parser.add_argument("--C", type=float, default=4.0, help="обратная сила регуляризации")
+    parser.add_argument("--min-category-count", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=13)
+    args = parser.parse_args()
+
+    rows = []
+    for path in DEFAULT_CORPORA + (args.corpus or []):
+        if path.exists():
+            loaded = load_labeled_corpus(path)
+            print(f"{path}: {len(loaded)} сообщений")
+            rows.extend(loaded)
+    # Одинаковые тексты (репосты) — одна запись, последняя разметка побеждает
+    rows = list({row["text"]: row for row in rows}.values())
+    if len(rows) < 50:
+        print(f"Слишком мало размеченных сообщений: {len(rows)}")
+        return 1
+
+    for row in rows:
+        if row["spam"] is None:
+            row["spam"] = weak_spam(row["text"])
+        if not row["relevant"] or row["spam"]:
+            row["category"] = "Прочее"
+
+    counts = {}
+    for row in rows:
+        counts[row["category"]] = counts.get(row["category"], 0) + 1
+    categories = sorted(c for c, n in counts.items() if n >= args.min_category_count)
+    if "Прочее" not in categories:
+        categories.append("Прочее")
+    for row in rows:
+        if row["category"] not in categories:
+            row["category"] = "Прочее"
+
+    random.Random(args.seed).shuffle(rows)
+    split = int(len(rows) * (1 - args.holdout))
+    train, test = rows[:split], rows[split:]
+
+    start = time.perf_counter()
+    X_train = featurize([r["text"] for r in train])
+    heads = {}
+    for name, key in (("relevant", "relevant"), ("spam", "spam")):
+        y = np.array([bool(r[key]) for r in train])
+        if y.all() or not y.any():
+            # Вырожденная метка: добавляем по одному фиктивному примеру, чтобы голова
+            # выдавала крайние вероятности, а не падала на fit
+            X_fit = np.vstack([X_train, np.zeros((1, N_FEATURES), dtype=np.float32)])
+            y = np.append(y, not y[0])
+        else:
+            X_fit = X_train
+        heads[name] = fit_head(X_fit, y, args.C)
+    heads["category"] = fit_head(X_train, np.array([r["category"] for r in train]), args.C)
+    categories = [str(c) for c in heads["category"].classes_]
+    print(f"Обучение: {len(train)} сообщений, {len(categories)} категорий, {time.perf_counter() - start:.1f} с")
+
+    metrics = {"train": len(train), "test": len(test)}
+    if test:
+        X_test = featurize([r["text"] for r in test])
+        for name in ("relevant", "spam", "category"):
+            truth = [r[name] for r in test]
+            pred = heads[name].predict(X_test)
+            metrics[f"{name}_accuracy"] = round(float(np.mean([p == t for p, t in zip(pred, truth)])), 4)
+        print("Отложенная выборка: " + ", ".join(f"{k}={v}" for k, v in metrics.items()))
+
+    version = time.strftime("%Y%m%d-%H%M")
+    export_onnx(args.output, heads["relevant"], heads["spam"], heads["category"], categories, version, metrics)
+    print(f"✅ Модель {version}: {args.output} ({args.output.stat().st_size / 1e6:.1f} МБ)")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
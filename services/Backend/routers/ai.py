@@ -9,7 +9,10 @@ import os
 from fastapi import APIRouter, HTTPException
 from starlette.concurrency import run_in_threadpool
 
-from core.http_client import get_http_client
+from services.gazetteer import get_gazetteer
+from services.message_filters import keyword_category
+from services.nominatim_scheduler import get_nominatim_scheduler
+from services.ai_scheduler import INTERACTIVE, ai_lane
 from services.realesrgan_service import realesrgan_service
 from services.zai_service import (
     CATEGORIES,
@@ -19,11 +22,13 @@ from services.zai_service import (
     _parse_json,
     analyze_complaint,
 )
+from services.vision_cache import get_vision_cache, prompt_namespace
 from services.zai_vision_service import analyze_image_with_glm4v
 
 router = APIRouter(prefix="/ai", tags=["ai"])
 
 _DEFAULT_CATEGORY = "Прочее"
+_ROUTER_VISION_MODEL = "grok-2-vision-latest"
 
 
 def _decode_image_b64(image_b64: str) -> bytes:
@@ -37,6 +42,13 @@ async def _analyze_image_payload(image_b64: str, text: str) -> Dict[str, Any]:
 
     try:
         if XAI_API_KEY:
+            vision_cache = get_vision_cache()
+            image_bytes = _decode_image_b64(image_b64)
+            # Текст пользователя входит в промпт — и в ключ кэша
+            cache_model = prompt_namespace(f"{_ROUTER_VISION_MODEL}:router", text)
+            cached = vision_cache.lookup(image_bytes, cache_model)
+            if cached:
+                return cached
             prompt = (
                 f"Проанализируй фото городской проблемы в Нижневартовске. {text}\n"
                 f"Категории: {', '.join(CATEGORIES)}\n\n"
@@ -47,7 +59,7 @@ async def _analyze_image_payload(image_b64: str, text: str) -> Dict[str, Any]:
                 'Верни только JSON: {"category":"...","summary":"...","severity":2}'
             )
             payload = {
-                "model": "grok-2-vision-latest",
+                "model": _ROUTER_VISION_MODEL,
                 "messages": [
                     {
                         "role": "user",
@@ -81,6 +93,7 @@ async def _analyze_image_payload(image_b64: str, text: str) -> Dict[str, Any]:
             if content:
                 parsed = _parse_json(content)
                 if parsed:
+                    vision_cache.store(image_bytes, cache_model, parsed)
                     return parsed
 
         # Fallback: use normalized local vision helper.
@@ -119,24 +132,14 @@ async def _reverse_geocode(lat: float | None, lng: float | None) -> str | None:
     if lat is None or lng is None:
         return None
 
-    url = (
-        "https://nominatim.openstreetmap.org/reverse"
-        f"?lat={lat}&lon={lng}&format=json&zoom=18&addressdetails=1"
-    )
-    try:
-        async with get_http_client(timeout=8.0, proxy=False) as client:
-            response = await client.get(
-                url,
-                headers={"User-Agent": "com.soobshio.app"},
-            )
-        if response.status_code != 200:
-            return None
-        payload = response.json()
-        display_name = payload.get("display_name")
-        if isinstance(display_name, str) and display_name.strip():
-            return display_name.strip()
-    except Exception:
-        return None
+    address = get_gazetteer().reverse(lat, lng)
+    if address:
+        return address
+
+    payload = await get_nominatim_scheduler().reverse(lat, lng, zoom=18, addressdetails=1)
+    display_name = payload.get("display_name") if payload else None
+    if isinstance(display_name, str) and display_name.strip():
+        return display_name.strip()
     return None
 
 
@@ -172,29 +175,15 @@ def _pick_category(*candidates: Any) -> str:
 
 
 def _guess_simple_category(text: str) -> str:
-    source = (text or "").lower()
-    keyword_map = {
-        "Дороги": ("яма", "асфальт", "выбои", "тротуар", "дорог"),
-        "Снег/Наледь": ("снег", "наледь", "гололед", "сугроб"),
-        "Освещение": ("фонарь", "освещ", "темно", "лампа"),
-        "Парковки": ("парков", "машина на газоне", "тротуаре"),
-        "Безопасность": ("драка", "опасно", "вор", "напад"),
-        "Транспорт": ("автобус", "маршрут", "остановк", "транспорт"),
-        "ЖКХ": ("подъезд", "лифт", "управляющ", "коммунал"),
-        "Экология": ("мусор", "свалка", "вонь", "запах"),
-    }
-    for category, keywords in keyword_map.items():
-        for keyword in keywords:
-            if keyword in source:
-                return category
-    return _DEFAULT_CATEGORY
+    return keyword_category(text or "", "simple", default=_DEFAULT_CATEGORY)
 
 
 @router.post("/analyze")
 async def analyze_text_for_complaint(request: dict):
     text = request.get("text", "")
     try:
-        return await analyze_complaint(text)
+        with ai_lane(INTERACTIVE):
+            return await analyze_complaint(text)
     except Exception as exc:
         return {"category": _DEFAULT_CATEGORY, "summary": text[:100], "error": str(exc)}
 
@@ -203,7 +192,8 @@ async def analyze_text_for_complaint(request: dict):
 async def analyze_image_for_complaint(request: dict):
     image_b64 = request.get("image", "")
     text = request.get("text", "")
-    return await _analyze_image_payload(image_b64, text)
+    with ai_lane(INTERACTIVE):
+        return await _analyze_image_payload(image_b64, text)
 
 
 @router.post("/upscale_image")
@@ -254,6 +244,11 @@ async def upscale_image_for_complaint(request: dict):
 
 @router.post("/sanitize_report")
 async def sanitize_report(request: dict):
+    with ai_lane(INTERACTIVE):
+        return await _sanitize_report(request)
+
+
+async def _sanitize_report(request: dict) -> Dict[str, Any]:
     text = str(request.get("text") or "").strip()
     image_b64 = str(request.get("image") or "").strip()
     lat = request.get("lat")
@@ -375,6 +370,14 @@ async def ai_proxy_stats():
         }
 
 
+@router.get("/governor")
+async def ai_governor_stats():
+    """Состояние AI governor: breaker'ы маршрутов, полосы планировщика (ожидание слота), fallback."""
+    from services.ai_governor import get_ai_governor
+
+    return get_ai_governor().snapshot()
+
+
 @router.get("/proxy/health")
 async def ai_proxy_health():
     try:
@@ -13,7 +13,12 @@ import httpx
 from bs4 import BeautifulSoup
 from fastapi import APIRouter, Query
 
+from services.gazetteer import get_gazetteer
+from services.geo_cache import get_geo_cache
 from services.geo_service import geoparse
+from services.landmark_index import VENUE_COORDS, get_venue_index  # noqa: F401
+from services.nominatim_scheduler import BACKFILL, geo_priority, get_nominatim_scheduler
+from services.ttl_cache import TTLCache
 
 router = APIRouter(tags=["map-data"])
 
@@ -26,43 +31,17 @@ SUPABASE_KEY = (
 SUPABASE_REPORTS_URL = f"{SUPABASE_URL}/rest/v1/reports" if SUPABASE_URL else ""
 AFISHA_URL = "https://www.n-vartovsk.ru/afisha/"
 
-VENUE_COORDS: dict[str, dict[str, Any]] = {
-    "дворец искусств": {
-        "name": "Дворец искусств",
-        "lat": 60.9404877,
-        "lng": 76.5587701,
-        "address": "ул. Ленина, 7, Нижневартовск",
-    },
-    "площади дворца искусств": {
-        "name": "Площадь Дворца искусств",
-        "lat": 60.9404877,
-        "lng": 76.5587701,
-        "address": "ул. Ленина, 7, Нижневартовск",
-    },
-    "площадь нефтяников": {
-        "name": "Площадь Нефтяников",
-        "lat": 60.9405,
-        "lng": 76.5450,
-        "address": "Площадь Нефтяников, Нижневартовск",
-    },
-    "green park": {
-        "name": "МФК Green Park",
-        "lat": 60.9384798,
-        "lng": 76.5558084,
-        "address": "ул. Ленина, 8, Нижневартовск",
-    },
-    "ленина, 8": {
-        "name": "МФК Green Park",
-        "lat": 60.9384798,
-        "lng": 76.5558084,
-        "address": "ул. Ленина, 8, Нижневартовск",
-    },
-}
-
 EVENT_DATE_RE = re.compile(r"(?P<date>\d{2}\.\d{2}\.\d{4})(?:\s+(?P<time>\d{2}:\d{2}))?")
 MAP_REPORTS_TIMEOUT_SECONDS = 12.0
 MAP_EVENTS_TIMEOUT_SECONDS = 12.0
 MAP_FEED_ENABLE_GEOPARSE = (os.getenv("MAP_FEED_ENABLE_GEOPARSE") or "0").strip() == "1"
+MAP_REPORTS_CACHE_SECONDS = float(os.getenv("MAP_REPORTS_CACHE_SECONDS") or "30")
+MAP_EVENTS_CACHE_SECONDS = float(os.getenv("MAP_EVENTS_CACHE_SECONDS") or "600")
+
+# Кэши ленты карты: маркеры по limit, афиша по числу дней, геопарсинг по id отчёта
+_markers_cache: TTLCache[int, list[dict[str, Any]]] = TTLCache(maxsize=16, ttl=MAP_REPORTS_CACHE_SECONDS)
+_events_cache: TTLCache[int, dict[str, list[dict[str, Any]]]] = TTLCache(maxsize=8, ttl=MAP_EVENTS_CACHE_SECONDS)
+_report_geo_cache: TTLCache[Any, dict[str, Any]] = TTLCache(maxsize=5000, ttl=24 * 3600)
 
 
 def _now_local() -> datetime:
@@ -98,11 +77,9 @@ def _is_public_source(source: str) -> bool:
 
 
 def _pick_venue(text: str) -> dict[str, Any] | None:
-    haystack = text.lower()
-    for key, venue in VENUE_COORDS.items():
-        if key in haystack:
-            return venue
-    return None
+    # Площадки афиши (VENUE_COORDS + синонимы, с падежными формами) — один проход по тексту
+    found = get_venue_index().first(text)
+    return found[1] if found else None
 
 
 def _extract_event_title(text: str) -> str:
@@ -147,8 +124,14 @@ async def _enrich_report(report: dict[str, Any]) -> dict[str, Any] | None:
     lat = report.get("lat")
     lng = report.get("lng")
     if (lat is None or lng is None) and MAP_FEED_ENABLE_GEOPARSE:
-        text = "\n".join(filter(None, [report.get("title"), report.get("description")]))
-        geo = await geoparse(text=text, ai_address=report.get("address"), location_hints=report.get("address"))
+        geo = _report_geo_cache.get(report.get("id")) if report.get("id") is not None else None
+        if geo is None:
+            text = "\n".join(filter(None, [report.get("title"), report.get("description")]))
+            # Догеокодирование ленты — после запросов пользователей и мониторинга
+            with geo_priority(BACKFILL):
+                geo = await geoparse(text=text, ai_address=report.get("address"), location_hints=report.get("address"))
+            if report.get("id") is not None:
+                _report_geo_cache.set(report["id"], geo)
         lat = geo.get("lat")
         lng = geo.get("lng")
         if not report.get("address") and geo.get("address"):
@@ -184,15 +167,22 @@ async def _enrich_report(report: dict[str, Any]) -> dict[str, Any] | None:
 
 
 async def _load_public_markers(limit: int) -> list[dict[str, Any]]:
+    cached = _markers_cache.get(limit)
+    if cached is not None:
+        return cached
     reports = await _fetch_supabase_reports(limit)
     tasks = [_enrich_report(report) for report in reports]
     enriched = await asyncio.gather(*tasks)
     markers = [item for item in enriched if item]
     markers.sort(key=lambda item: item.get("created_at") or "", reverse=True)
+    _markers_cache.set(limit, markers)
     return markers
 
 
 async def _load_city_events(days: int) -> dict[str, list[dict[str, Any]]]:
+    cached = _events_cache.get(days)
+    if cached is not None:
+        return cached
     async with httpx.AsyncClient(timeout=20.0, follow_redirects=True) as client:
         response = await client.get(AFISHA_URL)
         response.raise_for_status()
@@ -252,7 +242,9 @@ async def _load_city_events(days: int) -> dict[str, list[dict[str, Any]]]:
 
     week_events.sort(key=lambda item: item["created_at"])
     today_events.sort(key=lambda item: item["created_at"])
-    return {"today": today_events, "week": week_events}
+    events = {"today": today_events, "week": week_events}
+    _events_cache.set(days, events)
+    return events
 
 
 @router.get("/map/feed")
@@ -300,3 +292,13 @@ async def get_map_feed(
         "reports": reports,
         "events": events,
     }
+
+
+@router.get("/map/geocoder")
+async def get_geocoder_stats():
+    """Геокодинг: очередь Nominatim по классам (ожидание), кэш адресов, офлайн-справочник."""
+    return {
+        "nominatim": get_nominatim_scheduler().snapshot(),
+        "cache": get_geo_cache().stats(),
+        "gazetteer": get_gazetteer().stats(),
+    }
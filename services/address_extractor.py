@@ -0,0 +1,208 @@
+# services/address_extractor.py
+"""
+AddressExtractor — извлечение адреса из текста поста одним проходом.
+
+Раньше адрес искали три разных набора регулярок (geo_service — десяток
+re.search подряд, core/geoparse и keyword-анализ zai_service — свои, с
+расходящимися правилами). Теперь все шаблоны — ветки одного заранее
+скомпилированного выражения с именованными группами; finditer проходит текст
+один раз, из найденного выбирается лучшее по виду:
+
+  перекрёсток > улица с домом > мкр с домом > «дом N по ул. X» >
+  «Мира 62» без типа улицы > улица без дома > мкр без дома
+
+Ориентиры (если передан индекс services/landmark_index.py) ищутся тем же вызовом.
+
+Отсев ложных срабатываний (на реальных постах): номер дома не может быть
+частью даты/времени («01.03», «14:00»), возраста («60 лет», «33-летняя») или
+количества («5 машин»); адрес без типа улицы — только с заглавной буквы
+(«Интернациональная 9», но не «прописали 13»); улица без дома — тоже.
+Разметка для проверки: scripts/benchmarks/address_corpus.jsonl.
+"""
+
+import re
+from dataclasses import dataclass
+from typing import Optional, Tuple
+
+from services.landmark_index import LandmarkIndex
+
+CITY_SUFFIX = ", Нижневартовск"
+
+_W = r"[А-Яа-яЁё]+"
+_CAP = r"(?-i:[А-ЯЁ][а-яё]+)"
+_HOUSE_TAIL = r"(?:\s*[,.]?\s*(?:д(?:ом)?\.?\s*)?)"
+_HOUSE = (
+    # литера слитно («30б») или заглавная через пробел («10 А»; «26 и ост.» — не литера)
+    r"\d{1,4}(?:(?:[а-яА-Я]|(?-i:\s[А-Я]))(?![а-яА-Я]))?(?:/\d{1,4})?"
+    # не дата/время/возраст/количество
+    r"(?![\d\w]|[.:]\d|-[а-яА-Я])"
+    r"(?!\s*(?:лет|года?|г\.|%|руб|тыс|км|мин|час|чел|раз|шт|маш|мигрант))"
+)
+# Название улицы: «Мира», «Маршала Жукова», «60 лет Октября», «Ханты-Мансийская»;
+# второе слово со строчной — только если сразу за ним номер дома («ул. дружбы народов 30б»)
+_NAME = (
+    rf"(?:\d{{1,3}}\s+лет\s+)?{_W}(?:-{_W})?"
+    rf"(?:\s+{_CAP}|\s+{_W}(?={_HOUSE_TAIL}\d))?"
+)
+_STREET_TYPE = (
+    r"(?:ул(?:иц[аеуы]|\.)?|пр(?:оспект[аеу]?|-?кт\.?|\.)|пер(?:еул(?:ок|ке|ка)|\.)|б(?:ульвар[аеу]?|-р|\.))"
+    r"(?![А-Яа-яЁё])"
+)
+_NOT_AFTER_LETTER = r"(?<![А-Яа-яЁё])"
+
+_PATTERN = re.compile(
+    "|".join([
+        # перекрёсток/угол/пересечение Мира и (ул.) Ленина; «перекрёсток Мира - Маршала Жукова»
+        rf"{_NOT_AFTER_LETTER}(?:перекр[её]ст(?:ок|ке|ка|ку)|(?:на\s+)?угл[уе]|пересечени[еия])\s+"
+        rf"(?:(?:{_STREET_TYPE})\s*)?(?P<ix_a>{_NAME})(?:\s+и\s+|\s*[-—–]\s*)"
+        rf"(?:(?:{_STREET_TYPE})\s*)?(?P<ix_b>{_NAME})",
+        # Мира / Ленина
+        rf"{_NOT_AFTER_LETTER}(?P<sl_a>{_CAP})\s*/\s*(?:(?:{_STREET_TYPE})\s*)?(?P<sl_b>{_CAP})",
+        # ул. Мира 62, проспект Победы, д. 12, пер. Лесной 5, бульвар Рябиновый
+        rf"{_NOT_AFTER_LETTER}(?P<stype>{_STREET_TYPE})\s*(?P<street>{_NAME})(?:{_HOUSE_TAIL}(?P<house>{_HOUSE}))?",
+        # мкр. 10П д. 5, микрорайон 7 дом 3
+        rf"{_NOT_AFTER_LETTER}м(?:икрорайон[еау]?|кр(?:-?н)?)\.?\s*(?P<mkr>\d{{1,2}}[а-яА-Я]?)(?![\d\w])"
+        rf"(?:{_HOUSE_TAIL}(?P<mkr_house>{_HOUSE}))?",
+        # дом 15 по ул. Мира
+        rf"{_NOT_AFTER_LETTER}д(?:ом[еау]?|\.)\s*(?P<dom_house>{_HOUSE})\s+(?:по\s+)?(?:{_STREET_TYPE})\s*(?P<dom_street>{_NAME})",
+        # Интернациональная 9, Дружбы Народов 30б (без типа улицы — только с заглавной)
+        rf"{_NOT_AFTER_LETTER}(?P<bare>(?-i:[А-ЯЁ][а-яё]{{2,}})(?:-{_CAP})?(?:\s+{_CAP})?)\s*,?\s+(?P<bare_house>{_HOUSE})",
+    ]),
+    re.IGNORECASE,
+)
+
+# Слова, которые шаблоны принимают за улицу
+_SKIP_WORDS = frozenset({
+    "около", "более", "менее", "через", "после", "перед", "возле", "рядом", "номер", "этаж", "подъезд",
+    "дом", "дома", "квартира", "автобус", "маршрут", "маршрута", "маршруте", "было", "уже", "всего",
+    "января", "февраля", "марта", "апреля", "мая", "июня", "июля", "августа", "сентября", "октября",
+    "ноября", "декабря", "нижневартовск", "нижневартовска", "нижневартовске", "нижневартовску",
+    "это", "между", "улице", "улица", "проспект", "прислать", "подписаться", "вчера", "сегодня",
+    # категории вида «Снег/Наледь» в заголовках
+    "снег", "наледь",
+})
+_STREET_PREFIX = {"ул": "ул.", "пр": "пр.", "пе": "пер.", "б": "б-р"}
+
+# Вид совпадения → ранг (меньше — лучше)
+_RANKS = {
+    "intersection": 0, "street_house": 1, "microdistrict_house": 2, "house_on_street": 3,
+    "bare": 4, "street": 5, "microdistrict": 6,
+}
+
+
+@dataclass
+class ExtractedAddress:
+    """Адрес из текста; address — строка для геокодера (как прежние парсеры)."""
+    kind: Optional[str] = None
+    street_type: Optional[str] = None
+    street: Optional[str] = None
+    house: Optional[str] = None
+    intersection: Optional[Tuple[str, str]] = None
+    landmark: Optional[str] = None
+    landmark_coords: Optional[Tuple[float, float]] = None
+    span: Optional[Tuple[int, int]] = None
+
+    @property
+    def address(self) -> Optional[str]:
+        if self.intersection:
+            a, b = self.intersection
+            return f"перекрёсток ул. {a} и ул. {b}{CITY_SUFFIX}"
+        if not self.street:
+            return None
+        if self.street_type == "мкр.":
+            return f"мкр. {self.street} д. {self.house}{CITY_SUFFIX}" if self.house else f"мкр. {self.street}{CITY_SUFFIX}"
+        parts = [self.street_type or "ул.", self.street]
+        if self.house:
+            parts.append(self.house)
+        return " ".join(parts) + CITY_SUFFIX
+
+
+def _clean_house(house: str) -> str:
+    return house.replace(" ", "")
+
+
+def _skip(name: str) -> bool:
+    return name.split()[0].lower() in _SKIP_WORDS
+
+
+def _candidate(m: "re.Match") -> Optional[ExtractedAddress]:
+    """Совпадение ветки → адрес (None — ложное срабатывание)."""
+    g = m.groupdict()
+    span = m.span()
+    if g["ix_a"] or g["sl_a"]:
+        a, b = (g["ix_a"], g["ix_b"]) if g["ix_a"] else (g["sl_a"], g["sl_b"])
+        if _skip(a) or _skip(b):
+            return None
+        return ExtractedAddress(kind="intersection", intersection=(a.strip(), b.strip()), span=span)
+    if g["stype"]:
+        street = g["street"].strip()
+        house = g["house"]
+        # Без дома — только имя собственное («на улице холодно» — не адрес)
+        if _skip(street) or (not house and not (street[0].isupper() or street[0].isdigit())):
+            return None
+        prefix = _STREET_PREFIX.get(g["stype"][:2].lower()) or _STREET_PREFIX.get(g["stype"][:1].lower(), "ул.")
+        return ExtractedAddress(
+            kind="street_house" if house else "street",
+            street_type=prefix, street=street, house=_clean_house(house) if house else None, span=span,
+        )
+    if g["mkr"]:
+        house = g["mkr_house"]
+        return ExtractedAddress(
+            kind="microdistrict_house" if house else "microdistrict",
+            street_type="мкр.", street=g["mkr"].upper(), house=_clean_house(house) if house else None, span=span,
+        )
+    if g["dom_house"]:
+        street = g["dom_street"].strip()
+        if _skip(street):
+            return None
+        return ExtractedAddress(
+            kind="house_on_street", street_type="ул.", street=street, house=_clean_house(g["dom_house"]), span=span,
+        )
+    if g["bare"]:
+        street = g["bare"].strip()
+        if _skip(street):
+            return None
+        return ExtractedAddress(kind="bare", street_type="ул.", street=street, house=_clean_house(g["bare_house"]), span=span)
+    return None
+
+
+class AddressExtractor:
+    """Скомпилированные шаблоны адреса + (необязательно) индекс ориентиров."""
+
+    def __init__(self, landmarks: Optional[LandmarkIndex[Tuple[float, float]]] = None):
+        self.landmarks = landmarks
+
+    def find_landmark(self, text: str) -> Optional[Tuple[str, float, float]]:
+        """Первый (по порядку таблицы) ориентир, упомянутый в тексте."""
+        found = self.landmarks.first(text) if self.landmarks is not None else None
+        if not found:
+            return None
+        name, (lat, lon) = found
+        return name, lat, lon
+
+    def extract(self, text: str) -> ExtractedAddress:
+        """Лучший адрес в тексте и первый ориентир; пустой результат, если ничего нет."""
+        best: Optional[ExtractedAddress] = None
+        if text:
+            for m in _PATTERN.finditer(text):
+                found = _candidate(m)
+                if found is None:
+                    continue
+                if best is None or _RANKS[found.kind] < _RANKS[best.kind]:
+                    best = found
+                    if found.kind == "intersection":
+                        break
+        result = best or ExtractedAddress()
+        landmark = self.find_landmark(text)
+        if landmark:
+            result.landmark = landmark[0]
+            result.landmark_coords = (landmark[1], landmark[2])
+        return result
+
+
+_default = AddressExtractor()
+
+
+def extract_address(text: str) -> Optional[str]:
+    """Строка адреса для геокодера или None (без ориентиров)."""
+    return _default.extract(text).address
@@ -0,0 +1,90 @@
+# services/ai_batcher.py
+"""
+MicroBatcher — сборка одиночных запросов в пакеты.
+
+Вызывающие ждут submit(item); элементы копятся до max_items или до истечения
+окна max_wait с момента первого элемента пакета, затем run_batch(items)
+обрабатывает их одним вызовом и возвращает список результатов в том же
+порядке (None — для элемента нет результата, вызывающий использует свой
+fallback). Ошибка run_batch даёт None всем элементам пакета.
+"""
+
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, Generic, List, Optional, Tuple, TypeVar
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+BatchRunner = Callable[[List[T]], Awaitable[List[Optional[R]]]]
+
+
+class MicroBatcher(Generic[T, R]):
+    """Пакетирование по размеру (max_items) и времени (max_wait, сек)."""
+
+    def __init__(self, run_batch: BatchRunner, max_items: int = 8, max_wait: float = 0.1, name: str = "batch"):
+        self._run_batch = run_batch
+        self.max_items = max(1, max_items)
+        self.max_wait = max_wait
+        self.name = name
+        self._pending: List[Tuple[T, asyncio.Future]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._tasks: set = set()
+        self.batches = 0
+        self.items = 0
+        self.unresolved = 0
+        self.failed_batches = 0
+        self.max_batch = 0
+
+    async def submit(self, item: T) -> Optional[R]:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((item, future))
+        if len(self._pending) >= self.max_items:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_wait, self._flush)
+        return await future
+
+    def _flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self._pending:
+            return
+        batch, self._pending = self._pending[:self.max_items], self._pending[self.max_items:]
+        task = asyncio.get_running_loop().create_task(self._run(batch))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        if self._pending:
+            self._flush()
+
+    async def _run(self, batch: List[Tuple[T, asyncio.Future]]) -> None:
+        self.batches += 1
+        self.items += len(batch)
+        self.max_batch = max(self.max_batch, len(batch))
+        try:
+            results = await self._run_batch([item for item, _ in batch])
+        except Exception as e:
+            logger.error(f"❌ {self.name}: ошибка пакета из {len(batch)}: {e}", exc_info=True)
+            self.failed_batches += 1
+            results = []
+        for i, (_, future) in enumerate(batch):
+            result = results[i] if i < len(results) else None
+            if result is None:
+                self.unresolved += 1
+            if not future.done():
+                future.set_result(result)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "batches": self.batches,
+            "items": self.items,
+            "avg_batch": round(self.items / self.batches, 2) if self.batches else 0.0,
+            "max_batch": self.max_batch,
+            "unresolved": self.unresolved,
+            "failed_batches": self.failed_batches,
+            "pending": len(self._pending),
+        }
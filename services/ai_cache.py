@@ -1,170 +1,253 @@
 # services/ai_cache.py
 """
 Кэширование результатов AI анализа для снижения количества запросов к API
-Использует in-memory кэш с TTL и хеширование текста для ключей
-"""
 
-from collections import OrderedDict
+Два уровня:
+- in-memory LRU, ограниченный по объёму (AI_CACHE_MAX_BYTES);
+- общий для всех процессов SharedCache (SQLite/WAL или Redis, пространство
+  имён "ai") — переживает перезапуск, результат одного процесса видят остальные.
+
+Ключ — хеш полного нормализованного текста (без эмодзи, ссылок и лишних
+пробелов), поэтому репосты одного поста из разных пабликов попадают в одну
+запись. Нерелевантные посты кэшируются отдельно (negative cache) со своим TTL.
+"""
 
 import hashlib
-import time
+import json
 import logging
-from typing import Dict, Any, Optional
+import os
+import re
+import time
+import unicodedata
+from typing import Dict, Any, Optional, Tuple
+
+from services.shared_cache import SharedCache, get_shared_cache
+from services.ttl_cache import TTLCache
 
 logger = logging.getLogger(__name__)
 
-# Глобальный кэш: {hash: (result, timestamp)} — OrderedDict для O(1) FIFO
-_cache: OrderedDict[str, tuple] = OrderedDict()
-_cache_max_size = 1000  # Максимальное количество записей
-_cache_ttl = 3600 * 24  # TTL: 24 часа в секундах
+AI_CACHE_MAX_BYTES = int(os.getenv("AI_CACHE_MAX_BYTES", str(8 * 1024 * 1024)))
+AI_CACHE_TTL_HOURS = float(os.getenv("AI_CACHE_TTL_HOURS", "168"))  # 7 дней
+AI_CACHE_NEGATIVE_TTL_HOURS = float(os.getenv("AI_CACHE_NEGATIVE_TTL_HOURS", "24"))
+AI_CACHE_PERSIST = os.getenv("AI_CACHE_PERSIST", "1").strip().lower() not in ("0", "false", "no")
+_SHARED_NAMESPACE = "ai"
+
+_URL_RE = re.compile(r"(?:https?://|www\.)\S+|\b[\w.-]+\.(?:ru|com|org|net|рф)/\S*", re.IGNORECASE)
+_WS_RE = re.compile(r"\s+")
+# Эмодзи, пиктограммы, модификаторы, ZWJ/variation selectors
+_DROP_CATEGORIES = frozenset({"So", "Sk", "Cs", "Co", "Cf", "Mn"})
+
+
+def normalize_text(text: str) -> str:
+    """Текст для ключа кэша: без ссылок, эмодзи и лишних пробелов, в нижнем регистре."""
+    text = _URL_RE.sub(" ", text or "")
+    text = unicodedata.normalize("NFC", text)
+    text = "".join(ch for ch in text if unicodedata.category(ch) not in _DROP_CATEGORIES)
+    return _WS_RE.sub(" ", text).strip().casefold()
 
 
 def _hash_text(text: str, model: str = "") -> str:
-    """Создает хеш ключ для текста и модели"""
-    content = f"{model}:{text[:500]}"  # Используем первые 500 символов для хеша
+    """Создает хеш ключ для полного нормализованного текста и модели"""
+    content = f"text:{model}:{normalize_text(text)}"
     return hashlib.sha256(content.encode('utf-8')).hexdigest()
 
 
 def _hash_image(image_b64: str, caption: str = "", model: str = "") -> str:
-    """Создает хеш ключ для изображения"""
-    # Используем первые 100 символов base64 и caption
-    content = f"{model}:{image_b64[:100]}:{caption[:200]}"
+    """Создает хеш ключ для изображения (по всему содержимому) и подписи"""
+    digest = hashlib.sha256(image_b64.encode('ascii', 'ignore')).hexdigest()
+    content = f"image:{model}:{digest}:{normalize_text(caption)}"
     return hashlib.sha256(content.encode('utf-8')).hexdigest()
 
 
+def _is_negative(result: Dict[str, Any]) -> bool:
+    """Результат «нерелевантно» — кэшируется с коротким TTL."""
+    rel = result.get("relevant", True)
+    if isinstance(rel, str):
+        rel = rel.lower() in ("true", "1", "yes", "да")
+    return not rel
+
+
+class AICache:
+    """LRU в памяти (лимит по байтам) + общий для процессов SharedCache."""
+
+    def __init__(self, max_bytes: int = AI_CACHE_MAX_BYTES, persist: bool = AI_CACHE_PERSIST):
+        self.max_bytes = max_bytes
+        self.persist = persist
+        # key → (payload json, negative, размер в байтах); срок — в TTLCache
+        self._memory: TTLCache[str, Tuple[str, bool, int]] = TTLCache(
+            ttl=AI_CACHE_TTL_HOURS * 3600, max_weight=max_bytes, weigh=lambda entry: entry[2],
+        )
+        self.counters: Dict[str, int] = {
+            "hits_memory": 0, "hits_shared": 0, "hits_negative": 0, "misses": 0,
+            "writes": 0, "writes_negative": 0, "expired_dropped": 0,
+        }
+
+    def _shared(self) -> Optional[SharedCache]:
+        return get_shared_cache() if self.persist else None
+
+    def _remember(self, key: str, payload: str, ttl: float, negative: bool) -> None:
+        size = len(payload.encode("utf-8"))
+        self._memory.set(key, (payload, negative, size), ttl=ttl)
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        entry = self._memory.get(key)
+        if entry is not None:
+            payload, negative, _ = entry
+            self.counters["hits_memory"] += 1
+            if negative:
+                self.counters["hits_negative"] += 1
+            return json.loads(payload)
+
+        shared = self._shared()
+        if shared is not None:
+            # [negative, срок (unix), результат]
+            value = shared.get(_SHARED_NAMESPACE, key)
+            if value is not None:
+                negative, expires_at, result = value
+                self._remember(key, json.dumps(result, ensure_ascii=False), expires_at - time.time(), bool(negative))
+                self.counters["hits_shared"] += 1
+                if negative:
+                    self.counters["hits_negative"] += 1
+                return result
+
+        self.counters["misses"] += 1
+        return None
+
+    def set(self, key: str, result: Dict[str, Any]) -> None:
+        negative = _is_negative(result)
+        ttl = (AI_CACHE_NEGATIVE_TTL_HOURS if negative else AI_CACHE_TTL_HOURS) * 3600
+        payload = json.dumps(result, ensure_ascii=False, default=str)
+        self._remember(key, payload, ttl, negative)
+        self.counters["writes"] += 1
+        if negative:
+            self.counters["writes_negative"] += 1
+
+        shared = self._shared()
+        if shared is not None:
+            shared.set(_SHARED_NAMESPACE, key, [int(negative), round(time.time() + ttl), result], ttl)
+
+    def cleanup_expired(self) -> int:
+        removed = self._memory.expire()
+        shared = self._shared()
+        if shared is not None:
+            removed += shared.purge_expired()
+        self.counters["expired_dropped"] += removed
+        return removed
+
+    def clear(self) -> int:
+        size = self._memory.clear()
+        shared = self._shared()
+        if shared is not None:
+            size = max(size, shared.clear(_SHARED_NAMESPACE))
+        return size
+
+    def stats(self) -> Dict[str, Any]:
+        """Счётчики без обхода записей: истёкшие снимаются с вершины кучи сроков."""
+        self._memory.expire()
+        memory = self._memory.stats()
+        lookups = self.counters["hits_memory"] + self.counters["hits_shared"] + self.counters["misses"]
+        hits = self.counters["hits_memory"] + self.counters["hits_shared"]
+        shared = self._shared()
+        return {
+            "total": memory["size"],
+            "valid": memory["size"],
+            "expired": memory["expired"],
+            "evictions": memory["evicted"],
+            "memory_bytes": memory["weight"],
+            "max_bytes": self.max_bytes,
+            "persist": self.persist,
+            "ttl_hours": AI_CACHE_TTL_HOURS,
+            "negative_ttl_hours": AI_CACHE_NEGATIVE_TTL_HOURS,
+            "hit_rate": round(hits / lookups, 3) if lookups else 0.0,
+            "shared": shared.stats() if shared is not None else None,
+            **self.counters,
+        }
+
+
+_cache: Optional[AICache] = None
+
+
+def get_ai_cache() -> AICache:
+    global _cache
+    if _cache is None:
+        _cache = AICache()
+    return _cache
+
+
 def get_cached_text(text: str, model: str = "") -> Optional[Dict[str, Any]]:
     """
     Получить закэшированный результат анализа текста
-    
+
     Args:
         text: Текст для анализа
         model: Название модели (для разделения кэшей разных моделей)
-    
+
     Returns:
         Результат анализа или None если не найден/истек
     """
-    cache_key = _hash_text(text, model)
-    
-    if cache_key not in _cache:
-        return None
-    
-    result, timestamp = _cache[cache_key]
-    
-    # Проверяем TTL
-    if time.time() - timestamp > _cache_ttl:
-        del _cache[cache_key]
-        logger.debug(f"Cache expired for key: {cache_key[:16]}...")
-        return None
-    
-    logger.debug(f"Cache hit for text analysis (model: {model})")
-    return result.copy() if result else None
+    result = get_ai_cache().get(_hash_text(text, model))
+    if result is not None:
+        logger.debug(f"Cache hit for text analysis (model: {model})")
+    return result
 
 
 def set_cached_text(text: str, result: Dict[str, Any], model: str = ""):
     """
     Сохранить результат анализа текста в кэш
-    
+
     Args:
         text: Текст который анализировался
-        result: Результат анализа
+        result: Результат анализа (relevant=false — negative cache с коротким TTL)
         model: Название модели
     """
-    cache_key = _hash_text(text, model)
-    
-    # Ограничиваем размер кэша (FIFO)
-    if len(_cache) >= _cache_max_size:
-        _cache.popitem(last=False)  # O(1) FIFO eviction
-        logger.debug("Cache full, removed oldest entry")
-    
-    _cache[cache_key] = (result.copy(), time.time())
-    logger.debug(f"Cached text analysis result (model: {model}, cache size: {len(_cache)})")
+    get_ai_cache().set(_hash_text(text, model), result)
 
 
 def get_cached_image(image_b64: str, caption: str = "", model: str = "") -> Optional[Dict[str, Any]]:
     """
     Получить закэшированный результат анализа изображения
-    
+
     Args:
         image_b64: Base64 изображения
         caption: Подпись к изображению
         model: Название модели
-    
+
     Returns:
         Результат анализа или None если не найден/истек
     """
-    cache_key = _hash_image(image_b64, caption, model)
-    
-    if cache_key not in _cache:
-        return None
-    
-    result, timestamp = _cache[cache_key]
-    
-    # Проверяем TTL
-    if time.time() - timestamp > _cache_ttl:
-        del _cache[cache_key]
-        logger.debug(f"Cache expired for image key: {cache_key[:16]}...")
-        return None
-    
-    logger.debug(f"Cache hit for image analysis (model: {model})")
-    return result.copy() if result else None
+    result = get_ai_cache().get(_hash_image(image_b64, caption, model))
+    if result is not None:
+        logger.debug(f"Cache hit for image analysis (model: {model})")
+    return result
 
 
 def set_cached_image(image_b64: str, result: Dict[str, Any], caption: str = "", model: str = ""):
     """
     Сохранить результат анализа изображения в кэш
-    
+
     Args:
         image_b64: Base64 изображения
         result: Результат анализа
         caption: Подпись к изображению
         model: Название модели
     """
-    cache_key = _hash_image(image_b64, caption, model)
-    
-    # Ограничиваем размер кэша (FIFO)
-    if len(_cache) >= _cache_max_size:
-        _cache.popitem(last=False)  # O(1) FIFO eviction
-        logger.debug("Cache full, removed oldest entry")
-    
-    _cache[cache_key] = (result.copy(), time.time())
-    logger.debug(f"Cached image analysis result (model: {model}, cache size: {len(_cache)})")
+    get_ai_cache().set(_hash_image(image_b64, caption, model), result)
 
 
 def clear_cache():
-    """Очистить весь кэш"""
-    global _cache
-    size = len(_cache)
-    _cache.clear()
+    """Очистить весь кэш (память и общий уровень)"""
+    size = get_ai_cache().clear()
     logger.info(f"Cache cleared ({size} entries removed)")
 
 
 def get_cache_stats() -> Dict[str, Any]:
-    """Получить статистику кэша"""
-    now = time.time()
-    valid_entries = sum(1 for _, (_, ts) in _cache.items() if now - ts <= _cache_ttl)
-    expired_entries = len(_cache) - valid_entries
-    
-    return {
-        "total": len(_cache),
-        "valid": valid_entries,
-        "expired": expired_entries,
-        "max_size": _cache_max_size,
-        "ttl_hours": _cache_ttl / 3600,
-    }
+    """Получить статистику кэша (размер, hit/miss, вытеснения)"""
+    return get_ai_cache().stats()
 
 
 def cleanup_expired():
     """Удалить истекшие записи из кэша"""
-    now = time.time()
-    expired_keys = [
-        key for key, (_, timestamp) in _cache.items()
-        if now - timestamp > _cache_ttl
-    ]
-    
-    for key in expired_keys:
-        del _cache[key]
-    
-    if expired_keys:
-        logger.debug(f"Cleaned up {len(expired_keys)} expired cache entries")
-    
-    return len(expired_keys)
+    removed = get_ai_cache().cleanup_expired()
+    if removed:
+        logger.debug(f"Cleaned up {removed} expired cache entries")
+    return removed
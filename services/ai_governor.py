@@ -0,0 +1,403 @@
+# services/ai_governor.py
+"""
+AIGovernor — ограничение и контроль вызовов AI API (Grok и др.).
+
+- Общий лимит одновременных запросов; слоты выдаёт AIScheduler по полосам
+  (interactive раньше background, бюджет токенов в минуту). Если слот не
+  освободился за AI_QUEUE_TIMEOUT, вызов сразу уходит на fallback (keyword-анализ).
+- Скользящая статистика по провайдеру и маршруту (direct/proxy):
+  задержки, ошибки, таймауты, 429.
+- Circuit breaker на маршрут: после AI_BREAKER_FAILURES ошибок подряд или
+  429 маршрут открывается и запросы к нему не отправляются; через
+  AI_BREAKER_COOLDOWN (или Retry-After) пропускается одна пробная попытка
+  (half-open) — успех закрывает breaker, ошибка открывает снова.
+- Hedging: если основной маршрут не ответил за свой наблюдаемый p90,
+  вызывающий код запускает запасной и берёт первый ответ (hedge_delay()).
+  Хеджирование выключается, когда недавняя доля ошибок маршрутов выше
+  AI_HEDGE_ERROR_BUDGET или хеджируется больше AI_HEDGE_MAX_RATIO запросов.
+"""
+
+import asyncio
+import logging
+import os
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Deque, Dict, Optional, Tuple
+
+import httpx
+
+from services.ai_scheduler import AI_TOKENS_PER_MINUTE, AIScheduler, current_lane
+
+logger = logging.getLogger(__name__)
+
+AI_MAX_CONCURRENCY = int(os.getenv("AI_MAX_CONCURRENCY", "4"))
+AI_CALL_TIMEOUT = float(os.getenv("AI_CALL_TIMEOUT", "20"))
+AI_QUEUE_TIMEOUT = float(os.getenv("AI_QUEUE_TIMEOUT", "15"))
+AI_BREAKER_FAILURES = int(os.getenv("AI_BREAKER_FAILURES", "3"))
+AI_BREAKER_COOLDOWN = float(os.getenv("AI_BREAKER_COOLDOWN", "60"))
+AI_HEDGE_ENABLED = os.getenv("AI_HEDGE_ENABLED", "1").strip().lower() not in ("0", "false", "no")
+AI_HEDGE_MIN_SAMPLES = int(os.getenv("AI_HEDGE_MIN_SAMPLES", "20"))
+AI_HEDGE_MIN_DELAY = float(os.getenv("AI_HEDGE_MIN_DELAY", "0.5"))
+AI_HEDGE_MAX_RATIO = float(os.getenv("AI_HEDGE_MAX_RATIO", "0.15"))
+AI_HEDGE_ERROR_BUDGET = float(os.getenv("AI_HEDGE_ERROR_BUDGET", "0.2"))
+
+LATENCY_WINDOW = 500
+OUTCOME_WINDOW = 100
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+# HTTP статусы, которые считаются отказом маршрута (остальные 4xx — ошибка запроса)
+_ROUTE_FAILURE_STATUSES = frozenset({401, 403, 408, 429})
+
+
+@dataclass
+class RouteStats:
+    """Статистика маршрута провайдера"""
+    calls: int = 0
+    ok: int = 0
+    errors: int = 0
+    timeouts: int = 0
+    rate_limited: int = 0
+    rejected: int = 0  # не отправлено: breaker открыт
+    saturated: int = 0  # не отправлено: нет свободного слота
+    cancelled: int = 0  # проиграл хедж (или отменён вызывающим)
+    latencies: Deque[float] = field(default_factory=lambda: deque(maxlen=LATENCY_WINDOW))
+    # Последние исходы (True — ошибка) для бюджета ошибок хеджирования
+    outcomes: Deque[bool] = field(default_factory=lambda: deque(maxlen=OUTCOME_WINDOW))
+
+    @property
+    def recent_error_rate(self) -> float:
+        return sum(self.outcomes) / len(self.outcomes) if self.outcomes else 0.0
+
+    def percentile(self, q: float) -> float:
+        if not self.latencies:
+            return 0.0
+        data = sorted(self.latencies)
+        return data[min(len(data) - 1, int(len(data) * q / 100))]
+
+
+class CircuitBreaker:
+    """closed → open (ошибки подряд / 429) → half_open (одна проба) → closed"""
+
+    def __init__(self, failure_threshold: int = AI_BREAKER_FAILURES, cooldown: float = AI_BREAKER_COOLDOWN):
+        self.failure_threshold = max(1, failure_threshold)
+        self.cooldown = cooldown
+        self.state = CLOSED
+        self.failures = 0
+        self.open_until = 0.0
+        self.opened_count = 0
+        self._probe_in_flight = False
+
+    def available(self, now: float) -> bool:
+        """Можно ли сейчас отправить запрос (без захвата пробы)."""
+        if self.state == CLOSED:
+            return True
+        if self.state == OPEN:
+            return now >= self.open_until
+        return not self._probe_in_flight
+
+    def allow(self, now: float) -> bool:
+        """Разрешение на запрос; в half-open пропускает только одну пробу."""
+        if self.state == CLOSED:
+            return True
+        if self.state == OPEN:
+            if now < self.open_until:
+                return False
+            self.state = HALF_OPEN
+        if self._probe_in_flight:
+            return False
+        self._probe_in_flight = True
+        return True
+
+    def release_probe(self) -> None:
+        self._probe_in_flight = False
+
+    def success(self) -> None:
+        self.state = CLOSED
+        self.failures = 0
+        self._probe_in_flight = False
+
+    def failure(self, now: float, rate_limited: bool = False, retry_after: Optional[float] = None) -> bool:
+        """Фиксирует отказ; True, если breaker только что открылся."""
+        self.failures += 1
+        self._probe_in_flight = False
+        if self.state == HALF_OPEN or rate_limited or self.failures >= self.failure_threshold:
+            was_open = self.state == OPEN
+            self.state = OPEN
+            self.open_until = now + max(self.cooldown, retry_after or 0.0)
+            if not was_open:
+                self.opened_count += 1
+            return not was_open
+        return False
+
+
+@dataclass
+class AIAttempt:
+    """Попытка вызова: allowed=False — запрос не отправлять. Вызывающий код заполняет status."""
+    provider: str
+    route: str
+    allowed: bool = False
+    status: Optional[int] = None
+    retry_after: Optional[float] = None
+    tokens_used: Optional[int] = None  # usage.total_tokens из ответа — уточняет бюджет
+
+
+def retry_after_seconds(response: httpx.Response) -> Optional[float]:
+    """Retry-After из ответа (сек) или None."""
+    try:
+        return float(response.headers.get("retry-after", ""))
+    except ValueError:
+        return None
+
+
+class AIGovernor:
+    """Лимит параллельности + статистика + circuit breaker по (провайдер, маршрут)."""
+
+    def __init__(
+        self,
+        max_concurrency: int = AI_MAX_CONCURRENCY,
+        queue_timeout: float = AI_QUEUE_TIMEOUT,
+        failure_threshold: int = AI_BREAKER_FAILURES,
+        cooldown: float = AI_BREAKER_COOLDOWN,
+        tokens_per_minute: int = AI_TOKENS_PER_MINUTE,
+    ):
+        self.max_concurrency = max(1, max_concurrency)
+        self.queue_timeout = queue_timeout
+        self._failure_threshold = failure_threshold
+        self._cooldown = cooldown
+        self.scheduler = AIScheduler(self.max_concurrency, tokens_per_minute=tokens_per_minute)
+        self._routes: Dict[Tuple[str, str], RouteStats] = {}
+        self._breakers: Dict[Tuple[str, str], CircuitBreaker] = {}
+        self.in_flight = 0
+        self.waiting = 0
+        self.fallbacks: Dict[str, int] = {}
+        # Хеджирование по провайдеру: решения (True — хедж запущен) и счётчики
+        self._hedge_decisions: Dict[str, Deque[bool]] = {}
+        self.hedges: Dict[str, Dict[str, int]] = {}
+
+    def _route(self, provider: str, route: str) -> Tuple[RouteStats, CircuitBreaker]:
+        key = (provider, route)
+        if key not in self._routes:
+            self._routes[key] = RouteStats()
+            self._breakers[key] = CircuitBreaker(self._failure_threshold, self._cooldown)
+        return self._routes[key], self._breakers[key]
+
+    def available(self, provider: str) -> bool:
+        """Есть ли у провайдера хотя бы один маршрут, куда можно отправить запрос."""
+        now = time.monotonic()
+        breakers = [b for (p, _), b in self._breakers.items() if p == provider]
+        return not breakers or any(b.available(now) for b in breakers)
+
+    def record_fallback(self, provider: str) -> None:
+        """Запрос обслужен fallback-путём (провайдер недоступен или все маршруты отказали)."""
+        self.fallbacks[provider] = self.fallbacks.get(provider, 0) + 1
+
+    def hedge_delay(self, provider: str, primary: str, backup: str) -> Optional[float]:
+        """
+        Через сколько секунд без ответа primary запускать запасной маршрут backup
+        (p90 primary), или None — не хеджировать: мало данных, backup недоступен,
+        превышен бюджет ошибок или доля хеджей.
+        """
+        if not AI_HEDGE_ENABLED:
+            return None
+        stats, _ = self._route(provider, primary)
+        backup_stats, backup_breaker = self._route(provider, backup)
+        decisions = self._hedge_decisions.setdefault(provider, deque(maxlen=OUTCOME_WINDOW))
+        counters = self.hedges.setdefault(provider, {"hedged": 0, "backup_won": 0, "suppressed": 0})
+        if len(stats.latencies) < AI_HEDGE_MIN_SAMPLES or not backup_breaker.available(time.monotonic()):
+            return None
+        over_budget = max(stats.recent_error_rate, backup_stats.recent_error_rate) > AI_HEDGE_ERROR_BUDGET
+        # Доля хеджей считается от полного окна решений — на старте не душит первые хеджи
+        over_ratio = sum(decisions) >= AI_HEDGE_MAX_RATIO * OUTCOME_WINDOW
+        if over_budget or over_ratio:
+            counters["suppressed"] += 1
+            decisions.append(False)
+            return None
+        return max(AI_HEDGE_MIN_DELAY, stats.percentile(90))
+
+    def record_hedge(self, provider: str, hedged: bool, backup_won: bool = False) -> None:
+        """Итог вызова с возможностью хеджа: был ли запущен запасной маршрут и победил ли он."""
+        decisions = self._hedge_decisions.setdefault(provider, deque(maxlen=OUTCOME_WINDOW))
+        counters = self.hedges.setdefault(provider, {"hedged": 0, "backup_won": 0, "suppressed": 0})
+        decisions.append(hedged)
+        if hedged:
+            counters["hedged"] += 1
+        if backup_won:
+            counters["backup_won"] += 1
+
+    @property
+    def degraded(self) -> bool:
+        return any(b.state != CLOSED for b in self._breakers.values())
+
+    @asynccontextmanager
+    async def attempt(self, provider: str, route: str, tokens: int = 0) -> AsyncIterator[AIAttempt]:
+        """
+        Контекст одного HTTP запроса к AI:
+
+            async with governor.attempt("grok", "direct") as att:
+                if att.allowed:
+                    r = await client.post(...)
+                    att.status = r.status_code
+
+        Исключение внутри контекста считается отказом маршрута (и пробрасывается).
+        tokens — оценка токенов запроса для бюджета; полоса берётся из ai_lane().
+        """
+        stats, breaker = self._route(provider, route)
+        att = AIAttempt(provider, route)
+        if not breaker.allow(time.monotonic()):
+            stats.rejected += 1
+            yield att
+            return
+
+        lane = current_lane()
+        self.waiting += 1
+        try:
+            grant = await self.scheduler.acquire(lane, tokens, timeout=self.queue_timeout)
+        except asyncio.CancelledError:
+            breaker.release_probe()
+            raise
+        finally:
+            self.waiting -= 1
+        if grant is None:
+            breaker.release_probe()
+            stats.saturated += 1
+            logger.warning(
+                f"⏳ AI {provider}/{route} [{lane}]: нет свободного слота за {self.queue_timeout:.0f}с — fallback"
+            )
+            yield att
+            return
+
+        att.allowed = True
+        self.in_flight += 1
+        stats.calls += 1
+        started = time.monotonic()
+        try:
+            yield att
+        except asyncio.CancelledError:
+            # Отменённый (проигравший хедж) запрос шёл минимум столько — учитываем,
+            # иначе медленные ответы выпадают из окна и p90 занижается
+            stats.latencies.append(time.monotonic() - started)
+            stats.cancelled += 1
+            breaker.release_probe()
+            raise
+        except Exception as e:
+            timed_out = isinstance(e, (httpx.TimeoutException, asyncio.TimeoutError))
+            stats.outcomes.append(True)
+            self._failed(provider, route, stats, breaker, timed_out=timed_out)
+            raise
+        else:
+            stats.latencies.append(time.monotonic() - started)
+            status = att.status
+            stats.outcomes.append(status != 200)
+            if status == 200:
+                stats.ok += 1
+                if breaker.state != CLOSED:
+                    logger.info(f"✅ AI {provider}/{route}: маршрут восстановлен")
+                breaker.success()
+            elif status is not None and (status in _ROUTE_FAILURE_STATUSES or status >= 500):
+                self._failed(provider, route, stats, breaker, status=status, retry_after=att.retry_after)
+            else:
+                stats.errors += 1
+                breaker.release_probe()
+        finally:
+            self.in_flight -= 1
+            self.scheduler.release(grant, att.tokens_used)
+
+    def _failed(self, provider, route, stats, breaker, status=None, timed_out=False, retry_after=None) -> None:
+        stats.errors += 1
+        if timed_out:
+            stats.timeouts += 1
+        rate_limited = status == 429
+        if rate_limited:
+            stats.rate_limited += 1
+        if breaker.failure(time.monotonic(), rate_limited=rate_limited, retry_after=retry_after):
+            reason = "429" if rate_limited else ("таймаут" if timed_out else f"ошибки подряд: {breaker.failures}")
+            pause = breaker.open_until - time.monotonic()
+            logger.warning(f"🔌 AI {provider}/{route}: breaker открыт ({reason}), пауза {pause:.0f}с → keyword")
+
+    def snapshot(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        routes = {}
+        for (provider, route), s in self._routes.items():
+            b = self._breakers[(provider, route)]
+            routes[f"{provider}/{route}"] = {
+                "state": b.state,
+                "consecutive_failures": b.failures,
+                "opened_count": b.opened_count,
+                "retry_in_s": round(max(0.0, b.open_until - now), 1) if b.state == OPEN else 0.0,
+                "calls": s.calls,
+                "ok": s.ok,
+                "errors": s.errors,
+                "timeouts": s.timeouts,
+                "rate_limited": s.rate_limited,
+                "rejected": s.rejected,
+                "saturated": s.saturated,
+                "cancelled": s.cancelled,
+                "error_rate": round(s.errors / s.calls, 3) if s.calls else 0.0,
+                "recent_error_rate": round(s.recent_error_rate, 3),
+                "samples": len(s.latencies),
+                "p50_ms": round(s.percentile(50) * 1000, 1),
+                "p90_ms": round(s.percentile(90) * 1000, 1),
+                "p95_ms": round(s.percentile(95) * 1000, 1),
+                "p99_ms": round(s.percentile(99) * 1000, 1),
+            }
+        return {
+            "degraded": self.degraded,
+            "max_concurrency": self.max_concurrency,
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "fallbacks": dict(self.fallbacks),
+            "routes": routes,
+            "hedging": {
+                "enabled": AI_HEDGE_ENABLED,
+                "error_budget": AI_HEDGE_ERROR_BUDGET,
+                "max_ratio": AI_HEDGE_MAX_RATIO,
+                **{provider: dict(c) for provider, c in self.hedges.items()},
+            },
+            "scheduler": self.scheduler.snapshot(),
+        }
+
+    def format_stats(self) -> str:
+        snap = self.snapshot()
+        fallbacks = sum(snap["fallbacks"].values())
+        parts = [f"🤖 AI {snap['in_flight']}/{snap['max_concurrency']} ждут {snap['waiting']} fallback {fallbacks}"]
+        for lane, l in snap["scheduler"]["lanes"].items():
+            parts.append(f"{lane} {l['in_flight']}/{l['limit']} ждут {l['waiting']} p95 {l['wait_p95_ms']:.0f}ms")
+        for name, r in snap["routes"].items():
+            parts.append(
+                f"{name} {r['state']} ok {r['ok']}/{r['calls']} 429 {r['rate_limited']} "
+                f"отказ {r['rejected'] + r['saturated']} p95 {r['p95_ms']:.0f}ms"
+            )
+        return " | ".join(parts)
+
+
+_governor: Optional[AIGovernor] = None
+
+
+def get_ai_governor() -> AIGovernor:
+    global _governor
+    if _governor is None:
+        _governor = AIGovernor()
+    return _governor
+
+
+def share_ai_governor(parts: int) -> AIGovernor:
+    """
+    Governor процесса с 1/parts общего бюджета: параллельность и токены в минуту.
+    Для процессов-воркеров мониторинга (MONITOR_WORKERS) — иначе N процессов
+    вместе держат N×AI_MAX_CONCURRENCY запросов и тратят N×AI_TOKENS_PER_MINUTE.
+    Вызывать до первого AI-запроса процесса; меньше одного слота не бывает.
+    """
+    global _governor
+    parts = max(1, parts)
+    tokens = AI_TOKENS_PER_MINUTE and max(1, AI_TOKENS_PER_MINUTE // parts)
+    _governor = AIGovernor(max_concurrency=max(1, AI_MAX_CONCURRENCY // parts), tokens_per_minute=tokens)
+    logger.info(
+        "🧮 AI бюджет процесса: 1/%d — %d слотов, %s токенов/мин",
+        parts, _governor.max_concurrency, tokens or "∞",
+    )
+    return _governor
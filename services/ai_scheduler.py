@@ -0,0 +1,260 @@
+# services/ai_scheduler.py
+"""
+AIScheduler — приоритетные полосы для исходящих AI-запросов.
+
+Пользовательские запросы (API /ai/analyze, /ai/sanitize_report, бот) и фоновый
+мониторинг делят одну квоту xAI. Полоса задаётся контекстом вызова:
+
+    with ai_lane(INTERACTIVE):
+        result = await analyze_complaint(text)
+
+По умолчанию — BACKGROUND. Планировщик выдаёт слоты строго по приоритету:
+пока есть ждущие interactive-запросы, фоновые не запускаются. У каждой полосы
+свой лимит параллельности (фону по умолчанию на один слот меньше общего —
+пользователю всегда остаётся место), общий скользящий бюджет токенов в минуту
+(AI_TOKENS_PER_MINUTE, 0 — без лимита), из которого фону доступна доля
+AI_BACKGROUND_TPM_SHARE. Оценка токенов запроса уточняется фактическим
+usage.total_tokens из ответа. Время ожидания слота — гистограмма по полосам.
+"""
+
+import asyncio
+import bisect
+import logging
+import os
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any, Deque, Dict, Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+INTERACTIVE = "interactive"
+BACKGROUND = "background"
+LANES = (INTERACTIVE, BACKGROUND)  # в порядке приоритета
+
+AI_TOKENS_PER_MINUTE = int(os.getenv("AI_TOKENS_PER_MINUTE", "0"))
+AI_BACKGROUND_TPM_SHARE = float(os.getenv("AI_BACKGROUND_TPM_SHARE", "0.8"))
+_lane_limit_env = {
+    INTERACTIVE: os.getenv("AI_INTERACTIVE_CONCURRENCY", "").strip(),
+    BACKGROUND: os.getenv("AI_BACKGROUND_CONCURRENCY", "").strip(),
+}
+
+TPM_WINDOW = 60.0
+# Границы корзин гистограммы ожидания, мс (последняя корзина — всё, что больше)
+WAIT_BUCKETS_MS = (10, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000)
+# Оценка токенов: ~3 символа кириллицы на токен, фото ~ 1000 токенов
+_CHARS_PER_TOKEN = 3
+_IMAGE_TOKENS = 1000
+_DEFAULT_COMPLETION_TOKENS = 400
+
+_current_lane: ContextVar[str] = ContextVar("ai_lane", default=BACKGROUND)
+
+
+def current_lane() -> str:
+    return _current_lane.get()
+
+
+@contextmanager
+def ai_lane(lane: str) -> Iterator[None]:
+    """Все AI-запросы внутри блока (и в созданных из него задачах) идут в полосе lane."""
+    token = _current_lane.set(lane if lane in LANES else BACKGROUND)
+    try:
+        yield
+    finally:
+        _current_lane.reset(token)
+
+
+def estimate_tokens(payload: Dict[str, Any]) -> int:
+    """Грубая оценка prompt + completion токенов chat/completions запроса."""
+    chars = 0
+    images = 0
+    for message in payload.get("messages") or []:
+        content = message.get("content")
+        if isinstance(content, str):
+            chars += len(content)
+        elif isinstance(content, list):
+            for part in content:
+                if part.get("type") == "text":
+                    chars += len(part.get("text") or "")
+                elif part.get("type") == "image_url":
+                    images += 1
+    completion = int(payload.get("max_tokens") or _DEFAULT_COMPLETION_TOKENS)
+    return chars // _CHARS_PER_TOKEN + images * _IMAGE_TOKENS + completion
+
+
+@dataclass
+class LaneStats:
+    """Счётчики и гистограмма ожидания слота полосы"""
+    granted: int = 0
+    timeouts: int = 0
+    in_flight: int = 0
+    buckets: List[int] = field(default_factory=lambda: [0] * (len(WAIT_BUCKETS_MS) + 1))
+    waits: Deque[float] = field(default_factory=lambda: deque(maxlen=500))
+
+    def observe(self, wait: float) -> None:
+        self.granted += 1
+        self.waits.append(wait)
+        self.buckets[bisect.bisect_left(WAIT_BUCKETS_MS, wait * 1000)] += 1
+
+    def percentile(self, q: float) -> float:
+        if not self.waits:
+            return 0.0
+        data = sorted(self.waits)
+        return data[min(len(data) - 1, int(len(data) * q / 100))]
+
+
+@dataclass
+class _Waiter:
+    lane: str
+    tokens: int
+    future: asyncio.Future
+    enqueued_at: float
+
+
+@dataclass
+class Grant:
+    """Выданный слот; entry — запись в журнале токенов (уточняется после ответа)."""
+    lane: str
+    entry: Optional[List[float]] = None
+
+
+class AIScheduler:
+    """Слоты по полосам со строгим приоритетом + скользящий бюджет токенов."""
+
+    def __init__(
+        self,
+        max_concurrency: int,
+        lane_limits: Optional[Dict[str, int]] = None,
+        tokens_per_minute: int = AI_TOKENS_PER_MINUTE,
+        background_share: float = AI_BACKGROUND_TPM_SHARE,
+    ):
+        self.max_concurrency = max(1, max_concurrency)
+        limits = {
+            INTERACTIVE: self.max_concurrency,
+            BACKGROUND: max(1, self.max_concurrency - 1),
+        }
+        for lane, raw in _lane_limit_env.items():
+            if raw:
+                limits[lane] = int(raw)
+        limits.update(lane_limits or {})
+        self.lane_limits = {lane: max(1, min(self.max_concurrency, n)) for lane, n in limits.items()}
+        self.tokens_per_minute = max(0, tokens_per_minute)
+        self.background_share = min(1.0, max(0.0, background_share))
+        self.in_flight = 0
+        self._queues: Dict[str, Deque[_Waiter]] = {lane: deque() for lane in LANES}
+        self.lanes: Dict[str, LaneStats] = {lane: LaneStats() for lane in LANES}
+        # Журнал токенов за окно: [время выдачи, токены]
+        self._ledger: Deque[List[float]] = deque()
+        self._window_tokens = 0.0
+        self._wake: Optional[asyncio.TimerHandle] = None
+        self.budget_waits = 0
+
+    def _trim(self, now: float) -> None:
+        while self._ledger and self._ledger[0][0] <= now - TPM_WINDOW:
+            self._window_tokens -= self._ledger.popleft()[1]
+
+    def _budget_ok(self, lane: str, tokens: int) -> bool:
+        if not self.tokens_per_minute:
+            return True
+        limit = self.tokens_per_minute * (1.0 if lane == INTERACTIVE else self.background_share)
+        # Запрос больше всего бюджета пропускаем в пустое окно, иначе он не пройдёт никогда
+        return self._window_tokens + tokens <= limit or self._window_tokens <= 0
+
+    def _schedule_wake(self, now: float) -> None:
+        if self._wake is not None or not self._ledger:
+            return
+        delay = max(0.05, self._ledger[0][0] + TPM_WINDOW - now)
+        self._wake = asyncio.get_running_loop().call_later(delay, self._on_wake)
+
+    def _on_wake(self) -> None:
+        self._wake = None
+        self._dispatch()
+
+    def _dispatch(self) -> None:
+        now = time.monotonic()
+        self._trim(now)
+        for lane in LANES:
+            queue = self._queues[lane]
+            while queue:
+                waiter = queue[0]
+                if waiter.future.done():  # таймаут или отмена ожидания
+                    queue.popleft()
+                    continue
+                if self.in_flight >= self.max_concurrency or self.lanes[lane].in_flight >= self.lane_limits[lane]:
+                    break
+                if not self._budget_ok(lane, waiter.tokens):
+                    self.budget_waits += 1
+                    self._schedule_wake(now)
+                    break
+                queue.popleft()
+                grant = Grant(lane)
+                if self.tokens_per_minute:
+                    grant.entry = [now, float(waiter.tokens)]
+                    self._ledger.append(grant.entry)
+                    self._window_tokens += waiter.tokens
+                self.in_flight += 1
+                self.lanes[lane].in_flight += 1
+                self.lanes[lane].observe(now - waiter.enqueued_at)
+                waiter.future.set_result(grant)
+            if queue:
+                # Ждущие запросы старшей полосы: младшие уступают
+                return
+
+    async def acquire(self, lane: str, tokens: int = 0, timeout: Optional[float] = None) -> Optional[Grant]:
+        """Слот в полосе lane или None, если не дождались за timeout."""
+        lane = lane if lane in LANES else BACKGROUND
+        future = asyncio.get_running_loop().create_future()
+        self._queues[lane].append(_Waiter(lane, tokens, future, time.monotonic()))
+        self._dispatch()
+        try:
+            return await asyncio.wait_for(future, timeout=timeout)
+        except asyncio.TimeoutError:
+            self.lanes[lane].timeouts += 1
+            return None
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                self.release(future.result())
+            raise
+
+    def release(self, grant: Grant, tokens_used: Optional[int] = None) -> None:
+        """Возврат слота; tokens_used — фактический расход из ответа (уточняет бюджет)."""
+        self.in_flight -= 1
+        self.lanes[grant.lane].in_flight -= 1
+        now = time.monotonic()
+        self._trim(now)
+        # Запись ещё в окне (старые уже сняты _trim) — уточняем оценку фактом
+        if grant.entry is not None and tokens_used is not None and grant.entry[0] > now - TPM_WINDOW:
+            self._window_tokens += tokens_used - grant.entry[1]
+            grant.entry[1] = float(tokens_used)
+        self._dispatch()
+
+    def waiting(self, lane: Optional[str] = None) -> int:
+        lanes = [lane] if lane else LANES
+        return sum(1 for name in lanes for w in self._queues[name] if not w.future.done())
+
+    def snapshot(self) -> Dict[str, Any]:
+        self._trim(time.monotonic())
+        labels = [f"<={b}ms" for b in WAIT_BUCKETS_MS] + [f">{WAIT_BUCKETS_MS[-1]}ms"]
+        lanes = {}
+        for lane, s in self.lanes.items():
+            lanes[lane] = {
+                "limit": self.lane_limits[lane],
+                "in_flight": s.in_flight,
+                "waiting": self.waiting(lane),
+                "granted": s.granted,
+                "timeouts": s.timeouts,
+                "wait_p50_ms": round(s.percentile(50) * 1000, 1),
+                "wait_p95_ms": round(s.percentile(95) * 1000, 1),
+                "wait_histogram": dict(zip(labels, s.buckets)),
+            }
+        return {
+            "max_concurrency": self.max_concurrency,
+            "in_flight": self.in_flight,
+            "tokens_per_minute": self.tokens_per_minute,
+            "tokens_in_window": int(self._window_tokens),
+            "background_share": self.background_share,
+            "budget_waits": self.budget_waits,
+            "lanes": lanes,
+        }
@@ -0,0 +1,87 @@
+# services/cursor_store.py
+"""
+CursorStore — персистентные курсоры источников (последний обработанный id).
+
+Хранит для каждого источника (tg:<канал>, vk:<группа>) максимальный id
+обработанного сообщения в SQLite, чтобы после перезапуска мониторинг
+продолжал с места остановки, а не терял пропущенные сообщения.
+"""
+
+import logging
+import os
+import sqlite3
+import time
+from typing import Dict, Optional
+
+from core.config import STATE_DIR
+
+logger = logging.getLogger(__name__)
+
+
+class CursorStore:
+    """Курсоры источников: in-memory + write-through в SQLite (WAL)."""
+
+    def __init__(self, path: Optional[str] = None):
+        self._path = path or os.path.join(STATE_DIR, "cursors.sqlite3")
+        self._conn: Optional[sqlite3.Connection] = None
+        self._cursors: Dict[str, int] = {}
+        self._loaded = False
+
+    def _db(self) -> sqlite3.Connection:
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self._path) or ".", exist_ok=True)
+            self._conn = sqlite3.connect(self._path)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS cursors ("
+                " source TEXT PRIMARY KEY, last_id INTEGER NOT NULL, updated_at REAL NOT NULL)"
+            )
+            self._conn.commit()
+        return self._conn
+
+    def _load(self) -> None:
+        if self._loaded:
+            return
+        self._loaded = True
+        try:
+            for source, last_id in self._db().execute("SELECT source, last_id FROM cursors"):
+                self._cursors[source] = int(last_id)
+        except sqlite3.Error as e:
+            logger.error(f"CursorStore load error: {e}")
+
+    def get(self, source: str) -> Optional[int]:
+        """Последний обработанный id источника или None, если источник новый."""
+        self._load()
+        return self._cursors.get(source)
+
+    def advance(self, source: str, last_id: int) -> bool:
+        """Сдвигает курсор вперёд (назад — никогда). True, если курсор изменился."""
+        self._load()
+        if last_id is None:
+            return False
+        last_id = int(last_id)
+        current = self._cursors.get(source)
+        if current is not None and last_id <= current:
+            return False
+        self._cursors[source] = last_id
+        try:
+            db = self._db()
+            db.execute(
+                "INSERT INTO cursors (source, last_id, updated_at) VALUES (?, ?, ?) "
+                "ON CONFLICT(source) DO UPDATE SET last_id = excluded.last_id, updated_at = excluded.updated_at",
+                (source, last_id, time.time()),
+            )
+            db.commit()
+        except sqlite3.Error as e:
+            logger.error(f"CursorStore write error: {e}")
+        return True
+
+    def all(self) -> Dict[str, int]:
+        self._load()
+        return dict(self._cursors)
+
+    def close(self) -> None:
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
@@ -0,0 +1,342 @@
+# services/duplicate_index.py
+"""
+DuplicateIndex — поиск дубликатов жалоб в памяти за скользящее окно (7 дней).
+
+Заменяет запросы к reports с LIKE '%…%' (полный скан окна), сохраняя их смысл:
+- координаты: сетка ячеек размером с порог (~100 м), проверка 3×3 соседей
+- адрес: сохранённый адрес содержит первые 30 символов нового, как
+  LIKE '%адрес%' («ул. Мира 62, Нижневартовск» ⊃ «Мира 62»): кандидатов
+  отбирают триграммы символов, вхождение проверяется подстрокой
+- текст: сохранённое описание содержит первые 50 символов нового, как
+  LIKE '%текст%' («Репост из группы: <текст>» ⊃ «<текст>»): кандидаты — по целым
+  словам; дополнительно — близкий SimHash (тот же текст с правками)
+Сравнение без учёта регистра, ё/е и повторных пробелов.
+Индекс прогревается из БД при первом обращении и пополняется после сохранения.
+Жалобы пишут и другие процессы (API бэкенда, ultimate_bot.py, другие мониторы),
+поэтому sync() не чаще раза в DUPLICATE_SYNC_INTERVAL секунд догружает строки
+с id больше последнего прочитанного.
+"""
+
+import logging
+import math
+import os
+import time
+from collections import deque
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Deque, Dict, Hashable, Iterable, Optional, Set, Tuple
+
+from services.fingerprint import HammingIndex, normalize_text, simhash64
+
+logger = logging.getLogger(__name__)
+
+WINDOW_DAYS = 7
+LAT_DIFF = 0.0009  # ~100м
+LON_DIFF = 0.0012  # ~100м
+ADDRESS_KEY_LEN = 30
+SNIPPET_LEN = 50
+MIN_TEXT_LEN = 20
+TEXT_MAX_DISTANCE = 3
+DESCRIPTION_MAX_LEN = 2000  # как в save_to_db
+DUPLICATE_SYNC_INTERVAL = float(os.getenv("DUPLICATE_SYNC_INTERVAL", "30"))
+
+
+@dataclass
+class _Entry:
+    entry_id: int
+    created_at: float
+    category: str
+    cell: Optional[Tuple[int, int]]
+    lat: Optional[float]
+    lon: Optional[float]
+
+
+def _fold(text: str) -> str:
+    """Нижний регистр, ё→е, схлопнутые пробелы — нормализация для проверки вхождения."""
+    return " ".join(text.lower().replace("ё", "е").split())
+
+
+class SubstringIndex:
+    """
+    Записи, чья строка содержит запрос (LIKE '%запрос%'), в пределах группы.
+
+    words=False — ключи-триграммы символов (короткие строки: адреса);
+    words=True — ключи-слова (длинные описания): слова запроса, кроме крайних
+    (они могут оказаться обрывками слов строки), встречаются в ней целиком.
+    Кандидаты — пересечение самых редких ключей запроса, затем проверка
+    подстрокой; запрос без ключей проверяется перебором группы.
+    """
+
+    _MAX_KEYS = 3  # сколько самых редких ключей пересекать
+
+    def __init__(self, words: bool = False):
+        self._words = words
+        self._values: Dict[int, Tuple[Hashable, str]] = {}
+        self._groups: Dict[Hashable, Set[int]] = {}
+        self._postings: Dict[Tuple[Hashable, str], Set[int]] = {}
+
+    def _keys(self, value: str) -> Set[str]:
+        if self._words:
+            return set(value.split())
+        return {value[i:i + 3] for i in range(len(value) - 2)}
+
+    def _query_keys(self, query: str) -> Set[str]:
+        if self._words:
+            return set(query.split()[1:-1])
+        return self._keys(query)
+
+    def add(self, entry_id: int, group: Hashable, value: str) -> None:
+        self._values[entry_id] = (group, value)
+        self._groups.setdefault(group, set()).add(entry_id)
+        for key in self._keys(value):
+            self._postings.setdefault((group, key), set()).add(entry_id)
+
+    def remove(self, entry_id: int) -> None:
+        item = self._values.pop(entry_id, None)
+        if item is None:
+            return
+        group, value = item
+        self._discard(self._groups, group, entry_id)
+        for key in self._keys(value):
+            self._discard(self._postings, (group, key), entry_id)
+
+    @staticmethod
+    def _discard(table: Dict, key: Hashable, entry_id: int) -> None:
+        ids = table.get(key)
+        if ids is not None:
+            ids.discard(entry_id)
+            if not ids:
+                del table[key]
+
+    def find(self, group: Hashable, query: str) -> Optional[int]:
+        """id записи группы, строка которой содержит query, или None."""
+        if not query:
+            return None
+        keys = self._query_keys(query)
+        if keys:
+            postings = []
+            for key in keys:
+                ids = self._postings.get((group, key))
+                if not ids:
+                    return None
+                postings.append(ids)
+            postings.sort(key=len)
+            candidates: Iterable[int] = set.intersection(*postings[:self._MAX_KEYS])
+        else:
+            candidates = self._groups.get(group, ())
+        for entry_id in candidates:
+            if query in self._values[entry_id][1]:
+                return entry_id
+        return None
+
+    def __len__(self) -> int:
+        return len(self._values)
+
+
+@dataclass
+class DuplicateStats:
+    """Статистика проверок"""
+    checks: int = 0
+    by_coords: int = 0
+    by_address: int = 0
+    by_text: int = 0
+    loaded: int = 0
+    expired: int = 0
+
+
+class DuplicateIndex:
+    """
+    Индекс жалоб за последние window_days дней.
+
+    - is_duplicate(): проверка по координатам, адресу и тексту в пределах категории
+    - add(): добавляет сохранённую жалобу
+    - warm_start(db): загружает окно из таблицы reports
+    - sync(db): прогрев при первом вызове, затем догрузка новых строк reports
+    """
+
+    def __init__(self, window_days: int = WINDOW_DAYS, text_distance: int = TEXT_MAX_DISTANCE,
+                 sync_interval: float = DUPLICATE_SYNC_INTERVAL):
+        self._window = window_days * 86400
+        self._entries: Dict[int, _Entry] = {}
+        self._order: Deque[Tuple[float, int]] = deque()
+        self._cells: Dict[Tuple[str, int, int], Set[int]] = {}
+        self._addresses = SubstringIndex()
+        self._descriptions = SubstringIndex(words=True)
+        self._texts: HammingIndex[int] = HammingIndex(max_distance=text_distance)
+        self._next_local_id = -1
+        self._sync_interval = sync_interval
+        self._synced_at = 0.0
+        # Последний прочитанный из БД id; свои add() его не двигают — иначе строки
+        # других процессов с меньшим id были бы пропущены
+        self._last_id = 0
+        self.warmed = False
+        self.stats = DuplicateStats()
+
+    # --- ключи ---
+
+    @staticmethod
+    def _cell(lat: float, lon: float) -> Tuple[int, int]:
+        return math.floor(lat / LAT_DIFF), math.floor(lon / LON_DIFF)
+
+    @staticmethod
+    def _fingerprint(text: Optional[str]) -> Optional[int]:
+        if not text or len(text) <= MIN_TEXT_LEN:
+            return None
+        normalized = normalize_text(text[:DESCRIPTION_MAX_LEN])
+        return simhash64(normalized, normalized=True) if normalized else None
+
+    # --- запросы ---
+
+    def is_duplicate(
+        self,
+        text: Optional[str],
+        address: Optional[str],
+        lat: Optional[float],
+        lon: Optional[float],
+        category: str,
+    ) -> bool:
+        """True, если за окно уже есть похожая жалоба той же категории."""
+        self._expire()
+        self.stats.checks += 1
+
+        # По координатам (если есть)
+        if lat and lon:
+            ci, cj = self._cell(lat, lon)
+            for di in (-1, 0, 1):
+                for dj in (-1, 0, 1):
+                    for entry_id in self._cells.get((category, ci + di, cj + dj), ()):
+                        e = self._entries[entry_id]
+                        if abs(e.lat - lat) <= LAT_DIFF and abs(e.lon - lon) <= LON_DIFF:
+                            self.stats.by_coords += 1
+                            return True
+
+        # По адресу (если есть): сохранённый адрес содержит начало нового
+        if address and self._addresses.find(category, _fold(address[:ADDRESS_KEY_LEN])) is not None:
+            self.stats.by_address += 1
+            return True
+
+        # По тексту: сохранённое описание содержит начало нового, или близкий SimHash
+        if text and len(text) > MIN_TEXT_LEN:
+            if self._descriptions.find(category, _fold(text[:SNIPPET_LEN])) is not None:
+                self.stats.by_text += 1
+                return True
+            fingerprint = self._fingerprint(text)
+            if fingerprint is not None:
+                for entry_id, _ in self._texts.query(fingerprint):
+                    if self._entries[entry_id].category == category:
+                        self.stats.by_text += 1
+                        return True
+
+        return False
+
+    # --- пополнение ---
+
+    def add(
+        self,
+        entry_id: Optional[int],
+        text: Optional[str],
+        address: Optional[str],
+        lat: Optional[float],
+        lon: Optional[float],
+        category: str,
+        created_at: Optional[float] = None,
+    ) -> None:
+        """Добавляет жалобу в индекс (created_at — unix time, по умолчанию сейчас)."""
+        if entry_id is None:
+            entry_id = self._next_local_id
+            self._next_local_id -= 1
+        if entry_id in self._entries:
+            self._remove(entry_id)
+
+        ts = created_at if created_at is not None else time.time()
+        has_coords = bool(lat and lon)
+        entry = _Entry(
+            entry_id=entry_id,
+            created_at=ts,
+            category=category,
+            cell=self._cell(lat, lon) if has_coords else None,
+            lat=lat if has_coords else None,
+            lon=lon if has_coords else None,
+        )
+        self._entries[entry_id] = entry
+        self._order.append((ts, entry_id))
+
+        if entry.cell is not None:
+            self._cells.setdefault((category, *entry.cell), set()).add(entry_id)
+        if address:
+            self._addresses.add(entry_id, category, _fold(address))
+        if text:
+            self._descriptions.add(entry_id, category, _fold(text[:DESCRIPTION_MAX_LEN]))
+        fingerprint = self._fingerprint(text)
+        if fingerprint is not None:
+            self._texts.add(entry_id, fingerprint)
+
+    def _remove(self, entry_id: int) -> None:
+        e = self._entries.pop(entry_id, None)
+        if e is None:
+            return
+        if e.cell is not None:
+            key = (e.category, *e.cell)
+            ids = self._cells.get(key)
+            if ids is not None:
+                ids.discard(entry_id)
+                if not ids:
+                    del self._cells[key]
+        self._addresses.remove(entry_id)
+        self._descriptions.remove(entry_id)
+        self._texts.remove(entry_id)
+
+    def _expire(self) -> None:
+        cutoff = time.time() - self._window
+        while self._order and self._order[0][0] < cutoff:
+            ts, entry_id = self._order.popleft()
+            e = self._entries.get(entry_id)
+            # Запись могла быть перезаписана более свежей — удаляем только совпадающую
+            if e is not None and e.created_at == ts:
+                self._remove(entry_id)
+                self.stats.expired += 1
+
+    def _load(self, db, after_id: int = 0) -> int:
+        """Добавляет строки reports за окно с id > after_id. Возвращает число новых."""
+        from backend.models import Report
+
+        since = datetime.utcnow() - timedelta(seconds=self._window)
+        query = db.query(
+            Report.id, Report.description, Report.address,
+            Report.lat, Report.lng, Report.category, Report.created_at,
+        ).filter(Report.created_at >= since)
+        if after_id:
+            query = query.filter(Report.id > after_id)
+        added = 0
+        for rid, description, address, lat, lng, category, created_at in query.order_by(Report.id.asc()).all():
+            self._last_id = max(self._last_id, rid)
+            if rid in self._entries:  # сохранено этим процессом
+                continue
+            ts = created_at.replace(tzinfo=timezone.utc).timestamp() if created_at else None
+            self.add(rid, description, address, lat, lng, category, created_at=ts)
+            added += 1
+        self._synced_at = time.monotonic()
+        return added
+
+    def warm_start(self, db) -> int:
+        """Загружает жалобы за окно из таблицы reports. Возвращает их количество."""
+        loaded = self._load(db)
+        self.warmed = True
+        self.stats.loaded += loaded
+        logger.info(f"🧮 Индекс дубликатов: загружено {loaded} жалоб за {self._window // 86400} дн.")
+        return loaded
+
+    def sync(self, db, force: bool = False) -> int:
+        """Прогрев или догрузка жалоб, сохранённых после последнего чтения (не чаще sync_interval)."""
+        if not self.warmed:
+            return self.warm_start(db)
+        if not force and time.monotonic() - self._synced_at < self._sync_interval:
+            return 0
+        loaded = self._load(db, after_id=self._last_id)
+        self.stats.loaded += loaded
+        if loaded:
+            logger.debug(f"🧮 Индекс дубликатов: догружено {loaded} жалоб из БД")
+        return loaded
+
+    def __len__(self) -> int:
+        return len(self._entries)
@@ -0,0 +1,132 @@
+# services/fingerprint.py
+"""
+64-битные отпечатки для поиска почти-дубликатов: SimHash текста и индекс
+по расстоянию Хэмминга (разбиение на полосы, принцип Дирихле).
+"""
+
+import hashlib
+import re
+from collections import defaultdict
+from typing import Dict, Generic, Hashable, Iterable, List, Set, Tuple, TypeVar
+
+K = TypeVar("K", bound=Hashable)
+
+_URL_RE = re.compile(r"https?://\S+|www\.\S+")
+_NON_WORD_RE = re.compile(r"[^0-9a-zа-я]+")
+
+MASK64 = (1 << 64) - 1
+
+
+def normalize_text(text: str) -> str:
+    """Нижний регистр, ё→е, без ссылок, эмодзи и пунктуации, схлопнутые пробелы."""
+    t = (text or "").lower().replace("ё", "е")
+    t = _URL_RE.sub(" ", t)
+    t = _NON_WORD_RE.sub(" ", t)
+    return " ".join(t.split())
+
+
+def _hash64(token: str) -> int:
+    return int.from_bytes(hashlib.blake2b(token.encode("utf-8"), digest_size=8).digest(), "big")
+
+
+def _shingles(words: List[str], size: int) -> Iterable[str]:
+    if len(words) < size:
+        if words:
+            yield " ".join(words)
+        return
+    for i in range(len(words) - size + 1):
+        yield " ".join(words[i:i + size])
+
+
+def simhash64(text: str, shingle_size: int = 2, normalized: bool = False) -> int:
+    """SimHash по словным шинглам нормализованного текста."""
+    words = (text if normalized else normalize_text(text)).split()
+    if not words:
+        return 0
+    weights = [0] * 64
+    for shingle in _shingles(words, shingle_size):
+        h = _hash64(shingle)
+        for bit in range(64):
+            if h >> bit & 1:
+                weights[bit] += 1
+            else:
+                weights[bit] -= 1
+    value = 0
+    for bit in range(64):
+        if weights[bit] > 0:
+            value |= 1 << bit
+    return value
+
+
+def hamming(a: int, b: int) -> int:
+    return bin((a ^ b) & MASK64).count("1")
+
+
+class HammingIndex(Generic[K]):
+    """
+    Индекс 64-битных отпечатков для запросов «расстояние Хэмминга ≤ max_distance».
+
+    Отпечаток режется на max_distance + 1 полос: если отпечатки отличаются не
+    более чем в max_distance битах, хотя бы одна полоса совпадает целиком.
+    Кандидаты берутся из корзин полос и проверяются точным расстоянием.
+    """
+
+    def __init__(self, max_distance: int = 3):
+        self.max_distance = max_distance
+        bands = max_distance + 1
+        width = 64 // bands
+        self._bands: List[Tuple[int, int]] = []
+        offset = 0
+        for i in range(bands):
+            w = width if i < bands - 1 else 64 - offset
+            self._bands.append((offset, (1 << w) - 1))
+            offset += w
+        self._buckets: List[Dict[int, Set[K]]] = [defaultdict(set) for _ in self._bands]
+        self._values: Dict[K, int] = {}
+
+    def _band_keys(self, value: int) -> Iterable[Tuple[int, int]]:
+        for i, (offset, mask) in enumerate(self._bands):
+            yield i, (value >> offset) & mask
+
+    def add(self, key: K, value: int) -> None:
+        if key in self._values:
+            self.remove(key)
+        self._values[key] = value
+        for i, band in self._band_keys(value):
+            self._buckets[i][band].add(key)
+
+    def remove(self, key: K) -> None:
+        value = self._values.pop(key, None)
+        if value is None:
+            return
+        for i, band in self._band_keys(value):
+            bucket = self._buckets[i].get(band)
+            if bucket is not None:
+                bucket.discard(key)
+                if not bucket:
+                    del self._buckets[i][band]
+
+    def query(self, value: int, max_distance: int = None) -> List[Tuple[K, int]]:
+        """Ключи с расстоянием ≤ max_distance, отсортированные по расстоянию."""
+        limit = self.max_distance if max_distance is None else min(max_distance, self.max_distance)
+        seen: Set[K] = set()
+        found: List[Tuple[K, int]] = []
+        for i, band in self._band_keys(value):
+            for key in self._buckets[i].get(band, ()):
+                if key in seen:
+                    continue
+                seen.add(key)
+                d = hamming(value, self._values[key])
+                if d <= limit:
+                    found.append((key, d))
+        found.sort(key=lambda item: item[1])
+        return found
+
+    def get(self, key: K):
+        return self._values.get(key)
+
+    def __contains__(self, key: K) -> bool:
+        return key in self._values
+
+    def __len__(self) -> int:
+        return len(self._values)
@@ -0,0 +1,252 @@
+# services/gazetteer.py
+"""
+Gazetteer — офлайн-справочник адресов Нижневартовска из выгрузки OSM.
+
+Файл GAZETTEER_PATH (SQLite) строит scripts/setup/build_gazetteer.py:
+дома (улица + номер → центроид здания), улицы (точка на улице ближе всего к
+центру), перекрёстки (общие узлы улиц) и ориентиры (объекты с названием).
+При первом обращении всё читается в память:
+- прямой поиск — словари по каноническим ключам geo_cache.canonical_address
+  (тип улицы отдельно: «Ленина 10» и «ул. Ленина, д. 10» — один дом);
+- обратный — ближайший дом по сетке ячеек ~200 м (numpy по кандидатам).
+Оба — микросекунды; промах (или нет файла) — Nominatim как раньше.
+"""
+
+import logging
+import math
+import os
+import re
+import sqlite3
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from services.geo_cache import canonical_address
+
+logger = logging.getLogger(__name__)
+
+ROOT = Path(__file__).resolve().parent.parent
+GAZETTEER_PATH = os.getenv("GAZETTEER_PATH", str(ROOT / "data" / "geo" / "gazetteer.sqlite3"))
+GAZETTEER_ENABLED = os.getenv("GAZETTEER_ENABLED", "1").strip().lower() not in ("0", "false", "no")
+GAZETTEER_REVERSE_MAX_M = float(os.getenv("GAZETTEER_REVERSE_MAX_M", "150"))
+
+CITY = "Нижневартовск"
+Coords = Tuple[float, float]
+
+# Канонические типы улиц (значения geo_cache._STREET_TYPES)
+STREET_TYPES = frozenset({"ул", "пр-кт", "пер", "б-р", "проезд", "ш", "пл", "наб", "мкр", "кв-л"})
+_HOUSE_TOKEN_RE = re.compile(r"^\d+[а-я]?(?:/\d+[а-я]?)?$|^[кс]\d+$")
+_HOUSE_NUMBER_RE = re.compile(r"^\d+")
+_INTERSECTION_RE = re.compile(r"(?:перекрест\w*|пересечени\w*|угол|углу)\s+(.+?)\s+и\s+(.+?)(?:,|$)")
+
+# Ячейка сетки обратного поиска: ~220 м по широте, ~215 м по долготе на 61° с.ш.
+_CELL_LAT = 0.002
+_CELL_LON = 0.004
+_M_PER_DEG_LAT = 110574.0
+
+
+def split_address(canonical: str) -> Tuple[Optional[str], str, str]:
+    """
+    Канонический адрес → (тип улицы, название, дом).
+
+    Дом — хвост из номеров/корпусов/строений («10а к2»); название — всё до
+    него («60 лет октября 5» → название «60 лет октября»). Для «мкр 10п 5»
+    название — «10п».
+    """
+    tokens = canonical.split()
+    street_type = tokens.pop(0) if tokens and tokens[0] in STREET_TYPES else None
+    for i in range(1, len(tokens)):
+        if tokens[i][:1].isdigit() and all(_HOUSE_TOKEN_RE.match(t) for t in tokens[i:]):
+            return street_type, " ".join(tokens[:i]), " ".join(tokens[i:])
+    return street_type, " ".join(tokens), ""
+
+
+def _pick(entries: List[Tuple[Optional[str], float, float]], street_type: Optional[str]) -> Optional[Coords]:
+    """Одна точка из вариантов с разными типами улицы; неоднозначно — None (решит Nominatim)."""
+    if street_type:
+        typed = [e for e in entries if e[0] == street_type]
+        if typed:
+            entries = typed
+    if len(entries) == 1:
+        return entries[0][1], entries[0][2]
+    return None
+
+
+class Gazetteer:
+    """Справочник в памяти: прямой и обратный поиск без сети."""
+
+    def __init__(self, path: str = GAZETTEER_PATH):
+        self.path = path
+        self._loaded = False
+        self.available = False
+        self.meta: Dict[str, str] = {}
+        self._houses: Dict[Tuple[str, str], List[Tuple[Optional[str], float, float]]] = {}
+        self._streets: Dict[str, List[Tuple[Optional[str], float, float]]] = {}
+        self._landmarks: Dict[str, Coords] = {}
+        self._intersections: Dict[Tuple[str, str], Coords] = {}
+        self._lat = np.zeros(0)
+        self._lon = np.zeros(0)
+        self._labels: List[str] = []
+        self._grid: Dict[Tuple[int, int], np.ndarray] = {}
+        self.counters: Dict[str, int] = {
+            "forward": 0, "hits_house": 0, "hits_house_base": 0, "hits_street": 0,
+            "hits_intersection": 0, "hits_landmark": 0, "forward_misses": 0,
+            "reverse": 0, "reverse_hits": 0, "reverse_misses": 0,
+        }
+        self._forward_ns = 0
+        self._reverse_ns = 0
+
+    def load(self) -> bool:
+        if self._loaded:
+            return self.available
+        self._loaded = True
+        if not GAZETTEER_ENABLED or not os.path.exists(self.path):
+            return False
+        started = time.perf_counter()
+        try:
+            conn = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True)
+            try:
+                self._read(conn)
+            finally:
+                conn.close()
+        except sqlite3.Error as e:
+            logger.warning(f"⚠️ Справочник адресов не загружен ({self.path}): {e}")
+            return False
+        self.available = True
+        logger.info(
+            f"🗺️ Справочник адресов: {len(self._labels)} домов, {len(self._streets)} улиц, "
+            f"{len(self._landmarks)} ориентиров за {(time.perf_counter() - started) * 1000:.0f} мс"
+        )
+        return True
+
+    def _read(self, conn: sqlite3.Connection) -> None:
+        self.meta = dict(conn.execute("SELECT key, value FROM meta"))
+        lats, lons = [], []
+        for street_type, name, house, street, housenumber, lat, lon in conn.execute(
+            "SELECT street_type, name, house, street, housenumber, lat, lon FROM houses"
+        ):
+            self._houses.setdefault((name, house), []).append((street_type, lat, lon))
+            lats.append(lat)
+            lons.append(lon)
+            self._labels.append(f"{street}, {housenumber}, {CITY}")
+        for street_type, name, lat, lon in conn.execute("SELECT street_type, name, lat, lon FROM streets"):
+            self._streets.setdefault(name, []).append((street_type, lat, lon))
+        for key, lat, lon in conn.execute("SELECT key, lat, lon FROM landmarks"):
+            self._landmarks.setdefault(key, (lat, lon))
+        for a, b, lat, lon in conn.execute("SELECT a, b, lat, lon FROM intersections"):
+            self._intersections[(a, b)] = (lat, lon)
+
+        self._lat = np.asarray(lats, dtype=np.float64)
+        self._lon = np.asarray(lons, dtype=np.float64)
+        cells: Dict[Tuple[int, int], List[int]] = {}
+        for i, (lat, lon) in enumerate(zip(lats, lons)):
+            cells.setdefault((int(lat // _CELL_LAT), int(lon // _CELL_LON)), []).append(i)
+        self._grid = {cell: np.asarray(idx, dtype=np.int64) for cell, idx in cells.items()}
+
+    # ----- прямой поиск -----
+
+    def forward(self, address: str) -> Optional[Coords]:
+        """(lat, lon) по адресу/перекрёстку/названию ориентира или None (спросить Nominatim)."""
+        if not address or not self.load():
+            return None
+        started = time.perf_counter_ns()
+        kind, coords = self._forward(address)
+        self._forward_ns += time.perf_counter_ns() - started
+        self.counters["forward"] += 1
+        self.counters[f"hits_{kind}" if coords else "forward_misses"] += 1
+        return coords
+
+    def _forward(self, address: str) -> Tuple[str, Optional[Coords]]:
+        m = _INTERSECTION_RE.search(address.lower().replace("ё", "е"))
+        if m:
+            a = split_address(canonical_address(m.group(1)))[1]
+            b = split_address(canonical_address(m.group(2)))[1]
+            coords = self._intersections.get((a, b) if a <= b else (b, a))
+            return "intersection", coords
+
+        key = canonical_address(address)
+        if not key:
+            return "house", None
+        if key in self._landmarks:
+            return "landmark", self._landmarks[key]
+        street_type, name, house = split_address(key)
+        if not house:
+            entries = self._streets.get(name)
+            return "street", _pick(entries, street_type) if entries else None
+        entries = self._houses.get((name, house))
+        if entries:
+            return "house", _pick(entries, street_type)
+        # «10а к2»/«10а» нет в OSM — дом без корпуса, затем основной номер
+        base = _HOUSE_NUMBER_RE.match(house)
+        for fallback in dict.fromkeys((house.split()[0], base.group(0) if base else "")):
+            entries = self._houses.get((name, fallback)) if fallback and fallback != house else None
+            if entries:
+                return "house_base", _pick(entries, street_type)
+        return "house", None
+
+    # ----- обратный поиск -----
+
+    def reverse(self, lat: float, lon: float, max_distance_m: float = GAZETTEER_REVERSE_MAX_M) -> Optional[str]:
+        """«улица Ленина, 10А, Нижневартовск» — ближайший дом не дальше max_distance_m."""
+        if not self.load() or not len(self._labels):
+            return None
+        started = time.perf_counter_ns()
+        label = self._reverse(lat, lon, max_distance_m)
+        self._reverse_ns += time.perf_counter_ns() - started
+        self.counters["reverse"] += 1
+        self.counters["reverse_hits" if label else "reverse_misses"] += 1
+        return label
+
+    def _reverse(self, lat: float, lon: float, max_distance_m: float) -> Optional[str]:
+        m_per_deg_lon = _M_PER_DEG_LAT * math.cos(math.radians(lat))
+        ring_lat = max(1, math.ceil(max_distance_m / (_CELL_LAT * _M_PER_DEG_LAT)))
+        ring_lon = max(1, math.ceil(max_distance_m / (_CELL_LON * m_per_deg_lon)))
+        cell_lat, cell_lon = int(lat // _CELL_LAT), int(lon // _CELL_LON)
+        chunks = [
+            self._grid[cell]
+            for cell in (
+                (cell_lat + i, cell_lon + j)
+                for i in range(-ring_lat, ring_lat + 1)
+                for j in range(-ring_lon, ring_lon + 1)
+            )
+            if cell in self._grid
+        ]
+        if not chunks:
+            return None
+        idx = np.concatenate(chunks) if len(chunks) > 1 else chunks[0]
+        dy = (self._lat[idx] - lat) * _M_PER_DEG_LAT
+        dx = (self._lon[idx] - lon) * m_per_deg_lon
+        dist2 = dx * dx + dy * dy
+        best = int(np.argmin(dist2))
+        if dist2[best] > max_distance_m * max_distance_m:
+            return None
+        return self._labels[int(idx[best])]
+
+    def stats(self) -> Dict[str, Any]:
+        forward, reverse = self.counters["forward"], self.counters["reverse"]
+        hits = forward - self.counters["forward_misses"]
+        return {
+            "available": self.available,
+            "path": self.path,
+            "houses": len(self._labels),
+            "streets": len(self._streets),
+            "landmarks": len(self._landmarks),
+            "intersections": len(self._intersections),
+            "built_at": self.meta.get("built_at"),
+            "forward_hit_ratio": round(hits / forward, 3) if forward else 0.0,
+            "forward_avg_us": round(self._forward_ns / forward / 1000, 1) if forward else 0.0,
+            "reverse_avg_us": round(self._reverse_ns / reverse / 1000, 1) if reverse else 0.0,
+            **self.counters,
+        }
+
+
+_gazetteer: Optional[Gazetteer] = None
+
+
+def get_gazetteer() -> Gazetteer:
+    global _gazetteer
+    if _gazetteer is None:
+        _gazetteer = Gazetteer()
+    return _gazetteer
@@ -0,0 +1,166 @@
+# services/geo_cache.py
+"""
+GeoCache — кэш геокодинга с каноническими ключами адресов.
+
+- canonical_address(): «ул. Ленина, д. 10 А», «Ленина улица 10а» и
+  «улица ленина 10-а, Нижневартовск» дают один ключ «ул ленина 10а»
+  (типы улиц, дом/корпус/строение, литеры, регистр, ё, город);
+- два уровня: TTLCache в памяти + SharedCache (SQLite/WAL по умолчанию,
+  пространство "geo") — переживает перезапуск и общий для процессов;
+- отрицательный кэш: адрес, по которому Nominatim ответил пустым списком,
+  не запрашивается повторно GEO_CACHE_NEGATIVE_TTL_HOURS (лимит 1 запрос/с);
+  сетевые ошибки не кэшируются;
+- счётчики попаданий по уровням и hit ratio.
+"""
+
+import logging
+import os
+import re
+from typing import Any, Dict, Optional, Tuple
+
+from services.shared_cache import get_shared_cache
+from services.ttl_cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+GEO_CACHE_MAX_SIZE = int(os.getenv("GEO_CACHE_MAX_SIZE", "5000"))
+GEO_CACHE_TTL_DAYS = float(os.getenv("GEO_CACHE_TTL_DAYS", "30"))
+GEO_CACHE_NEGATIVE_TTL_HOURS = float(os.getenv("GEO_CACHE_NEGATIVE_TTL_HOURS", "24"))
+
+_NAMESPACE = "geo"
+# Маркер «не найдено» в памяти и в общем кэше
+_NEGATIVE: Tuple = ()
+MISS = object()
+
+Coords = Tuple[float, float]
+
+# Варианты написания типа улицы → канонический вид
+_STREET_TYPES = {
+    "улица": "ул", "ул": "ул",
+    "проспект": "пр-кт", "пр-кт": "пр-кт", "просп": "пр-кт", "пр": "пр-кт", "пркт": "пр-кт",
+    "переулок": "пер", "пер": "пер",
+    "бульвар": "б-р", "б-р": "б-р", "бул": "б-р",
+    "проезд": "проезд", "пр-д": "проезд",
+    "шоссе": "ш", "ш": "ш",
+    "площадь": "пл", "пл": "пл",
+    "набережная": "наб", "наб": "наб",
+    "микрорайон": "мкр", "мкр": "мкр", "мкрн": "мкр", "мкр-н": "мкр",
+    "квартал": "кв-л", "кв-л": "кв-л",
+}
+# Части номера дома: «дом» убирается, корпус/строение — короткие метки
+_HOUSE_PARTS = {
+    "дом": "", "д": "",
+    "корпус": "к", "корп": "к", "к": "к",
+    "строение": "с", "стр": "с", "с": "с",
+}
+_DROP_WORDS = frozenset({
+    "г", "город", "гор", "нижневартовск", "нижневартовска", "хмао", "хмао-югра", "югра",
+    "россия", "рф", "ханты-мансийский", "автономный", "округ", "ао",
+})
+_TOKEN_RE = re.compile(r"[0-9а-яa-z]+(?:-[0-9а-яa-z]+)*(?:/[0-9а-яa-z]+)?")
+# «10 а», «10-а», «10 «а»» → «10а»; литера — одна буква (не «к 2»/«с 1» — корпус/строение)
+_HOUSE_LETTER_RE = re.compile(r"\b(\d+)\s*-?\s*[\"«]?([а-я])[\"»]?(?![а-я])(?!\s*\d)")
+
+
+def canonical_address(address: str) -> str:
+    """Ключ кэша: канонический вид адреса (не для показа пользователю)."""
+    text = (address or "").lower().replace("ё", "е")
+    text = _HOUSE_LETTER_RE.sub(r"\1\2", text)
+    street_type = None
+    tokens = []
+    for token in _TOKEN_RE.findall(text):
+        if token in _DROP_WORDS:
+            continue
+        if token in _STREET_TYPES and street_type is None:
+            street_type = _STREET_TYPES[token]
+            continue
+        if token in _HOUSE_PARTS:
+            if _HOUSE_PARTS[token]:
+                tokens.append(_HOUSE_PARTS[token])
+            continue
+        tokens.append(token)
+    # «к 2» → «к2», «с 1» → «с1»
+    merged = []
+    for token in tokens:
+        if merged and merged[-1] in ("к", "с") and token[:1].isdigit():
+            merged[-1] += token
+        else:
+            merged.append(token)
+    if street_type:
+        merged.insert(0, street_type)
+    return " ".join(merged)
+
+
+class GeoCache:
+    """Память (TTLCache) + SharedCache; положительный и отрицательный TTL."""
+
+    def __init__(self, maxsize: int = GEO_CACHE_MAX_SIZE):
+        self.ttl = GEO_CACHE_TTL_DAYS * 86400
+        self.negative_ttl = GEO_CACHE_NEGATIVE_TTL_HOURS * 3600
+        self._memory: TTLCache[str, Tuple] = TTLCache(maxsize=maxsize, ttl=self.ttl)
+        self.counters: Dict[str, int] = {
+            "hits_memory": 0, "hits_shared": 0, "hits_negative": 0, "misses": 0,
+            "writes": 0, "writes_negative": 0,
+        }
+
+    def get(self, address: str) -> Any:
+        """(lat, lon); None — известно, что не геокодируется; MISS — нет в кэше."""
+        key = canonical_address(address)
+        if not key:
+            return MISS
+        value = self._memory.get(key)
+        if value is not None:
+            self.counters["hits_memory"] += 1
+        else:
+            shared = get_shared_cache().get(_NAMESPACE, key)
+            if shared is None:
+                self.counters["misses"] += 1
+                return MISS
+            value = tuple(float(v) for v in shared)
+            # Остаток срока в общем кэше неизвестен: «не найдено» держим не дольше negative_ttl
+            self._memory.set(key, value, ttl=self.negative_ttl if value == _NEGATIVE else None)
+            self.counters["hits_shared"] += 1
+        if value == _NEGATIVE:
+            self.counters["hits_negative"] += 1
+            return None
+        return value
+
+    def put(self, address: str, coords: Coords) -> None:
+        key = canonical_address(address)
+        if not key:
+            return
+        value = (round(float(coords[0]), 7), round(float(coords[1]), 7))
+        self._memory.set(key, value)
+        get_shared_cache().set(_NAMESPACE, key, list(value), self.ttl)
+        self.counters["writes"] += 1
+
+    def put_negative(self, address: str) -> None:
+        """Nominatim ответил «не найдено» — не спрашиваем снова negative_ttl."""
+        key = canonical_address(address)
+        if not key:
+            return
+        self._memory.set(key, _NEGATIVE, ttl=self.negative_ttl)
+        get_shared_cache().set(_NAMESPACE, key, [], self.negative_ttl)
+        self.counters["writes_negative"] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        hits = self.counters["hits_memory"] + self.counters["hits_shared"]
+        lookups = hits + self.counters["misses"]
+        return {
+            "size": len(self._memory),
+            "maxsize": self._memory.maxsize,
+            "ttl_days": GEO_CACHE_TTL_DAYS,
+            "negative_ttl_hours": GEO_CACHE_NEGATIVE_TTL_HOURS,
+            "hit_ratio": round(hits / lookups, 3) if lookups else 0.0,
+            **self.counters,
+        }
+
+
+_cache: Optional[GeoCache] = None
+
+
+def get_geo_cache() -> GeoCache:
+    global _cache
+    if _cache is None:
+        _cache = GeoCache()
+    return _cache
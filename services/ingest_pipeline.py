@@ -0,0 +1,288 @@
+# services/ingest_pipeline.py
+"""
+IngestPipeline — многостадийный конвейер обработки входящих сообщений.
+
+Каждая стадия (ingest → filter → analyze → geocode → persist → publish)
+имеет свою ограниченную очередь и пул asyncio-воркеров, поэтому медленный
+AI или геокодер не задерживает остальные сообщения, а переполненная очередь
+притормаживает отправителя (backpressure). Для каждой стадии собирается
+статистика: глубина очереди, пропускная способность и задержки.
+"""
+
+import asyncio
+import logging
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Обработчик стадии: возвращает элемент для следующей стадии или None (отбросить)
+StageHandler = Callable[[Any], Awaitable[Optional[Any]]]
+
+# Возврат обработчика: элемент передан за пределы конвейера (например, в процесс-воркер)
+HANDED_OFF = object()
+
+# Уведомление после стадии: (элемент, имя стадии, passed); passed=False — отброшен или ошибка
+StageDoneCallback = Callable[[Any, str, bool], None]
+
+# Окно для расчёта текущей пропускной способности (сек)
+THROUGHPUT_WINDOW = 60.0
+
+
+@dataclass
+class StageSpec:
+    """Описание стадии конвейера"""
+    name: str
+    handler: StageHandler
+    workers: int = 1
+    queue_size: int = 100
+
+
+@dataclass
+class StageStats:
+    """Статистика стадии"""
+    processed: int = 0
+    passed: int = 0
+    dropped: int = 0
+    handed_off: int = 0
+    errors: int = 0
+    busy: int = 0
+    total_latency: float = 0.0
+    max_latency: float = 0.0
+    latencies: Deque[float] = field(default_factory=lambda: deque(maxlen=2000))
+    done_at: Deque[float] = field(default_factory=lambda: deque(maxlen=10000))
+
+    def record(self, latency: float) -> None:
+        self.processed += 1
+        self.total_latency += latency
+        if latency > self.max_latency:
+            self.max_latency = latency
+        self.latencies.append(latency)
+        self.done_at.append(time.monotonic())
+
+    def percentile(self, q: float) -> float:
+        """Перцентиль задержки (сек) по последним измерениям"""
+        if not self.latencies:
+            return 0.0
+        ordered = sorted(self.latencies)
+        idx = min(len(ordered) - 1, max(0, int(round(q / 100.0 * (len(ordered) - 1)))))
+        return ordered[idx]
+
+    def throughput(self, window: float = THROUGHPUT_WINDOW) -> float:
+        """Обработано сообщений в секунду за последние window секунд"""
+        if window <= 0:
+            return 0.0
+        cutoff = time.monotonic() - window
+        while self.done_at and self.done_at[0] < cutoff:
+            self.done_at.popleft()
+        return len(self.done_at) / window
+
+
+class IngestPipeline:
+    """
+    Конвейер из последовательных стадий с ограниченными очередями.
+
+    - submit() ждёт свободного места в очереди стадии (backpressure)
+    - обработчик стадии возвращает элемент дальше или None, чтобы отбросить его
+      (HANDED_OFF — элемент ушёл из конвейера, например в процесс-воркер)
+    - исключение в обработчике логируется и считается ошибкой, элемент отбрасывается
+    - on_stage_done(item, stage, passed) вызывается после каждой стадии
+      (HANDED_OFF — passed=True): например, чтобы сдвинуть курсор источника,
+      только когда сообщение сохранено или отброшено
+    """
+
+    def __init__(
+        self,
+        stages: List[StageSpec],
+        name: str = "ingest",
+        on_stage_done: Optional[StageDoneCallback] = None,
+    ):
+        if not stages:
+            raise ValueError("Pipeline requires at least one stage")
+        self.name = name
+        self._specs = stages
+        self._index = {spec.name: i for i, spec in enumerate(stages)}
+        self._queues: List[asyncio.Queue] = []
+        self._stats: List[StageStats] = [StageStats() for _ in stages]
+        self._tasks: List[asyncio.Task] = []
+        self._completed = StageStats()
+        self._started_at: Optional[float] = None
+        self._on_stage_done = on_stage_done
+
+    @property
+    def stage_names(self) -> List[str]:
+        return [spec.name for spec in self._specs]
+
+    @property
+    def running(self) -> bool:
+        return bool(self._tasks)
+
+    async def start(self) -> None:
+        """Создаёт очереди и запускает воркеры всех стадий."""
+        if self._tasks:
+            return
+        self._queues = [asyncio.Queue(maxsize=max(1, spec.queue_size)) for spec in self._specs]
+        self._started_at = time.monotonic()
+        for i, spec in enumerate(self._specs):
+            for w in range(max(1, spec.workers)):
+                task = asyncio.create_task(self._worker(i), name=f"{self.name}:{spec.name}:{w}")
+                self._tasks.append(task)
+        logger.info(
+            "🧵 Конвейер %s: %s",
+            self.name,
+            " → ".join(f"{s.name}×{max(1, s.workers)}" for s in self._specs),
+        )
+
+    def _resolve(self, stage: Optional[str]) -> int:
+        if stage is None:
+            return 0
+        if stage not in self._index:
+            raise KeyError(f"Unknown pipeline stage: {stage}")
+        return self._index[stage]
+
+    async def submit(self, item: Any, stage: Optional[str] = None, submitted_at: Optional[float] = None) -> None:
+        """
+        Ставит элемент в очередь стадии (по умолчанию первой), ожидая места.
+        submitted_at (time.monotonic) — исходное время поступления, если элемент
+        возвращается в конвейер извне: сквозная задержка считается от него.
+        """
+        if not self._queues:
+            raise RuntimeError("Pipeline is not started")
+        ts = submitted_at if submitted_at is not None else time.monotonic()
+        await self._queues[self._resolve(stage)].put((item, ts))
+
+    def try_submit(self, item: Any, stage: Optional[str] = None) -> bool:
+        """Неблокирующая постановка в очередь. False, если очередь заполнена."""
+        if not self._queues:
+            raise RuntimeError("Pipeline is not started")
+        try:
+            self._queues[self._resolve(stage)].put_nowait((item, time.monotonic()))
+            return True
+        except asyncio.QueueFull:
+            return False
+
+    def queue_depth(self, stage: Optional[str] = None) -> Tuple[int, int]:
+        """(текущая глубина, ёмкость) очереди стадии."""
+        idx = self._resolve(stage)
+        depth = self._queues[idx].qsize() if self._queues else 0
+        return depth, max(1, self._specs[idx].queue_size)
+
+    async def join(self, until: Optional[str] = None) -> None:
+        """Ждёт, пока все поставленные элементы пройдут конвейер (или стадии до until включительно)."""
+        last = self._resolve(until) if until is not None else len(self._queues) - 1
+        for q in self._queues[:last + 1]:
+            await q.join()
+
+    async def stop(self, drain: bool = True, timeout: Optional[float] = 30.0) -> None:
+        """Останавливает воркеры; при drain=True сначала дожидается опустошения очередей."""
+        if drain and self._queues:
+            try:
+                await asyncio.wait_for(self.join(), timeout=timeout)
+            except asyncio.TimeoutError:
+                logger.warning("⚠️ Конвейер %s: не успел опустошить очереди за %ss", self.name, timeout)
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def _worker(self, idx: int) -> None:
+        spec = self._specs[idx]
+        stats = self._stats[idx]
+        queue = self._queues[idx]
+        next_queue = self._queues[idx + 1] if idx + 1 < len(self._queues) else None
+
+        while True:
+            item, submitted_at = await queue.get()
+            try:
+                stats.busy += 1
+                started = time.perf_counter()
+                try:
+                    result = await spec.handler(item)
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    stats.errors += 1
+                    result = None
+                    logger.error("❌ Стадия %s: %s", spec.name, e, exc_info=True)
+                finally:
+                    stats.busy -= 1
+                    stats.record(time.perf_counter() - started)
+                self._notify(item if result is None or result is HANDED_OFF else result, spec.name, result is not None)
+
+                if result is None:
+                    stats.dropped += 1
+                    continue
+                if result is HANDED_OFF:
+                    stats.handed_off += 1
+                    continue
+                stats.passed += 1
+                if next_queue is not None:
+                    await next_queue.put((result, submitted_at))
+                else:
+                    self._completed.record(time.monotonic() - submitted_at)
+            finally:
+                queue.task_done()
+
+    def _notify(self, item: Any, stage: str, passed: bool) -> None:
+        if self._on_stage_done is None:
+            return
+        try:
+            self._on_stage_done(item, stage, passed)
+        except Exception as e:
+            logger.error("❌ Конвейер %s: on_stage_done после %s: %s", self.name, stage, e, exc_info=True)
+
+    def stats(self) -> Dict[str, Any]:
+        """Снимок статистики по стадиям и сквозной задержке."""
+        uptime = time.monotonic() - self._started_at if self._started_at else 0.0
+        window = min(THROUGHPUT_WINDOW, uptime)
+        stages: Dict[str, Any] = {}
+        for i, spec in enumerate(self._specs):
+            s = self._stats[i]
+            stages[spec.name] = {
+                "workers": max(1, spec.workers),
+                "queue_depth": self._queues[i].qsize() if self._queues else 0,
+                "queue_size": spec.queue_size,
+                "busy": s.busy,
+                "processed": s.processed,
+                "passed": s.passed,
+                "dropped": s.dropped,
+                "handed_off": s.handed_off,
+                "errors": s.errors,
+                "throughput_per_s": round(s.throughput(window), 3),
+                "avg_ms": round(s.total_latency / s.processed * 1000, 1) if s.processed else 0.0,
+                "p50_ms": round(s.percentile(50) * 1000, 1),
+                "p95_ms": round(s.percentile(95) * 1000, 1),
+                "p99_ms": round(s.percentile(99) * 1000, 1),
+                "max_ms": round(s.max_latency * 1000, 1),
+            }
+        done = self._completed
+        return {
+            "uptime_s": round(uptime, 1),
+            "stages": stages,
+            "end_to_end": {
+                "completed": done.processed,
+                "throughput_per_s": round(done.throughput(window), 3),
+                "p50_ms": round(done.percentile(50) * 1000, 1),
+                "p95_ms": round(done.percentile(95) * 1000, 1),
+                "p99_ms": round(done.percentile(99) * 1000, 1),
+                "max_ms": round(done.max_latency * 1000, 1),
+            },
+        }
+
+    def latency_samples(self) -> Dict[str, Tuple[float, ...]]:
+        """Сырые последние задержки по стадиям (для бенчмарков)."""
+        samples = {spec.name: tuple(self._stats[i].latencies) for i, spec in enumerate(self._specs)}
+        samples["end_to_end"] = tuple(self._completed.latencies)
+        return samples
+
+    def format_stats(self) -> str:
+        """Короткая строка для логов: очередь/воркеры/p95 по стадиям."""
+        snap = self.stats()
+        parts = []
+        for name, s in snap["stages"].items():
+            parts.append(f"{name} q{s['queue_depth']}/{s['queue_size']} busy{s['busy']}/{s['workers']} p95 {s['p95_ms']:.0f}ms")
+        e2e = snap["end_to_end"]
+        parts.append(f"e2e {e2e['completed']} шт p95 {e2e['p95_ms']:.0f}ms")
+        return " | ".join(parts)
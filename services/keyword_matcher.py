@@ -0,0 +1,123 @@
+# services/keyword_matcher.py
+"""
+KeywordMatcher — поиск многих подстрок за один проход по тексту.
+
+Все ключевые слова всех списков собираются в один префиксный бор (trie),
+который компилируется в одно регулярное выражение: движок re ищет ближайшую
+позицию, с которой начинается какое-либо слово, и спускается по бору до
+самого длинного из них; следующий поиск начинается со следующего символа. Более короткие слова, входящие в найденное как
+подстроки (например «купи» в «купить»), добавляются из заранее посчитанной
+таблицы вложенности — так находятся все вхождения, как у Aho-Corasick, но
+основной цикл работает внутри C-кода re, а не в Python.
+
+Семантика совпадает с `keyword in text.lower()`: поиск подстрок без учёта
+границ слов, ключевые слова сравниваются в нижнем регистре.
+"""
+
+import re
+from typing import Dict, FrozenSet, Iterable, Mapping, Optional, Sequence, Set
+
+
+def _trie_pattern(words: Iterable[str]) -> str:
+    """Регулярное выражение бора; в каждом узле сначала продолжения, потом конец слова."""
+    trie: Dict = {}
+    for word in words:
+        node = trie
+        for ch in word:
+            node = node.setdefault(ch, {})
+        node[""] = True
+
+    def build(node: Dict) -> str:
+        branches = []
+        for ch in sorted(k for k in node if k):
+            branches.append(re.escape(ch) + build(node[ch]))
+        if not branches:
+            return ""
+        if "" in node:
+            branches.append("")  # слово закончилось здесь — пробуем после более длинных
+        if len(branches) == 1:
+            return branches[0]
+        return "(?:" + "|".join(branches) + ")"
+
+    return build(trie)
+
+
+class KeywordMatcher:
+    """
+    Набор именованных списков ключевых слов, скомпилированный в один автомат.
+
+    - scan(text): {список: множество найденных слов} за один проход
+    - counts(text): {список: число различных найденных слов}
+    - first(text, order): первый по порядку список, в котором есть совпадение
+    """
+
+    def __init__(self, tables: Mapping[str, Iterable[str]]):
+        self._tables: Dict[str, FrozenSet[str]] = {}
+        owners: Dict[str, Set[str]] = {}
+        for name, words in tables.items():
+            normalized = frozenset(w.lower() for w in words if w)
+            self._tables[name] = normalized
+            for w in normalized:
+                owners.setdefault(w, set()).add(name)
+        self._owners: Dict[str, FrozenSet[str]] = {w: frozenset(n) for w, n in owners.items()}
+
+        vocabulary = sorted(owners)
+        # Для каждого слова — все слова словаря, входящие в него как подстрока (включая само)
+        self._contained: Dict[str, tuple] = {
+            w: tuple(v for v in vocabulary if v in w) for w in vocabulary
+        }
+        self._regex = re.compile(_trie_pattern(vocabulary)) if vocabulary else None
+
+    @property
+    def tables(self) -> Dict[str, FrozenSet[str]]:
+        return dict(self._tables)
+
+    def find_all(self, text: str, lowered: bool = False) -> Set[str]:
+        """Все ключевые слова, встречающиеся в тексте."""
+        if not text or self._regex is None:
+            return set()
+        t = text if lowered else text.lower()
+        search = self._regex.search
+        contained = self._contained
+        found: Set[str] = set()
+        m = search(t)
+        while m is not None:
+            found.update(contained[m.group()])
+            m = search(t, m.start() + 1)
+        return found
+
+    def scan(self, text: str, lowered: bool = False) -> Dict[str, Set[str]]:
+        """Найденные слова по спискам (списки без совпадений отсутствуют)."""
+        hits: Dict[str, Set[str]] = {}
+        for w in self.find_all(text, lowered):
+            for name in self._owners[w]:
+                hits.setdefault(name, set()).add(w)
+        return hits
+
+    def counts(self, text: str, lowered: bool = False) -> Dict[str, int]:
+        """Число различных найденных слов по каждому списку (включая нулевые)."""
+        counts = dict.fromkeys(self._tables, 0)
+        for name, words in self.scan(text, lowered).items():
+            counts[name] = len(words)
+        return counts
+
+    def first(self, text: str, order: Sequence[str], lowered: bool = False) -> Optional[str]:
+        """Первый список из order, в котором нашлось хотя бы одно слово."""
+        hits = self.scan(text, lowered)
+        for name in order:
+            if name in hits:
+                return name
+        return None
+
+
+def first_hit(hits: Mapping[str, Set[str]], order: Sequence[str]) -> Optional[str]:
+    """Первый список из order с совпадениями в результате scan()."""
+    for name in order:
+        if hits.get(name):
+            return name
+    return None
+
+
+def hit_count(hits: Mapping[str, Set[str]], name: str) -> int:
+    return len(hits.get(name, ()))
+
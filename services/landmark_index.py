@@ -0,0 +1,210 @@
+# services/landmark_index.py
+"""
+LandmarkIndex — поиск известных мест (ориентиры, площадки афиши) в тексте.
+
+Раньше geo_service.find_landmark и _pick_venue в routers/map_data перебирали
+свои таблицы подстрокой `name in text.lower()` — время росло с каждой новой
+записью, а «в старом Вартовске» или «у Ледового дворца» не находились.
+
+Теперь названия и синонимы приводятся к основам (отсекается падежное
+окончание каждого слова: «старом вартовске» и «старый вартовск» → «стар
+вартовск»), основы целыми словами собираются в автомат KeywordMatcher. Текст
+нормализуется так же — двумя проходами re — и просматривается один раз,
+сколько бы мест ни было в таблице. Совпадение внутри более длинного
+(«дворец искусств» в «площади дворца искусств») отбрасывается, из остального
+выбирается первое по порядку таблицы (как при прежнем переборе); ответ —
+сразу координаты/данные места. Беглые гласные («дворец» → «дворца») —
+через явные синонимы.
+"""
+
+import re
+from typing import Dict, Generic, Iterable, List, Mapping, Optional, Tuple, TypeVar
+
+from services.keyword_matcher import KeywordMatcher
+
+T = TypeVar("T")
+
+# Известные ориентиры Нижневартовска → координаты
+NV_LANDMARKS: Dict[str, Tuple[float, float]] = {
+    "самотлор": (60.9398, 76.5652),
+    "озеро комсомольское": (60.9450, 76.5500),
+    "комсомольское озеро": (60.9450, 76.5500),
+    "тц мегион": (60.9340, 76.5580),
+    "тц сити центр": (60.9380, 76.5530),
+    "сити центр": (60.9380, 76.5530),
+    "тц югра молл": (60.9420, 76.5700),
+    "югра молл": (60.9420, 76.5700),
+    "тц западный": (60.9350, 76.5350),
+    "западный": (60.9350, 76.5350),
+    "тц мегаполис": (60.9370, 76.5600),
+    "мегаполис": (60.9370, 76.5600),
+    "автовокзал": (60.9410, 76.5730),
+    "жд вокзал": (60.9560, 76.5850),
+    "аэропорт": (60.9490, 76.4880),
+    "городская больница": (60.9370, 76.5480),
+    "поликлиника 1": (60.9360, 76.5520),
+    "поликлиника 2": (60.9400, 76.5600),
+    "школа 1": (60.9350, 76.5500),
+    "школа 2": (60.9380, 76.5550),
+    "администрация города": (60.9370, 76.5530),
+    "площадь нефтяников": (60.9370, 76.5530),
+    "парк победы": (60.9400, 76.5480),
+    "дворец искусств": (60.9380, 76.5510),
+    "ледовый дворец": (60.9420, 76.5650),
+    "стадион центральный": (60.9390, 76.5560),
+    "набережная": (60.9300, 76.5500),
+    "район 10п": (60.9500, 76.5800),
+    "район 10а": (60.9480, 76.5750),
+    "район 2п": (60.9350, 76.5400),
+    "район 6п": (60.9400, 76.5650),
+    "район 7п": (60.9420, 76.5700),
+    "район 17": (60.9300, 76.5350),
+    "старый вартовск": (60.9250, 76.5300),
+}
+
+# Синоним → название из NV_LANDMARKS (формы, которые не сводятся к той же основе)
+LANDMARK_ALIASES: Dict[str, str] = {
+    "дворца искусств": "дворец искусств",
+    "дворце искусств": "дворец искусств",
+    "ледового дворца": "ледовый дворец",
+    "ж/д вокзал": "жд вокзал",
+    "железнодорожный вокзал": "жд вокзал",
+    "горбольница": "городская больница",
+}
+
+# Только в точной форме: «просим администрацию города» — адресат жалобы, а не место
+LANDMARK_EXACT = frozenset({"администрация города"})
+
+# Площадки афиши n-vartovsk.ru → точка на карте
+VENUE_COORDS: Dict[str, Dict[str, object]] = {
+    "дворец искусств": {
+        "name": "Дворец искусств",
+        "lat": 60.9404877,
+        "lng": 76.5587701,
+        "address": "ул. Ленина, 7, Нижневартовск",
+    },
+    "площади дворца искусств": {
+        "name": "Площадь Дворца искусств",
+        "lat": 60.9404877,
+        "lng": 76.5587701,
+        "address": "ул. Ленина, 7, Нижневартовск",
+    },
+    "площадь нефтяников": {
+        "name": "Площадь Нефтяников",
+        "lat": 60.9405,
+        "lng": 76.5450,
+        "address": "Площадь Нефтяников, Нижневартовск",
+    },
+    "green park": {
+        "name": "МФК Green Park",
+        "lat": 60.9384798,
+        "lng": 76.5558084,
+        "address": "ул. Ленина, 8, Нижневартовск",
+    },
+    "ленина, 8": {
+        "name": "МФК Green Park",
+        "lat": 60.9384798,
+        "lng": 76.5558084,
+        "address": "ул. Ленина, 8, Нижневартовск",
+    },
+}
+
+VENUE_ALIASES: Dict[str, str] = {
+    "дворца искусств": "дворец искусств",
+    "дворце искусств": "дворец искусств",
+    "грин парк": "green park",
+}
+
+_NON_WORD_RE = re.compile(r"[^0-9a-zа-я]+")
+# Падежные окончания (длинные раньше); основа — не короче 3 букв. Просмотр первой буквы
+# окончания до lookbehind — вдвое быстрее на длинных постах
+_ENDING_RE = re.compile(
+    r"(?=[аяоеуюыиьй])(?<=[а-я]{3})(?:ами|ями|ого|его|ому|ему|ыми|ими|ой|ей|ий|ый|ое|ее|ая|яя|ую|юю|ые|ие|ых|их"
+    r"|ом|ем|ам|ям|ах|ях|ов|ев|ью|а|я|у|ю|е|ы|и|о|ь|й)(?= )"
+)
+
+
+def normalize_text(text: str) -> str:
+    """Нижний регистр, ё→е, слова через один пробел; пробел по краям."""
+    t = _NON_WORD_RE.sub(" ", text.lower().replace("ё", "е")).strip()
+    return f" {t} " if t else " "
+
+
+def stem_text(text: str) -> str:
+    """normalize_text без падежных окончаний."""
+    return _ENDING_RE.sub("", normalize_text(text))
+
+
+class LandmarkIndex(Generic[T]):
+    """Таблица мест (название → данные) + синонимы, скомпилированные в один автомат."""
+
+    def __init__(
+        self,
+        places: Mapping[str, T],
+        aliases: Optional[Mapping[str, str]] = None,
+        exact: Iterable[str] = (),
+    ):
+        self.places: Dict[str, T] = {name.lower(): value for name, value in places.items()}
+        # Названия без падежных форм: совпадение основы проверяется подстрокой, как раньше
+        self._exact = frozenset(name.lower() for name in exact)
+        self._order = {name: i for i, name in enumerate(self.places)}
+        self._by_stem: Dict[str, List[str]] = {}
+        names = [(name, name) for name in self.places]
+        names += [(alias, target.lower()) for alias, target in (aliases or {}).items() if target.lower() in self.places]
+        for alias, name in names:
+            stem = stem_text(alias)
+            if stem.strip():
+                owners = self._by_stem.setdefault(stem, [])
+                if name not in owners:
+                    owners.append(name)
+        self._matcher = KeywordMatcher({"place": self._by_stem}) if self._by_stem else None
+        # Слово основы — подстрока исходного слова («вартовск» в «вартовске»): если в тексте нет
+        # самого длинного слова ни одной основы, нормализация и отсечение окончаний не нужны
+        self._heads = KeywordMatcher({"head": {max(stem.split(), key=len) for stem in self._by_stem}})
+
+    def __len__(self) -> int:
+        return len(self.places)
+
+    def _names(self, text: str) -> List[str]:
+        if self._matcher is None or not text:
+            return []
+        lowered = text.lower().replace("ё", "е")
+        if not self._heads.find_all(lowered, lowered=True):
+            return []
+        normalized = normalize_text(lowered)
+        stems = self._matcher.find_all(_ENDING_RE.sub("", normalized), lowered=True)
+        # Совпадения, целиком входящие в более длинное, — не отдельные места
+        longest = [stem for stem in stems if not any(stem != other and stem in other for other in stems)]
+        names = {name for stem in longest for name in self._by_stem[stem]}
+        if names & self._exact:
+            names = {name for name in names if name not in self._exact or normalize_text(name) in normalized}
+        return sorted(names, key=self._order.__getitem__)
+
+    def find_all(self, text: str) -> List[Tuple[str, T]]:
+        """Все упомянутые места (название, данные) в порядке таблицы."""
+        return [(name, self.places[name]) for name in self._names(text)]
+
+    def first(self, text: str) -> Optional[Tuple[str, T]]:
+        """Первое по порядку таблицы упомянутое место или None."""
+        names = self._names(text)
+        return (names[0], self.places[names[0]]) if names else None
+
+
+_landmark_index: Optional[LandmarkIndex[Tuple[float, float]]] = None
+_venue_index: Optional[LandmarkIndex[Dict[str, object]]] = None
+
+
+def get_landmark_index() -> LandmarkIndex[Tuple[float, float]]:
+    """Ориентиры города (geo_service.geoparse)."""
+    global _landmark_index
+    if _landmark_index is None:
+        _landmark_index = LandmarkIndex(NV_LANDMARKS, LANDMARK_ALIASES, LANDMARK_EXACT)
+    return _landmark_index
+
+
+def get_venue_index() -> LandmarkIndex[Dict[str, object]]:
+    """Площадки афиши (routers/map_data)."""
+    global _venue_index
+    if _venue_index is None:
+        _venue_index = LandmarkIndex(VENUE_COORDS, VENUE_ALIASES)
+    return _venue_index
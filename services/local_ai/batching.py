@@ -0,0 +1,118 @@
+"""
+Dynamic batching for the local AI models.
+
+Requests are queued; a single worker task takes whatever is waiting (up to
+max_batch_size), waits at most max_wait_ms for more to arrive, and runs one
+forward pass for the whole group in a worker thread. While a batch is being
+computed new requests accumulate, so under load batches grow on their own
+and the model never sees more than one batch at a time.
+"""
+
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+
+class DynamicBatcher:
+    def __init__(
+        self,
+        infer_batch: Callable[[List[str]], List[Any]],
+        max_batch_size: int = 16,
+        max_wait_ms: float = 10.0,
+    ):
+        self.infer_batch = infer_batch
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max_wait_ms / 1000.0
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+        # One thread: the model runs one batch at a time
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="local-ai")
+        self.batches = 0
+        self.items = 0
+        self.max_seen = 0
+        self.busy_seconds = 0.0
+        self.started_at = time.monotonic()
+
+    def start(self) -> None:
+        if self._worker is None:
+            self._queue = asyncio.Queue()
+            self._worker = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+        self._executor.shutdown(wait=False)
+
+    async def submit(self, text: str) -> Any:
+        if self._worker is None:
+            self.start()
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((text, future))
+        return await future
+
+    async def submit_many(self, texts: List[str]) -> List[Any]:
+        return list(await asyncio.gather(*(self.submit(t) for t in texts)))
+
+    async def _collect(self) -> List[Tuple[str, asyncio.Future]]:
+        batch = [await self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+                continue
+            except asyncio.QueueEmpty:
+                pass
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout=remaining))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._collect()
+            # Callers that gave up (client disconnected) are not computed
+            batch = [(text, future) for text, future in batch if not future.done()]
+            if not batch:
+                continue
+            started = time.monotonic()
+            try:
+                results = await loop.run_in_executor(
+                    self._executor, self.infer_batch, [text for text, _ in batch]
+                )
+            except Exception as exc:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(exc)
+                continue
+            finally:
+                self.busy_seconds += time.monotonic() - started
+            self.batches += 1
+            self.items += len(batch)
+            self.max_seen = max(self.max_seen, len(batch))
+            for (_, future), result in zip(batch, results):
+                if not future.done():
+                    future.set_result(result)
+
+    def stats(self) -> Dict[str, Any]:
+        uptime = time.monotonic() - self.started_at
+        return {
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": round(self.max_wait * 1000, 1),
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "batches": self.batches,
+            "items": self.items,
+            "avg_batch": round(self.items / self.batches, 2) if self.batches else 0.0,
+            "max_batch_seen": self.max_seen,
+            "utilization": round(self.busy_seconds / uptime, 3) if uptime else 0.0,
+        }
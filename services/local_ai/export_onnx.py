@@ -0,0 +1,12 @@
+"""
+Export both local AI models to ONNX ahead of time (LOCAL_AI_BACKEND=onnx
+otherwise exports them on first start).
+
+    cd services/local_ai && python export_onnx.py
+"""
+
+from main import MODEL_NLI, MODEL_SENTIMENT_CLS, export_onnx
+
+if __name__ == "__main__":
+    for name in (MODEL_NLI, MODEL_SENTIMENT_CLS):
+        print(f"{name}: {export_onnx(name)}")
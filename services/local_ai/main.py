@@ -1,15 +1,14 @@
 import os
+from contextlib import asynccontextmanager
+from typing import List
+
 import torch
 import uvicorn
-from fastapi import FastAPI
+from fastapi import FastAPI, HTTPException
 from pydantic import BaseModel
 from transformers import pipeline, AutoTokenizer, AutoModelForSequenceClassification
 
-app = FastAPI(
-    title="Local AI Module for Soobshio",
-    description="Microservice for analyzing complaints locally using cointegrated/rubert-tiny2 based models",
-    version="1.0.0"
-)
+from batching import DynamicBatcher
 
 # We use cointegrated/rubert-tiny-sentiment for sentiment analysis (urgency surrogate)
 # And zero-shot-classification for category prediction (using a cross-encoder or NLI model)
@@ -19,23 +18,57 @@ MODEL_SENTIMENT = "cointegrated/rubert-tiny2-cedr-emotion-rubert-base"
 # NOTE: cointegrated/rubert-tiny-sentiment or similar can be used, 
 # here we use a simple pipeline for demonstration with rubert-tiny2 baseline
 
+MODEL_SENTIMENT_CLS = "cointegrated/rubert-tiny-sentiment"
+
 device = 0 if torch.cuda.is_available() else -1
 
-print("Loading models...")
-# Zero-shot classification (for categorizing complaints)
-classifier = pipeline(
-    "zero-shot-classification", 
-    model=MODEL_NLI,
-    device=device
-)
+# torch (default) or onnx: ONNX Runtime on CPU via optimum, models exported once into ONNX_DIR
+BACKEND = os.getenv("LOCAL_AI_BACKEND", "torch").strip().lower()
+ONNX_DIR = os.getenv("LOCAL_AI_ONNX_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "onnx"))
+# Dynamic batching: concurrent requests share one forward pass
+MAX_BATCH_SIZE = int(os.getenv("LOCAL_AI_MAX_BATCH", "16"))
+MAX_WAIT_MS = float(os.getenv("LOCAL_AI_MAX_WAIT_MS", "10"))
+MAX_BATCH_REQUEST = 256
 
-# Using a standard sentiment model or emotion model to gauge 'urgency' or 'tone'
-sentiment = pipeline(
-    "text-classification", 
-    model="cointegrated/rubert-tiny-sentiment", 
-    device=device
-)
-print("Models loaded successfully!")
+classifier = None
+sentiment = None
+
+
+def onnx_model_dir(model_name: str) -> str:
+    return os.path.join(ONNX_DIR, model_name.replace("/", "__"))
+
+
+def export_onnx(model_name: str) -> str:
+    """Export a sequence-classification model to ONNX (once) and return its directory."""
+    from optimum.onnxruntime import ORTModelForSequenceClassification
+
+    target = onnx_model_dir(model_name)
+    if not os.path.exists(os.path.join(target, "model.onnx")):
+        print(f"Exporting {model_name} to ONNX -> {target}")
+        model = ORTModelForSequenceClassification.from_pretrained(model_name, export=True)
+        model.save_pretrained(target)
+        AutoTokenizer.from_pretrained(model_name).save_pretrained(target)
+    return target
+
+
+def load_pipeline(task: str, model_name: str):
+    if BACKEND == "onnx":
+        from optimum.onnxruntime import ORTModelForSequenceClassification
+
+        target = export_onnx(model_name)
+        model = ORTModelForSequenceClassification.from_pretrained(target, provider="CPUExecutionProvider")
+        return pipeline(task, model=model, tokenizer=AutoTokenizer.from_pretrained(target))
+    return pipeline(task, model=model_name, device=device)
+
+
+def load_models() -> None:
+    global classifier, sentiment
+    print(f"Loading models (backend: {BACKEND})...")
+    # Zero-shot classification (for categorizing complaints)
+    classifier = load_pipeline("zero-shot-classification", MODEL_NLI)
+    # Using a standard sentiment model or emotion model to gauge 'urgency' or 'tone'
+    sentiment = load_pipeline("text-classification", MODEL_SENTIMENT_CLS)
+    print("Models loaded successfully!")
 
 class ComplaintRequest(BaseModel):
     text: str
@@ -55,19 +88,19 @@ CATEGORIES = [
     "Прочее"
 ]
 
-@app.post("/analyze", response_model=ComplaintResponse)
-def analyze_complaint(req: ComplaintRequest):
+class BatchRequest(BaseModel):
+    texts: List[str]
+
+class BatchResponse(BaseModel):
+    results: List[ComplaintResponse]
+
+
+def build_response(text: str, cat_result: dict, sent_result: dict) -> ComplaintResponse:
     # 1. Category Prediction
-    cat_result = classifier(
-        req.text,
-        candidate_labels=CATEGORIES,
-        hypothesis_template="Этот текст о теме {}."
-    )
     top_category = cat_result['labels'][0]
     top_score = cat_result['scores'][0]
-    
+
     # 2. Sentiment/Urgency Prediction
-    sent_result = sentiment(req.text)[0]
     sent_label = sent_result['label']
     
     # Simple heuristic: if sentiment is negative or anger/fear, mark as urgent
@@ -77,7 +110,7 @@ def analyze_complaint(req: ComplaintRequest):
         
     # Example heuristic for emergency keywords
     emergency_keywords = ["срочно", "пожар", "убивают", "помогите", "авария", "кровь", "труба прорвала"]
-    if any(kw in req.text.lower() for kw in emergency_keywords):
+    if any(kw in text.lower() for kw in emergency_keywords):
         is_urgent = True
 
     return ComplaintResponse(
@@ -87,9 +120,61 @@ def analyze_complaint(req: ComplaintRequest):
         is_urgent=is_urgent
     )
 
+
+def infer_batch(texts: List[str]) -> List[ComplaintResponse]:
+    """One forward pass per model for the whole batch (runs in the batcher thread)."""
+    # Zero-shot batches (text, label) pairs: one pass = every text against every category
+    cat_results = classifier(
+        texts,
+        candidate_labels=CATEGORIES,
+        hypothesis_template="Этот текст о теме {}.",
+        batch_size=len(texts) * len(CATEGORIES),
+    )
+    if isinstance(cat_results, dict):
+        cat_results = [cat_results]
+    sent_results = sentiment(texts, batch_size=len(texts))
+    return [build_response(t, c, s) for t, c, s in zip(texts, cat_results, sent_results)]
+
+
+batcher = DynamicBatcher(infer_batch, max_batch_size=MAX_BATCH_SIZE, max_wait_ms=MAX_WAIT_MS)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    load_models()
+    batcher.start()
+    yield
+    await batcher.stop()
+
+
+app = FastAPI(
+    title="Local AI Module for Soobshio",
+    description="Microservice for analyzing complaints locally using cointegrated/rubert-tiny2 based models",
+    version="1.1.0",
+    lifespan=lifespan,
+)
+
+
+@app.post("/analyze", response_model=ComplaintResponse)
+async def analyze_complaint(req: ComplaintRequest):
+    return await batcher.submit(req.text)
+
+
+@app.post("/analyze_batch", response_model=BatchResponse)
+async def analyze_batch(req: BatchRequest):
+    if len(req.texts) > MAX_BATCH_REQUEST:
+        raise HTTPException(status_code=413, detail=f"at most {MAX_BATCH_REQUEST} texts per request")
+    return BatchResponse(results=await batcher.submit_many(req.texts))
+
+
 @app.get("/health")
 def health_check():
-    return {"status": "ok", "models_loaded": True}
+    return {
+        "status": "ok",
+        "models_loaded": classifier is not None and sentiment is not None,
+        "backend": BACKEND,
+        "batching": batcher.stats(),
+    }
 
 if __name__ == "__main__":
     uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True)
@@ -0,0 +1,296 @@
+# services/local_classifier.py
+"""
+Локальный предклассификатор текста (ONNX, CPU) перед запросом к Grok.
+
+Модель — линейные головы над хешированными признаками (слова + символьные
+3–5-граммы, signed hashing, log1p-TF, L2): relevant (сигмоида), spam
+(сигмоида) и category (softmax). Признаки считаются здесь же, в featurize(),
+а ONNX-граф — только MatMul/Add/активации, поэтому не нужны строковые
+операторы и sklearn в рантайме. Обучение и экспорт —
+scripts/setup/train_text_classifier.py, сверка с keyword-путём —
+scripts/benchmarks/local_classifier.py.
+
+Уверенные предсказания (вероятности за порогами) отвечают сразу, без LLM;
+неуверенные возвращают None — сообщение уходит в Grok как раньше. Без файла
+модели или onnxruntime классификатор просто выключен.
+"""
+
+import json
+import logging
+import math
+import os
+import re
+import time
+import zlib
+from dataclasses import dataclass
+from pathlib import Path
+from threading import Lock
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+from core.config import STATE_DIR
+from services.ai_cache import normalize_text
+
+try:
+    import onnxruntime as ort
+except ImportError:  # onnxruntime ставится вместе с Real-ESRGAN, но не обязателен
+    ort = None
+
+logger = logging.getLogger(__name__)
+
+ROOT = Path(__file__).resolve().parent.parent
+MODEL_DIR = ROOT / "data" / "models" / "text_classifier"
+
+LOCAL_CLASSIFIER_ENABLED = os.getenv("LOCAL_CLASSIFIER_ENABLED", "1").strip().lower() not in ("0", "false", "no")
+LOCAL_CLASSIFIER_PATH = os.getenv("LOCAL_CLASSIFIER_PATH", str(MODEL_DIR / "text_classifier.onnx"))
+# Пороги уверенности: ниже — эскалация в Grok
+LOCAL_CLASSIFIER_RELEVANCE_THRESHOLD = float(os.getenv("LOCAL_CLASSIFIER_RELEVANCE_THRESHOLD", "0.92"))
+LOCAL_CLASSIFIER_SPAM_THRESHOLD = float(os.getenv("LOCAL_CLASSIFIER_SPAM_THRESHOLD", "0.95"))
+LOCAL_CLASSIFIER_CATEGORY_THRESHOLD = float(os.getenv("LOCAL_CLASSIFIER_CATEGORY_THRESHOLD", "0.85"))
+# Журнал ответов Grok — обучающая выборка для следующей версии модели
+LOCAL_CLASSIFIER_COLLECT = os.getenv("LOCAL_CLASSIFIER_COLLECT", "1").strip().lower() not in ("0", "false", "no")
+LABELS_LOG_PATH = os.path.join(STATE_DIR, "classifier_labels.jsonl")
+
+N_FEATURES = 1 << 15
+_CHAR_NGRAMS = (3, 4, 5)
+_WORD_RE = re.compile(r"[0-9a-zа-яё]+")
+
+
+def _bucket(token: str) -> int:
+    """Signed hashing: младшие биты — индекс, старший бит — знак."""
+    h = zlib.crc32(token.encode("utf-8"))
+    return -(h % N_FEATURES) - 1 if h & 0x80000000 else h % N_FEATURES
+
+
+def _tokens(text: str) -> List[str]:
+    norm = normalize_text(text).replace("ё", "е")
+    tokens: List[str] = []
+    words = _WORD_RE.findall(norm)
+    for word in words:
+        tokens.append(f"w:{word}")
+        padded = f"<{word}>"
+        for n in _CHAR_NGRAMS:
+            for i in range(len(padded) - n + 1):
+                tokens.append(padded[i:i + n])
+    for a, b in zip(words, words[1:]):
+        tokens.append(f"b:{a}_{b}")
+    return tokens
+
+
+def featurize(texts: Sequence[str]) -> np.ndarray:
+    """Матрица признаков float32 [len(texts), N_FEATURES] — та же, что при обучении."""
+    out = np.zeros((len(texts), N_FEATURES), dtype=np.float32)
+    for row, text in enumerate(texts):
+        counts: Dict[int, float] = {}
+        for token in _tokens(text):
+            b = _bucket(token)
+            counts[b] = counts.get(b, 0.0) + 1.0
+        if not counts:
+            continue
+        vec = out[row]
+        for b, c in counts.items():
+            value = math.log1p(c)
+            if b < 0:
+                vec[-b - 1] -= value
+            else:
+                vec[b] += value
+        norm = float(np.linalg.norm(vec))
+        if norm:
+            vec /= norm
+    return out
+
+
+@dataclass
+class LocalPrediction:
+    relevant: float
+    spam: float
+    category: str
+    category_confidence: float
+    cpu_us: float
+
+    def decision(self) -> Optional[str]:
+        """'spam' / 'irrelevant' / 'relevant' при уверенном ответе, иначе None (в Grok)."""
+        if self.spam >= LOCAL_CLASSIFIER_SPAM_THRESHOLD:
+            return "spam"
+        if self.relevant <= 1.0 - LOCAL_CLASSIFIER_RELEVANCE_THRESHOLD:
+            return "irrelevant"
+        if (
+            self.relevant >= LOCAL_CLASSIFIER_RELEVANCE_THRESHOLD
+            and self.category_confidence >= LOCAL_CLASSIFIER_CATEGORY_THRESHOLD
+        ):
+            return "relevant"
+        return None
+
+
+class LocalClassifier:
+    """Ленивая ONNX-сессия + счётчики решений и CPU на сообщение."""
+
+    def __init__(self, path: str = LOCAL_CLASSIFIER_PATH) -> None:
+        self.path = Path(path)
+        self._session = None
+        self._lock = Lock()
+        self._failed = False
+        self.categories: List[str] = []
+        self.version = ""
+        self.counters: Dict[str, int] = {
+            "predictions": 0, "spam": 0, "irrelevant": 0, "relevant": 0, "escalated": 0, "errors": 0,
+        }
+        self._cpu_total_us = 0.0
+
+    def _ensure_session(self):
+        if self._session is not None or self._failed:
+            return self._session
+        with self._lock:
+            if self._session is not None or self._failed:
+                return self._session
+            if ort is None:
+                logger.info("ℹ️ Локальный классификатор выключен: onnxruntime не установлен")
+                self._failed = True
+                return None
+            if not self.path.exists():
+                logger.info(f"ℹ️ Локальный классификатор выключен: нет модели {self.path}")
+                self._failed = True
+                return None
+            options = ort.SessionOptions()
+            options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+            options.intra_op_num_threads = 1
+            options.inter_op_num_threads = 1
+            try:
+                session = ort.InferenceSession(
+                    self.path.as_posix(), sess_options=options, providers=["CPUExecutionProvider"],
+                )
+                meta = session.get_modelmeta().custom_metadata_map
+                self.categories = json.loads(meta.get("categories", "[]"))
+                self.version = meta.get("version", "")
+                n_features = int(meta.get("n_features", N_FEATURES))
+            except Exception as e:
+                logger.error(f"❌ Локальный классификатор: не удалось загрузить {self.path}: {e}")
+                self._failed = True
+                return None
+            if n_features != N_FEATURES or not self.categories:
+                logger.error(
+                    f"❌ Локальный классификатор: модель несовместима "
+                    f"(n_features={n_features}, категорий {len(self.categories)})"
+                )
+                self._failed = True
+                return None
+            self._session = session
+            logger.info(f"🧠 Локальный классификатор {self.version}: {len(self.categories)} категорий")
+            return self._session
+
+    @property
+    def available(self) -> bool:
+        return LOCAL_CLASSIFIER_ENABLED and self._ensure_session() is not None
+
+    def predict_batch(self, texts: Sequence[str]) -> Optional[List[LocalPrediction]]:
+        session = self._ensure_session()
+        if session is None or not texts:
+            return None
+        start = time.process_time()
+        try:
+            relevant, spam, category = session.run(
+                ["relevant", "spam", "category"], {"features": featurize(texts)}
+            )
+        except Exception as e:
+            self.counters["errors"] += 1
+            logger.error(f"❌ Локальный классификатор: ошибка инференса: {e}")
+            return None
+        cpu_us = (time.process_time() - start) * 1e6 / len(texts)
+        self._cpu_total_us += cpu_us * len(texts)
+        predictions = []
+        for i in range(len(texts)):
+            idx = int(category[i].argmax())
+            predictions.append(LocalPrediction(
+                relevant=float(relevant[i][0]),
+                spam=float(spam[i][0]),
+                category=self.categories[idx],
+                category_confidence=float(category[i][idx]),
+                cpu_us=cpu_us,
+            ))
+        return predictions
+
+    def predict(self, text: str) -> Optional[LocalPrediction]:
+        """Предсказание для одного сообщения; решение (или эскалация) учитывается в счётчиках."""
+        if not LOCAL_CLASSIFIER_ENABLED:
+            return None
+        predictions = self.predict_batch([text])
+        if not predictions:
+            return None
+        prediction = predictions[0]
+        self.counters["predictions"] += 1
+        self.counters[prediction.decision() or "escalated"] += 1
+        return prediction
+
+    def stats(self) -> Dict[str, Any]:
+        predictions = self.counters["predictions"]
+        decided = predictions - self.counters["escalated"]
+        return {
+            "enabled": LOCAL_CLASSIFIER_ENABLED,
+            "loaded": self._session is not None,
+            "version": self.version,
+            "skip_rate": round(decided / predictions, 3) if predictions else 0.0,
+            "avg_cpu_us": round(self._cpu_total_us / predictions, 1) if predictions else 0.0,
+            **self.counters,
+        }
+
+
+def record_label(text: str, result: Dict[str, Any]) -> None:
+    """Дописывает ответ Grok в журнал обучающей выборки (LABELS_LOG_PATH)."""
+    if not LOCAL_CLASSIFIER_COLLECT or not text:
+        return
+    item = {
+        "text": text[:2000],
+        "relevant": bool(result.get("relevant", True)),
+        "category": result.get("category"),
+        "provider": result.get("provider"),
+        "ts": int(time.time()),
+    }
+    try:
+        os.makedirs(os.path.dirname(LABELS_LOG_PATH) or ".", exist_ok=True)
+        with open(LABELS_LOG_PATH, "a", encoding="utf-8") as f:
+            f.write(json.dumps(item, ensure_ascii=False) + "\n")
+    except OSError as e:
+        logger.debug(f"Журнал разметки: ошибка записи: {e}")
+
+
+def load_labeled_corpus(path: Path) -> List[Dict[str, Any]]:
+    """
+    Размеченные сообщения из JSON-списка или JSONL: text (или title/description),
+    relevant, category, необязательно spam. Выгрузка reports — это жалобы,
+    для них relevant=True по умолчанию.
+    """
+    raw = path.read_text(encoding="utf-8")
+    if path.suffix == ".jsonl":
+        items = [json.loads(line) for line in raw.splitlines() if line.strip()]
+    else:
+        items = json.loads(raw)
+    rows = []
+    for item in items:
+        if not isinstance(item, dict):
+            continue
+        text = item.get("text") or "\n".join(
+            part for part in (item.get("title"), item.get("description")) if part
+        )
+        if not text:
+            continue
+        category = item.get("category")
+        if category in (None, "", "other"):
+            category = "Прочее"
+        rows.append({
+            "text": text,
+            "relevant": bool(item.get("relevant", True)),
+            "category": category,
+            "spam": item.get("spam"),
+        })
+    return rows
+
+
+_classifier: Optional[LocalClassifier] = None
+
+
+def get_local_classifier() -> LocalClassifier:
+    global _classifier
+    if _classifier is None:
+        _classifier = LocalClassifier()
+    return _classifier
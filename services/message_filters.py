@@ -0,0 +1,172 @@
+# services/message_filters.py
+"""
+Общие таблицы ключевых слов для фильтров TG/VK и keyword-категоризации.
+
+Все списки (реклама, маркеры жалоб, правила категорий zai_service, geoparse
+и routers/ai) скомпилированы в один KeywordMatcher: scan() за один проход по
+тексту возвращает совпадения сразу по всем спискам, а функции фильтров
+и категоризации работают уже с результатом scan().
+"""
+
+from typing import Dict, List, Mapping, Optional, Set, Tuple
+
+from services.keyword_matcher import KeywordMatcher, first_hit
+
+# --- Telegram (start_all_monitoring.py) ---
+
+TG_AD_KEYWORDS = [
+    "реклама", "промокод", "скидк", "акция", "распродаж", "купи", "закажи",
+    "доставк", "интернет-магазин", "подписывайтесь", "подпишись",
+    "розыгрыш", "конкурс", "приз", "выигра", "бесплатн", "бонус",
+    "кредит", "займ", "ипотек", "инвестиц", "заработ", "доход",
+    "казино", "ставк", "букмекер", "тотализатор",
+    "знакомств", "свидани", "отношени",
+    "гороскоп", "предсказан", "гадани",
+    "продаётся", "продается", "сдаётся", "сдается", "аренд", "купить",
+    "вакансия", "требуется сотрудник", "ищем работник",
+    "taplink", "inst:", "@.*_bot",
+]
+
+# Явная реклама: достаточно одного такого слова
+TG_STRONG_AD_KEYWORDS = [
+    "промокод", "розыгрыш", "казино", "букмекер", "гороскоп",
+    "продаётся", "продается", "сдаётся", "сдается", "вакансия", "taplink",
+]
+
+COMPLAINT_MARKERS = [
+    "проблем", "жалоб", "не работает", "сломан", "разбит", "поломк",
+    "авари", "прорыв", "прорвал", "затоп", "течь", "течёт", "протечк",
+    "яма", "выбоин", "колея", "трещин",
+    "не убира", "не чист", "грязн", "мусор", "свалк",
+    "не горит", "не свет", "темно", "фонар",
+    "опасн", "угроз", "вандал", "хулиган",
+    "пожар", "взрыв", "обрушен", "провал",
+    "запах", "вонь", "дым", "загрязн",
+    "холодн", "не греет", "отключ",
+    "просим", "требуем", "когда", "сколько можно", "надоело",
+    "помогите", "обратите внимание", "срочно",
+    "ДТП", "дтп", "столкнов", "наезд",
+]
+
+# --- VK (vk_monitor_service.py) ---
+
+VK_AD_KEYWORDS = [
+    "реклама", "промокод", "скидк", "акция", "распродаж", "купи", "закажи",
+    "доставк", "интернет-магазин", "розыгрыш", "конкурс", "приз",
+    "кредит", "займ", "ипотек", "инвестиц", "казино", "ставк", "букмекер",
+    "продаётся", "продается", "сдаётся", "сдается", "аренд",
+    "вакансия", "требуется сотрудник", "гороскоп", "знакомств",
+    "подписывайтесь", "подпишись", "переходи по ссылке",
+    "taplink", "inst:", "whatsapp",
+]
+
+VK_STRONG_AD_KEYWORDS = [
+    "промокод", "казино", "букмекер", "гороскоп", "taplink",
+    "продаётся", "продается", "сдаётся", "сдается",
+]
+
+VK_COMPLAINT_MARKERS = [
+    m for m in COMPLAINT_MARKERS if m != "прорвал"
+] + [
+    "лифт не работ", "подъезд", "домофон",
+    "детск площадк", "качел", "горк",
+    "автобус не", "маршрут отмен",
+]
+
+# --- Категории по ключевым словам (порядок = приоритет) ---
+
+# zai_service._keyword_analyze
+KEYWORD_CATEGORY_RULES: List[Tuple[str, List[str]]] = [
+    ("Освещение", ["фонар", "освещен", "свет не гор", "темно", "лампа"]),
+    ("Дороги", ["яма", "дорог", "асфальт", "тротуар", "выбоин", "колея"]),
+    ("Снег/Наледь", ["снег", "налед", "гололёд", "гололед", "сугроб", "не чищ"]),
+    ("ЖКХ", ["жкх", "управляющ", "коммунал", "квитанц", "тариф"]),
+    ("Отопление", ["отоплен", "батаре", "холодн", "не греет"]),
+    ("Водоснабжение и канализация", ["канализ", "труб", "течь", "затоп", "прорыв"]),
+    ("Бытовой мусор", ["мусор", "свалк", "отход", "контейнер"]),
+    ("Транспорт", ["автобус", "маршрут", "транспорт", "остановк"]),
+    ("Благоустройство", ["двор", "клумб", "газон", "лавочк", "скамейк"]),
+    ("Экология", ["эколог", "загрязн", "выброс", "запах"]),
+    ("Парковки", ["парков", "стоянк"]),
+    ("Лифты и подъезды", ["лифт", "подъезд", "домофон"]),
+    ("Детские площадки", ["детск", "площадк", "качел", "горк"]),
+    ("Безопасность", ["безопасн", "полиц", "кража", "вандал"]),
+    ("Медицина", ["больниц", "поликлиник", "врач", "скорая"]),
+    ("Газоснабжение", ["газ ", "газов", "газоснабж"]),
+    ("Строительство", ["строй", "стройк"]),
+    ("ЧП", ["пожар", "взрыв", "авари", "обрушен"]),
+]
+
+# core/geoparse._extract_category_from_text
+GEOPARSE_CATEGORY_KEYWORDS: Dict[str, List[str]] = {
+    "Дороги": ["яма", "дорог", "асфальт", "тротуар", "выбоин", "колея", "светофор"],
+    "ЖКХ": ["жкх", "управляющ", "коммунал", "квитанц", "тариф", "подъезд"],
+    "Освещение": ["фонар", "освещен", "свет не гор", "темно", "лампа"],
+    "Транспорт": ["автобус", "маршрут", "транспорт", "остановк", "парков"],
+    "Экология": ["эколог", "загрязн", "выброс", "запах", "мусор", "свалк"],
+    "Безопасность": ["полиц", "кража", "вандал", "камер", "охрана"],
+    "Снег/Наледь": ["снег", "налед", "гололёд", "гололед", "сугроб"],
+    "Отопление": ["отоплен", "батаре", "холодн", "не греет"],
+    "Водоснабжение и канализация": ["канализ", "труб", "течь", "затоп", "прорыв"],
+    "Благоустройство": ["двор", "клумб", "газон", "лавочк", "сквер", "парк"],
+}
+
+# routers/ai._guess_simple_category
+SIMPLE_CATEGORY_KEYWORDS: Dict[str, Tuple[str, ...]] = {
+    "Дороги": ("яма", "асфальт", "выбои", "тротуар", "дорог"),
+    "Снег/Наледь": ("снег", "наледь", "гололед", "сугроб"),
+    "Освещение": ("фонарь", "освещ", "темно", "лампа"),
+    "Парковки": ("парков", "машина на газоне", "тротуаре"),
+    "Безопасность": ("драка", "опасно", "вор", "напад"),
+    "Транспорт": ("автобус", "маршрут", "остановк", "транспорт"),
+    "ЖКХ": ("подъезд", "лифт", "управляющ", "коммунал"),
+    "Экология": ("мусор", "свалка", "вонь", "запах"),
+}
+
+# Схемы категоризации: префикс списка в матчере → категории в порядке приоритета
+CATEGORY_SCHEMES: Dict[str, List[str]] = {
+    "zai": [cat for cat, _ in KEYWORD_CATEGORY_RULES],
+    "geo": list(GEOPARSE_CATEGORY_KEYWORDS),
+    "simple": list(SIMPLE_CATEGORY_KEYWORDS),
+}
+
+
+def _build_tables() -> Dict[str, List[str]]:
+    tables: Dict[str, List[str]] = {
+        "tg_ad": TG_AD_KEYWORDS,
+        "tg_ad_strong": TG_STRONG_AD_KEYWORDS,
+        "tg_complaint": COMPLAINT_MARKERS,
+        "vk_ad": VK_AD_KEYWORDS,
+        "vk_ad_strong": VK_STRONG_AD_KEYWORDS,
+        "vk_complaint": VK_COMPLAINT_MARKERS,
+    }
+    for cat, keywords in KEYWORD_CATEGORY_RULES:
+        tables[f"zai:{cat}"] = keywords
+    for cat, keywords in GEOPARSE_CATEGORY_KEYWORDS.items():
+        tables[f"geo:{cat}"] = keywords
+    for cat, keywords in SIMPLE_CATEGORY_KEYWORDS.items():
+        tables[f"simple:{cat}"] = list(keywords)
+    return tables
+
+
+MATCHER = KeywordMatcher(_build_tables())
+
+_SCHEME_ORDER: Dict[str, List[str]] = {
+    scheme: [f"{scheme}:{cat}" for cat in cats] for scheme, cats in CATEGORY_SCHEMES.items()
+}
+
+
+def scan(text: str) -> Dict[str, Set[str]]:
+    """Совпадения по всем спискам за один проход: {список: найденные слова}."""
+    return MATCHER.scan(text)
+
+
+def category_from_hits(hits: Mapping[str, Set[str]], scheme: str) -> Optional[str]:
+    """Первая по приоритету категория схемы (zai/geo/simple) с совпадением или None."""
+    name = first_hit(hits, _SCHEME_ORDER[scheme])
+    return name.split(":", 1)[1] if name else None
+
+
+def keyword_category(text: str, scheme: str, default: str = "Прочее") -> str:
+    """Категория по ключевым словам в рамках схемы."""
+    return category_from_hits(scan(text), scheme) or default
@@ -0,0 +1,92 @@
+# services/monitor_recorder.py
+"""
+MonitorRecorder — запись входящих постов мониторинга в JSONL.
+
+Включается переменной MONITOR_RECORD_PATH. Каждая строка — одно событие:
+TG сообщение (канал, id, текст, метаданные медиа, время публикации и
+получения) или VK пост стены как его вернул wall.get (с группой) — до
+фильтров и анализа.
+Записи проигрывает scripts/benchmarks/replay_monitoring.py.
+"""
+
+import json
+import logging
+import os
+import time
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+RECORD_FORMAT_VERSION = 2  # 2: VK — сырой пост стены вместо готовой жалобы
+
+
+def _iso(dt: Optional[datetime]) -> Optional[str]:
+    return dt.isoformat() if dt else None
+
+
+def media_metadata(message) -> Optional[Dict[str, Any]]:
+    """Метаданные медиа Telethon-сообщения (без содержимого файла)."""
+    photo = getattr(message, "photo", None)
+    if photo is not None:
+        meta: Dict[str, Any] = {"type": "photo", "id": getattr(photo, "id", None)}
+        sizes = [s for s in (getattr(photo, "sizes", None) or []) if getattr(s, "w", None)]
+        if sizes:
+            largest = max(sizes, key=lambda s: s.w * s.h)
+            meta.update(w=largest.w, h=largest.h, size=getattr(largest, "size", None))
+        return meta
+    document = getattr(message, "document", None)
+    if document is not None:
+        return {
+            "type": "document",
+            "id": getattr(document, "id", None),
+            "mime_type": getattr(document, "mime_type", None),
+            "size": getattr(document, "size", None),
+        }
+    return None
+
+
+class MonitorRecorder:
+    """Дописывает события в JSONL-файл (построчный flush — запись переживает падение)."""
+
+    def __init__(self, path: str):
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._file = open(path, "a", encoding="utf-8")
+        self.count = 0
+
+    def _write(self, record: Dict[str, Any]) -> None:
+        record["v"] = RECORD_FORMAT_VERSION
+        record["received_at"] = time.time()
+        try:
+            self._file.write(json.dumps(record, ensure_ascii=False, default=str) + "\n")
+            self._file.flush()
+            self.count += 1
+        except (OSError, ValueError) as e:
+            logger.error(f"MonitorRecorder write error: {e}")
+
+    def record_tg(self, channel_username: str, message) -> None:
+        self._write({
+            "kind": "tg",
+            "channel": channel_username,
+            "msg_id": message.id,
+            "date": _iso(getattr(message, "date", None)),
+            "text": message.message or "",
+            "media": media_metadata(message),
+        })
+
+    def record_vk(self, group: tuple, post: Dict[str, Any]) -> None:
+        self._write({"kind": "vk", "group": list(group), "post": post})
+
+    def close(self) -> None:
+        if not self._file.closed:
+            self._file.close()
+
+
+def recorder_from_env() -> Optional[MonitorRecorder]:
+    """MonitorRecorder на MONITOR_RECORD_PATH или None, если запись выключена."""
+    path = os.getenv("MONITOR_RECORD_PATH", "").strip()
+    if not path:
+        return None
+    logger.info(f"📼 Запись входящих постов: {path}")
+    return MonitorRecorder(path)
@@ -0,0 +1,359 @@
+# services/nominatim_scheduler.py
+"""
+NominatimScheduler — единая на процесс очередь запросов к Nominatim.
+
+Геокодинг (geo_service, core/geoparse), обратный геокодинг (routers/ai, поиск
+УК, EXIF-координаты) и догеокодирование ленты карты раньше ходили в Nominatim
+каждый сам по себе, и вместе превышали правило «не больше 1 запроса в
+секунду» — Nominatim отвечал 429/503 и тормозил всех. Теперь:
+- общий лимит NOMINATIM_RATE_PER_SECOND на старт запросов (0 — без лимита),
+  синхронный get_coordinates_sync занимает слоты того же лимита;
+- классы приоритета: interactive (API, бот) > ingest (мониторинг) >
+  backfill (догеокодирование старых жалоб). Класс — из контекста
+  geo_priority(...), по умолчанию — из полосы AI (ai_lane(INTERACTIVE) →
+  interactive, иначе ingest);
+- одинаковые ждущие запросы объединяются (класс — старший из ждущих);
+- 429/503 ставят очередь на паузу (Retry-After или экспонента), таймауты и
+  обрывы соединения — повтор через очередь, не больше NOMINATIM_MAX_RETRIES;
+- ожидание в очереди — гистограмма по классам (видно, когда геокодинг —
+  узкое место).
+"""
+
+import asyncio
+import heapq
+import itertools
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import httpx
+
+from core.http_client import get_http_client
+from services.ai_scheduler import INTERACTIVE, WAIT_BUCKETS_MS, LaneStats, current_lane
+
+logger = logging.getLogger(__name__)
+
+INGEST = "ingest"
+BACKFILL = "backfill"
+PRIORITIES = (INTERACTIVE, INGEST, BACKFILL)  # в порядке приоритета
+_RANK = {name: rank for rank, name in enumerate(PRIORITIES)}
+
+NOMINATIM_BASE_URL = os.getenv("NOMINATIM_BASE_URL", "https://nominatim.openstreetmap.org").rstrip("/")
+NOMINATIM_RATE_PER_SECOND = float(os.getenv("NOMINATIM_RATE_PER_SECOND", "1"))
+NOMINATIM_MAX_IN_FLIGHT = int(os.getenv("NOMINATIM_MAX_IN_FLIGHT", "2"))
+NOMINATIM_MAX_RETRIES = int(os.getenv("NOMINATIM_MAX_RETRIES", "2"))
+NOMINATIM_USER_AGENT = os.getenv("NOMINATIM_USER_AGENT", "SoobshioApp/1.0")
+NOMINATIM_TIMEOUT = 15.0
+# Сколько вызывающий ждёт ответа (очередь + запрос) по классам, сек
+QUEUE_TIMEOUTS = {INTERACTIVE: 15.0, INGEST: 120.0, BACKFILL: 600.0}
+# Пауза после 429/503 без Retry-After: 5, 10, 20 … до 60 с
+THROTTLE_BACKOFF = 5.0
+THROTTLE_BACKOFF_MAX = 60.0
+
+_priority: ContextVar[Optional[str]] = ContextVar("geo_priority", default=None)
+
+
+def current_priority() -> str:
+    priority = _priority.get()
+    if priority is not None:
+        return priority
+    return INTERACTIVE if current_lane() == INTERACTIVE else INGEST
+
+
+@contextmanager
+def geo_priority(priority: str) -> Iterator[None]:
+    """Запросы к Nominatim внутри блока (и в созданных из него задачах) идут с классом priority."""
+    token = _priority.set(priority if priority in _RANK else INGEST)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+class _Request:
+    __slots__ = ("key", "endpoint", "params", "priority", "future", "waiters", "attempts", "queued", "enqueued_at")
+
+    def __init__(self, key, endpoint: str, params: Dict[str, Any], priority: str, future: asyncio.Future):
+        self.key = key
+        self.endpoint = endpoint
+        self.params = params
+        self.priority = priority
+        self.future = future
+        self.waiters = 0
+        self.attempts = 0
+        self.queued = True
+        self.enqueued_at = time.monotonic()
+
+
+class NominatimScheduler:
+    """Приоритетная очередь + общий лимит частоты + объединение одинаковых запросов."""
+
+    def __init__(
+        self,
+        rate_per_second: float = NOMINATIM_RATE_PER_SECOND,
+        max_in_flight: int = NOMINATIM_MAX_IN_FLIGHT,
+        max_retries: int = NOMINATIM_MAX_RETRIES,
+        base_url: str = NOMINATIM_BASE_URL,
+    ):
+        self.interval = 1.0 / rate_per_second if rate_per_second > 0 else 0.0
+        self.max_in_flight = max(1, max_in_flight)
+        self.max_retries = max(0, max_retries)
+        self.base_url = base_url
+        # Слоты общие для async-очереди и синхронных вызовов из потоков
+        self._slot_lock = threading.Lock()
+        self._next_slot = 0.0
+        self._paused_until = 0.0
+        self._heap: List[Tuple[int, int, _Request]] = []
+        self._seq = itertools.count()
+        self._pending: Dict[Any, _Request] = {}
+        self._wake: Optional[asyncio.Event] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._client: Optional[httpx.AsyncClient] = None
+        self.in_flight = 0
+        self.classes: Dict[str, LaneStats] = {p: LaneStats() for p in PRIORITIES}
+        self.counters: Dict[str, int] = {
+            "enqueued": 0, "deduped": 0, "sent": 0, "ok": 0, "throttled": 0,
+            "retries": 0, "errors": 0, "abandoned": 0, "sync_slots": 0,
+        }
+
+    # ----- лимит частоты -----
+
+    def _slot_delay(self, now: float) -> float:
+        return max(0.0, self._next_slot - now, self._paused_until - now)
+
+    def reserve_slot(self) -> float:
+        """Занимает ближайший слот; возвращает, сколько ждать до него (сек)."""
+        with self._slot_lock:
+            now = time.monotonic()
+            delay = self._slot_delay(now)
+            self._next_slot = now + delay + self.interval
+            return delay
+
+    def wait_slot_sync(self) -> None:
+        """Слот для синхронного запроса (legacy get_coordinates_sync) — блокирует поток."""
+        self.counters["sync_slots"] += 1
+        delay = self.reserve_slot()
+        if delay > 0:
+            time.sleep(delay)
+
+    def _pause(self, seconds: float) -> None:
+        with self._slot_lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+    # ----- очередь -----
+
+    def _start(self) -> None:
+        loop = asyncio.get_running_loop()
+        if self._worker is not None and not self._worker.done() and self._loop is loop:
+            return
+        if self._loop is not loop:
+            # Новый event loop (скрипты с несколькими asyncio.run): очередь и клиент прежнего непригодны
+            self._heap.clear()
+            self._pending.clear()
+            self._client = None
+            self.in_flight = 0
+        self._loop = loop
+        self._wake = asyncio.Event()
+        self._slots = asyncio.Semaphore(self.max_in_flight)
+        self._worker = loop.create_task(self._run())
+
+    def _push(self, request: _Request) -> None:
+        heapq.heappush(self._heap, (_RANK[request.priority], next(self._seq), request))
+        self._wake.set()
+
+    async def get(
+        self,
+        endpoint: str,
+        params: Dict[str, Any],
+        priority: Optional[str] = None,
+        timeout: Optional[float] = None,
+    ) -> Optional[Any]:
+        """JSON ответа Nominatim (search → список, reverse → dict) или None при ошибке/таймауте."""
+        self._start()
+        priority = priority if priority in _RANK else current_priority()
+        params = {"format": "json", **params}
+        key = (endpoint, tuple(sorted((k, str(v)) for k, v in params.items())))
+        stats = self.classes[priority]
+        request = self._pending.get(key)
+        if request is None:
+            request = _Request(key, endpoint, params, priority, asyncio.get_running_loop().create_future())
+            self._pending[key] = request
+            self.counters["enqueued"] += 1
+            self._push(request)
+        else:
+            self.counters["deduped"] += 1
+            if request.queued and _RANK[priority] < _RANK[request.priority]:
+                # Ждёт старший класс — запрос поднимается (старая запись в куче пропустится)
+                request.priority = priority
+                self._push(request)
+        request.waiters += 1
+        try:
+            return await asyncio.wait_for(asyncio.shield(request.future), timeout or QUEUE_TIMEOUTS[priority])
+        except asyncio.TimeoutError:
+            stats.timeouts += 1
+            return None
+        finally:
+            request.waiters -= 1
+
+    async def search(self, query: str, **params: Any) -> Optional[List[Dict[str, Any]]]:
+        return await self.get("search", {"q": query, "limit": 1, **params})
+
+    async def reverse(self, lat: float, lon: float, **params: Any) -> Optional[Dict[str, Any]]:
+        return await self.get("reverse", {"lat": lat, "lon": lon, **params})
+
+    def _pop(self) -> Optional[_Request]:
+        while self._heap:
+            rank, _, request = heapq.heappop(self._heap)
+            if not request.queued or rank != _RANK[request.priority]:
+                continue  # уже отправлен или поднят в старший класс
+            if request.waiters <= 0:
+                # Все вызывающие перестали ждать — не тратим слот
+                self.counters["abandoned"] += 1
+                request.queued = False
+                self._finish(request, None)
+                continue
+            return request
+        return None
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            if not self._heap:
+                self._wake.clear()
+                await self._wake.wait()
+                continue
+            await self._slots.acquire()
+            # Ждём слот, не выбирая запрос: за это время может прийти более срочный
+            while True:
+                delay = self._slot_delay(time.monotonic())
+                if delay <= 0:
+                    break
+                await asyncio.sleep(delay)
+            request = self._pop()
+            if request is None:
+                self._slots.release()
+                continue
+            if self.reserve_slot() > 0:
+                # Слот перехватил синхронный вызов — запрос обратно в очередь
+                self._push(request)
+                self._slots.release()
+                continue
+            request.queued = False
+            if request.attempts == 0:
+                self.classes[request.priority].observe(time.monotonic() - request.enqueued_at)
+            loop.create_task(self._execute(request))
+
+    def _finish(self, request: _Request, result: Optional[Any]) -> None:
+        if self._pending.get(request.key) is request:
+            del self._pending[request.key]
+        if not request.future.done():
+            request.future.set_result(result)
+
+    def _retry(self, request: _Request) -> bool:
+        if request.attempts > self.max_retries:
+            return False
+        self.counters["retries"] += 1
+        request.queued = True
+        self._push(request)
+        return True
+
+    def get_client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            # Nominatim часто блокирует прокси или даёт таймауты — без прокси
+            self._client = get_http_client(
+                timeout=NOMINATIM_TIMEOUT,
+                proxy=None,
+                limits=httpx.Limits(max_connections=self.max_in_flight + 2, max_keepalive_connections=2),
+            )
+        return self._client
+
+    async def _execute(self, request: _Request) -> None:
+        request.attempts += 1
+        self.in_flight += 1
+        self.counters["sent"] += 1
+        result = None
+        try:
+            resp = await self.get_client().get(
+                f"{self.base_url}/{request.endpoint}",
+                params=request.params,
+                headers={"User-Agent": NOMINATIM_USER_AGENT},
+            )
+            if resp.status_code in (429, 503):
+                self.counters["throttled"] += 1
+                retry_after = resp.headers.get("Retry-After", "")
+                backoff = float(retry_after) if retry_after.isdigit() else min(
+                    THROTTLE_BACKOFF_MAX, THROTTLE_BACKOFF * 2 ** (request.attempts - 1)
+                )
+                self._pause(backoff)
+                logger.warning(f"⚠️ Nominatim {resp.status_code}: пауза очереди {backoff:.0f} с")
+                if self._retry(request):
+                    return
+            else:
+                resp.raise_for_status()
+                result = resp.json()
+                self.counters["ok"] += 1
+        except (httpx.TimeoutException, httpx.ConnectError) as e:
+            self.counters["errors"] += 1
+            if self._retry(request):
+                return
+            logger.warning(f"⚠️ Nominatim {request.endpoint}: {e}")
+        except Exception as e:
+            self.counters["errors"] += 1
+            logger.warning(f"⚠️ Nominatim {request.endpoint}: {e}")
+        finally:
+            self.in_flight -= 1
+            self._slots.release()
+        self._finish(request, result)
+
+    def waiting(self, priority: Optional[str] = None) -> int:
+        return sum(
+            1 for r in self._pending.values()
+            if r.queued and r.waiters > 0 and (priority is None or r.priority == priority)
+        )
+
+    def snapshot(self) -> Dict[str, Any]:
+        labels = [f"<={b}ms" for b in WAIT_BUCKETS_MS] + [f">{WAIT_BUCKETS_MS[-1]}ms"]
+        classes = {}
+        for name, s in self.classes.items():
+            classes[name] = {
+                "waiting": self.waiting(name),
+                "sent": s.granted,
+                "timeouts": s.timeouts,
+                "wait_p50_ms": round(s.percentile(50) * 1000, 1),
+                "wait_p95_ms": round(s.percentile(95) * 1000, 1),
+                "wait_histogram": dict(zip(labels, s.buckets)),
+            }
+        return {
+            "rate_per_second": round(1.0 / self.interval, 3) if self.interval else 0,
+            "in_flight": self.in_flight,
+            "waiting": self.waiting(),
+            "paused_for_s": round(max(0.0, self._paused_until - time.monotonic()), 1),
+            "classes": classes,
+            **self.counters,
+        }
+
+    def format_stats(self) -> str:
+        snap = self.snapshot()
+        parts = [
+            f"🌍 Nominatim ждут {snap['waiting']} отправлено {snap['sent']} "
+            f"объединено {snap['deduped']} 429/503 {snap['throttled']}"
+        ]
+        for name, c in snap["classes"].items():
+            parts.append(f"{name} ждут {c['waiting']} p95 {c['wait_p95_ms']:.0f}ms таймаут {c['timeouts']}")
+        return " | ".join(parts)
+
+
+_scheduler: Optional[NominatimScheduler] = None
+
+
+def get_nominatim_scheduler() -> NominatimScheduler:
+    global _scheduler
+    if _scheduler is None:
+        _scheduler = NominatimScheduler()
+    return _scheduler
@@ -0,0 +1,246 @@
+# services/publish_queue.py
+"""
+PublishQueue — исходящая очередь публикаций в Telegram-канал.
+
+- приоритет: жалобы с severity=3 обгоняют обычные, внутри приоритета — FIFO;
+  пост выбирается, когда слот отправки уже получен (токен, конец FloodWait), —
+  срочная жалоба, пришедшая за время ожидания, уходит первой
+- темп задаёт token bucket (лимиты Telegram для каналов ~20 сообщений/мин)
+- FloodWaitError паркует только эту очередь на e.seconds, конвейер приёма
+  продолжает работать; сообщение возвращается в очередь на своё место
+- повторы при ошибках с ключом идемпотентности: один ключ не отправляется дважды
+- метрики: глубина очереди, задержка от постановки до отправки, FloodWait
+"""
+
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from collections import OrderedDict, deque
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional, Tuple
+
+from telethon.errors import FloodWaitError
+
+from services.rate_limiter import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+# Telegram: в канал не более ~20 сообщений в минуту, короткий всплеск до 3
+DEFAULT_RATE_PER_MIN = 20.0
+DEFAULT_BURST = 3
+DEFAULT_MAX_RETRIES = 3
+RETRY_BASE_DELAY = 5.0
+SENT_KEYS_LIMIT = 5000
+FLOOD_WAIT_PADDING = 1.0
+
+PRIORITY_URGENT = 0
+PRIORITY_NORMAL = 1
+
+
+def priority_for_severity(severity: Optional[int]) -> int:
+    """severity=3 (серьёзная жалоба) → срочная публикация"""
+    try:
+        return PRIORITY_URGENT if int(severity) >= 3 else PRIORITY_NORMAL
+    except (TypeError, ValueError):
+        return PRIORITY_NORMAL
+
+
+@dataclass
+class PublishItem:
+    """Пост, ожидающий отправки"""
+    key: str
+    text: str
+    priority: int = PRIORITY_NORMAL
+    meta: Dict[str, Any] = field(default_factory=dict)
+    enqueued_at: float = field(default_factory=time.monotonic)
+    attempts: int = 0
+
+
+@dataclass
+class PublishStats:
+    """Статистика очереди публикаций"""
+    enqueued: int = 0
+    sent: int = 0
+    skipped: int = 0
+    deduplicated: int = 0
+    retries: int = 0
+    failed: int = 0
+    flood_waits: int = 0
+    flood_wait_seconds: float = 0.0
+    lags: Deque[float] = field(default_factory=lambda: deque(maxlen=1000))
+
+    def lag_percentile(self, q: float) -> float:
+        if not self.lags:
+            return 0.0
+        ordered = sorted(self.lags)
+        idx = min(len(ordered) - 1, max(0, int(round(q / 100.0 * (len(ordered) - 1)))))
+        return ordered[idx]
+
+
+# Отправка поста: True — отправлен, False — пропущен (например, дубликат)
+SendFunc = Callable[[PublishItem], Awaitable[bool]]
+
+
+class PublishQueue:
+    """
+    Приоритетная очередь исходящих постов с одним отправителем.
+
+    - enqueue() не ждёт отправки: стадия публикации конвейера не блокируется
+    - send(item) вызывается не чаще, чем позволяет token bucket
+    """
+
+    def __init__(
+        self,
+        send: SendFunc,
+        rate_per_min: float = DEFAULT_RATE_PER_MIN,
+        burst: int = DEFAULT_BURST,
+        max_retries: int = DEFAULT_MAX_RETRIES,
+        name: str = "publish",
+    ):
+        self.name = name
+        self._send = send
+        self._bucket = TokenBucket(rate=rate_per_min / 60.0, capacity=burst)
+        self._max_retries = max_retries
+        self._heap: List[Tuple[int, int, PublishItem]] = []
+        self._ready = asyncio.Event()
+        self._seq = itertools.count()
+        self._pending: Dict[str, PublishItem] = {}
+        self._sent_keys: "OrderedDict[str, float]" = OrderedDict()
+        self._parked_until = 0.0
+        self._task: Optional[asyncio.Task] = None
+        self.stats = PublishStats()
+
+    async def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run(), name=f"{self.name}:sender")
+
+    def enqueue(self, item: PublishItem) -> bool:
+        """Ставит пост в очередь. False, если ключ уже отправлен или ожидает отправки."""
+        if item.key in self._sent_keys or item.key in self._pending:
+            self.stats.deduplicated += 1
+            return False
+        self._pending[item.key] = item
+        self._push(item, next(self._seq))
+        self.stats.enqueued += 1
+        return True
+
+    def _push(self, item: PublishItem, seq: int) -> None:
+        heapq.heappush(self._heap, (item.priority, seq, item))
+        self._ready.set()
+
+    def _requeue(self, item: PublishItem, seq: int) -> None:
+        # Возвращаем с прежним порядковым номером — пост не теряет место в очереди
+        self._push(item, seq)
+
+    async def _run(self) -> None:
+        while True:
+            while not self._heap:
+                self._ready.clear()
+                await self._ready.wait()
+            # Сначала слот (конец FloodWait, токен), потом выбор поста: за время
+            # ожидания мог прийти более срочный
+            park = self._parked_until - time.monotonic()
+            if park > 0:
+                await asyncio.sleep(park)
+            await self._bucket.acquire()
+            _, seq, item = heapq.heappop(self._heap)
+            await self._deliver(item, seq)
+
+    async def _deliver(self, item: PublishItem, seq: int) -> None:
+        item.attempts += 1
+        try:
+            sent = await self._send(item)
+        except asyncio.CancelledError:
+            raise
+        except FloodWaitError as e:
+            wait = float(e.seconds) + FLOOD_WAIT_PADDING
+            self._parked_until = time.monotonic() + wait
+            self._bucket.drain()
+            self.stats.flood_waits += 1
+            self.stats.flood_wait_seconds += wait
+            item.attempts -= 1  # FloodWait — не ошибка поста
+            logger.warning(f"⏸️ FloodWait {e.seconds}с: очередь публикаций на паузе ({len(self._heap) + 1} в очереди)")
+            self._requeue(item, seq)
+            return
+        except Exception as e:
+            if item.attempts <= self._max_retries:
+                self.stats.retries += 1
+                delay = RETRY_BASE_DELAY * 2 ** (item.attempts - 1)
+                logger.warning(f"⚠️ Публикация {item.key}: {e} — повтор {item.attempts}/{self._max_retries} через {delay:.0f}с")
+                asyncio.get_running_loop().call_later(delay, self._requeue, item, seq)
+                return
+            self.stats.failed += 1
+            self._pending.pop(item.key, None)
+            logger.error(f"❌ Публикация {item.key}: {e} — попытки исчерпаны")
+            return
+
+        self._pending.pop(item.key, None)
+        if not sent:
+            self.stats.skipped += 1
+            return
+        self.stats.sent += 1
+        self.stats.lags.append(time.monotonic() - item.enqueued_at)
+        self._sent_keys[item.key] = time.time()
+        while len(self._sent_keys) > SENT_KEYS_LIMIT:
+            self._sent_keys.popitem(last=False)
+
+    async def stop(self, drain: bool = True, timeout: Optional[float] = 30.0) -> None:
+        """Останавливает отправителя; при drain=True сначала ждёт опустошения очереди."""
+        if self._task is None:
+            return
+        if drain and self._pending:
+            try:
+                await asyncio.wait_for(self._drained(), timeout=timeout)
+            except asyncio.TimeoutError:
+                logger.warning(f"⚠️ Очередь публикаций: не отправлено {len(self._pending)} постов за {timeout}с")
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+
+    async def _drained(self) -> None:
+        # Ждём и отложенные повторы (их ещё нет в очереди, но они в _pending)
+        while self._pending:
+            await asyncio.sleep(0.2)
+
+    def depth(self) -> int:
+        return len(self._pending)
+
+    @property
+    def parked_for(self) -> float:
+        """Сколько ещё секунд очередь на паузе из-за FloodWait"""
+        return max(0.0, self._parked_until - time.monotonic())
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Метрики очереди"""
+        s = self.stats
+        oldest = min((i.enqueued_at for i in self._pending.values()), default=None)
+        return {
+            "depth": self.depth(),
+            "urgent": sum(1 for i in self._pending.values() if i.priority == PRIORITY_URGENT),
+            "oldest_wait_s": round(time.monotonic() - oldest, 1) if oldest is not None else 0.0,
+            "parked_s": round(self.parked_for, 1),
+            "enqueued": s.enqueued,
+            "sent": s.sent,
+            "skipped": s.skipped,
+            "deduplicated": s.deduplicated,
+            "retries": s.retries,
+            "failed": s.failed,
+            "flood_waits": s.flood_waits,
+            "flood_wait_s": round(s.flood_wait_seconds, 1),
+            "lag_p50_s": round(s.lag_percentile(50), 2),
+            "lag_p95_s": round(s.lag_percentile(95), 2),
+            "lag_max_s": round(max(s.lags), 2) if s.lags else 0.0,
+        }
+
+    def format_stats(self) -> str:
+        snap = self.snapshot()
+        line = (
+            f"📤 Очередь публикаций: {snap['depth']} (срочных {snap['urgent']}), "
+            f"отправлено {snap['sent']}, лаг p50 {snap['lag_p50_s']}с p95 {snap['lag_p95_s']}с, "
+            f"FloodWait {snap['flood_waits']}"
+        )
+        if snap["parked_s"]:
+            line += f", пауза ещё {snap['parked_s']}с"
+        return line
@@ -0,0 +1,203 @@
+# services/published_index.py
+"""
+PublishedIndex — локальный индекс уже опубликованных в @monitornv постов.
+
+Заменяет проверку дубликатов через скачивание последних сообщений канала:
+ключи (сводка, адрес, округлённые координаты) хранятся в памяти и в SQLite,
+записи старше окна (по умолчанию 24 ч) истекают. При запуске индекс один раз
+дополняется из истории канала.
+"""
+
+import logging
+import os
+import re
+import sqlite3
+import time
+from datetime import datetime
+from typing import Dict, Iterable, Optional, Tuple
+
+from core.config import STATE_DIR
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_WINDOW_HOURS = 24
+SUMMARY_KEY_LEN = 50  # Сравниваем первые 50 символов сводки (как раньше)
+
+# Строки поста (см. publish_to_telegram в start_all_monitoring.py)
+_SUMMARY_RE = re.compile(r"^📝\s*(.+)$", re.MULTILINE)
+_ADDRESS_RE = re.compile(r"^📍\s*(.+)$", re.MULTILINE)
+_COORDS_RE = re.compile(r"^🗺️?\s*(-?\d+\.\d+),\s*(-?\d+\.\d+)", re.MULTILINE)
+
+
+def _normalize(text: str) -> str:
+    t = text.lower().replace("ё", "е")
+    t = re.sub(r"\s+", " ", t)
+    return t.strip(" .,;:!?-")
+
+
+def summary_key(summary: Optional[str]) -> Optional[str]:
+    if not summary:
+        return None
+    key = _normalize(summary)[:SUMMARY_KEY_LEN].strip()
+    return key or None
+
+
+def address_key(address: Optional[str]) -> Optional[str]:
+    if not address:
+        return None
+    return _normalize(address) or None
+
+
+def coords_key(lat: Optional[float], lon: Optional[float]) -> Optional[str]:
+    if not lat or not lon:
+        return None
+    return f"{float(lat):.3f},{float(lon):.3f}"
+
+
+class PublishedIndex:
+    """
+    Индекс опубликованных постов с истечением по времени.
+
+    - is_published(): O(1) проверка по сводке, адресу или координатам
+    - add(): запоминает пост в памяти и в SQLite
+    - rebuild_from_posts(): дополняет индекс из текстов постов канала
+    """
+
+    KINDS = ("summary", "address", "coords")
+
+    def __init__(self, path: Optional[str] = None, window_hours: float = DEFAULT_WINDOW_HOURS):
+        self._path = path or os.path.join(STATE_DIR, "published_index.sqlite3")
+        self._window = window_hours * 3600
+        self._keys: Dict[Tuple[str, str], float] = {}
+        self._conn: Optional[sqlite3.Connection] = None
+        self._last_prune = 0.0
+
+    def _db(self) -> sqlite3.Connection:
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self._path) or ".", exist_ok=True)
+            self._conn = sqlite3.connect(self._path)
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS published ("
+                " kind TEXT NOT NULL, key TEXT NOT NULL, published_at REAL NOT NULL,"
+                " PRIMARY KEY (kind, key))"
+            )
+            self._conn.commit()
+        return self._conn
+
+    def load(self) -> int:
+        """Загружает из SQLite записи в пределах окна. Возвращает их количество."""
+        cutoff = time.time() - self._window
+        try:
+            db = self._db()
+            db.execute("DELETE FROM published WHERE published_at < ?", (cutoff,))
+            db.commit()
+            for kind, key, ts in db.execute("SELECT kind, key, published_at FROM published"):
+                self._keys[(kind, key)] = ts
+        except sqlite3.Error as e:
+            logger.error(f"PublishedIndex load error: {e}")
+        return len(self._keys)
+
+    def _iter_keys(self, summary, address, lat, lon):
+        for kind, key in (
+            ("summary", summary_key(summary)),
+            ("address", address_key(address)),
+            ("coords", coords_key(lat, lon)),
+        ):
+            if key:
+                yield kind, key
+
+    def is_published(
+        self,
+        summary: Optional[str],
+        address: Optional[str],
+        lat: Optional[float],
+        lon: Optional[float],
+    ) -> bool:
+        """True, если похожий пост уже публиковался в пределах окна."""
+        cutoff = time.time() - self._window
+        for kind, key in self._iter_keys(summary, address, lat, lon):
+            ts = self._keys.get((kind, key))
+            if ts is not None and ts >= cutoff:
+                return True
+        return False
+
+    def add(
+        self,
+        summary: Optional[str],
+        address: Optional[str],
+        lat: Optional[float],
+        lon: Optional[float],
+        published_at: Optional[float] = None,
+    ) -> None:
+        """Запоминает опубликованный пост."""
+        ts = published_at or time.time()
+        rows = []
+        for kind, key in self._iter_keys(summary, address, lat, lon):
+            if self._keys.get((kind, key), 0.0) < ts:
+                self._keys[(kind, key)] = ts
+                rows.append((kind, key, ts))
+        if rows:
+            try:
+                db = self._db()
+                db.executemany(
+                    "INSERT INTO published (kind, key, published_at) VALUES (?, ?, ?) "
+                    "ON CONFLICT(kind, key) DO UPDATE SET published_at = excluded.published_at",
+                    rows,
+                )
+                db.commit()
+            except sqlite3.Error as e:
+                logger.error(f"PublishedIndex write error: {e}")
+        self._maybe_prune()
+
+    def rebuild_from_posts(self, posts: Iterable[Tuple[str, Optional[datetime]]]) -> int:
+        """
+        Дополняет индекс из текстов постов канала (формат publish_to_telegram).
+        posts — пары (текст, дата публикации). Возвращает число учтённых постов.
+        """
+        cutoff = time.time() - self._window
+        count = 0
+        for text, date in posts:
+            if not text:
+                continue
+            ts = date.timestamp() if date else time.time()
+            if ts < cutoff:
+                continue
+            m_summary = _SUMMARY_RE.search(text)
+            m_address = _ADDRESS_RE.search(text)
+            m_coords = _COORDS_RE.search(text)
+            if not (m_summary or m_address or m_coords):
+                continue
+            self.add(
+                m_summary.group(1) if m_summary else None,
+                m_address.group(1) if m_address else None,
+                float(m_coords.group(1)) if m_coords else None,
+                float(m_coords.group(2)) if m_coords else None,
+                published_at=ts,
+            )
+            count += 1
+        return count
+
+    def _maybe_prune(self) -> None:
+        now = time.time()
+        if now - self._last_prune < 600:
+            return
+        self._last_prune = now
+        cutoff = now - self._window
+        expired = [k for k, ts in self._keys.items() if ts < cutoff]
+        for k in expired:
+            del self._keys[k]
+        if expired:
+            try:
+                db = self._db()
+                db.execute("DELETE FROM published WHERE published_at < ?", (cutoff,))
+                db.commit()
+            except sqlite3.Error as e:
+                logger.error(f"PublishedIndex prune error: {e}")
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def close(self) -> None:
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
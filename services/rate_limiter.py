@@ -1,9 +1,10 @@
 # services/rate_limiter.py
 """
 Rate limiting для защиты от спама и злоупотреблений
-Использует простой sliding window алгоритм
+Использует простой sliding window алгоритм; TokenBucket — для исходящих запросов
 """
 
+import asyncio
 import time
 import logging
 from typing import Dict
@@ -70,6 +71,60 @@ class RateLimiter:
             _rate_limits[key].clear()
 
 
+class TokenBucket:
+    """
+    Token bucket для исходящих запросов: rate токенов в секунду, запас до capacity.
+    acquire() ждёт появления токена, поэтому короткие всплески проходят сразу,
+    а длинные растягиваются до средней скорости rate.
+    """
+
+    def __init__(self, rate: float, capacity: float = 1.0):
+        if not rate > 0:
+            # При rate 0 токен не появится никогда — acquire() ждал бы вечно
+            raise ValueError(f"TokenBucket rate must be > 0, got {rate}")
+        self.rate = rate
+        self.capacity = max(1.0, capacity)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def try_acquire(self, tokens: float = 1.0) -> bool:
+        """Забрать токены без ожидания. False, если их недостаточно."""
+        self._refill()
+        if self._tokens >= tokens:
+            self._tokens -= tokens
+            return True
+        return False
+
+    def delay(self, tokens: float = 1.0) -> float:
+        """Сколько секунд ждать до появления tokens токенов"""
+        self._refill()
+        missing = tokens - self._tokens
+        if missing <= 0:
+            return 0.0
+        return missing / self.rate
+
+    async def acquire(self, tokens: float = 1.0) -> float:
+        """Дождаться и забрать токены. Возвращает время ожидания (сек)."""
+        waited = 0.0
+        async with self._lock:
+            while not self.try_acquire(tokens):
+                pause = self.delay(tokens)
+                waited += pause
+                await asyncio.sleep(pause)
+        return waited
+
+    def drain(self) -> None:
+        """Обнулить запас (например, после FloodWait — не отправлять пачкой сразу)"""
+        self._refill()
+        self._tokens = 0.0
+
+
 # Импорт настроек из конфигурации
 from core.config import RATE_LIMIT_COMPLAINT, RATE_LIMIT_ADMIN, RATE_LIMIT_GENERAL
 
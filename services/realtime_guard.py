@@ -2,13 +2,16 @@
 """
 RealtimeGuard — фильтрация старых сообщений и дедупликация.
 Гарантирует обработку только новых сообщений, поступивших после запуска системы.
+С хранилищем курсоров (CursorStore) запоминает последний обработанный id
+источника, чтобы после перезапуска догнать пропущенные сообщения.
 """
 
+import heapq
 import logging
 from collections import OrderedDict
 from dataclasses import dataclass
 from datetime import datetime, timezone
-from typing import Optional, Tuple
+from typing import Dict, List, Optional, Set, Tuple
 
 logger = logging.getLogger(__name__)
 
@@ -19,6 +22,7 @@ class GuardStats:
     skipped_old: int = 0
     skipped_duplicate: int = 0
     processed_count: int = 0
+    backfilled_count: int = 0
 
 
 class RealtimeGuard:
@@ -28,14 +32,25 @@ class RealtimeGuard:
     - Фильтрация по таймстемпу: пропускает только сообщения >= время запуска
     - Дедупликация по (source, message_id): не обрабатывает одно сообщение дважды
     - FIFO-очистка: при превышении max_size удаляет старейшие записи
+    - Курсоры (если передан cursor_store): на диск сохраняется нижняя граница
+      источника — наибольший id, до которого все принятые сообщения уже
+      сохранены или отброшены (release). mark_processed отмечает дубликат сразу,
+      но курсор не двигает: сообщение, ещё стоящее в очереди, при падении
+      процесса догонится после перезапуска
+    - Пока источник догоняется (begin_catch_up), курсор не уходит дальше
+      просмотренного догонкой: id живых сообщений ждут end_catch_up
     """
 
-    def __init__(self, max_size: int = 10000, trim_size: int = 5000):
+    def __init__(self, max_size: int = 10000, trim_size: int = 5000, cursor_store=None):
         self._startup_time: datetime = datetime.now(timezone.utc)
         self._processed_ids: OrderedDict = OrderedDict()
         self._max_size = max_size
         self._trim_size = trim_size
         self._stats = GuardStats()
+        self._cursors = cursor_store
+        self._catching_up: Dict[str, int] = {}  # источник → последний просмотренный догонкой id
+        self._in_flight: Dict[str, Set[int]] = {}
+        self._settled: Dict[str, List[int]] = {}  # куча id, готовых к сдвигу курсора
 
     def is_new_message(self, timestamp: Optional[datetime]) -> bool:
         """
@@ -68,11 +83,20 @@ class RealtimeGuard:
             return True
         return False
 
-    def mark_processed(self, source: str, message_id: int) -> None:
-        """Добавляет ID в множество обработанных, при необходимости очищает."""
+    def mark_processed(self, source: str, message_id: int, backfill: bool = False) -> None:
+        """
+        Добавляет ID в множество обработанных, при необходимости очищает.
+        Сообщение считается в обработке, пока не вызван release (курсор его не пройдёт).
+        """
         key: Tuple[str, int] = (source, message_id)
         self._processed_ids[key] = datetime.now(timezone.utc)
         self._stats.processed_count += 1
+        if backfill:
+            self._stats.backfilled_count += 1
+        if self._cursors is not None:
+            self._in_flight.setdefault(source, set()).add(message_id)
+            if backfill:
+                self._scanned(source, message_id)
 
         if len(self._processed_ids) > self._max_size:
             # FIFO: удаляем старейшие, оставляем trim_size
@@ -81,6 +105,71 @@ class RealtimeGuard:
                 self._processed_ids.popitem(last=False)
             logger.info(f"🧹 Очистка множества обработанных: {self._max_size} → {len(self._processed_ids)}")
 
+    # --- Курсоры и догонка ---
+
+    def release(self, source: str, message_id: int) -> None:
+        """Сообщение сохранено или отброшено конвейером: курсор может его пройти."""
+        in_flight = self._in_flight.get(source)
+        if not in_flight or message_id not in in_flight:
+            return
+        in_flight.discard(message_id)
+        self._settle(source, message_id)
+
+    def mark_skipped(self, source: str, message_id: int) -> None:
+        """Сообщение догонки пропущено без обработки (старое, дубликат): курсор может его пройти."""
+        if self._cursors is None:
+            return
+        self._scanned(source, message_id)
+        self._settle(source, message_id)
+
+    def _scanned(self, source: str, message_id: int) -> None:
+        if source in self._catching_up and message_id > self._catching_up[source]:
+            self._catching_up[source] = message_id
+
+    def _settle(self, source: str, message_id: int) -> None:
+        heapq.heappush(self._settled.setdefault(source, []), message_id)
+        self._commit(source)
+
+    def _commit(self, source: str) -> None:
+        """Курсор → наибольший готовый id ниже всех, что ещё в обработке (и не дальше догонки)."""
+        settled = self._settled.get(source)
+        if not settled or self._cursors is None:
+            return
+        in_flight = self._in_flight.get(source)
+        lowest = min(in_flight) if in_flight else None
+        # Живые сообщения во время догонки ждут её: иначе при падении посреди
+        # догонки курсор «перепрыгнет» недогнанную часть пропуска
+        limit = self._catching_up.get(source)
+        target = None
+        while settled and (lowest is None or settled[0] < lowest) and (limit is None or settled[0] <= limit):
+            target = heapq.heappop(settled)
+        if target is not None:
+            self._cursors.advance(source, target)
+
+    def cursor(self, source: str) -> Optional[int]:
+        """Последний сохранённый id источника (None — курсора ещё нет)."""
+        if self._cursors is None:
+            return None
+        return self._cursors.get(source)
+
+    def set_cursor(self, source: str, message_id: int) -> None:
+        """Ставит курсор без обработки (первый запуск: якорь на последнем сообщении)."""
+        if self._cursors is not None:
+            self._cursors.advance(source, message_id)
+
+    def begin_catch_up(self, source: str) -> None:
+        """Источник догоняется: курсор не уходит дальше просмотренного догонкой."""
+        self._catching_up[source] = self.cursor(source) or 0
+
+    def end_catch_up(self, source: str) -> None:
+        """
+        Догонка завершена: курсор может пройти и отложенные живые сообщения.
+        Прерванную догонку не завершают, а повторяют с последнего просмотренного
+        id — до тех пор курсор остаётся в пределах просмотренного.
+        """
+        self._catching_up.pop(source, None)
+        self._commit(source)
+
     @property
     def startup_time(self) -> datetime:
         """Время запуска (UTC)"""
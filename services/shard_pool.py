@@ -0,0 +1,106 @@
+# services/shard_pool.py
+"""
+ShardPool — пул процессов-воркеров с шардированием по ключу источника.
+
+Координатор (процесс с Telegram-клиентом, дедупликацией, БД и публикацией)
+раздаёт элементы воркерам через отдельные входные очереди: один источник
+всегда попадает в один и тот же процесс. Воркеры возвращают результаты и
+служебные сообщения в общую выходную очередь, которую координатор читает
+асинхронно (results()). Процессы запускаются через spawn — без общего
+состояния asyncio/Telethon с родителем.
+"""
+
+import asyncio
+import logging
+import multiprocessing as mp
+import zlib
+from typing import Any, AsyncIterator, Callable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Сообщение воркера: (тип, полезная нагрузка)
+ShardMessage = Tuple[str, Any]
+
+INPUT_QUEUE_SIZE = 200
+_STOP = None
+
+
+class ShardPool:
+    """
+    N процессов target(index, total, in_queue, out_queue, *args).
+
+    - shard_for(key): стабильный номер шарда для ключа источника
+    - send(shard, item): постановка элемента воркеру (ждёт места в очереди)
+    - results(): асинхронный поток сообщений воркеров
+    - stop(): сигнал остановки и ожидание завершения процессов
+    """
+
+    def __init__(self, workers: int, target: Callable, args: tuple = (), name: str = "shard"):
+        if workers < 1:
+            raise ValueError("ShardPool requires at least one worker")
+        self.workers = workers
+        self.name = name
+        self._target = target
+        self._args = args
+        self._ctx = mp.get_context("spawn")
+        self._inputs: List[Any] = []
+        self._output: Optional[Any] = None
+        self._processes: List[Any] = []
+        self.sent = [0] * workers
+
+    def start(self) -> None:
+        self._output = self._ctx.Queue()
+        for i in range(self.workers):
+            in_q = self._ctx.Queue(maxsize=INPUT_QUEUE_SIZE)
+            proc = self._ctx.Process(
+                target=self._target,
+                args=(i, self.workers, in_q, self._output, *self._args),
+                name=f"{self.name}-{i}",
+                daemon=True,
+            )
+            proc.start()
+            self._inputs.append(in_q)
+            self._processes.append(proc)
+        logger.info(f"🧩 {self.name}: запущено {self.workers} процессов-воркеров")
+
+    def shard_for(self, key: str) -> int:
+        return zlib.crc32((key or "").encode("utf-8")) % self.workers
+
+    async def send(self, shard: int, item: Any) -> None:
+        """Передаёт элемент воркеру; при полной очереди ждёт в пуле потоков (backpressure)."""
+        q = self._inputs[shard]
+        try:
+            q.put_nowait(item)
+        except Exception:
+            await asyncio.get_running_loop().run_in_executor(None, q.put, item)
+        self.sent[shard] += 1
+
+    async def results(self) -> AsyncIterator[ShardMessage]:
+        """Сообщения воркеров по мере поступления (до остановки пула)."""
+        loop = asyncio.get_running_loop()
+        while True:
+            message = await loop.run_in_executor(None, self._output.get)
+            if message is _STOP:
+                return
+            yield message
+
+    def alive(self) -> List[bool]:
+        return [p.is_alive() for p in self._processes]
+
+    async def stop(self, timeout: float = 30.0) -> None:
+        """Просит воркеры доработать очереди и завершиться; зависшие — terminate."""
+        loop = asyncio.get_running_loop()
+        for q in self._inputs:
+            try:
+                await loop.run_in_executor(None, q.put, _STOP)
+            except Exception:
+                pass
+        for proc in self._processes:
+            await loop.run_in_executor(None, proc.join, timeout)
+            if proc.is_alive():
+                logger.warning(f"⚠️ {proc.name}: не завершился за {timeout}с — terminate")
+                proc.terminate()
+        if self._output is not None:
+            self._output.put(_STOP)  # разблокировать results()
+        self._processes = []
+        self._inputs = []
@@ -0,0 +1,389 @@
+# services/shared_cache.py
+"""
+SharedCache — общий для всех процессов уровень кэша (AI анализ, геокодинг).
+
+Бэкенд API, start_all_monitoring.py, ultimate_bot.py и VK монитор — отдельные
+процессы; без общего уровня один и тот же пост/адрес обрабатывался бы каждым
+из них. Бэкенды:
+- SQLite (по умолчанию): STATE_DIR/shared_cache.sqlite3, WAL +
+  synchronous=NORMAL — запись без fsync, читатели не блокируют писателя.
+  Вызовы идут из корутин, поэтому set/delete не трогают файл: их пишет
+  фоновый поток пачками (одна транзакция на пачку), а чтение ждёт
+  блокировку не дольше SHARED_CACHE_READ_TIMEOUT_MS;
+- Redis: при REDIS_URL (или SHARED_CACHE_BACKEND=redis); срок жизни — EX.
+
+Значения — компактный JSON (без пробелов), больше COMPRESS_MIN_BYTES —
+zlib; первый байт задаёт формат. Ключи — "<namespace>:<key>". Ошибки
+бэкенда не пробрасываются: кэш просто промахивается.
+"""
+
+import json
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+import zlib
+from typing import Any, Dict, Optional, Tuple
+
+from core.config import STATE_DIR
+
+try:
+    import redis
+except ImportError:  # redis есть в requirements, но для SQLite-бэкенда не нужен
+    redis = None
+
+logger = logging.getLogger(__name__)
+
+REDIS_URL = os.getenv("REDIS_URL", "").strip()
+SHARED_CACHE_BACKEND = os.getenv("SHARED_CACHE_BACKEND", "").strip().lower()  # sqlite | redis | off
+SHARED_CACHE_PATH = os.getenv("SHARED_CACHE_PATH", os.path.join(STATE_DIR, "shared_cache.sqlite3"))
+SHARED_CACHE_REDIS_PREFIX = os.getenv("SHARED_CACHE_REDIS_PREFIX", "soobshio:")
+SHARED_CACHE_READ_TIMEOUT_MS = int(os.getenv("SHARED_CACHE_READ_TIMEOUT_MS", "50"))
+SHARED_CACHE_WRITE_BATCH = int(os.getenv("SHARED_CACHE_WRITE_BATCH", "256"))
+
+COMPRESS_MIN_BYTES = 256
+_RAW = b"j"
+_ZLIB = b"z"
+
+
+def encode(value: Any) -> bytes:
+    data = json.dumps(value, ensure_ascii=False, separators=(",", ":"), default=str).encode("utf-8")
+    if len(data) >= COMPRESS_MIN_BYTES:
+        packed = zlib.compress(data, 6)
+        if len(packed) < len(data):
+            return _ZLIB + packed
+    return _RAW + data
+
+
+def decode(blob: bytes) -> Any:
+    kind, data = blob[:1], blob[1:]
+    if kind == _ZLIB:
+        data = zlib.decompress(data)
+    return json.loads(data.decode("utf-8"))
+
+
+class SQLiteBackend:
+    """
+    Один файл на хост; у каждого процесса свои соединения.
+
+    Чтение — в вызывающем потоке (event loop) с коротким busy timeout: занятая
+    база — промах, а не остановка цикла. Запись — в фоновом потоке: set/delete
+    кладут операцию в очередь, поток забирает всё накопившееся и коммитит
+    одной транзакцией. Ещё не записанные значения видны get() этого процесса.
+    Удаление истёкших записей тоже уходит в фоновый поток.
+    """
+
+    name = "sqlite"
+
+    _WRITE_TIMEOUT = 5.0
+    _PURGE = object()  # маркер очереди: удалить истёкшие
+
+    def __init__(self, path: str = SHARED_CACHE_PATH, read_timeout_ms: int = SHARED_CACHE_READ_TIMEOUT_MS,
+                 write_batch: int = SHARED_CACHE_WRITE_BATCH):
+        self.path = path
+        self.read_timeout_ms = read_timeout_ms
+        self.write_batch = max(1, write_batch)
+        self._conn: Optional[sqlite3.Connection] = None
+        self._writer_conn: Optional[sqlite3.Connection] = None
+        self._write_lock = threading.Lock()
+        # key → (blob, expires_at); blob None — ожидающее удаление
+        self._pending: Dict[str, Tuple[Optional[bytes], float]] = {}
+        self._pending_lock = threading.Lock()
+        self._queue: "queue.Queue[Any]" = queue.Queue()
+        self._writer: Optional[threading.Thread] = None
+        self._pid = os.getpid()
+
+    def _open(self, timeout: float) -> sqlite3.Connection:
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=timeout, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS shared_cache ("
+            " key TEXT PRIMARY KEY, value BLOB NOT NULL, expires_at REAL NOT NULL) WITHOUT ROWID"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS shared_cache_expires ON shared_cache(expires_at)")
+        conn.commit()
+        return conn
+
+    def _check_fork(self) -> None:
+        # Соединения и поток не переживают fork (ShardPool) — в потомке открываем свои
+        if self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._conn = self._writer_conn = self._writer = None
+            self._write_lock = threading.Lock()
+            self._pending_lock = threading.Lock()
+            self._pending = {}
+            self._queue = queue.Queue()
+
+    def _db(self) -> sqlite3.Connection:
+        self._check_fork()
+        if self._conn is None:
+            # Схема создаётся с обычным таймаутом, дальше чтение ждёт не дольше read_timeout_ms
+            conn = self._open(self._WRITE_TIMEOUT)
+            conn.execute(f"PRAGMA busy_timeout={int(self.read_timeout_ms)}")
+            self._conn = conn
+        return self._conn
+
+    def _write_db(self) -> sqlite3.Connection:
+        if self._writer_conn is None:
+            self._writer_conn = self._open(self._WRITE_TIMEOUT)
+        return self._writer_conn
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._pending_lock:
+            pending = self._pending.get(key)
+        if pending is not None:
+            blob, expires_at = pending
+            return blob if blob is not None and expires_at > time.time() else None
+        row = self._db().execute(
+            "SELECT value FROM shared_cache WHERE key = ? AND expires_at > ?", (key, time.time())
+        ).fetchone()
+        return row[0] if row else None
+
+    def _put(self, item: Any) -> None:
+        if self._writer is None:
+            self._writer = threading.Thread(target=self._write_loop, name="shared-cache-writer", daemon=True)
+            self._writer.start()
+        self._queue.put(item)
+
+    def _enqueue(self, key: str, blob: Optional[bytes], expires_at: float) -> None:
+        self._check_fork()
+        with self._pending_lock:
+            self._pending[key] = (blob, expires_at)
+        self._put(key)
+
+    def set(self, key: str, blob: bytes, ttl: float) -> None:
+        self._enqueue(key, blob, time.time() + ttl)
+
+    def delete(self, key: str) -> None:
+        self._enqueue(key, None, 0.0)
+
+    def _write_loop(self) -> None:
+        q = self._queue
+        while True:
+            keys = set()
+            item = q.get()
+            while True:
+                if item is None:
+                    self._write(keys)
+                    return
+                if item is self._PURGE:
+                    self._purge()
+                else:
+                    keys.add(item)
+                if len(keys) >= self.write_batch:
+                    break
+                try:
+                    item = q.get_nowait()
+                except queue.Empty:
+                    break
+            self._write(keys)
+
+    def _write(self, keys) -> None:
+        """Пишет ожидающие значения ключей одной транзакцией."""
+        with self._pending_lock:
+            batch = [(key, self._pending[key]) for key in keys if key in self._pending]
+        if not batch:
+            return
+        try:
+            with self._write_lock:
+                db = self._write_db()
+                for key, (blob, expires_at) in batch:
+                    if blob is None:
+                        db.execute("DELETE FROM shared_cache WHERE key = ?", (key,))
+                    else:
+                        db.execute(
+                            "INSERT OR REPLACE INTO shared_cache (key, value, expires_at) VALUES (?, ?, ?)",
+                            (key, blob, expires_at),
+                        )
+                db.commit()
+        except Exception as e:
+            logger.debug(f"Shared cache batch write error ({len(batch)}): {e}")
+        finally:
+            with self._pending_lock:
+                for key, item in batch:
+                    # Значение могли обновить, пока шла запись, — тогда оно ждёт следующей пачки
+                    if self._pending.get(key) is item:
+                        del self._pending[key]
+
+    def flush(self) -> None:
+        """Синхронно записывает всё, что ещё в очереди."""
+        with self._pending_lock:
+            keys = list(self._pending)
+        if keys:
+            self._write(keys)
+
+    def clear(self, prefix: str) -> int:
+        self.flush()
+        with self._write_lock:
+            db = self._write_db()
+            # Диапазон по первичному ключу вместо LIKE: "ns:" <= key < "ns;"
+            removed = db.execute(
+                "DELETE FROM shared_cache WHERE key >= ? AND key < ?", (prefix, prefix[:-1] + chr(ord(prefix[-1]) + 1))
+            ).rowcount
+            db.commit()
+        return removed
+
+    def _purge(self) -> None:
+        try:
+            with self._write_lock:
+                db = self._write_db()
+                removed = db.execute("DELETE FROM shared_cache WHERE expires_at <= ?", (time.time(),)).rowcount
+                db.commit()
+            logger.debug(f"Shared cache: purged {removed} expired")
+        except Exception as e:
+            logger.debug(f"Shared cache purge error: {e}")
+
+    def purge_expired(self) -> int:
+        """Ставит удаление истёкших в очередь фонового потока; число удалённых — в лог (debug)."""
+        self._check_fork()
+        self._put(self._PURGE)
+        return 0
+
+    def close(self) -> None:
+        if self._writer is not None and self._pid == os.getpid():
+            self._queue.put(None)
+            self._writer.join(timeout=self._WRITE_TIMEOUT)
+            self._writer = None
+        self.flush()
+        for conn in (self._conn, self._writer_conn):
+            if conn is not None:
+                conn.close()
+        self._conn = self._writer_conn = None
+
+
+class RedisBackend:
+    """Redis: общий для процессов и хостов; истечение — средствами Redis."""
+
+    name = "redis"
+
+    def __init__(self, url: str = REDIS_URL, prefix: str = SHARED_CACHE_REDIS_PREFIX):
+        self.prefix = prefix
+        self._client = redis.Redis.from_url(url, socket_timeout=0.5, socket_connect_timeout=0.5)
+        self._client.ping()
+
+    def get(self, key: str) -> Optional[bytes]:
+        return self._client.get(self.prefix + key)
+
+    def set(self, key: str, blob: bytes, ttl: float) -> None:
+        self._client.set(self.prefix + key, blob, ex=max(1, int(ttl)))
+
+    def delete(self, key: str) -> None:
+        self._client.delete(self.prefix + key)
+
+    def clear(self, prefix: str) -> int:
+        keys = list(self._client.scan_iter(match=f"{self.prefix}{prefix}*", count=500))
+        return self._client.delete(*keys) if keys else 0
+
+    def purge_expired(self) -> int:
+        return 0
+
+    def close(self) -> None:
+        self._client.close()
+
+
+def _make_backend():
+    backend = SHARED_CACHE_BACKEND or ("redis" if REDIS_URL else "sqlite")
+    if backend == "off":
+        return None
+    if backend == "redis":
+        if redis is None:
+            logger.warning("⚠️ Общий кэш: пакет redis не установлен — SQLite")
+        elif not REDIS_URL:
+            logger.warning("⚠️ Общий кэш: REDIS_URL не задан — SQLite")
+        else:
+            try:
+                return RedisBackend()
+            except Exception as e:
+                logger.warning(f"⚠️ Общий кэш: Redis недоступен ({e}) — SQLite")
+    return SQLiteBackend()
+
+
+class SharedCache:
+    """Пространства имён поверх бэкенда + кодек + счётчики."""
+
+    def __init__(self, backend=None):
+        self.backend = backend
+        self.counters: Dict[str, int] = {"hits": 0, "misses": 0, "writes": 0, "errors": 0, "bytes_written": 0}
+
+    def get(self, namespace: str, key: str) -> Optional[Any]:
+        if self.backend is None:
+            return None
+        try:
+            blob = self.backend.get(f"{namespace}:{key}")
+            value = decode(blob) if blob is not None else None
+        except Exception as e:
+            self.counters["errors"] += 1
+            logger.debug(f"Shared cache read error ({namespace}): {e}")
+            value = None
+        self.counters["hits" if value is not None else "misses"] += 1
+        return value
+
+    def set(self, namespace: str, key: str, value: Any, ttl: float) -> None:
+        if self.backend is None or ttl <= 0:
+            return
+        try:
+            blob = encode(value)
+            self.backend.set(f"{namespace}:{key}", blob, ttl)
+        except Exception as e:
+            self.counters["errors"] += 1
+            logger.debug(f"Shared cache write error ({namespace}): {e}")
+            return
+        self.counters["writes"] += 1
+        self.counters["bytes_written"] += len(blob)
+
+    def delete(self, namespace: str, key: str) -> None:
+        if self.backend is None:
+            return
+        try:
+            self.backend.delete(f"{namespace}:{key}")
+        except Exception as e:
+            self.counters["errors"] += 1
+            logger.debug(f"Shared cache delete error ({namespace}): {e}")
+
+    def clear(self, namespace: str) -> int:
+        if self.backend is None:
+            return 0
+        try:
+            return self.backend.clear(f"{namespace}:")
+        except Exception as e:
+            self.counters["errors"] += 1
+            logger.debug(f"Shared cache clear error ({namespace}): {e}")
+            return 0
+
+    def purge_expired(self) -> int:
+        if self.backend is None:
+            return 0
+        try:
+            return self.backend.purge_expired()
+        except Exception as e:
+            self.counters["errors"] += 1
+            logger.debug(f"Shared cache purge error: {e}")
+            return 0
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.counters["hits"] + self.counters["misses"]
+        return {
+            "backend": self.backend.name if self.backend is not None else "off",
+            "hit_rate": round(self.counters["hits"] / lookups, 3) if lookups else 0.0,
+            **self.counters,
+        }
+
+    def close(self) -> None:
+        if self.backend is not None:
+            self.backend.close()
+
+
+_cache: Optional[SharedCache] = None
+
+
+def get_shared_cache() -> SharedCache:
+    global _cache
+    if _cache is None:
+        _cache = SharedCache(_make_backend())
+        if _cache.backend is not None:
+            logger.info(f"🗄️ Общий кэш: {_cache.backend.name}")
+    return _cache
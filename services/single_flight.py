@@ -0,0 +1,69 @@
+# services/single_flight.py
+"""
+SingleFlight — склейка одновременных одинаковых запросов.
+
+Один и тот же пост приходит из нескольких каналов почти одновременно, а кэш
+записывается только после ответа первого запроса. SingleFlight.do(key, factory)
+запускает factory() один раз на ключ: остальные вызовы с тем же ключом, пока
+запрос в полёте, ждут тот же результат (или ту же ошибку). Запрос идёт
+отдельной задачей — отмена одного из ждущих не отменяет его для остальных.
+
+Результаты-словари вызывающие часто дополняют на месте, поэтому по умолчанию
+каждый получает свою копию (clone=copy.deepcopy); для неизменяемых значений
+clone=None.
+"""
+
+import asyncio
+import copy
+import logging
+from typing import Any, Awaitable, Callable, Dict, Generic, Hashable, Optional, TypeVar
+
+logger = logging.getLogger(__name__)
+
+R = TypeVar("R")
+
+
+class SingleFlight(Generic[R]):
+    """Не больше одного запроса в полёте на ключ."""
+
+    def __init__(self, name: str = "flight", clone: Optional[Callable[[Any], Any]] = copy.deepcopy):
+        self.name = name
+        self._clone = clone
+        self._inflight: Dict[Hashable, asyncio.Task] = {}
+        self._waiters: Dict[Hashable, int] = {}
+        self.calls = 0
+        self.coalesced = 0
+        self.max_waiters = 0
+
+    async def do(self, key: Hashable, factory: Callable[[], Awaitable[R]]) -> R:
+        self.calls += 1
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.get_running_loop().create_task(factory())
+            self._inflight[key] = task
+            self._waiters[key] = 1
+            task.add_done_callback(lambda _t, k=key: self._done(k, _t))
+        else:
+            self.coalesced += 1
+            self._waiters[key] += 1
+            self.max_waiters = max(self.max_waiters, self._waiters[key])
+            logger.debug(f"{self.name}: ждём запрос в полёте ({self._waiters[key]} ожидающих)")
+        result = await asyncio.shield(task)
+        return self._clone(result) if self._clone is not None and result is not None else result
+
+    def _done(self, key: Hashable, task: asyncio.Task) -> None:
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+            self._waiters.pop(key, None)
+        # Ошибку забирают ждущие; если все отменились — не шумим «exception never retrieved»
+        if not task.cancelled():
+            task.exception()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "calls": self.calls,
+            "coalesced": self.coalesced,
+            "coalesce_rate": round(self.coalesced / self.calls, 3) if self.calls else 0.0,
+            "max_waiters": self.max_waiters,
+            "inflight": len(self._inflight),
+        }
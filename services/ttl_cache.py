@@ -0,0 +1,154 @@
+# services/ttl_cache.py
+"""
+TTLCache — in-process кэш с истечением срока через min-heap.
+
+- get/set — O(1) по словарю + O(log n) на запись в кучу сроков;
+- истёкшие записи снимаются с вершины кучи понемногу при каждом обращении
+  (не более EXPIRE_BATCH за раз), поэтому полного обхода кэша нет никогда;
+- вытеснение LRU по числу записей (maxsize) и/или суммарному весу (max_weight);
+- счётчики hits/misses/expired/evicted ведутся на лету — stats() за O(1).
+"""
+
+import heapq
+import itertools
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Generic, Hashable, Iterator, List, Optional, Tuple, TypeVar
+
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+
+EXPIRE_BATCH = 32
+_MISSING = object()
+
+
+class TTLCache(Generic[K, V]):
+    """LRU + TTL (в т.ч. свой TTL на запись), ограничение по количеству и весу."""
+
+    def __init__(
+        self,
+        maxsize: Optional[int] = None,
+        ttl: float = 3600.0,
+        max_weight: Optional[int] = None,
+        weigh: Optional[Callable[[V], int]] = None,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.max_weight = max_weight
+        self._weigh = weigh
+        self._clock = clock
+        # key → (value, expires_at, weight); порядок = LRU (старые в начале)
+        self._data: "OrderedDict[K, Tuple[V, float, int]]" = OrderedDict()
+        self._heap: List[Tuple[float, int, K]] = []
+        self._seq = itertools.count()
+        self.weight = 0
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evicted = 0
+        self.sets = 0
+
+    def _drop(self, key: K) -> None:
+        _, _, weight = self._data.pop(key)
+        self.weight -= weight
+
+    def expire(self, limit: Optional[int] = None) -> int:
+        """Снимает истёкшие записи с вершины кучи (не больше limit). O(k log n)."""
+        now = self._clock()
+        removed = 0
+        heap = self._heap
+        while heap and heap[0][0] <= now and (limit is None or removed < limit):
+            expires_at, _, key = heapq.heappop(heap)
+            entry = self._data.get(key)
+            # Запись могла быть перезаписана с новым сроком или уже удалена
+            if entry is not None and entry[1] == expires_at:
+                self._drop(key)
+                self.expired += 1
+                removed += 1
+        # Ленивые удаления копят устаревшие элементы кучи — изредка перестраиваем
+        if len(heap) > 2 * len(self._data) + 64:
+            self._heap = [(exp, next(self._seq), k) for k, (_, exp, _) in self._data.items()]
+            heapq.heapify(self._heap)
+        return removed
+
+    def get(self, key: K, default: Any = None) -> Any:
+        self.expire(EXPIRE_BATCH)
+        entry = self._data.get(key)
+        if entry is None:
+            self.misses += 1
+            return default
+        if entry[1] <= self._clock():
+            self._drop(key)
+            self.expired += 1
+            self.misses += 1
+            return default
+        self._data.move_to_end(key)
+        self.hits += 1
+        return entry[0]
+
+    def set(self, key: K, value: V, ttl: Optional[float] = None) -> None:
+        self.expire(EXPIRE_BATCH)
+        expires_at = self._clock() + (self.ttl if ttl is None else ttl)
+        weight = self._weigh(value) if self._weigh else 0
+        if key in self._data:
+            self._drop(key)
+        self._data[key] = (value, expires_at, weight)
+        self.weight += weight
+        heapq.heappush(self._heap, (expires_at, next(self._seq), key))
+        self.sets += 1
+        while self._data and (
+            (self.maxsize is not None and len(self._data) > self.maxsize)
+            or (self.max_weight is not None and self.weight > self.max_weight and len(self._data) > 1)
+        ):
+            oldest = next(iter(self._data))
+            self._drop(oldest)
+            self.evicted += 1
+
+    def pop(self, key: K, default: Any = None) -> Any:
+        entry = self._data.get(key)
+        if entry is None:
+            return default
+        self._drop(key)
+        return entry[0]
+
+    def clear(self) -> int:
+        size = len(self._data)
+        self._data.clear()
+        self._heap.clear()
+        self.weight = 0
+        return size
+
+    def __contains__(self, key: K) -> bool:
+        entry = self._data.get(key)
+        return entry is not None and entry[1] > self._clock()
+
+    def __getitem__(self, key: K) -> V:
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            raise KeyError(key)
+        return value
+
+    def __setitem__(self, key: K, value: V) -> None:
+        self.set(key, value)
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __iter__(self) -> Iterator[K]:
+        return iter(list(self._data))
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "weight": self.weight,
+            "max_weight": self.max_weight,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            "expired": self.expired,
+            "evicted": self.evicted,
+            "sets": self.sets,
+        }
@@ -24,6 +24,7 @@ from aiogram.types import (
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 # Импорты сервисов
+from services.ai_scheduler import INTERACTIVE, ai_lane
 from services.geo_service import get_coordinates
 from services.realtime_guard import RealtimeGuard
 from services.supabase_service import (
@@ -287,7 +288,8 @@ async def handle_complaint_text(message: Message, state: FSMContext, text_overri
 
     wait_msg = await message.answer("🤖 Анализирую...")
     try:
-        result = await analyze_complaint(text)
+        with ai_lane(INTERACTIVE):
+            result = await analyze_complaint(text)
         if not result or not result.get("relevant", True):
             await wait_msg.edit_text("🤔 Это не похоже на городскую проблему. Опишите конкретнее.")
             return
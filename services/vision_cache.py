@@ -0,0 +1,220 @@
+# services/vision_cache.py
+"""
+VisionCache — кэш результатов анализа фото по содержимому изображения.
+
+Ключ точного совпадения — SHA-256 декодированных байтов файла. Дополнительно
+для каждого фото считается dHash (64 бита, Pillow): то же фото, пересжатое
+или уменьшенное при репосте, отличается от оригинала лишь в нескольких битах
+и находится через HammingIndex. Ответ модели зависит и от текста запроса
+(подписи к фото), поэтому пространство ключей — модель + хеш нормализованного
+текста (prompt_namespace). Записи хранятся в SQLite
+(STATE_DIR/vision_cache.sqlite3) и переживают перезапуск.
+"""
+
+import hashlib
+import io
+import json
+import logging
+import os
+import sqlite3
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from PIL import Image
+
+from core.config import STATE_DIR
+from services.fingerprint import HammingIndex
+
+logger = logging.getLogger(__name__)
+
+VISION_CACHE_TTL_DAYS = float(os.getenv("VISION_CACHE_TTL_DAYS", "30"))
+VISION_CACHE_MAX_ENTRIES = int(os.getenv("VISION_CACHE_MAX_ENTRIES", "20000"))
+VISION_DHASH_MAX_DISTANCE = int(os.getenv("VISION_DHASH_MAX_DISTANCE", "4"))
+
+# Почти однотонные картинки дают вырожденный dHash — по нему не сопоставляем
+_MIN_DHASH_BITS = 6
+# Допустимое расхождение пропорций при поиске по dHash (ресайз сохраняет пропорции)
+_ASPECT_TOLERANCE = 0.08
+
+
+def image_digest(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def prompt_namespace(model: str, text: Optional[str]) -> str:
+    """Модель + хеш текста запроса (регистр и пробелы не различаются) — аргумент model для lookup/store."""
+    normalized = " ".join((text or "").lower().replace("ё", "е").split())
+    return f"{model}:{hashlib.sha256(normalized.encode('utf-8')).hexdigest()[:16]}"
+
+
+def image_dhash(data: bytes) -> Optional[Tuple[int, float]]:
+    """(dHash 64 бита, ширина/высота) или None, если изображение не читается."""
+    try:
+        with Image.open(io.BytesIO(data)) as img:
+            width, height = img.size
+            small = img.convert("L").resize((9, 8), Image.LANCZOS)
+            pixels = list(small.getdata())
+    except Exception as e:
+        logger.debug(f"dHash: не удалось прочитать изображение: {e}")
+        return None
+    value = 0
+    for row in range(8):
+        for col in range(8):
+            if pixels[row * 9 + col] > pixels[row * 9 + col + 1]:
+                value |= 1 << (row * 8 + col)
+    return value, (width / height if height else 0.0)
+
+
+def _to_signed(value: int) -> int:
+    return value - (1 << 64) if value >= 1 << 63 else value
+
+
+def _to_unsigned(value: int) -> int:
+    return value + (1 << 64) if value < 0 else value
+
+
+class VisionCache:
+    """Точный (sha256) + перцептивный (dHash) поиск результата по фото."""
+
+    def __init__(self, path: Optional[str] = None, max_entries: int = VISION_CACHE_MAX_ENTRIES):
+        self._path = path or os.path.join(STATE_DIR, "vision_cache.sqlite3")
+        self.max_entries = max_entries
+        self._conn: Optional[sqlite3.Connection] = None
+        # ключ "model:digest" → (payload json, expires_at, aspect)
+        self._entries: "OrderedDict[str, Tuple[str, float, float]]" = OrderedDict()
+        self._index: HammingIndex[str] = HammingIndex(max_distance=VISION_DHASH_MAX_DISTANCE)
+        self._loaded = False
+        self.counters: Dict[str, int] = {
+            "hits_exact": 0, "hits_perceptual": 0, "misses": 0, "writes": 0, "evictions": 0,
+        }
+
+    def _db(self) -> sqlite3.Connection:
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self._path) or ".", exist_ok=True)
+            self._conn = sqlite3.connect(self._path, timeout=5.0)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS vision_cache ("
+                " key TEXT PRIMARY KEY, dhash INTEGER, aspect REAL NOT NULL, payload TEXT NOT NULL,"
+                " expires_at REAL NOT NULL, created_at REAL NOT NULL)"
+            )
+            self._conn.commit()
+        return self._conn
+
+    def _load(self) -> None:
+        if self._loaded:
+            return
+        self._loaded = True
+        now = time.time()
+        try:
+            db = self._db()
+            db.execute("DELETE FROM vision_cache WHERE expires_at <= ?", (now,))
+            db.commit()
+            rows = db.execute(
+                "SELECT key, dhash, aspect, payload, expires_at FROM vision_cache "
+                "ORDER BY created_at DESC LIMIT ?", (self.max_entries,)
+            ).fetchall()
+        except sqlite3.Error as e:
+            logger.error(f"VisionCache load error: {e}")
+            return
+        for key, dhash, aspect, payload, expires_at in reversed(rows):
+            self._remember(key, None if dhash is None else _to_unsigned(dhash), aspect, payload, expires_at)
+        if rows:
+            logger.info(f"🖼️ Кэш vision: загружено {len(rows)} записей")
+
+    def _remember(self, key: str, dhash: Optional[int], aspect: float, payload: str, expires_at: float) -> None:
+        self._entries.pop(key, None)
+        self._entries[key] = (payload, expires_at, aspect)
+        if dhash is not None and _MIN_DHASH_BITS <= bin(dhash).count("1") <= 64 - _MIN_DHASH_BITS:
+            self._index.add(key, dhash)
+        while len(self._entries) > self.max_entries:
+            old, _ = self._entries.popitem(last=False)
+            self._index.remove(old)
+            self.counters["evictions"] += 1
+
+    def _live(self, key: str, now: float) -> Optional[Tuple[str, float, float]]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry[1] <= now:
+            self._entries.pop(key, None)
+            self._index.remove(key)
+            return None
+        return entry
+
+    def lookup(self, data: bytes, model: str) -> Optional[Dict[str, Any]]:
+        """Результат для изображения (тот же файл или перцептивно то же фото) или None."""
+        self._load()
+        now = time.time()
+        entry = self._live(f"{model}:{image_digest(data)}", now)
+        if entry is not None:
+            self.counters["hits_exact"] += 1
+            return json.loads(entry[0])
+
+        fingerprint = image_dhash(data)
+        if fingerprint is not None:
+            dhash, aspect = fingerprint
+            prefix = f"{model}:"
+            for key, distance in self._index.query(dhash):
+                if not key.startswith(prefix):
+                    continue
+                candidate = self._live(key, now)
+                if candidate is None:
+                    continue
+                if aspect and candidate[2] and abs(aspect / candidate[2] - 1) > _ASPECT_TOLERANCE:
+                    continue
+                self.counters["hits_perceptual"] += 1
+                logger.debug(f"Vision cache: перцептивное совпадение (d={distance})")
+                return json.loads(candidate[0])
+
+        self.counters["misses"] += 1
+        return None
+
+    def store(self, data: bytes, model: str, result: Dict[str, Any]) -> None:
+        self._load()
+        key = f"{model}:{image_digest(data)}"
+        fingerprint = image_dhash(data)
+        dhash, aspect = fingerprint if fingerprint is not None else (None, 0.0)
+        now = time.time()
+        expires_at = now + VISION_CACHE_TTL_DAYS * 86400
+        payload = json.dumps(result, ensure_ascii=False, default=str)
+        self._remember(key, dhash, aspect, payload, expires_at)
+        self.counters["writes"] += 1
+        try:
+            db = self._db()
+            db.execute(
+                "INSERT OR REPLACE INTO vision_cache (key, dhash, aspect, payload, expires_at, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (key, None if dhash is None else _to_signed(dhash), aspect, payload, expires_at, now),
+            )
+            db.commit()
+        except sqlite3.Error as e:
+            logger.debug(f"VisionCache write error: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.counters["hits_exact"] + self.counters["hits_perceptual"] + self.counters["misses"]
+        hits = lookups - self.counters["misses"]
+        return {
+            "entries": len(self._entries),
+            "indexed": len(self._index),
+            "max_entries": self.max_entries,
+            "hit_rate": round(hits / lookups, 3) if lookups else 0.0,
+            **self.counters,
+        }
+
+    def close(self) -> None:
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+
+_cache: Optional[VisionCache] = None
+
+
+def get_vision_cache() -> VisionCache:
+    global _cache
+    if _cache is None:
+        _cache = VisionCache()
+    return _cache
@@ -1,17 +1,26 @@
 # services/vk_monitor_service.py
 """
 Мониторинг VK пабликов Нижневартовска
-Polling wall.get → AI анализ → фильтрация → SQLite + Telegram
+Polling wall.get → фильтрация → AI анализ → SQLite + Telegram
+
+Стены всех групп запрашиваются пакетно через execute (до 25 wall.get за вызов),
+новые посты определяются по курсорам vk:<group_id> в CursorStore (переживают
+перезапуск), а интервал опроса каждой группы подстраивается под её частоту постов.
 """
 
 import asyncio
 import logging
 import os
 import re
+import time
+from dataclasses import dataclass
 from datetime import datetime
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Set, Tuple
 
 from core.http_client import get_http_client
+from services.cursor_store import CursorStore
+from services.keyword_matcher import hit_count
+from services.message_filters import scan as scan_keywords
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -46,51 +55,34 @@ VK_GROUPS = [
 ]
 
 
-# Хранилище последних обработанных постов (post_id → timestamp)
-_last_post_ids: Dict[int, int] = {}  # group_id → last_post_id
-_processed_posts: set = set()  # множество обработанных post_id
+# Пакетный опрос: execute выполняет до 25 вызовов API за один запрос
+VK_EXECUTE_BATCH = 25
+WALL_FETCH_COUNT = 10
+WALL_MAX_PAGES = 3  # страниц на группу за цикл, если вся страница — новые посты
 
-# Правила фильтрации VK постов
-VK_AD_KEYWORDS = [
-    "реклама", "промокод", "скидк", "акция", "распродаж", "купи", "закажи",
-    "доставк", "интернет-магазин", "розыгрыш", "конкурс", "приз",
-    "кредит", "займ", "ипотек", "инвестиц", "казино", "ставк", "букмекер",
-    "продаётся", "продается", "сдаётся", "сдается", "аренд",
-    "вакансия", "требуется сотрудник", "гороскоп", "знакомств",
-    "подписывайтесь", "подпишись", "переходи по ссылке",
-    "taplink", "inst:", "whatsapp",
-]
+# Адаптивный интервал опроса группы (сек) по наблюдаемой частоте постов
+VK_POLL_MIN_INTERVAL = float(os.getenv("VK_POLL_MIN_INTERVAL", "30"))
+VK_POLL_MAX_INTERVAL = float(os.getenv("VK_POLL_MAX_INTERVAL", "600"))
+RATE_EWMA_ALPHA = 0.3
+POSTS_PER_POLL_TARGET = 0.5  # опрашивать примерно вдвое чаще, чем выходят посты
 
-VK_COMPLAINT_MARKERS = [
-    "проблем", "жалоб", "не работает", "сломан", "разбит", "поломк",
-    "авари", "прорыв", "затоп", "течь", "течёт", "протечк",
-    "яма", "выбоин", "колея", "трещин",
-    "не убира", "не чист", "грязн", "мусор", "свалк",
-    "не горит", "не свет", "темно", "фонар",
-    "опасн", "угроз", "вандал", "хулиган",
-    "пожар", "взрыв", "обрушен", "провал",
-    "запах", "вонь", "дым", "загрязн",
-    "холодн", "не греет", "отключ",
-    "просим", "требуем", "когда", "сколько можно", "надоело",
-    "помогите", "обратите внимание", "срочно",
-    "ДТП", "дтп", "столкнов", "наезд",
-    "лифт не работ", "подъезд", "домофон",
-    "детск площадк", "качел", "горк",
-    "автобус не", "маршрут отмен",
-]
+# Догонка после перезапуска: посты старше startup_time - N часов пропускаются
+VK_BACKFILL_MAX_AGE_HOURS = float(os.getenv("VK_BACKFILL_MAX_AGE_HOURS", "24"))
+
+# Правила фильтрации VK постов: таблицы ключевых слов — в services/message_filters.py
 
 MIN_TEXT_LENGTH = 30  # Минимальная длина поста для анализа
 
 
-def is_vk_ad(text: str) -> bool:
+def is_vk_ad(text: str, hits: Optional[Dict[str, Set[str]]] = None) -> bool:
     """Проверяет, является ли VK пост рекламой"""
-    t = text.lower()
-    ad_count = sum(1 for kw in VK_AD_KEYWORDS if kw in t)
+    if hits is None:
+        hits = scan_keywords(text)
+    ad_count = hit_count(hits, "vk_ad")
     if ad_count >= 2:
         return True
     # Явные маркеры рекламы
-    if any(kw in t for kw in ["промокод", "казино", "букмекер", "гороскоп", "taplink",
-                               "продаётся", "продается", "сдаётся", "сдается"]):
+    if "vk_ad_strong" in hits:
         return True
     # Много ссылок — скорее всего реклама
     url_count = len(re.findall(r'https?://\S+', text))
@@ -99,17 +91,20 @@ def is_vk_ad(text: str) -> bool:
     return False
 
 
-def has_vk_complaint_markers(text: str) -> bool:
+def has_vk_complaint_markers(text: str, hits: Optional[Dict[str, Set[str]]] = None) -> bool:
     """Проверяет наличие маркеров жалобы в VK посте"""
-    t = text.lower()
-    return any(m in t for m in VK_COMPLAINT_MARKERS)
+    if hits is None:
+        hits = scan_keywords(text)
+    return "vk_complaint" in hits
 
 
-def is_vk_relevant(text: str, category: str) -> bool:
+def is_vk_relevant(text: str, category: str, hits: Optional[Dict[str, Set[str]]] = None) -> bool:
     """Определяет релевантность VK поста"""
     if len(text.strip()) < MIN_TEXT_LENGTH:
         return False
-    if is_vk_ad(text):
+    if hits is None:
+        hits = scan_keywords(text)
+    if is_vk_ad(text, hits):
         return False
     relevant_cats = [
         "ЖКХ", "Дороги", "Благоустройство", "Транспорт", "Экология",
@@ -121,7 +116,7 @@ def is_vk_relevant(text: str, category: str) -> bool:
     ]
     if category in relevant_cats:
         return True
-    if has_vk_complaint_markers(text):
+    if has_vk_complaint_markers(text, hits):
         return True
     return False
 
@@ -207,40 +202,6 @@ async def fetch_group_wall(group_id: int, count: int = 10) -> List[dict]:
     return [p for p in items if p.get("date", 0) >= today_ts]
 
 
-async def fetch_new_posts(group_id: int) -> List[dict]:
-    """Получает только новые посты за сегодня (которые ещё не обработаны)"""
-    posts = await fetch_group_wall(group_id, count=10)
-    new_posts = []
-
-    # Начало текущего дня (00:00 UTC)
-    today_start = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
-    today_ts = int(today_start.timestamp())
-
-    for post in posts:
-        post_id = post.get("id", 0)
-        post_ts = post.get("date", 0)
-        unique_key = f"{group_id}_{post_id}"
-
-        # Пропускаем старые посты (до начала текущего дня)
-        if post_ts < today_ts:
-            continue
-
-        # Пропускаем уже обработанные
-        if unique_key in _processed_posts:
-            continue
-
-        _processed_posts.add(unique_key)
-        new_posts.append(post)
-
-    # Ограничиваем размер множества
-    if len(_processed_posts) > 5000:
-        recent = list(_processed_posts)[-2500:]
-        _processed_posts.clear()
-        _processed_posts.update(recent)
-
-    return new_posts
-
-
 def extract_post_text(post: dict) -> str:
     """Извлекает текст из VK поста (включая репосты)"""
     text = post.get("text", "")
@@ -298,6 +259,7 @@ def get_group_short_name(group_id: int) -> str:
 
 # Статистика VK мониторинга
 vk_stats = {
+    "api_calls": 0,
     "total": 0,
     "filtered_ad": 0,
     "filtered_short": 0,
@@ -308,149 +270,327 @@ vk_stats = {
 }
 
 
+def shard_groups(groups: List[tuple], index: int, total: int) -> List[tuple]:
+    """Группы шарда index из total (round-robin по порядку в списке)"""
+    return [g for i, g in enumerate(groups) if i % total == index]
+
+
+def _cursor_source(group_id: int) -> str:
+    return f"vk:{group_id}"
+
+
+def _wall_get_code(requests: List[Tuple[int, int, int]]) -> str:
+    """VKScript для execute: массив ответов wall.get по (owner_id, count, offset)"""
+    calls = ",".join(
+        f'API.wall.get({{"owner_id":{owner_id},"count":{count},"offset":{offset},"filter":"owner"}})'
+        for owner_id, count, offset in requests
+    )
+    return f"return [{calls}];"
+
+
+async def fetch_walls(requests: List[Tuple[int, int, int]]) -> List[Optional[List[dict]]]:
+    """
+    Стены групп пакетами через execute. Результат выровнен по requests:
+    список постов или None, если стену получить не удалось.
+    Если execute недоступен — по одному wall.get (с веб-fallback) для первой страницы.
+    """
+    results: List[Optional[List[dict]]] = []
+    for start in range(0, len(requests), VK_EXECUTE_BATCH):
+        chunk = requests[start:start + VK_EXECUTE_BATCH]
+        vk_stats["api_calls"] += 1
+        response = await vk_api_call("execute", {"code": _wall_get_code(chunk)})
+        if isinstance(response, list) and len(response) == len(chunk):
+            for item in response:
+                results.append(item.get("items", []) if isinstance(item, dict) else None)
+            continue
+        logger.warning(f"⚠️ VK execute не выполнен — опрос {len(chunk)} стен по одной")
+        for owner_id, count, offset in chunk:
+            if offset:
+                results.append(None)
+                continue
+            vk_stats["api_calls"] += 1
+            results.append(await fetch_group_wall(owner_id, count=count))
+            await asyncio.sleep(0.5)  # Rate limit
+    return results
+
+
+def interval_for_rate(rate: Optional[float], default: float) -> float:
+    """Интервал опроса по частоте постов (постов/сек); без оценки — default"""
+    if rate is None:
+        return default
+    if rate <= 0:
+        return VK_POLL_MAX_INTERVAL
+    return min(VK_POLL_MAX_INTERVAL, max(VK_POLL_MIN_INTERVAL, POSTS_PER_POLL_TARGET / rate))
+
+
+@dataclass
+class GroupSchedule:
+    """Расписание опроса группы: EWMA частоты постов → интервал"""
+    interval: float
+    next_poll: float = 0.0
+    last_poll: Optional[float] = None
+    rate: Optional[float] = None  # постов/сек
+
+    def observe(self, new_count: int, now: float, post_dates: List[int], default: float) -> None:
+        if self.last_poll is not None:
+            sample = new_count / max(1.0, now - self.last_poll)
+        else:
+            # Первый опрос: оценка по датам постов на странице
+            dates = sorted(d for d in post_dates if d)
+            span = dates[-1] - dates[0] if len(dates) >= 2 else 0
+            sample = (len(dates) - 1) / span if span > 0 else None
+        if sample is not None:
+            self.rate = sample if self.rate is None else RATE_EWMA_ALPHA * sample + (1 - RATE_EWMA_ALPHA) * self.rate
+        self.last_poll = now
+        self.interval = interval_for_rate(self.rate, default)
+        self.next_poll = now + self.interval
+
+
+async def fetch_new_posts(groups: List[tuple], store: CursorStore) -> Dict[int, List[dict]]:
+    """
+    Новые посты (id > курсора) для групп одним execute (+ дополнительные страницы,
+    если вся страница оказалась новой). Посты — по возрастанию id.
+    Группы без курсора только запоминают текущий последний пост.
+    Для групп, стену которых получить не удалось, ключа в результате нет.
+    """
+    cursors = {gid: store.get(_cursor_source(gid)) for _, gid, _ in groups}
+    collected: Dict[int, List[dict]] = {}
+    pending = [gid for _, gid, _ in groups]
+    for page in range(WALL_MAX_PAGES):
+        if not pending:
+            break
+        requests = [(gid, WALL_FETCH_COUNT, page * WALL_FETCH_COUNT) for gid in pending]
+        walls = await fetch_walls(requests)
+        more = []
+        for gid, items in zip(pending, walls):
+            if items is None:
+                if page == 0:
+                    continue
+                items = []
+            cursor = cursors[gid]
+            if cursor is None:
+                ids = [p.get("id", 0) for p in items]
+                if ids:
+                    store.advance(_cursor_source(gid), max(ids))
+                collected[gid] = []
+                continue
+            fresh = [p for p in items if p.get("id", 0) > cursor]
+            collected.setdefault(gid, []).extend(fresh)
+            regular = [p for p in items if not p.get("is_pinned")]
+            if len(items) >= WALL_FETCH_COUNT and regular and all(p.get("id", 0) > cursor for p in regular):
+                more.append(gid)
+        if more and page + 1 == WALL_MAX_PAGES:
+            logger.warning(f"⚠️ VK: у {len(more)} групп новых постов больше {WALL_MAX_PAGES * WALL_FETCH_COUNT} — часть пропущена")
+        pending = more
+    for gid, posts in collected.items():
+        unique = {p.get("id", 0): p for p in posts}
+        collected[gid] = [unique[pid] for pid in sorted(unique)]
+    return collected
+
+
+def vk_post_data(post: dict, group: tuple) -> dict:
+    """Данные VK поста без анализа: текст, источник, ссылка, фото"""
+    short_name, group_id, name = group
+    post_id = post.get("id", 0)
+    return {
+        "text": extract_post_text(post),
+        "source": f"vk:{short_name}",
+        "source_name": name,
+        "post_link": build_vk_post_link(group_id, post_id),
+        "post_id": post_id,
+        "group_id": group_id,
+        "post_date": datetime.fromtimestamp(post.get("date", 0)).isoformat(),
+        "photos": extract_vk_photos(post),
+    }
+
+
+def vk_prefilter(text: str, hits: Optional[Dict[str, Set[str]]] = None, name: str = "") -> bool:
+    """Фильтры VK поста до AI: короткий текст, реклама (учитывает vk_stats)"""
+    if len(text.strip()) < MIN_TEXT_LENGTH:
+        vk_stats["filtered_short"] += 1
+        return False
+    if hits is None:
+        hits = scan_keywords(text)
+    if is_vk_ad(text, hits):
+        vk_stats["filtered_ad"] += 1
+        logger.debug(f"🚫 VK реклама [{name}]: {text[:40]}...")
+        return False
+    return True
+
+
+def vk_accept(text: str, category: str, relevant: bool, hits: Optional[Dict[str, Set[str]]] = None, name: str = "") -> bool:
+    """Фильтры VK поста после AI: решение модели + keyword-релевантность (учитывает vk_stats)"""
+    if not relevant:
+        vk_stats["filtered_irrelevant"] += 1
+        logger.info(f"⏭️ VK AI: нерелевантно [{name}] ({category}): {text[:40]}...")
+        return False
+    if not is_vk_relevant(text, category, hits):
+        vk_stats["filtered_irrelevant"] += 1
+        logger.debug(f"⏭️ VK нерелевантно [{name}] ({category})")
+        return False
+    vk_stats["published"] += 1
+    vk_stats["by_group"][name] = vk_stats["by_group"].get(name, 0) + 1
+    return True
+
+
+def _is_outdated(post: dict, group_id: int, oldest_ts: float) -> bool:
+    """Пост старше окна догонки"""
+    if post.get("date", 0) >= oldest_ts:
+        return False
+    vk_stats.setdefault("filtered_old", 0)
+    vk_stats["filtered_old"] += 1
+    logger.info(f"⏭️ VK старый пост: {group_id}/{post.get('id', 0)}, дата: {datetime.fromtimestamp(post.get('date', 0))}")
+    return True
+
+
+async def forward_post(post: dict, group: tuple, on_post, oldest_ts: float) -> None:
+    """Сырой VK пост → on_post(post_data); фильтры и AI анализ — у вызывающего"""
+    vk_stats["total"] += 1
+    if _is_outdated(post, group[1], oldest_ts):
+        return
+    await on_post(vk_post_data(post, group))
+
+
+async def process_post(post: dict, group: tuple, on_complaint, oldest_ts: float) -> None:
+    """Фильтры + AI анализ одного VK поста, при жалобе — on_complaint(complaint_data)"""
+    from services.zai_service import analyze_complaint
+
+    short_name, group_id, name = group
+    text = extract_post_text(post)
+    vk_stats["total"] += 1
+
+    # Фильтр: старый пост (вне окна догонки)
+    if _is_outdated(post, group_id, oldest_ts):
+        return
+
+    # Фильтры: короткий текст, реклама (совпадения ключевых слов — один проход на пост)
+    keyword_hits = scan_keywords(text)
+    if not vk_prefilter(text, keyword_hits, name):
+        return
+
+    # AI анализ
+    logger.info(f"🤖 VK анализ [{name}]: {text[:50]}...")
+    analysis = await analyze_complaint(text)
+    category = analysis.get("category", "Прочее")
+    provider = analysis.get("provider", "?")
+
+    # Фильтры: решение AI и keyword-based релевантность
+    if not vk_accept(text, category, analysis.get("relevant", True), keyword_hits, name):
+        return
+
+    # Формируем данные жалобы
+    complaint_data = vk_post_data(post, group)
+    complaint_data.update(
+        category=category,
+        address=analysis.get("address"),
+        summary=analysis.get("summary", text[:100]),
+        provider=provider,
+        severity=analysis.get("severity"),
+        location_hints=analysis.get("location_hints"),
+    )
+
+    if complaint_data["photos"]:
+        logger.info(f"📸 Найдено фото в VK: {len(complaint_data['photos'])}")
+
+    logger.info(f"✅ VK [{provider}] {category} из {name} → обработка")
+
+    if on_complaint:
+        try:
+            await on_complaint(complaint_data)
+        except Exception as e:
+            logger.error(f"Callback error: {e}")
+            vk_stats["errors"] += 1
+
+
 async def poll_all_groups(
     on_complaint: Optional[callable] = None,
     poll_interval: int = 120,
     startup_time: Optional[datetime] = None,
+    groups: Optional[List[tuple]] = None,
+    cursor_store: Optional[CursorStore] = None,
+    on_post: Optional[callable] = None,
+    recorder=None,
 ):
     """
     Основной цикл polling VK групп.
-    on_complaint(post_data) — callback при обнаружении жалобы.
-    poll_interval — интервал опроса в секундах (default 2 мин).
+    on_complaint(post_data) — callback при обнаружении жалобы (фильтры и AI — здесь же).
+    on_post(post_data) — вместо on_complaint: каждый новый пост без анализа
+    (vk_post_data), фильтры и AI — в конвейере вызывающего (vk_prefilter / vk_accept).
+    poll_interval — начальный интервал опроса в секундах (default 2 мин), далее
+    у каждой группы свой: VK_POLL_MIN_INTERVAL..VK_POLL_MAX_INTERVAL по частоте постов.
+    groups — подмножество VK_GROUPS (шард воркера), по умолчанию все группы.
+    cursor_store — курсоры vk:<group_id>; по умолчанию открывается свой CursorStore.
+    recorder — MonitorRecorder: каждый новый пост записывается до фильтров (replay).
     """
-    from services.zai_service import analyze_complaint
+    groups = list(VK_GROUPS) if groups is None else list(groups)
 
-    if not VK_GROUPS:
+    if not groups:
         logger.error("❌ Нет VK групп для мониторинга")
         return
 
-    logger.info(f"🔵 VK мониторинг: {len(VK_GROUPS)} групп, интервал {poll_interval}с")
-    for short_name, gid, name in VK_GROUPS:
-        logger.info(f"   • {name} (id: {gid})")
+    store = cursor_store if cursor_store is not None else CursorStore()
+    schedules = {gid: GroupSchedule(interval=poll_interval) for _, gid, _ in groups}
+    started_ts = startup_time.timestamp() if startup_time else time.time()
+    oldest_ts = started_ts - VK_BACKFILL_MAX_AGE_HOURS * 3600
 
-    # Первый проход — запоминаем текущие посты, не обрабатываем
-    logger.info("📋 Инициализация: запоминаем текущие посты...")
-    for short_name, group_id, name in VK_GROUPS:
-        try:
-            posts = await fetch_group_wall(group_id, count=5)
-            for post in posts:
-                unique_key = f"{group_id}_{post.get('id', 0)}"
-                _processed_posts.add(unique_key)
-            await asyncio.sleep(0.5)  # Rate limit
-        except Exception as e:
-            logger.error(f"Init error {name}: {e}")
-
-    logger.info(f"✅ Инициализация завершена, запомнено {len(_processed_posts)} постов")
+    logger.info(f"🔵 VK мониторинг: {len(groups)} групп, интервал {VK_POLL_MIN_INTERVAL:.0f}-{VK_POLL_MAX_INTERVAL:.0f}с (execute)")
+    for short_name, gid, name in groups:
+        cursor = store.get(_cursor_source(gid))
+        state = f"курсор {cursor}" if cursor is not None else "новая — запомним текущие посты"
+        logger.info(f"   • {name} (id: {gid}), {state}")
     logger.info("🔄 Начинаю мониторинг новых постов...")
 
-    while True:
-        try:
-            for short_name, group_id, name in VK_GROUPS:
-                try:
-                    new_posts = await fetch_new_posts(group_id)
-                    for post in new_posts:
-                        text = extract_post_text(post)
-                        post_id = post.get("id", 0)
-                        post_date = datetime.fromtimestamp(post.get("date", 0))
-                        vk_stats["total"] += 1
-
-                        # Фильтр: старый пост (до запуска системы)
-                        if startup_time:
-                            from datetime import timezone as _tz
-                            post_date_utc = post_date.replace(tzinfo=_tz.utc) if post_date.tzinfo is None else post_date
-                            startup_utc = startup_time.replace(tzinfo=_tz.utc) if startup_time.tzinfo is None else startup_time
-                            if post_date_utc < startup_utc:
-                                vk_stats.setdefault("filtered_old", 0)
-                                vk_stats["filtered_old"] += 1
-                                logger.info(f"⏭️ VK старый пост: {group_id}/{post_id}, дата: {post_date}")
-                                continue
-
-                        # Фильтр: короткий текст
-                        if len(text.strip()) < MIN_TEXT_LENGTH:
-                            vk_stats["filtered_short"] += 1
-                            continue
-
-                        # Фильтр: реклама
-                        if is_vk_ad(text):
-                            vk_stats["filtered_ad"] += 1
-                            logger.debug(f"🚫 VK реклама [{name}]: {text[:40]}...")
-                            continue
-
-                        # AI анализ
-                        logger.info(f"🤖 VK анализ [{name}]: {text[:50]}...")
-                        analysis = await analyze_complaint(text)
-                        category = analysis.get("category", "Прочее")
-                        address = analysis.get("address")
-                        summary = analysis.get("summary", text[:100])
-                        provider = analysis.get("provider", "?")
-                        location_hints = analysis.get("location_hints")
-
-                        # Фильтр: AI решил что не релевантно
-                        if not analysis.get("relevant", True):
-                            vk_stats["filtered_irrelevant"] += 1
-                            logger.info(f"⏭️ VK AI: нерелевантно [{name}] ({category}): {text[:40]}...")
-                            continue
-
-                        # Фильтр: keyword-based релевантность
-                        if not is_vk_relevant(text, category):
-                            vk_stats["filtered_irrelevant"] += 1
-                            logger.debug(f"⏭️ VK нерелевантно [{name}] ({category})")
+    reported_total = 0
+    try:
+        while True:
+            try:
+                now = time.monotonic()
+                due = [g for g in groups if schedules[g[1]].next_poll <= now]
+                if due:
+                    fresh = await fetch_new_posts(due, store)
+                    now = time.monotonic()
+                    for group in due:
+                        short_name, group_id, name = group
+                        schedule = schedules[group_id]
+                        if group_id not in fresh:
+                            vk_stats["errors"] += 1
+                            schedule.next_poll = now + schedule.interval
                             continue
-
-                        # Формируем данные жалобы
-                        post_link = build_vk_post_link(group_id, post_id)
-                        photos = extract_vk_photos(post)
-                        complaint_data = {
-                            "text": text,
-                            "category": category,
-                            "address": address,
-                            "summary": summary,
-                            "provider": provider,
-                            "source": f"vk:{short_name}",
-                            "source_name": name,
-                            "post_link": post_link,
-                            "post_id": post_id,
-                            "group_id": group_id,
-                            "post_date": post_date.isoformat(),
-                            "location_hints": location_hints,
-                            "photos": photos,
-                        }
-
-                        vk_stats["published"] += 1
-                        vk_stats["by_group"][name] = vk_stats["by_group"].get(name, 0) + 1
-
-                        if photos:
-                            logger.info(f"📸 Найдено фото в VK: {len(photos)}")
-
-                        logger.info(f"✅ VK [{provider}] {category} из {name} → обработка")
-
-                        if on_complaint:
+                        posts = fresh[group_id]
+                        schedule.observe(len(posts), now, [p.get("date", 0) for p in posts], poll_interval)
+                        for post in posts:
+                            if recorder is not None:
+                                recorder.record_vk(group, post)
                             try:
-                                await on_complaint(complaint_data)
+                                if on_post is not None:
+                                    await forward_post(post, group, on_post, oldest_ts)
+                                else:
+                                    await process_post(post, group, on_complaint, oldest_ts)
                             except Exception as e:
-                                logger.error(f"Callback error: {e}")
+                                logger.error(f"VK poll error [{name}]: {e}")
                                 vk_stats["errors"] += 1
-
-                    await asyncio.sleep(0.5)  # Rate limit между группами
-
-                except Exception as e:
-                    logger.error(f"VK poll error [{name}]: {e}")
-                    vk_stats["errors"] += 1
-
-            # Статистика каждые N итераций
-            if vk_stats["total"] > 0 and vk_stats["total"] % 20 == 0:
-                logger.info(
-                    f"📊 VK: всего {vk_stats['total']} | "
-                    f"опубликовано {vk_stats['published']} | "
-                    f"реклама {vk_stats['filtered_ad']} | "
-                    f"нерелевантно {vk_stats['filtered_irrelevant']}"
-                )
-
-            await asyncio.sleep(poll_interval)
-
-        except asyncio.CancelledError:
-            logger.info("⏹️ VK мониторинг остановлен")
-            break
-        except Exception as e:
-            logger.error(f"VK polling loop error: {e}", exc_info=True)
-            await asyncio.sleep(30)
+                            store.advance(_cursor_source(group_id), post.get("id", 0))
+
+                # Статистика каждые N постов
+                if vk_stats["total"] - reported_total >= 20:
+                    reported_total = vk_stats["total"]
+                    logger.info(
+                        f"📊 VK: всего {vk_stats['total']} | "
+                        f"опубликовано {vk_stats['published']} | "
+                        f"реклама {vk_stats['filtered_ad']} | "
+                        f"нерелевантно {vk_stats['filtered_irrelevant']} | "
+                        f"API вызовов {vk_stats['api_calls']}"
+                    )
+
+                wake = min(s.next_poll for s in schedules.values())
+                await asyncio.sleep(max(1.0, wake - time.monotonic()))
+
+            except asyncio.CancelledError:
+                logger.info("⏹️ VK мониторинг остановлен")
+                break
+            except Exception as e:
+                logger.error(f"VK polling loop error: {e}", exc_info=True)
+                await asyncio.sleep(30)
+    finally:
+        if cursor_store is None:
+            store.close()
@@ -6,14 +6,22 @@ Provides text classification for city complaints with category, address,
 severity, and relevance detection.
 """
 
+import asyncio
 import json
 import logging
 import os
 import re
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Optional, Tuple
 
 from core.http_client import get_http_client, get_proxy_url
-from services.ai_cache import get_cached_text, set_cached_text
+from services.address_extractor import extract_address
+from services.ai_batcher import MicroBatcher
+from services.ai_cache import get_cached_text, normalize_text, set_cached_text
+from services.ai_governor import AI_CALL_TIMEOUT, get_ai_governor, retry_after_seconds
+from services.ai_scheduler import INTERACTIVE, current_lane, estimate_tokens
+from services.local_classifier import get_local_classifier, record_label
+from services.message_filters import keyword_category
+from services.single_flight import SingleFlight
 
 logger = logging.getLogger(__name__)
 
@@ -39,6 +47,10 @@ if XAI_API_KEY:
 else:
     logger.warning("XAI_API_KEY not set — will fallback to keyword")
 
+# Micro-batching: messages arriving within the window share one Grok call
+AI_BATCH_MAX_ITEMS: int = int(os.getenv("AI_BATCH_MAX_ITEMS", "8"))
+AI_BATCH_WINDOW_MS: float = float(os.getenv("AI_BATCH_WINDOW_MS", "150"))
+
 AI_TEXT_PROVIDER: str = os.getenv("AI_TEXT_PROVIDER", "grok").strip().lower()
 if AI_TEXT_PROVIDER not in ("grok", "keyword"):
     AI_TEXT_PROVIDER = "grok"
@@ -113,6 +125,53 @@ def _parse_json(text: str) -> Optional[Dict[str, Any]]:
 
 
 # --- Shared retry-with-proxy logic ---
+def _response_json(r) -> Dict[str, Any]:
+    try:
+        data = r.json()
+    except ValueError:
+        return {}
+    return data if isinstance(data, dict) else {}
+
+
+async def _call_route(
+    api_url: str,
+    payload: dict,
+    headers: dict,
+    label: str,
+    provider: str,
+    mode: str,
+    proxy: Optional[str],
+    tokens: int,
+) -> Optional[str]:
+    """One governed attempt over one route; content string or None."""
+    governor = get_ai_governor()
+    try:
+        async with governor.attempt(provider, mode, tokens) as attempt:
+            if not attempt.allowed:
+                logger.debug("%s [%s] skipped: route unavailable", label, mode)
+                return None
+            async with get_http_client(timeout=AI_CALL_TIMEOUT, proxy=proxy) as client:
+                r = await client.post(api_url, json=payload, headers=headers)
+            attempt.status = r.status_code
+            if r.status_code == 429:
+                attempt.retry_after = retry_after_seconds(r)
+            elif r.status_code == 200:
+                data = _response_json(r)
+                attempt.tokens_used = (data.get("usage") or {}).get("total_tokens")
+
+        if r.status_code != 200:
+            logger.warning("%s [%s] HTTP %d: %s", label, mode, r.status_code, r.text[:200])
+            return None
+
+        msg = data.get("choices", [{}])[0].get("message", {})
+        return msg.get("content") or msg.get("reasoning_content") or None
+    except asyncio.CancelledError:
+        raise
+    except Exception as e:
+        logger.debug("%s [%s] error: %s", label, mode, e)
+        return None
+
+
 async def _call_ai_api(
     api_url: str,
     payload: dict,
@@ -122,43 +181,72 @@ async def _call_ai_api(
     """
     Call an AI chat/completions endpoint with proxy fallback.
 
+    Every attempt goes through the AI governor (concurrency limit, per-route
+    stats, circuit breaker): routes with an open breaker are skipped, so a
+    degraded provider falls through to the caller's fallback immediately.
+
+    Hedging: if the direct route has not answered by its observed p90
+    latency, the proxy route is fired as well and the first answer wins
+    (the loser is cancelled). The governor suppresses hedging while the
+    routes are over their error budget.
+
     Returns the content string from the first successful response, or None.
     """
+    governor = get_ai_governor()
+    provider = label.split()[0].lower()
+    tokens = estimate_tokens(payload)
     proxy_url = get_proxy_url()
-    attempts = [(False, "direct"), (True, "proxy")]
-
-    for use_proxy, mode in attempts:
-        if use_proxy and not proxy_url:
-            continue
-        try:
-            px = proxy_url if use_proxy else None
-            async with get_http_client(timeout=60.0, proxy=px) as client:
-                r = await client.post(api_url, json=payload, headers=headers)
-
-            if r.status_code != 200:
-                logger.warning("%s [%s] HTTP %d: %s", label, mode, r.status_code, r.text[:200])
-                continue
-
-            data = r.json()
-            msg = data.get("choices", [{}])[0].get("message", {})
-            content = msg.get("content") or msg.get("reasoning_content") or ""
+    routes = [("direct", None)]
+    if proxy_url:
+        routes.append(("proxy", proxy_url))
+
+    def call(route):
+        mode, px = route
+        return _call_route(api_url, payload, headers, label, provider, mode, px, tokens)
+
+    delay = governor.hedge_delay(provider, "direct", "proxy") if len(routes) > 1 else None
+    if delay is None:
+        for route in routes:
+            content = await call(route)
             if content:
                 return content
-        except Exception as e:
-            logger.debug("%s [%s] error: %s", label, mode, e)
+        return None
 
-    return None
+    primary = asyncio.ensure_future(call(routes[0]))
+    pending = {primary}
+    content = None
+    try:
+        done, _ = await asyncio.wait(pending, timeout=delay)
+        if done:
+            governor.record_hedge(provider, hedged=False)
+            return primary.result() or await call(routes[1])
+
+        logger.debug("%s: direct slower than p90 (%.2fs), hedging via proxy", label, delay)
+        backup = asyncio.ensure_future(call(routes[1]))
+        pending = {primary, backup}
+        while pending and not content:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.result() and not content:
+                    content = task.result()
+                    governor.record_hedge(provider, hedged=True, backup_won=task is backup)
+    finally:
+        for task in pending:
+            task.cancel()
+    if not content:
+        governor.record_hedge(provider, hedged=True)
+    return content
 
 
-async def _grok_analyze(text: str) -> Optional[Dict[str, Any]]:
-    """Analyze via Grok (xAI) with caching."""
-    if not XAI_API_KEY:
-        return None
+def _grok_headers() -> Dict[str, str]:
+    return {
+        "Authorization": f"Bearer {XAI_API_KEY}",
+        "Content-Type": "application/json",
+    }
 
-    cached = get_cached_text(text, XAI_TEXT_MODEL)
-    if cached:
-        return cached
 
+async def _grok_request(text: str) -> Optional[Dict[str, Any]]:
+    """Single-message Grok call (no cache)."""
     payload = {
         "model": XAI_TEXT_MODEL,
         "messages": [
@@ -167,26 +255,147 @@ async def _grok_analyze(text: str) -> Optional[Dict[str, Any]]:
         ],
         "temperature": 0.1,
     }
-    headers = {
-        "Authorization": f"Bearer {XAI_API_KEY}",
-        "Content-Type": "application/json",
-    }
+    content = await _call_ai_api(
+        f"{XAI_BASE}/chat/completions", payload, _grok_headers(), "Grok"
+    )
+    return _parse_json(content) if content else None
+
+
+def _make_batch_prompt(texts: List[str]) -> str:
+    """Build one user prompt for several messages; the answer is a JSON array."""
+    items = "\n\n".join(
+        f"Сообщение {i}:\n\"\"\"\n{text[:1500]}\n\"\"\"" for i, text in enumerate(texts, 1)
+    )
+    return (
+        f"Проанализируй {len(texts)} сообщений из пабликов Нижневартовска. "
+        f"Оценивай каждое сообщение независимо от остальных.\n\n"
+        f"Категории проблем: {', '.join(CATEGORIES)}\n\n"
+        f"{items}\n\n"
+        f"Для каждого сообщения определи те же поля, что и для одиночного анализа: "
+        f"relevant, category, address (точный адрес или null), summary (суть своими словами, "
+        f"до 120 символов, не копируя текст), severity (1/2/3), priority (низкий/средний/высокий), "
+        f"location_hints (или null).\n\n"
+        f'Верни ТОЛЬКО JSON-массив из {len(texts)} объектов по порядку сообщений: '
+        f'[{{"id":1,"relevant":true/false,"category":"...","address":"...или null",'
+        f'"summary":"...","severity":1/2/3,"priority":"...","location_hints":"...или null"}}, ...]'
+    )
+
 
+def _parse_json_array(text: str) -> Optional[List[Any]]:
+    """Extract a JSON array from model response (may be wrapped in ```json or an object)."""
+    text = text.strip()
+    if text.startswith("```"):
+        text = re.sub(r"^```(?:json)?\s*", "", text)
+        text = re.sub(r"\s*```$", "", text)
+    try:
+        data = json.loads(text)
+    except json.JSONDecodeError:
+        m = re.search(r"\[.*\]", text, re.DOTALL)
+        if not m:
+            return None
+        try:
+            data = json.loads(m.group())
+        except json.JSONDecodeError:
+            return None
+    if isinstance(data, dict):
+        data = next((v for v in data.values() if isinstance(v, list)), None)
+    return data if isinstance(data, list) else None
+
+
+async def _grok_request_batch(texts: List[str]) -> List[Optional[Dict[str, Any]]]:
+    """
+    Several messages in one Grok call. Results are aligned with texts;
+    items missing from (or malformed in) the answer are None.
+    """
+    if len(texts) == 1:
+        return [await _grok_request(texts[0])]
+
+    payload = {
+        "model": XAI_TEXT_MODEL,
+        "messages": [
+            {"role": "system", "content": SYSTEM_PROMPT},
+            {"role": "user", "content": _make_batch_prompt(texts)},
+        ],
+        "temperature": 0.1,
+    }
     content = await _call_ai_api(
-        f"{XAI_BASE}/chat/completions", payload, headers, "Grok"
+        f"{XAI_BASE}/chat/completions", payload, _grok_headers(), "Grok batch"
     )
-    if not content:
-        logger.error("Grok: all attempts failed")
+    items = _parse_json_array(content) if content else None
+    results: List[Optional[Dict[str, Any]]] = [None] * len(texts)
+    if not items:
+        return results
+    for pos, item in enumerate(items):
+        if not isinstance(item, dict) or "category" not in item:
+            continue
+        idx = item.pop("id", pos + 1)
+        try:
+            idx = int(idx) - 1
+        except (TypeError, ValueError):
+            idx = pos
+        if 0 <= idx < len(texts) and results[idx] is None:
+            results[idx] = item
+    logger.info("Grok batch: %d/%d parsed", sum(r is not None for r in results), len(texts))
+    return results
+
+
+_batcher: Optional[MicroBatcher] = None
+
+
+def _get_batcher() -> MicroBatcher:
+    global _batcher
+    if _batcher is None:
+        _batcher = MicroBatcher(
+            _grok_request_batch, max_items=AI_BATCH_MAX_ITEMS,
+            max_wait=AI_BATCH_WINDOW_MS / 1000, name="Grok batch",
+        )
+    return _batcher
+
+
+_text_flight: SingleFlight[Optional[Dict[str, Any]]] = SingleFlight("Grok text")
+
+
+async def _grok_analyze(text: str) -> Optional[Dict[str, Any]]:
+    """
+    Analyze via Grok (xAI) with caching. Concurrent copies of the same text
+    (reposts) share one in-flight request; distinct messages are micro-batched.
+    """
+    if not XAI_API_KEY:
         return None
 
-    result = _parse_json(content)
-    if result:
-        logger.info("Grok (%s): category=%s", XAI_TEXT_MODEL, result.get("category"))
-        set_cached_text(text, result, XAI_TEXT_MODEL)
-    return result
+    cached = get_cached_text(text, XAI_TEXT_MODEL)
+    if cached:
+        return cached
 
+    key = f"{XAI_TEXT_MODEL}:{normalize_text(text)}"
+    return await _text_flight.do(key, lambda: _grok_analyze_uncached(text))
 
 
+async def _grok_analyze_uncached(text: str) -> Optional[Dict[str, Any]]:
+    governor = get_ai_governor()
+    if not governor.available("grok"):
+        logger.debug("Grok: circuit open, skipping to keyword analysis")
+        governor.record_fallback("grok")
+        return None
+
+    result = None
+    # Interactive requests skip the batch window: one message, lowest latency
+    if AI_BATCH_MAX_ITEMS > 1 and current_lane() != INTERACTIVE:
+        result = await _get_batcher().submit(text)
+        # Not resolved by the batch (parse error, missing item): single call
+        if result is None and governor.available("grok"):
+            result = await _grok_request(text)
+    else:
+        result = await _grok_request(text)
+
+    if not result:
+        logger.error("Grok: all attempts failed")
+        governor.record_fallback("grok")
+        return None
+
+    logger.info("Grok (%s): category=%s", XAI_TEXT_MODEL, result.get("category"))
+    set_cached_text(text, result, XAI_TEXT_MODEL)
+    return result
 
 
 # --- Keyword rules for severity assignment ---
@@ -199,55 +408,23 @@ _MEDIUM_RISK_CATS = frozenset({
 })
 
 
+def _severity_for(category: str) -> Tuple[int, str]:
+    """Severity and priority based on category."""
+    if category in _HIGH_RISK_CATS:
+        return 3, "высокий"
+    if category in _MEDIUM_RISK_CATS:
+        return 2, "средний"
+    return 1, "низкий"
+
+
 def _keyword_analyze(text: str) -> Dict[str, Any]:
     """Keyword-based fallback analysis (no AI)."""
-    t = text.lower()
-
-    keyword_rules = [
-        ("Освещение", ["фонар", "освещен", "свет не гор", "темно", "лампа"]),
-        ("Дороги", ["яма", "дорог", "асфальт", "тротуар", "выбоин", "колея"]),
-        ("Снег/Наледь", ["снег", "налед", "гололёд", "гололед", "сугроб", "не чищ"]),
-        ("ЖКХ", ["жкх", "управляющ", "коммунал", "квитанц", "тариф"]),
-        ("Отопление", ["отоплен", "батаре", "холодн", "не греет"]),
-        ("Водоснабжение и канализация", ["канализ", "труб", "течь", "затоп", "прорыв"]),
-        ("Бытовой мусор", ["мусор", "свалк", "отход", "контейнер"]),
-        ("Транспорт", ["автобус", "маршрут", "транспорт", "остановк"]),
-        ("Благоустройство", ["двор", "клумб", "газон", "лавочк", "скамейк"]),
-        ("Экология", ["эколог", "загрязн", "выброс", "запах"]),
-        ("Парковки", ["парков", "стоянк"]),
-        ("Лифты и подъезды", ["лифт", "подъезд", "домофон"]),
-        ("Детские площадки", ["детск", "площадк", "качел", "горк"]),
-        ("Безопасность", ["безопасн", "полиц", "кража", "вандал"]),
-        ("Медицина", ["больниц", "поликлиник", "врач", "скорая"]),
-        ("Газоснабжение", ["газ ", "газов", "газоснабж"]),
-        ("Строительство", ["строй", "стройк"]),
-        ("ЧП", ["пожар", "взрыв", "авари", "обрушен"]),
-    ]
-
-    category = "Прочее"
-    for cat, keywords in keyword_rules:
-        if any(kw in t for kw in keywords):
-            category = cat
-            break
+    category = keyword_category(text, "zai")
 
-    # Address extraction via regex
-    address = None
-    for pat in [
-        r'(?:ул(?:ица|ице)?\.?\s+)([А-Яа-яЁё]+(?:\s+[А-Яа-яЁё]+)?)\s*,?\s*(\d+[а-яА-Я]?)',
-        r'(?:пр(?:оспект|оспекте)?\.?\s+)([А-Яа-яЁё]+(?:\s+[А-Яа-яЁё]+)?)\s*,?\s*(\d+[а-яА-Я]?)',
-    ]:
-        m = re.search(pat, text, re.IGNORECASE)
-        if m:
-            address = f"ул. {m.group(1)} {m.group(2)}, Нижневартовск"
-            break
+    # Address extraction: shared compiled patterns (services/address_extractor.py)
+    address = extract_address(text)
 
-    # Severity based on category
-    if category in _HIGH_RISK_CATS:
-        severity, priority = 3, "высокий"
-    elif category in _MEDIUM_RISK_CATS:
-        severity, priority = 2, "средний"
-    else:
-        severity, priority = 1, "низкий"
+    severity, priority = _severity_for(category)
 
     summary = f"Проблема ({category}, приор. {priority}): требуется проверка и разбор ситуации."
 
@@ -263,6 +440,72 @@ def _keyword_analyze(text: str) -> Dict[str, Any]:
     }
 
 
+_SENTENCE_END_RE = re.compile(r"(?<=[.!?…])\s+")
+
+
+def _text_summary(text: str, max_len: int = 120) -> str:
+    """
+    Summary from the post itself: leading sentences that fit into max_len.
+
+    Not a per-category template: the published-post index dedups on the
+    first characters of the summary, so identical templates would mark every
+    other complaint of the same category as already published.
+    """
+    cleaned = " ".join((text or "").split())
+    summary = ""
+    for sentence in _SENTENCE_END_RE.split(cleaned):
+        candidate = f"{summary} {sentence}".strip()
+        if len(candidate) > max_len:
+            break
+        summary = candidate
+    if summary or not cleaned:
+        return summary
+    return cleaned[: max_len - 3].rstrip() + "..."
+
+
+def _local_analyze(text: str) -> Optional[Dict[str, Any]]:
+    """
+    Confident answer of the local ONNX pre-classifier, or None to escalate to Grok.
+    Address/severity for relevant messages come from the keyword rules.
+    """
+    classifier = get_local_classifier()
+    prediction = classifier.predict(text)
+    decision = prediction.decision() if prediction else None
+    if decision is None:
+        return None
+
+    provider = f"local:{classifier.version}" if classifier.version else "local"
+    if decision in ("spam", "irrelevant"):
+        return {
+            "category": "Прочее",
+            "address": None,
+            "summary": "Реклама/спам" if decision == "spam" else "Не жалоба",
+            "relevant": False,
+            "spam": decision == "spam",
+            "location_hints": None,
+            "severity": 1,
+            "priority": "низкий",
+            "method": "local",
+            "provider": provider,
+        }
+
+    result = _keyword_analyze(text)
+    category = prediction.category
+    result["severity"], result["priority"] = _severity_for(category)
+    result.update({
+        "category": category,
+        "relevant": True,
+        "summary": _text_summary(text),
+        "method": "local",
+        "provider": provider,
+    })
+    logger.info(
+        "Local classifier: category=%s (p=%.2f, relevant=%.2f)",
+        category, prediction.category_confidence, prediction.relevant,
+    )
+    return result
+
+
 # --- Public API ---
 
 
@@ -288,6 +531,10 @@ def get_ai_provider_status() -> Dict[str, Any]:
         "active": AI_TEXT_PROVIDER,
         "xai_configured": bool(XAI_API_KEY),
         "xai_model": XAI_TEXT_MODEL,
+        "governor": get_ai_governor().snapshot(),
+        "batching": _batcher.stats() if _batcher is not None else None,
+        "local_classifier": get_local_classifier().stats(),
+        "single_flight": _text_flight.stats(),
     }
 
 
@@ -306,9 +553,13 @@ async def analyze_complaint(text: str) -> Dict[str, Any]:
 
     for provider in order:
         if provider == "grok":
+            local = _local_analyze(text)
+            if local:
+                return local
             result = await _grok_analyze(text)
             if result:
                 result["provider"] = f"grok:{XAI_TEXT_MODEL}"
+                record_label(text, result)
                 return _normalize_result(result)
         elif provider == "keyword":
             break
@@ -11,6 +11,8 @@ import re
 from typing import Any, Dict, Optional
 
 from core.http_client import get_http_client
+from services.single_flight import SingleFlight
+from services.vision_cache import get_vision_cache, image_digest, prompt_namespace
 from services.zai_service import CATEGORIES  # Single source of truth
 
 logger = logging.getLogger(__name__)
@@ -157,6 +159,22 @@ async def _grok_vision(
     return None
 
 
+_vision_flight: SingleFlight[Optional[Dict[str, Any]]] = SingleFlight("Grok vision")
+
+
+async def _grok_vision_cached(
+    image_bytes: bytes, image_b64: str, media_type: str, caption: str, cache_model: str
+) -> Optional[Dict[str, Any]]:
+    """Vision cache lookup (incl. recompressed/resized reposts), then Grok Vision."""
+    vision_cache = get_vision_cache()
+    result = vision_cache.lookup(image_bytes, cache_model)
+    if result is None:
+        result = await _grok_vision(image_b64, media_type, caption)
+        if result:
+            vision_cache.store(image_bytes, cache_model, result)
+    return result
+
+
 async def analyze_image_with_glm4v(
     image_path: str, caption: Optional[str] = None
 ) -> Dict[str, Any]:
@@ -172,7 +190,8 @@ async def analyze_image_with_glm4v(
     # Read and encode image
     try:
         with open(image_path, "rb") as f:
-            image_b64 = base64.b64encode(f.read()).decode("utf-8")
+            image_bytes = f.read()
+        image_b64 = base64.b64encode(image_bytes).decode("utf-8")
         media_type = _get_media_type(image_path)
     except Exception as e:
         logger.error("Image read error: %s", e)
@@ -186,8 +205,16 @@ async def analyze_image_with_glm4v(
             result["exif_lat"], result["exif_lon"] = exif_coords
         return result
 
-    # 1. Grok Vision
-    result = await _grok_vision(image_b64, media_type, caption or "")
+    # 1. Grok Vision (known photo — from cache, incl. recompressed/resized reposts)
+    result = None
+    if XAI_API_KEY:
+        # The caption is part of the prompt: cache and in-flight keys include its hash.
+        # The same photo reposted with the same caption: one request in flight
+        cache_model = prompt_namespace(XAI_VISION_MODEL, caption)
+        result = await _vision_flight.do(
+            f"{cache_model}:{image_digest(image_bytes)}",
+            lambda: _grok_vision_cached(image_bytes, image_b64, media_type, caption or "", cache_model),
+        )
     if result:
         result["provider"] = f"grok:{XAI_VISION_MODEL}"
         if exif_coords:
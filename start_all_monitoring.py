@@ -4,11 +4,15 @@
 """
 
 import asyncio
+import functools
 import logging
 import re
 import sys
 import os
-from datetime import datetime
+import time
+from dataclasses import asdict, dataclass, field
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional, Set, Tuple
 
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
@@ -34,12 +38,23 @@ logger = logging.getLogger(__name__)
 
 # Импорты сервисов
 from services.zai_service import analyze_complaint
+from services.ai_governor import get_ai_governor, share_ai_governor
+from services.nominatim_scheduler import get_nominatim_scheduler
 from services.geo_service import geoparse
 from services.zai_vision_service import analyze_image_with_glm4v
 from services.vk_monitor_service import (
-    VK_GROUPS, poll_all_groups, VK_SERVICE_TOKEN,
+    VK_GROUPS, poll_all_groups, shard_groups, vk_accept, vk_prefilter, VK_SERVICE_TOKEN,
 )
 from services.realtime_guard import RealtimeGuard
+from services.cursor_store import CursorStore
+from services.ingest_pipeline import HANDED_OFF, IngestPipeline, StageSpec
+from services.shard_pool import ShardPool
+from services.published_index import PublishedIndex
+from services.publish_queue import PublishItem, PublishQueue, priority_for_severity
+from services.duplicate_index import DuplicateIndex
+from services.message_filters import scan as scan_keywords
+from services.monitor_recorder import MonitorRecorder, recorder_from_env
+from services.keyword_matcher import hit_count
 from services.admin_panel import get_webapp_version
 
 # Telegram config
@@ -83,35 +98,7 @@ TAG = {
     "Строительство": "стройка", "Парковки": "парковки",
 }
 
-# Фильтры (из start_monitoring.py)
-AD_KEYWORDS = [
-    "реклама", "промокод", "скидк", "акция", "распродаж", "купи", "закажи",
-    "доставк", "интернет-магазин", "подписывайтесь", "подпишись",
-    "розыгрыш", "конкурс", "приз", "выигра", "бесплатн", "бонус",
-    "кредит", "займ", "ипотек", "инвестиц", "заработ", "доход",
-    "казино", "ставк", "букмекер", "тотализатор",
-    "знакомств", "свидани", "отношени",
-    "гороскоп", "предсказан", "гадани",
-    "продаётся", "продается", "сдаётся", "сдается", "аренд", "купить",
-    "вакансия", "требуется сотрудник", "ищем работник",
-    "taplink", "inst:", "@.*_bot",
-]
-
-COMPLAINT_MARKERS = [
-    "проблем", "жалоб", "не работает", "сломан", "разбит", "поломк",
-    "авари", "прорыв", "прорвал", "затоп", "течь", "течёт", "протечк",
-    "яма", "выбоин", "колея", "трещин",
-    "не убира", "не чист", "грязн", "мусор", "свалк",
-    "не горит", "не свет", "темно", "фонар",
-    "опасн", "угроз", "вандал", "хулиган",
-    "пожар", "взрыв", "обрушен", "провал",
-    "запах", "вонь", "дым", "загрязн",
-    "холодн", "не греет", "отключ",
-    "просим", "требуем", "когда", "сколько можно", "надоело",
-    "помогите", "обратите внимание", "срочно",
-    "ДТП", "дтп", "столкнов", "наезд",
-]
-
+# Фильтры: таблицы ключевых слов — в services/message_filters.py (один проход по тексту)
 RELEVANT_CATEGORIES = [
     "ЖКХ", "Дороги", "Благоустройство", "Транспорт", "Экология",
     "Животные", "Безопасность", "Снег/Наледь", "Освещение",
@@ -124,13 +111,11 @@ RELEVANT_CATEGORIES = [
 MIN_TEXT_LENGTH = 20
 
 
-def is_ad_or_spam(text: str) -> bool:
-    t = text.lower()
-    ad_count = sum(1 for kw in AD_KEYWORDS if kw in t)
-    if ad_count >= 1 and any(kw in t for kw in [
-        "промокод", "розыгрыш", "казино", "букмекер", "гороскоп",
-        "продаётся", "продается", "сдаётся", "сдается", "вакансия", "taplink",
-    ]):
+def is_ad_or_spam(text: str, hits: Optional[Dict[str, Set[str]]] = None) -> bool:
+    if hits is None:
+        hits = scan_keywords(text)
+    ad_count = hit_count(hits, "tg_ad")
+    if ad_count >= 1 and "tg_ad_strong" in hits:
         return True
     if ad_count >= 2:
         return True
@@ -142,19 +127,22 @@ def is_ad_or_spam(text: str) -> bool:
     return False
 
 
-def has_complaint_markers(text: str) -> bool:
-    t = text.lower()
-    return any(m in t for m in COMPLAINT_MARKERS)
+def has_complaint_markers(text: str, hits: Optional[Dict[str, Set[str]]] = None) -> bool:
+    if hits is None:
+        hits = scan_keywords(text)
+    return "tg_complaint" in hits
 
 
-def is_relevant_message(text: str, category: str) -> bool:
+def is_relevant_message(text: str, category: str, hits: Optional[Dict[str, Set[str]]] = None) -> bool:
     if len(text.strip()) < MIN_TEXT_LENGTH:
         return False
-    if is_ad_or_spam(text):
+    if hits is None:
+        hits = scan_keywords(text)
+    if is_ad_or_spam(text, hits):
         return False
     if category in RELEVANT_CATEGORIES:
         return True
-    if has_complaint_markers(text):
+    if has_complaint_markers(text, hits):
         return True
     return False
 
@@ -169,68 +157,34 @@ stats = {
 
 # RealtimeGuard — инициализируется в main()
 guard: RealtimeGuard = None
+cursor_store: Optional[CursorStore] = None
+
+# Догонка пропущенного за время простоя (по курсорам каналов)
+CATCHUP_ENABLED = os.getenv("MONITOR_CATCHUP", "1") == "1"
+CATCHUP_MAX_PER_CHANNEL = int(os.getenv("MONITOR_CATCHUP_MAX_PER_CHANNEL", "200"))
+CATCHUP_MAX_AGE_HOURS = float(os.getenv("MONITOR_CATCHUP_MAX_AGE_HOURS", "24"))
+CATCHUP_RATE = float(os.getenv("MONITOR_CATCHUP_RATE", "2"))  # сообщений/сек на все каналы
+# Повтор прерванной догонки канала: пауза растёт вдвое от MIN до MAX секунд
+CATCHUP_RETRY_MIN = float(os.getenv("MONITOR_CATCHUP_RETRY_MIN", "5"))
+CATCHUP_RETRY_MAX = float(os.getenv("MONITOR_CATCHUP_RETRY_MAX", "600"))
+
+# Индекс опубликованных постов — инициализируется в main()
+published_index: Optional[PublishedIndex] = None
+PUBLISHED_INDEX_REBUILD_LIMIT = 200  # сколько последних постов канала читать при запуске
+
+
+# Индекс дубликатов за 7 дней — прогревается из БД при первой проверке
+duplicate_index = DuplicateIndex()
 
 
 def _check_duplicate(db, text, address, lat, lon, category):
-    """Проверяет дубликаты жалоб по тексту, адресу и координатам"""
-    from sqlalchemy import func, and_
-    from backend.models import Report
-    from datetime import datetime, timedelta
-    
-    # Проверка за последние 7 дней
-    week_ago = datetime.utcnow() - timedelta(days=7)
-    
-    def _escape_like(s: str) -> str:
-        """Escape special LIKE characters to prevent unintended matching."""
-        return s.replace("%", "\\%").replace("_", "\\_")
-    
-    # По координатам (если есть)
-    if lat and lon:
-        # Радиус ~100 метров
-        lat_diff = 0.0009  # ~100м
-        lon_diff = 0.0012  # ~100м
-        similar_coords = db.query(Report).filter(
-            and_(
-                Report.lat.between(lat - lat_diff, lat + lat_diff),
-                Report.lng.between(lon - lon_diff, lon + lon_diff),
-                Report.category == category,
-                Report.created_at >= week_ago
-            )
-        ).first()
-        if similar_coords:
-            return True
-    
-    # По адресу (если есть)
-    if address:
-        addr_normalized = _escape_like(address.lower().strip()[:30])
-        similar_addr = db.query(Report).filter(
-            and_(
-                func.lower(Report.address).like("%" + addr_normalized + "%"),
-                Report.category == category,
-                Report.created_at >= week_ago
-            )
-        ).first()
-        if similar_addr:
-            return True
-    
-    # По тексту (первые 50 символов)
-    if text and len(text) > 20:
-        text_snippet = _escape_like(text[:50].lower().strip())
-        similar_text = db.query(Report).filter(
-            and_(
-                func.lower(Report.description).like("%" + text_snippet + "%"),
-                Report.category == category,
-                Report.created_at >= week_ago
-            )
-        ).first()
-        if similar_text:
-            return True
-    
-    return False
+    """Проверяет дубликаты жалоб по тексту, адресу и координатам (в памяти)"""
+    duplicate_index.sync(db)
+    return duplicate_index.is_duplicate(text, address, lat, lon, category)
 
 
 async def save_to_db(summary, text, lat, lng, address, category, source, msg_id=None, channel=None):
-    """Сохраняет жалобу в SQLite с проверкой дубликатов"""
+    """Сохраняет жалобу в SQLite с проверкой дубликатов (None — дубликат, ошибка БД — исключение)"""
     db = None
     try:
         from backend.database import SessionLocal
@@ -256,10 +210,8 @@ async def save_to_db(summary, text, lat, lng, address, category, source, msg_id=
         db.add(report)
         db.commit()
         report_id = report.id
+        duplicate_index.add(report_id, text[:2000], address, lat, lng, category)
         return report_id
-    except Exception as e:
-        logger.error(f"DB error: {e}")
-        return None
     finally:
         if db is not None:
             db.close()
@@ -289,42 +241,11 @@ def _get_source_icon(source_label, source_link):
         return "📢"  # Общая иконка
 
 
-async def _check_duplicate_post(client, summary, address, lat, lon, category):
-    """Проверяет дубликаты постов в канале перед публикацией"""
-    try:
-        from datetime import datetime
-        # Получаем последние сообщения из канала (за последние 24 часа)
-        messages = await client.get_messages(TARGET_CHANNEL, limit=50)
-        now = datetime.now()
-        
-        for msg in messages:
-            if not msg.text:
-                continue
-            
-            # Проверка по тексту сводки
-            if summary and summary[:50].lower() in msg.text.lower():
-                return True
-            
-            # Проверка по адресу
-            if address and address.lower() in msg.text.lower():
-                return True
-            
-            # Проверка по координатам (если есть)
-            if lat and lon:
-                coord_str = f"{lat:.4f}, {lon:.4f}"
-                if coord_str in msg.text or f"{lat:.3f}" in msg.text:
-                    return True
-        
-        return False
-    except Exception as e:
-        logger.debug(f"Duplicate check error: {e}")
-        return False
-
-
-async def publish_to_telegram(client, category, report_id, summary, address, lat, lon, source_label, source_link, timestamp, geo_accuracy=None):
-    """Публикует жалобу в @monitornv с иконками соцсетей и ссылкой на маркер карты"""
-    # Проверка дубликатов перед публикацией
-    if await _check_duplicate_post(client, summary, address, lat, lon, category):
+async def publish_to_telegram(category, report_id, summary, address, lat, lon, source_label, source_link, timestamp,
+                              geo_accuracy=None, severity=None, kind="tg", provider="?"):
+    """Ставит жалобу в очередь публикации @monitornv (иконки соцсетей, ссылка на маркер карты)"""
+    # Проверка дубликатов перед публикацией (локальный индекс вместо скачивания ленты канала)
+    if published_index is not None and published_index.is_published(summary, address, lat, lon):
         logger.info(f"⏭️ Дубликат поста пропущен: {category} @ {address or f'{lat},{lon}'}")
         return False
     
@@ -365,58 +286,482 @@ async def publish_to_telegram(client, category, report_id, summary, address, lat
     lines.append(f"#{tag} #ПульсГорода #Нижневартовск")
 
     post_text = "\n".join(lines)
+    item = PublishItem(
+        key=source_link or f"report:{report_id}",
+        text=post_text,
+        priority=priority_for_severity(severity),
+        meta={
+            "summary": summary, "address": address, "lat": lat, "lon": lon,
+            "kind": kind, "category": category, "provider": provider, "source_label": source_label,
+        },
+    )
+    return publish_queue.enqueue(item)
+
+
+async def _send_post(client, item: PublishItem) -> bool:
+    """Отправка поста из очереди публикаций (FloodWait обрабатывает очередь)"""
+    m = item.meta
+    place = m["address"] or f"{m['lat']},{m['lon']}"
+    # Повторная проверка: похожий пост мог уйти, пока этот ждал в очереди
+    if published_index is not None and published_index.is_published(m["summary"], m["address"], m["lat"], m["lon"]):
+        logger.info(f"⏭️ Дубликат поста пропущен: {m['category']} @ {place}")
+        return False
+    await client.send_message(TARGET_CHANNEL, item.text, parse_mode='html')
+    if published_index is not None:
+        published_index.add(m["summary"], m["address"], m["lat"], m["lon"])
+    stats[f"{m['kind']}_published"] += 1
+    logger.info(f"✅ {m['kind'].upper()} [{m['provider']}] {m['category']} из {m['source_label']}")
+    return True
+
+
+# Очередь публикаций — инициализируется в main()
+publish_queue: Optional[PublishQueue] = None
+PUBLISH_RATE_PER_MIN = float(os.getenv("PUBLISH_RATE_PER_MIN", "20"))
+PUBLISH_BURST = int(os.getenv("PUBLISH_BURST", "3"))
+
+
+
+
+# ============================================================
+# INGEST PIPELINE
+# ============================================================
+
+@dataclass
+class ComplaintJob:
+    """Сообщение из TG/VK, проходящее стадии конвейера"""
+    kind: str                      # "tg" | "vk"
+    text: str
+    source: str                    # tg:@channel / vk:short_name
+    source_label: str
+    source_link: str
+    msg_id: Optional[int] = None
+    channel: Optional[str] = None
+    caption: str = ""
+    photo_path: Optional[str] = None
+    photo_result: Optional[dict] = None
+    analyzed: bool = False
+    prefiltered: bool = False
+    category: str = "Прочее"
+    address: Optional[str] = None
+    summary: str = ""
+    provider: str = "?"
+    severity: Optional[int] = None
+    location_hints: Optional[str] = None
+    exif_lat: Optional[float] = None
+    exif_lon: Optional[float] = None
+    lat: Optional[float] = None
+    lon: Optional[float] = None
+    report_id: Optional[int] = None
+    persist_failed: bool = False   # ошибка БД: курсор не отпускается, догонка повторит
+    keyword_hits: Optional[Dict[str, Set[str]]] = field(default=None, repr=False)  # результат scan_keywords
+    received_at: float = field(default_factory=time.monotonic)  # для сквозной задержки (в т.ч. через воркеры)
+    raw: Any = field(default=None, repr=False)  # telethon Message (только на стадии ingest)
+
+
+# Размеры пулов воркеров и очередей по стадиям (env: PIPELINE_<STAGE>_WORKERS / _QUEUE)
+PIPELINE_DEFAULTS = {
+    "ingest": (2, 200),
+    "dispatch": (1, 200),
+    "filter": (1, 200),
+    "analyze": (4, 100),
+    "geocode": (2, 100),
+    "emit": (1, 200),
+    "persist": (1, 100),
+    "publish": (1, 100),
+}
+
+# Состав конвейера: один процесс / координатор / процесс-воркер (MONITOR_WORKERS > 1)
+PIPELINE_LAYOUT = ("ingest", "filter", "analyze", "geocode", "persist", "publish")
+COORDINATOR_LAYOUT = ("ingest", "dispatch", "geocode", "persist", "publish")
+SHARD_LAYOUT = ("filter", "analyze", "emit")
+
+# Процессы-воркеры: TG каналы шардируются по источнику (filter → analyze), VK группы
+# делятся между воркерами (посты идут в их же конвейер с filter). Каждому воркеру —
+# 1/N бюджета AI (share_ai_governor). Приём TG, RealtimeGuard, геокодинг (один лимит
+# Nominatim на процесс), индекс дубликатов, БД и очередь публикаций остаются в
+# координаторе — общие для всех шардов.
+MONITOR_WORKERS = int(os.getenv("MONITOR_WORKERS", "1"))
+SHARD_STATS_INTERVAL = 10.0
+SHARD_STAT_KEYS = ("tg_total", "tg_filtered", "vk_total", "vk_filtered")
+
+
+def _stage_setting(stage: str, kind: str, default: int) -> int:
     try:
-        await client.send_message(TARGET_CHANNEL, post_text, parse_mode='html')
+        return int(os.getenv(f"PIPELINE_{stage.upper()}_{kind}", default))
+    except ValueError:
+        return default
+
+
+def _prefilter(job: ComplaintJob) -> bool:
+    """Длина + реклама/спам (правила TG или VK); учитывает статистику"""
+    job.prefiltered = True
+    if job.kind == "vk":
+        stats['vk_total'] += 1
+        job.keyword_hits = scan_keywords(job.text)
+        if not vk_prefilter(job.text, job.keyword_hits, job.source_label):
+            stats['vk_filtered'] += 1
+            return False
         return True
-    except Exception as e:
-        logger.error(f"❌ Публикация TG: {e}")
+    if not job.text or len(job.text.strip()) < MIN_TEXT_LENGTH:
+        return False
+    stats['tg_total'] += 1
+    job.keyword_hits = scan_keywords(job.text)
+    if is_ad_or_spam(job.text, job.keyword_hits):
+        stats['tg_filtered'] += 1
         return False
+    return True
+
+
+def _accept(job: ComplaintJob, relevant: bool = True) -> bool:
+    """Фильтр релевантности после AI (правила TG или VK); учитывает статистику"""
+    if job.kind == "vk":
+        accepted = vk_accept(job.text, job.category, relevant, job.keyword_hits, job.source_label)
+    elif not relevant:
+        logger.info(f"⏭️ AI: нерелевантно [{job.provider}] из {job.source_label}: {job.text[:40]}...")
+        accepted = False
+    else:
+        accepted = is_relevant_message(job.text, job.category, job.keyword_hits)
+    if not accepted:
+        stats[f'{job.kind}_filtered'] += 1
+    return accepted
+
+
+async def _stage_ingest(client, job: ComplaintJob) -> Optional[ComplaintJob]:
+    """Скачивание фото из TG сообщения во временный файл"""
+    message, job.raw = job.raw, None
+    if message is not None and getattr(message, "photo", None):
+        tmp_path = None
+        try:
+            import tempfile
+            tmp = tempfile.NamedTemporaryFile(delete=False, suffix=".jpg")
+            tmp_path = tmp.name
+            tmp.close()
+            await client.download_media(message, file=tmp_path)
+            job.photo_path = tmp_path
+            job.caption = message.message or ""
+        except Exception as e:
+            logger.error(f"Photo download error: {e}")
+            if tmp_path:
+                _remove_file(tmp_path)
+    return job
+
+
+async def _stage_filter(job: ComplaintJob) -> Optional[ComplaintJob]:
+    """Быстрые фильтры до AI: длина текста и реклама"""
+    if job.analyzed:
+        return job
+    # Фото без подписи: текст появится после анализа изображения
+    if job.photo_path and not job.text:
+        return job
+    if not _prefilter(job):
+        _discard_photo(job)
+        return None
+    return job
+
+
+async def _stage_analyze(job: ComplaintJob) -> Optional[ComplaintJob]:
+    """AI анализ: фото (vision) или текст, затем фильтр релевантности"""
+    if job.analyzed:
+        return job
+
+    if job.photo_path:
+        try:
+            job.photo_result = await analyze_image_with_glm4v(job.photo_path, job.caption)
+            # text по‑прежнему нужен для базы и дальнейшей обработки,
+            # но в служебный канал мы шлём только аналитическое summary,
+            # поэтому НЕ дублируем сюда сырой текст.
+            if not job.text:
+                job.text = job.photo_result.get("description", "")
+        except Exception as e:
+            logger.error(f"Photo analysis error: {e}")
+        finally:
+            _discard_photo(job)
+
+    if not job.prefiltered and not _prefilter(job):
+        return None
+
+    relevant = True
+    photo_result = job.photo_result
+    if photo_result:
+        job.category = photo_result.get('category', 'Прочее')
+        job.address = photo_result.get('address')
+        # В служебный канал отправляем только анализ (описание от модели),
+        # без прямого копирования текста жалобы.
+        raw_desc = photo_result.get('description')
+        if raw_desc:
+            summary = raw_desc
+        else:
+            summary = f"Проблема ({job.category}): требуется проверка по фото из канала."
+        job.provider = photo_result.get('provider', '?')
+        job.location_hints = photo_result.get('location_hints')
+        job.exif_lat = photo_result.get('exif_lat')
+        job.exif_lon = photo_result.get('exif_lon')
+        has_vehicle = photo_result.get('has_vehicle_violation', False)
+        plates = photo_result.get('plates')
+
+        if has_vehicle and plates:
+            summary = f"🚗 Нарушение парковки ({plates}). {summary}"
+        elif has_vehicle:
+            summary = f"🚗 Нарушение парковки. {summary}"
+        job.summary = summary
+    else:
+        # Текстовый анализ
+        analysis = await analyze_complaint(job.text)
+        job.category = analysis.get('category', 'Прочее')
+        job.address = analysis.get('address')
+        job.summary = analysis.get('summary', job.text[:100])
+        job.provider = analysis.get('provider', '?')
+        job.severity = analysis.get('severity')
+        job.location_hints = analysis.get('location_hints')
+        relevant = analysis.get('relevant', True)
+
+    # AI + keyword фильтрация
+    if not _accept(job, relevant):
+        return None
 
+    job.analyzed = True
+    return job
 
-async def process_complaint(client, text, category, address, summary, provider, source, source_label, source_link, msg_id=None, channel=None, location_hints=None, exif_lat=None, exif_lon=None):
-    """Единая обработка жалобы: EXIF GPS / геопарсинг → SQLite → Telegram"""
-    # Приоритет: EXIF GPS → geoparse (AI адрес → парсер → ориентиры → hints)
-    lat, lon = None, None
-    if exif_lat and exif_lon:
-        lat, lon = exif_lat, exif_lon
+
+async def _stage_geocode(job: ComplaintJob) -> Optional[ComplaintJob]:
+    """Координаты: EXIF GPS → geoparse (AI адрес → парсер → ориентиры → hints)"""
+    if job.exif_lat and job.exif_lon:
+        job.lat, job.lon = job.exif_lat, job.exif_lon
         # Обратное геокодирование если нет адреса
-        if not address:
+        if not job.address:
             try:
                 from services.geo_service import reverse_geocode
-                rev_addr = await reverse_geocode(exif_lat, exif_lon)
+                rev_addr = await reverse_geocode(job.exif_lat, job.exif_lon)
                 if rev_addr:
-                    address = rev_addr
+                    job.address = rev_addr
             except Exception:
                 pass
     else:
-        geo = await geoparse(text, ai_address=address, location_hints=location_hints)
-        lat = geo.get("lat")
-        lon = geo.get("lng")
+        geo = await geoparse(job.text, ai_address=job.address, location_hints=job.location_hints)
+        job.lat = geo.get("lat")
+        job.lon = geo.get("lng")
         if geo.get("address"):
-            address = geo["address"]
+            job.address = geo["address"]
+    return job
+
+
+async def _stage_persist(job: ComplaintJob) -> Optional[ComplaintJob]:
+    """SQLite (с проверкой дубликатов)"""
+    try:
+        job.report_id = await save_to_db(
+            job.summary, job.text, job.lat, job.lon, job.address, job.category,
+            job.source, job.msg_id, job.channel,
+        )
+    except Exception as e:
+        # Дубликат — report_id None, публикация как раньше; ошибка БД — сообщение
+        # отбрасывается, а его id остаётся в обработке, и курсор канала его не пройдёт
+        job.persist_failed = True
+        _discard_photo(job)
+        logger.error(f"DB error ({job.source} #{job.msg_id}), повтор при догонке: {e}")
+        return None
+    return job
 
-    # SQLite
-    report_id = await save_to_db(summary, text, lat, lon, address, category, source, msg_id, channel)
 
+async def _stage_publish(job: ComplaintJob) -> Optional[ComplaintJob]:
+    """Постановка в очередь публикации @monitornv (отправка — в PublishQueue)"""
+    lat, lon = job.lat, job.lon
     # Определяем точность геолокации
     geo_accuracy = None
     if lat and lon:
-        if exif_lat and exif_lon:
+        if job.exif_lat and job.exif_lon:
             geo_accuracy = "high"  # EXIF GPS = 100% точность
-        elif address and len(address.split()) >= 3:  # Полный адрес с домом
+        elif job.address and len(job.address.split()) >= 3:  # Полный адрес с домом
             geo_accuracy = "high"
         else:
             geo_accuracy = "medium"
-    
-    # Telegram @monitornv
+
     timestamp = datetime.now().strftime('%d.%m.%Y %H:%M')
-    published = await publish_to_telegram(
-        client, category, report_id, summary, address, lat, lon,
-        source_label, source_link, timestamp, geo_accuracy=geo_accuracy
+    queued = await publish_to_telegram(
+        job.category, job.report_id, job.summary, job.address, lat, lon,
+        job.source_label, job.source_link, timestamp, geo_accuracy=geo_accuracy,
+        severity=job.severity, kind=job.kind, provider=job.provider,
     )
 
-    stats['by_category'][category] = stats['by_category'].get(category, 0) + 1
-    return published
+    stats['by_category'][job.category] = stats['by_category'].get(job.category, 0) + 1
+    if queued:
+        logger.debug(f"📤 В очереди публикации: {job.category} из {job.source_label} (severity {job.severity})")
+    return job
+
+
+def _discard_photo(job: ComplaintJob) -> None:
+    if job.photo_path:
+        _remove_file(job.photo_path)
+        job.photo_path = None
+
+
+def _remove_file(path: str) -> None:
+    try:
+        os.unlink(path)
+    except OSError:
+        pass
+
+
+def _cursor_key(job: ComplaintJob) -> Optional[Tuple[str, int]]:
+    """(источник RealtimeGuard, id) TG сообщения; курсоры VK двигает vk_monitor_service"""
+    if job.kind != "tg" or job.msg_id is None or not job.channel:
+        return None
+    return f"tg:{job.channel.lstrip('@')}", job.msg_id
+
+
+def _release_cursor(job: ComplaintJob, stage: str, passed: bool) -> None:
+    """Курсор TG канала проходит сообщение только после persist или когда оно отброшено (не из-за ошибки БД)"""
+    if guard is None or job.persist_failed or (passed and stage != "persist"):
+        return
+    key = _cursor_key(job)
+    if key is not None:
+        guard.release(*key)
+
+
+def build_pipeline(client, layout=PIPELINE_LAYOUT, extra_handlers=None, name="monitoring",
+                   on_stage_done=_release_cursor) -> IngestPipeline:
+    """Собирает конвейер (по умолчанию ingest → filter → analyze → geocode → persist → publish)"""
+    handlers = {
+        "ingest": functools.partial(_stage_ingest, client),
+        "filter": _stage_filter,
+        "analyze": _stage_analyze,
+        "geocode": _stage_geocode,
+        "persist": _stage_persist,
+        "publish": _stage_publish,
+    }
+    handlers.update(extra_handlers or {})
+    specs = []
+    for stage in layout:
+        workers, queue_size = PIPELINE_DEFAULTS[stage]
+        specs.append(StageSpec(
+            name=stage,
+            handler=handlers[stage],
+            workers=_stage_setting(stage, "WORKERS", workers),
+            queue_size=_stage_setting(stage, "QUEUE", queue_size),
+        ))
+    return IngestPipeline(specs, name=name, on_stage_done=on_stage_done)
+
+
+# Конвейер — инициализируется в main()
+pipeline: Optional[IngestPipeline] = None
+
+# Запись входящих постов для replay (MONITOR_RECORD_PATH) — инициализируется в main()
+recorder: Optional[MonitorRecorder] = None
+
+
+# ============================================================
+# SHARDED WORKERS (MONITOR_WORKERS > 1)
+# ============================================================
+
+# Пул процессов-воркеров — инициализируется в main()
+shards: Optional[ShardPool] = None
+_shard_reports: Dict[int, dict] = {}
+
+
+def _job_to_wire(job: ComplaintJob) -> dict:
+    """ComplaintJob → dict для передачи между процессами (без telethon-объекта)"""
+    job.raw = None
+    return asdict(job)
+
+
+async def _stage_dispatch(job: ComplaintJob):
+    """Координатор: передача TG сообщения в процесс-воркер его источника"""
+    await shards.send(shards.shard_for(job.source), _job_to_wire(job))
+    return HANDED_OFF
+
+
+async def _pump_shard_results(client) -> None:
+    """Координатор: результаты воркеров (TG и VK) → geocode/persist/publish, статистика"""
+    async for kind, payload in shards.results():
+        try:
+            if kind == "job":
+                job = ComplaintJob(**payload)
+                await pipeline.submit(job, stage="geocode", submitted_at=job.received_at)
+            elif kind == "dropped":
+                if guard is not None:
+                    guard.release(*payload)
+            elif kind == "record":
+                if recorder is not None:
+                    recorder.record_vk(*payload)
+            elif kind == "stats":
+                index, counters, summary = payload
+                _shard_reports[index] = {"counters": counters, "pipeline": summary}
+                for key in SHARD_STAT_KEYS:
+                    stats[key] = sum(r["counters"].get(key, 0) for r in _shard_reports.values())
+        except Exception as e:
+            logger.error(f"❌ Шард: ошибка обработки результата ({kind}): {e}", exc_info=True)
+
+
+class _ShardRecorder:
+    """Запись VK постов воркера через координатор (JSONL пишет один процесс)"""
+
+    def __init__(self, out_queue):
+        self._out_queue = out_queue
+
+    def record_vk(self, group: tuple, post: dict) -> None:
+        self._out_queue.put(("record", (group, post)))
+
+
+def _shard_worker_main(index, total, in_queue, out_queue, startup_time, run_vk, record):
+    """Точка входа процесса-воркера (spawn)"""
+    try:
+        asyncio.run(_shard_worker(index, total, in_queue, out_queue, startup_time, run_vk, record))
+    except KeyboardInterrupt:
+        pass
+
+
+async def _shard_worker(index, total, in_queue, out_queue, startup_time, run_vk, record):
+    """Воркер: filter → analyze для своих TG источников + опрос своих VK групп"""
+    global pipeline
+
+    share_ai_governor(total)
+
+    async def emit(job: ComplaintJob) -> ComplaintJob:
+        out_queue.put(("job", _job_to_wire(job)))
+        return job
+
+    def dropped(job: ComplaintJob, stage: str, passed: bool) -> None:
+        # Отброшенное воркером до координатора не вернётся — курсор отпускает координатор
+        key = _cursor_key(job)
+        if not passed and key is not None:
+            out_queue.put(("dropped", key))
+
+    pipeline = build_pipeline(None, SHARD_LAYOUT, {"emit": emit}, name=f"shard-{index}", on_stage_done=dropped)
+    await pipeline.start()
+
+    def report():
+        counters = {key: stats[key] for key in SHARD_STAT_KEYS}
+        summary = f"{pipeline.format_stats()}\n   {get_ai_governor().format_stats()}"
+        out_queue.put(("stats", (index, counters, summary)))
+
+    async def report_periodic():
+        while True:
+            await asyncio.sleep(SHARD_STATS_INTERVAL)
+            report()
+
+    tasks = [asyncio.create_task(report_periodic())]
+    groups = shard_groups(VK_GROUPS, index, total) if run_vk else []
+    if groups:
+        tasks.append(asyncio.create_task(
+            poll_all_groups(
+                on_post=handle_vk_post, poll_interval=120, startup_time=startup_time, groups=groups,
+                recorder=_ShardRecorder(out_queue) if record else None,
+            )
+        ))
+    logger.info(f"🧩 Воркер {index + 1}/{total}: TG шард + {len(groups)} VK групп")
+
+    loop = asyncio.get_running_loop()
+    try:
+        while True:
+            payload = await loop.run_in_executor(None, in_queue.get)
+            if payload is None:
+                break
+            job = ComplaintJob(**payload)
+            await pipeline.submit(job, submitted_at=job.received_at)
+    finally:
+        for task in tasks:
+            task.cancel()
+        await pipeline.stop(drain=True, timeout=30.0)
+        report()
 
 
 # ============================================================
@@ -424,155 +769,182 @@ async def process_complaint(client, text, category, address, summary, provider,
 # ============================================================
 
 async def handle_telegram_message(client, event):
-    """Обработчик новых сообщений из TG каналов (текст + фото)"""
+    """Обработчик новых сообщений из TG каналов: проверки guard → конвейер"""
     try:
+        channel_username = event.chat.username or ""
+        message_id = event.message.id
+
         # RealtimeGuard: проверка таймстемпа
         if guard:
             msg_time = event.message.date
             if not guard.is_new_message(msg_time):
-                channel = event.chat.username or ""
-                logger.info(f"⏭️ Старое сообщение: @{channel}/{event.message.id}, время: {msg_time}")
+                logger.info(f"⏭️ Старое сообщение: @{channel_username}/{message_id}, время: {msg_time}")
                 return
 
-            source = f"tg:{event.chat.username or ''}"
-            if guard.is_duplicate(source, event.message.id):
-                logger.debug(f"⏭️ Дубликат: {source}/{event.message.id}")
+            source = f"tg:{channel_username}"
+            if guard.is_duplicate(source, message_id):
+                logger.debug(f"⏭️ Дубликат: {source}/{message_id}")
                 return
+            # Отмечаем сразу: копия сообщения, пришедшая пока оригинал в конвейере, — дубликат.
+            # Курсор канала пройдёт его только после persist (_release_cursor)
+            guard.mark_processed(source, message_id)
 
-        text = event.message.text or event.message.message or ""
-        channel_username = event.chat.username or ""
-        channel_title = event.chat.title or channel_username
-        message_id = event.message.id
-        msg_link = f"https://t.me/{channel_username}/{message_id}"
+        if recorder is not None:
+            recorder.record_tg(channel_username, event.message)
+        await pipeline.submit(_tg_job(channel_username, event.message))
 
-        # Обработка фото с подписью
-        photo_result = None
-        if event.message.photo:
-            try:
-                import tempfile
-                tmp = tempfile.NamedTemporaryFile(delete=False, suffix=".jpg")
-                await client.download_media(event.message, file=tmp.name)
-                tmp.close()
-                caption = event.message.message or ""
-                photo_result = await analyze_image_with_glm4v(tmp.name, caption)
-                import os as _os
-                _os.unlink(tmp.name)
-                # text по‑прежнему нужен для базы и дальнейшей обработки,
-                # но в служебный канал мы шлём только аналитическое summary,
-                # поэтому НЕ дублируем сюда сырой текст.
-                if not text:
-                    text = caption or photo_result.get("description", "")
-            except Exception as e:
-                logger.error(f"Photo download/analysis error: {e}")
-
-        if not text or len(text.strip()) < MIN_TEXT_LENGTH:
-            return
-
-        stats['tg_total'] += 1
-
-        if is_ad_or_spam(text):
-            stats['tg_filtered'] += 1
-            return
-
-        # Если есть результат анализа фото — используем его
-        if photo_result:
-            category = photo_result.get('category', 'Прочее')
-            address = photo_result.get('address')
-            # В служебный канал отправляем только анализ (описание от модели),
-            # без прямого копирования текста жалобы.
-            raw_desc = photo_result.get('description')
-            if raw_desc:
-                summary = raw_desc
-            else:
-                summary = f"Проблема ({category}): требуется проверка по фото из канала."
-            provider = photo_result.get('provider', '?')
-            location_hints = photo_result.get('location_hints')
-            exif_lat = photo_result.get('exif_lat')
-            exif_lon = photo_result.get('exif_lon')
-            has_vehicle = photo_result.get('has_vehicle_violation', False)
-            plates = photo_result.get('plates')
-
-            if has_vehicle and plates:
-                summary = f"🚗 Нарушение парковки ({plates}). {summary}"
-            elif has_vehicle:
-                summary = f"🚗 Нарушение парковки. {summary}"
-        else:
-            # Текстовый анализ
-            analysis = await analyze_complaint(text)
-            category = analysis.get('category', 'Прочее')
-            address = analysis.get('address')
-            summary = analysis.get('summary', text[:100])
-            provider = analysis.get('provider', '?')
-            location_hints = analysis.get('location_hints')
-            exif_lat = None
-            exif_lon = None
-
-            # AI фильтрация
-            if not analysis.get('relevant', True):
-                stats['tg_filtered'] += 1
-                logger.info(f"⏭️ AI: нерелевантно [{provider}] из @{channel_username}: {text[:40]}...")
-                return
+    except Exception as e:
+        logger.error(f"❌ TG handler error: {e}", exc_info=True)
 
-        if not is_relevant_message(text, category):
-            stats['tg_filtered'] += 1
-            return
-
-        # Если есть EXIF координаты — передаём их напрямую в process_complaint
-        published = await process_complaint(
-            client, text, category, address, summary, provider,
-            source=f"tg:@{channel_username}",
-            source_label=f"@{channel_username}",
-            source_link=msg_link,
-            msg_id=message_id,
-            channel=f"@{channel_username}",
-            location_hints=location_hints,
-            exif_lat=exif_lat,
-            exif_lon=exif_lon,
-        )
-        if published:
-            stats['tg_published'] += 1
-            logger.info(f"✅ TG [{provider}] {category} из @{channel_username}")
 
-        # RealtimeGuard: отмечаем как обработанное
-        if guard:
-            guard.mark_processed(f"tg:{channel_username}", message_id)
+def _tg_job(channel_username: str, message) -> ComplaintJob:
+    return ComplaintJob(
+        kind="tg",
+        text=message.text or message.message or "",
+        source=f"tg:@{channel_username}",
+        source_label=f"@{channel_username}",
+        source_link=f"https://t.me/{channel_username}/{message.id}",
+        msg_id=message.id,
+        channel=f"@{channel_username}",
+        raw=message,
+    )
 
-    except Exception as e:
-        logger.error(f"❌ TG handler error: {e}", exc_info=True)
 
+async def prepare_catch_up(client) -> list:
+    """
+    Определяет каналы для догонки до регистрации обработчика новых сообщений:
+    с этого момента курсор канала двигает только догонка, поэтому живые
+    сообщения не «перепрыгнут» пропуск, если процесс упадёт посреди догонки.
+    """
+    plan = []
+    for channel in CHANNELS_TO_MONITOR:
+        try:
+            entity = await client.get_entity(channel)
+            channel_username = entity.username or channel.lstrip("@")
+            source = f"tg:{channel_username}"
+            cursor = guard.cursor(source)
+            if cursor is None:
+                # Первый запуск: пропуска нет — ставим якорь на последнем сообщении
+                latest = await client.get_messages(entity, limit=1)
+                if latest:
+                    guard.set_cursor(source, latest[0].id)
+                continue
+            guard.begin_catch_up(source)
+            plan.append((entity, channel_username, cursor))
+        except Exception as e:
+            logger.warning(f"⚠️ Догонка {channel}: {e}")
+    return plan
+
+
+@dataclass
+class ChannelCatchUp:
+    """Состояние догонки канала: с какого id продолжать после прерывания"""
+    entity: Any
+    channel_username: str
+    last_id: int                   # последний просмотренный id (iter_messages min_id)
+    queued: int = 0
+    attempts: int = 0
+    due: float = 0.0               # time.monotonic() следующей попытки
+
+
+async def _catch_up_channel(client, state: ChannelCatchUp, interval: float) -> None:
+    """Догоняет один канал от state.last_id до момента запуска (исключение — прервано)"""
+    source = f"tg:{state.channel_username}"
+    oldest = guard.startup_time - timedelta(hours=CATCHUP_MAX_AGE_HOURS)
+    async for message in client.iter_messages(state.entity, min_id=state.last_id, reverse=True):
+        if message.date and message.date >= guard.startup_time:
+            break  # дальше — живые сообщения, их принимает обработчик
+        if message.date and message.date < oldest:
+            guard.mark_skipped(source, message.id)
+            state.last_id = message.id
+            continue
+        if state.queued >= CATCHUP_MAX_PER_CHANNEL:
+            logger.warning(f"⚠️ Догонка @{state.channel_username}: лимит {CATCHUP_MAX_PER_CHANNEL}, остальное пропущено")
+            break
+        if guard.is_duplicate(source, message.id):
+            guard.mark_skipped(source, message.id)
+            state.last_id = message.id
+            continue
+
+        # Не занимаем больше половины очереди — живые сообщения идут первыми
+        depth, capacity = pipeline.queue_depth()
+        while depth * 2 >= capacity:
+            await asyncio.sleep(1.0)
+            depth, capacity = pipeline.queue_depth()
+
+        guard.mark_processed(source, message.id, backfill=True)
+        await pipeline.submit(_tg_job(state.channel_username, message))
+        state.last_id = message.id
+        state.queued += 1
+        await asyncio.sleep(interval)
+    guard.end_catch_up(source)
+
+
+async def catch_up_channels(client, plan: list) -> None:
+    """
+    Фоновая догонка пропущенных за время простоя сообщений TG каналов.
+    Прерванная догонка канала (сеть, FloodWait) повторяется с последнего
+    просмотренного id через растущую паузу; остальные каналы тем временем догоняются.
+    """
+    interval = 1.0 / CATCHUP_RATE if CATCHUP_RATE > 0 else 0.0
+    pending = [ChannelCatchUp(entity, channel_username, cursor) for entity, channel_username, cursor in plan]
+    total = 0
+    while pending:
+        state = min(pending, key=lambda s: s.due)
+        delay = state.due - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        try:
+            await _catch_up_channel(client, state, interval)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            backoff = min(CATCHUP_RETRY_MAX, CATCHUP_RETRY_MIN * 2 ** state.attempts)
+            state.attempts += 1
+            state.due = time.monotonic() + backoff
+            logger.warning(
+                f"⚠️ Догонка @{state.channel_username} прервана на id {state.last_id}: {e} — повтор через {backoff:.0f}с"
+            )
+            continue
+        pending.remove(state)
+        if state.queued:
+            logger.info(f"⏪ Догонка @{state.channel_username}: {state.queued} сообщений в конвейер")
+        total += state.queued
+    logger.info(f"⏪ Догонка завершена: {total} пропущенных сообщений")
 
 
 # ============================================================
 # VK MONITORING CALLBACK
 # ============================================================
 
-async def handle_vk_complaint(client, complaint_data: dict):
-    """Callback для VK мониторинга — обрабатывает найденную жалобу"""
-    stats['vk_total'] += 1
-
-    published = await process_complaint(
-        client,
-        text=complaint_data["text"],
-        category=complaint_data["category"],
-        address=complaint_data.get("address"),
-        summary=complaint_data["summary"],
-        provider=complaint_data.get("provider", "?"),
-        source=complaint_data["source"],
-        source_label=complaint_data["source_name"],
-        source_link=complaint_data["post_link"],
-        location_hints=complaint_data.get("location_hints"),
+async def handle_vk_post(post_data: dict):
+    """Callback для VK мониторинга — сырой пост в конвейер: фильтры и AI анализ на его стадиях"""
+    job = ComplaintJob(
+        kind="vk",
+        text=post_data["text"],
+        source=post_data["source"],
+        source_label=post_data["source_name"],
+        source_link=post_data["post_link"],
     )
-    if published:
-        stats['vk_published'] += 1
-        logger.info(f"✅ VK [{complaint_data.get('provider')}] {complaint_data['category']} из {complaint_data['source_name']}")
+    await pipeline.submit(job, stage="filter")
 
 
 # ============================================================
 # MAIN
 # ============================================================
 
+async def _rebuild_published_index(client) -> None:
+    """Один раз при запуске дополняет индекс опубликованного из ленты канала"""
+    try:
+        messages = await client.get_messages(TARGET_CHANNEL, limit=PUBLISHED_INDEX_REBUILD_LIMIT)
+        added = published_index.rebuild_from_posts((m.message, m.date) for m in messages if m.message)
+        logger.info(f"🗂️ Индекс публикаций: +{added} из канала, всего ключей {len(published_index)}")
+    except Exception as e:
+        logger.warning(f"⚠️ Индекс публикаций: не удалось прочитать канал: {e}")
+
+
 async def main():
-    global guard
+    global guard, pipeline, published_index, cursor_store, publish_queue, recorder, shards
     logger.info("=" * 60)
     logger.info("🚀 ЕДИНЫЙ МОНИТОРИНГ: Telegram + VK → AI → SQLite + @monitornv")
     logger.info("=" * 60)
@@ -581,12 +953,34 @@ async def main():
         logger.error("❌ TG_API_ID или TG_API_HASH не найдены в .env")
         return
 
-    # Инициализация RealtimeGuard
-    guard = RealtimeGuard()
+    # Инициализация RealtimeGuard (курсоры каналов — на диске)
+    cursor_store = CursorStore()
+    guard = RealtimeGuard(cursor_store=cursor_store)
     logger.info(f"⏱️ Время запуска (UTC): {guard.startup_time.isoformat()}")
     logger.info("🛡️ RealtimeGuard: только новые сообщения + дедупликация")
 
+    published_index = PublishedIndex()
+    logger.info(f"🗂️ Индекс публикаций: загружено {published_index.load()} ключей")
+
+    recorder = recorder_from_env()
+
     client = TelegramClient('monitoring_session', API_ID, API_HASH)
+    if MONITOR_WORKERS > 1:
+        shards = ShardPool(
+            MONITOR_WORKERS, _shard_worker_main,
+            args=(guard.startup_time, bool(VK_SERVICE_TOKEN), recorder is not None), name="monitoring-shard",
+        )
+        pipeline = build_pipeline(client, COORDINATOR_LAYOUT, {"dispatch": _stage_dispatch})
+    else:
+        pipeline = build_pipeline(client)
+    publish_queue = PublishQueue(
+        functools.partial(_send_post, client),
+        rate_per_min=PUBLISH_RATE_PER_MIN,
+        burst=PUBLISH_BURST,
+    )
+    vk_task = None
+    catch_up_task = None
+    shard_pump_task = None
 
     try:
         # Если сессия валидна — подключится без ввода кода
@@ -608,6 +1002,16 @@ async def main():
                 logger.info(f"✅ Целевой канал: {ch.title}")
             except Exception as e:
                 logger.error(f"❌ Канал {TARGET_CHANNEL}: {e}")
+            await _rebuild_published_index(client)
+
+        await pipeline.start()
+        await publish_queue.start()
+        if shards is not None:
+            shards.start()
+            shard_pump_task = asyncio.create_task(_pump_shard_results(client))
+
+        # Каналы для догонки — до регистрации обработчика (см. prepare_catch_up)
+        catch_up_plan = await prepare_catch_up(client) if CATCHUP_ENABLED else []
 
         # --- Telegram мониторинг ---
         logger.info(f"\n📡 TELEGRAM: {len(CHANNELS_TO_MONITOR)} каналов")
@@ -619,23 +1023,27 @@ async def main():
             await handle_telegram_message(client, event)
             _print_stats_periodic()
 
+        if catch_up_plan:
+            catch_up_task = asyncio.create_task(catch_up_channels(client, catch_up_plan))
+
         # --- VK мониторинг ---
-        if VK_SERVICE_TOKEN:
+        if VK_SERVICE_TOKEN and shards is not None:
+            logger.info(f"\n🔵 VK: {len(VK_GROUPS)} пабликов, опрос в {shards.workers} процессах-воркерах")
+        elif VK_SERVICE_TOKEN:
             logger.info(f"\n🔵 VK: {len(VK_GROUPS)} пабликов")
             for short_name, gid, name in VK_GROUPS:
                 logger.info(f"   • {name}")
 
-            async def vk_callback(complaint_data):
-                await handle_vk_complaint(client, complaint_data)
-
             vk_task = asyncio.create_task(
-                poll_all_groups(on_complaint=vk_callback, poll_interval=120, startup_time=guard.startup_time)
+                poll_all_groups(
+                    on_post=handle_vk_post, poll_interval=120,
+                    startup_time=guard.startup_time, cursor_store=cursor_store, recorder=recorder,
+                )
             )
-            logger.info("✅ VK polling запущен (интервал 2 мин)")
+            logger.info("✅ VK polling запущен (execute, адаптивный интервал)")
         else:
             logger.warning("⚠️ VK_SERVICE_TOKEN не задан — VK мониторинг отключён")
             logger.warning("   Получите токен: https://dev.vk.com → Мои приложения → Сервисный ключ")
-            vk_task = None
 
         # Data storage: SQLite + Supabase
         logger.info("✅ Данные сохраняются в SQLite + Supabase")
@@ -652,9 +1060,25 @@ async def main():
     except Exception as e:
         logger.error(f"❌ {e}", exc_info=True)
     finally:
+        for task in (vk_task, catch_up_task):
+            if task is not None:
+                task.cancel()
+        if shards is not None:
+            # Порядок: раздать воркерам принятое → дождаться их результатов → persist/publish
+            try:
+                await asyncio.wait_for(pipeline.join(until="dispatch"), timeout=30.0)
+            except asyncio.TimeoutError:
+                logger.warning("⚠️ Не все сообщения переданы воркерам за 30с")
+            await shards.stop(timeout=60.0)
+            if shard_pump_task is not None:
+                await shard_pump_task
+        await pipeline.stop(drain=True, timeout=30.0)
+        await publish_queue.stop(drain=True, timeout=30.0)
         _print_final_stats()
-        if vk_task is not None:
-            vk_task.cancel()
+        published_index.close()
+        cursor_store.close()
+        if recorder is not None:
+            recorder.close()
         await client.disconnect()
 
 
@@ -667,13 +1091,25 @@ def _print_stats_periodic():
         total = stats['tg_total'] + stats['vk_total']
         published = stats['tg_published'] + stats['vk_published']
         gs = guard.stats if guard else None
-        guard_info = f" | 🛡️ Старые: {gs.skipped_old} Дубли: {gs.skipped_duplicate}" if gs else ""
+        guard_info = (
+            f" | 🛡️ Старые: {gs.skipped_old} Дубли: {gs.skipped_duplicate} Догнано: {gs.backfilled_count}"
+            if gs else ""
+        )
         logger.info(
             f"📊 TG: {stats['tg_published']}/{stats['tg_total']} | "
             f"VK: {stats['vk_published']}/{stats['vk_total']} | "
             ""
             f"Всего: {published}/{total}{guard_info}"
         )
+        if pipeline is not None:
+            logger.info(f"🧵 {pipeline.format_stats()}")
+        for index, report in sorted(_shard_reports.items()):
+            logger.info(f"🧩 Воркер {index + 1}: {report['pipeline']}")
+        if shards is None:
+            logger.info(get_ai_governor().format_stats())
+            logger.info(get_nominatim_scheduler().format_stats())
+        if publish_queue is not None:
+            logger.info(publish_queue.format_stats())
 
 
 def _print_final_stats():
@@ -685,6 +1121,20 @@ def _print_final_stats():
     logger.info(f"   Всего: {published}/{total}")
     for cat, cnt in sorted(stats['by_category'].items(), key=lambda x: x[1], reverse=True):
         logger.info(f"   {EMOJI.get(cat, '❔')} {cat}: {cnt}")
+    if pipeline is not None:
+        logger.info("🧵 Конвейер по стадиям:")
+        for name, s in pipeline.stats()["stages"].items():
+            logger.info(
+                f"   {name}: {s['processed']} обработано, {s['dropped']} отброшено, "
+                f"{s['errors']} ошибок, avg {s['avg_ms']}ms, p95 {s['p95_ms']}ms"
+            )
+    for index, report in sorted(_shard_reports.items()):
+        logger.info(f"🧩 Воркер {index + 1}: {report['pipeline']}")
+    if shards is None:
+        logger.info(get_ai_governor().format_stats())
+        logger.info(get_nominatim_scheduler().format_stats())
+    if publish_queue is not None:
+        logger.info(publish_queue.format_stats())
 
 
 if __name__ == "__main__":